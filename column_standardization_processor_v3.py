@@ -8,8 +8,12 @@ CSV列名智能标准化处理器 V3
 
 import json
 import os
+import atexit
+import csv
+import hashlib
 import asyncio
 import logging
+import threading
 from typing import Dict, List, Tuple, Any, Optional
 from datetime import datetime
 from pathlib import Path
@@ -24,13 +28,221 @@ logger = logging.getLogger(__name__)
 # 导入DeepSeek客户端
 from deepseek_client import DeepSeekClient
 
+# 列映射记忆文件（表头基本每周不变，命中后无需调用AI）
+DEFAULT_MEMO_PATH = Path(__file__).parent / 'config' / 'column_mapping_memo.json'
+# 命中计数只在内存中累加，随下一次写回一并落盘；累计到该次数时单独落盘一次
+HIT_FLUSH_EVERY = 50
+
+
+def _reason(info: Any) -> Optional[str]:
+    """取AI返回的筛选/未映射说明中的原因"""
+    if isinstance(info, dict):
+        return info.get('reason')
+    return str(info) if info else None
+
+
+class ColumnMappingMemo:
+    """
+    列映射记忆
+    
+    以 doc_id + 规范化表头签名 为键，保存AI返回的列映射结果。
+    - 标准化前先查询记忆，命中则不调用AI
+    - AI映射成功后写回记忆
+    - 同一doc_id的表头签名发生变化时使旧记忆失效
+    """
+    
+    def __init__(self, memo_path: Optional[str] = None):
+        self.memo_path = Path(memo_path) if memo_path else DEFAULT_MEMO_PATH
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._unsaved_hits = 0
+    
+    @staticmethod
+    def normalize_header(name: Any) -> str:
+        """规范化单个列名（去除首尾空白、合并内部空白）"""
+        return ' '.join(str(name or '').split())
+    
+    @classmethod
+    def header_signature(cls, headers) -> str:
+        """
+        计算有序表头签名
+        
+        Args:
+            headers: 有序表头列表，或 {Excel列标识: 列名} 字典
+        """
+        if isinstance(headers, dict):
+            items = [f"{col_id}={cls.normalize_header(name)}"
+                     for col_id, name in sorted(headers.items())]
+        else:
+            items = [cls.normalize_header(name) for name in headers]
+        return hashlib.sha256('\x1f'.join(items).encode('utf-8')).hexdigest()[:32]
+    
+    @staticmethod
+    def _key(doc_id: Optional[str], signature: str) -> str:
+        # 无doc_id时按签名单独建档
+        return doc_id if doc_id else f"sig:{signature}"
+    
+    def _load(self) -> Dict[str, Dict]:
+        if not self.memo_path.exists():
+            return {}
+        try:
+            with open(self.memo_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('entries', {})
+        except Exception as e:
+            logger.warning(f"列映射记忆加载失败，将重新学习: {e}")
+            return {}
+    
+    def _save(self):
+        self.memo_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.memo_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': '1.0', 'entries': self._entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.memo_path)
+        self._unsaved_hits = 0
+
+    def flush(self):
+        """落盘尚未保存的命中计数"""
+        with self._lock:
+            if self._unsaved_hits:
+                self._save()
+    
+    def lookup(self, doc_id: Optional[str], signature: str,
+               column_mapping: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """
+        查询记忆
+        
+        Returns:
+            命中时返回与AI响应同结构的解析结果，否则返回None
+        """
+        with self._lock:
+            key = self._key(doc_id, signature)
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            
+            if entry.get('signature') != signature:
+                # 表头漂移：旧映射不再可信
+                logger.info(f"表头已变化，列映射记忆失效: {key}")
+                del self._entries[key]
+                self._save()
+                return None
+            
+            learned = entry.get('columns', {})
+            # 记忆必须覆盖本次所有修改列（列标识和原始列名都一致）
+            for col_id, col_name in column_mapping.items():
+                known = learned.get(col_id)
+                if not known or known.get('original_name') != self.normalize_header(col_name):
+                    return None
+            
+            # 命中计数不必每次落盘，避免每次命中都重写整个记忆文件
+            entry['hits'] = entry.get('hits', 0) + 1
+            entry['last_hit_at'] = datetime.now().isoformat()
+            self._unsaved_hits += 1
+            if self._unsaved_hits >= HIT_FLUSH_EVERY:
+                self._save()
+        
+        mapped = {col_id: learned[col_id] for col_id in column_mapping}
+        confidences = [c.get('confidence', 1.0) for c in mapped.values()]
+        filtered_out = {col_id: {"original_name": c['original_name'], "reason": c['filtered_out']}
+                        for col_id, c in mapped.items()
+                        if not c.get('standard_name') and c.get('filtered_out')}
+        result = {
+            "success": True,
+            "column_mapping": {col_id: c['standard_name'] for col_id, c in mapped.items()
+                               if c.get('standard_name')},
+            "confidence_scores": {col_id: c.get('confidence', 1.0) for col_id, c in mapped.items()
+                                  if c.get('standard_name')},
+            "unmapped_columns": {col_id: {"original_name": c['original_name'],
+                                          "reason": c.get('unmapped_reason') or "记忆中无法映射"}
+                                 for col_id, c in mapped.items()
+                                 if not c.get('standard_name') and col_id not in filtered_out},
+            "statistics": {
+                "total_columns": len(column_mapping),
+                "mapped_count": sum(1 for c in mapped.values() if c.get('standard_name')),
+                "average_confidence": round(sum(confidences) / len(confidences), 3) if confidences else 0
+            }
+        }
+        if filtered_out:
+            result["filtered_out"] = filtered_out
+            result["statistics"]["filtered_count"] = len(filtered_out)
+        return result
+    
+    def remember(self, doc_id: Optional[str], signature: str,
+                 column_mapping: Dict[str, str], parsed: Dict[str, Any]):
+        """AI映射成功后写回记忆（同一签名下的映射会合并）"""
+        ai_mapping = parsed.get('column_mapping', {})
+        confidence_scores = parsed.get('confidence_scores', {})
+        filtered_out = parsed.get('filtered_out') or {}
+        unmapped = parsed.get('unmapped_columns') or {}
+        
+        with self._lock:
+            key = self._key(doc_id, signature)
+            entry = self._entries.get(key)
+            if not entry or entry.get('signature') != signature:
+                entry = {
+                    'doc_id': doc_id,
+                    'signature': signature,
+                    'created_at': datetime.now().isoformat(),
+                    'hits': 0,
+                    'columns': {}
+                }
+                self._entries[key] = entry
+            
+            for col_id, col_name in column_mapping.items():
+                column = {
+                    'original_name': self.normalize_header(col_name),
+                    'standard_name': ai_mapping.get(col_id),
+                    'confidence': confidence_scores.get(col_id, 1.0)
+                }
+                # 被筛选掉/无法映射的列连同原因一起记住，命中时原样还原
+                if col_id in filtered_out:
+                    column['filtered_out'] = _reason(filtered_out[col_id]) or "超过19列被筛选"
+                elif col_id in unmapped:
+                    column['unmapped_reason'] = _reason(unmapped[col_id])
+                entry['columns'][col_id] = column
+            entry['updated_at'] = datetime.now().isoformat()
+            self._save()
+    
+    def invalidate(self, doc_id: str):
+        """手动清除某个文档的记忆"""
+        with self._lock:
+            if self._entries.pop(doc_id, None) is not None:
+                self._save()
+
+
+_memos: Dict[Path, ColumnMappingMemo] = {}
+_memos_lock = threading.Lock()
+
+
+def get_column_mapping_memo(memo_path: Optional[str] = None) -> ColumnMappingMemo:
+    """
+    按文件路径共享列映射记忆实例
+    每次工作流都会新建处理器，共享实例使命中计数能跨次累积，进程退出时落盘
+    """
+    path = Path(memo_path) if memo_path else DEFAULT_MEMO_PATH
+    with _memos_lock:
+        memo = _memos.get(path)
+        if memo is None:
+            memo = _memos[path] = ColumnMappingMemo(path)
+            atexit.register(memo.flush)
+        return memo
+
+
 class ColumnStandardizationProcessorV3:
     """列名标准化处理器V3 - 适配简化输出格式，支持智能筛选"""
     
-    def __init__(self, api_key: str):
-        """初始化处理器"""
+    def __init__(self, api_key: str, memo_path: Optional[str] = None, use_memo: bool = True):
+        """
+        初始化处理器
+        
+        Args:
+            api_key: DeepSeek API密钥
+            memo_path: 列映射记忆文件路径（默认config/column_mapping_memo.json）
+            use_memo: 是否启用列映射记忆
+        """
         self.api_key = api_key
         self.deepseek_client = DeepSeekClient(api_key)
+        self.memo = get_column_mapping_memo(memo_path) if use_memo else None
         
         # 19个标准列名
         self.standard_columns = [
@@ -63,6 +275,23 @@ class ColumnStandardizationProcessorV3:
         
         return column_mapping
     
+    @staticmethod
+    def read_header_row(csv_path: str) -> List[str]:
+        """
+        读取CSV的表头行
+        腾讯文档导出的CSV第一行可能是标题行，取前两行中非空单元格最多的一行
+        """
+        with open(csv_path, 'r', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            candidates = []
+            for row in reader:
+                candidates.append(row)
+                if len(candidates) >= 2:
+                    break
+        if not candidates:
+            return []
+        return max(candidates, key=lambda row: sum(1 for cell in row if cell.strip()))
+    
     def build_smart_standardization_prompt(self, column_mapping: Dict[str, str]) -> str:
         """
         构建智能标准化提示词
@@ -141,16 +370,34 @@ class ColumnStandardizationProcessorV3:
         
         return prompt
     
-    async def standardize_column_names(self, column_mapping: Dict[str, str]) -> Dict[str, Any]:
+    async def standardize_column_names(self, column_mapping: Dict[str, str],
+                                       doc_id: Optional[str] = None,
+                                       headers: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         调用AI进行列名标准化（支持智能筛选）
+        优先查询列映射记忆，命中时不调用AI
         
         Args:
             column_mapping: {Excel列标识: 列名} 的字典
+            doc_id: 腾讯文档ID（可选，用于记忆键）
+            headers: 完整有序表头（可选，提供时按整表表头计算签名）
             
         Returns:
             标准化结果
         """
+        signature = None
+        if self.memo is not None:
+            signature = ColumnMappingMemo.header_signature(headers if headers else column_mapping)
+            cached = self.memo.lookup(doc_id, signature, column_mapping)
+            if cached is not None:
+                logger.info(f"列映射记忆命中（doc_id={doc_id}），跳过AI调用")
+                return {
+                    "success": True,
+                    "result": cached,
+                    "original_mapping": column_mapping,
+                    "from_memo": True
+                }
+        
         prompt = self.build_smart_standardization_prompt(column_mapping)
         
         messages = [
@@ -188,6 +435,9 @@ class ColumnStandardizationProcessorV3:
                         parsed["column_mapping"] = filtered_mapping
                         parsed["statistics"]["mapped_count"] = 19
                     
+                    if self.memo is not None:
+                        self.memo.remember(doc_id, signature, column_mapping, parsed)
+                    
                     return {
                         "success": True,
                         "result": parsed,
@@ -265,12 +515,16 @@ class ColumnStandardizationProcessorV3:
             "filtered_count": len(standardization_result["result"].get("filtered_out", {}))
         }
     
-    async def process_simplified_comparison_file(self, comparison_file_path: str) -> Dict[str, Any]:
+    async def process_simplified_comparison_file(self, comparison_file_path: str,
+                                                 doc_id: Optional[str] = None,
+                                                 headers: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         处理简化CSV对比结果文件的完整流程
         
         Args:
             comparison_file_path: 简化CSV对比结果文件路径
+            doc_id: 腾讯文档ID（可选，用于列映射记忆）
+            headers: 完整有序表头（可选）
             
         Returns:
             处理结果
@@ -287,7 +541,9 @@ class ColumnStandardizationProcessorV3:
                 return {"success": False, "error": "未找到修改列"}
             
             # 步骤2：调用AI标准化（支持智能筛选）
-            standardization_result = await self.standardize_column_names(column_mapping)
+            standardization_result = await self.standardize_column_names(
+                column_mapping, doc_id=doc_id, headers=headers
+            )
             
             if not standardization_result.get("success"):
                 return standardization_result
@@ -304,13 +560,15 @@ class ColumnStandardizationProcessorV3:
             logger.error(f"处理文件失败: {e}")
             return {"success": False, "error": str(e)}
     
-    def sync_process_file(self, comparison_file_path: str) -> Dict[str, Any]:
+    def sync_process_file(self, comparison_file_path: str,
+                          doc_id: Optional[str] = None,
+                          headers: Optional[List[str]] = None) -> Dict[str, Any]:
         """同步版本的文件处理"""
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
             return loop.run_until_complete(
-                self.process_simplified_comparison_file(comparison_file_path)
+                self.process_simplified_comparison_file(comparison_file_path, doc_id, headers)
             )
         finally:
             loop.close()
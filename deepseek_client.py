@@ -8,9 +8,16 @@ DeepSeek V3 API客户端
 import aiohttp
 import asyncio
 import json
+import os
 import logging
 from typing import Dict, Any, List, Optional
 
+try:
+    from production.core_modules.workflow_stage_metrics import count_external_call
+except ImportError:
+    def count_external_call(kind: str, n: int = 1):
+        """指标模块不可用时不计数"""
+
 logger = logging.getLogger(__name__)
 
 class DeepSeekClient:
@@ -18,7 +25,8 @@ class DeepSeekClient:
     
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.base_url = "https://api.siliconflow.cn/v1"
+        # 可通过环境变量指向本地模拟服务（离线基准测试使用）
+        self.base_url = os.getenv('DEEPSEEK_BASE_URL', "https://api.siliconflow.cn/v1")
         self.model = "deepseek-ai/DeepSeek-V3"
         
         # 配置
@@ -54,6 +62,7 @@ class DeepSeekClient:
         
         try:
             timeout = aiohttp.ClientTimeout(total=self.timeout)
+            count_external_call('deepseek')
             async with aiohttp.ClientSession(timeout=timeout) as session:
                 async with session.post(
                     f"{self.base_url}/chat/completions",
@@ -182,6 +191,7 @@ class DeepSeekClient:
         }
         
         try:
+            count_external_call('deepseek')
             response = requests.post(
                 f"{self.base_url}/chat/completions",
                 headers=headers,
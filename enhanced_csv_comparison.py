@@ -6,9 +6,18 @@
 """
 
 import csv
+import os
+import sys
 from typing import Dict, List, Any, Tuple
 import difflib
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'production/core_modules'))
+try:
+    from baseline_store import load_baseline
+except ImportError:
+    load_baseline = None
+from cell_diff_kernel import changed_cells
+
 def enhanced_csv_compare(baseline_path: str, target_path: str) -> Dict[str, Any]:
     """
     专业CSV对比功能 - 单元格级别对比
@@ -21,9 +30,16 @@ def enhanced_csv_compare(baseline_path: str, target_path: str) -> Dict[str, Any]
         dict: 详细的对比结果，包含相似度评分
     """
     
-    # 读取文件
-    with open(baseline_path, 'r', encoding='utf-8') as f:
-        baseline_data = list(csv.reader(f))
+    # 读取文件（基线取列式存储，一周内只解析一次）
+    baseline_data = None
+    if load_baseline is not None:
+        try:
+            baseline_data = load_baseline(baseline_path).rows()
+        except (OSError, ValueError):
+            baseline_data = None
+    if baseline_data is None:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline_data = list(csv.reader(f))
     
     with open(target_path, 'r', encoding='utf-8') as f:
         target_data = list(csv.reader(f))
@@ -58,52 +74,22 @@ def enhanced_csv_compare(baseline_path: str, target_path: str) -> Dict[str, Any]
     # 处理每个操作码
     for tag, i1, i2, j1, j2 in matcher.get_opcodes():
         if tag == 'equal':
-            # 相同的行结构，但仍需检查每个单元格（因为可能有细微差异）
-            for baseline_idx, target_idx in zip(range(i1, i2), range(j1, j2)):
-                baseline_row = baseline_data[baseline_idx]
-                target_row = target_data[target_idx]
-                
-                # 对比共同列的单元格
-                row_has_changes = False
-                for col_idx in range(min_cols):
-                    total_cells_compared += 1
-                    baseline_cell = baseline_row[col_idx] if col_idx < len(baseline_row) else ""
-                    target_cell = target_row[col_idx] if col_idx < len(target_row) else ""
-                    
-                    if baseline_cell == target_cell:
-                        identical_cells += 1
-                    else:
-                        modified_cells += 1
-                        row_has_changes = True
-                
-                if row_has_changes and baseline_idx not in modified_rows:
-                    modified_rows.append(baseline_idx)
+            # 相同的行：前min_cols列（补齐后）的元组完全相同，逐格对比必然全部一致
+            total_cells_compared += (i2 - i1) * min_cols
+            identical_cells += (i2 - i1) * min_cols
         
         elif tag == 'replace':
             # 被替换的行 - 也进行单元格级别对比
             # 对于替换的行，仍然进行单元格级别的对比
             # 这能更准确地反映实际的修改情况
-            for baseline_idx in range(i1, min(i2, i1 + (j2-j1))):
-                target_idx = j1 + (baseline_idx - i1)
-                if target_idx < j2:
-                    baseline_row = baseline_data[baseline_idx]
-                    target_row = target_data[target_idx]
-                    
-                    # 对比单元格
-                    row_has_changes = False
-                    for col_idx in range(min_cols):
-                        total_cells_compared += 1
-                        baseline_cell = baseline_row[col_idx] if col_idx < len(baseline_row) else ""
-                        target_cell = target_row[col_idx] if col_idx < len(target_row) else ""
-                        
-                        if baseline_cell == target_cell:
-                            identical_cells += 1
-                        else:
-                            modified_cells += 1
-                            row_has_changes = True
-                    
-                    if row_has_changes:
-                        modified_rows.append(baseline_idx)
+            paired = min(i2 - i1, j2 - j1)
+            changed = changed_cells(baseline_tuples[i1:i1 + paired], target_tuples[j1:j1 + paired],
+                                    strip=False, n_cols=min_cols)
+            total_cells_compared += paired * min_cols
+            modified_cells += len(changed)
+            identical_cells += paired * min_cols - len(changed)
+            changed_rows = sorted({row for row, _ in changed})
+            modified_rows.extend(i1 + row for row in changed_rows)
             
             # 处理行数不匹配的情况
             if i2-i1 > j2-j1:
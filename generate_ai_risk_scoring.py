@@ -10,6 +10,8 @@ import random
 import os
 from datetime import datetime
 
+from production.core_modules.result_file_index import record_result_file
+
 class AIRiskScoringProcessor:
     def __init__(self):
         """初始化AI风险评分处理器"""
@@ -142,6 +144,7 @@ class AIRiskScoringProcessor:
         output_file = f"/root/projects/tencent-doc-manager/csv_versions/standard_outputs/table_{table_num:03d}_diff_risk_scoring_final.json"
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(output_data, f, ensure_ascii=False, indent=2)
+        record_result_file(output_file, output_data)
         
         print(f"✅ table_{table_num:03d} AI评分完成: L1={summary_stats['l1_high_risk_count']}, L2={summary_stats['l2_medium_risk_count']}, L3={summary_stats['l3_low_risk_count']}")
     
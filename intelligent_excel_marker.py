@@ -16,6 +16,15 @@ from openpyxl.styles import PatternFill
 from openpyxl.comments import Comment
 import logging
 
+try:
+    from production.core_modules.score_stream import iter_events, iter_records
+    from production.core_modules.result_file_index import (
+        find_score_file, parse_document_key, register_score_file
+    )
+except ImportError:
+    from score_stream import iter_events, iter_records
+    from result_file_index import find_score_file, parse_document_key, register_score_file
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -149,6 +158,8 @@ class DetailedScoreGenerator:
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(score_data, f, ensure_ascii=False, indent=2)
         
+        register_score_file(output_file, parse_document_key(target_file), doc_name)
+        
         logger.info(f"✓ 详细打分JSON已生成: {output_file}")
         logger.info(f"  - 总单元格: {score_data['statistics']['total_cells']}")
         logger.info(f"  - 变更单元格: {score_data['statistics']['changed_cells']}")
@@ -257,14 +268,18 @@ class IntelligentExcelMarker:
         
         # 使用列级别涂色模式
         self.use_column_level_coloring = True
+
+        # 最近一次涂色的打分单元格数与实际涂色数
+        self.last_scored_cells = 0
+        self.last_colored_cells = 0
     
     def find_matching_score_file(self, excel_file: str) -> Optional[str]:
         """
         查找与Excel文件匹配的详细打分JSON
         
         匹配逻辑：
-        1. 提取Excel文件的基础名称
-        2. 在打分目录中查找包含该名称的JSON
+        1. 标准文件名按 (doc_id, 周, 版本) 查打分文件查找索引，再退到该文档最新的打分
+        2. 索引未命中（打分早于索引的旧文件）时，在打分目录中查找包含该名称的JSON
         3. 如果有多个匹配，选择最新的
         """
         # 提取文档标识信息
@@ -273,6 +288,18 @@ class IntelligentExcelMarker:
         
         logger.info(f"查找匹配的打分文件: {doc_name}")
         
+        # 方法0：查找索引（常数时间，与目录中的历史文件数无关）
+        document = parse_document_key(base_name)
+        if document:
+            indexed = (find_score_file(self.score_dir, document['doc_id'],
+                                       document['week'], document['version'])
+                       or find_score_file(self.score_dir, document['doc_id']))
+        else:
+            indexed = find_score_file(self.score_dir, name=doc_name)
+        if indexed:
+            logger.info(f"✓ 找到匹配的打分文件（索引）: {indexed}")
+            return indexed
+        
         # 方法1：通过文档名称匹配
         pattern1 = os.path.join(self.score_dir, f"detailed_scores_{doc_name}_*.json")
         matches = glob.glob(pattern1)
@@ -329,10 +356,6 @@ class IntelligentExcelMarker:
         logger.info(f"  Excel文件: {excel_file}")
         logger.info(f"  打分文件: {score_file}")
         
-        # 加载打分数据
-        with open(score_file, 'r', encoding='utf-8') as f:
-            score_data = json.load(f)
-        
         # 加载Excel文件
         wb = openpyxl.load_workbook(excel_file)
         ws = wb.active
@@ -343,82 +366,52 @@ class IntelligentExcelMarker:
         else:
             color_stats = {"EXTREME_HIGH": 0, "HIGH": 0, "MEDIUM": 0, "LOW": 0}
         
-        # 兼容两种数据格式
-        if 'cell_scores' in score_data:
-            # 旧格式：cell_scores字典
-            scores_to_process = score_data['cell_scores'].items()
-        elif 'scores' in score_data:
-            # 新格式：scores数组，需要转换
-            scores_to_process = []
-            for item in score_data['scores']:
-                cell_ref = item.get('cell')
+        # 先读取非数组字段（scores元素只跳过不解析），只用其中一种格式涂色，
+        # 避免同一单元格在cell_scores和scores中各涂一次
+        metadata = {}
+        cell_scores = None
+        has_scores = False
+        for kind, key, value in iter_events(score_file, parse_items=False):
+            if kind == 'section' and key == 'metadata':
+                metadata = value
+            elif kind == 'section' and key == 'cell_scores':
+                cell_scores = value
+            elif kind == 'array' and key == 'scores':
+                has_scores = True
+        has_cell_scores = cell_scores is not None
+        scored_cells = 0
+
+        if has_cell_scores:
+            # 旧格式：cell_scores字典（存在时优先使用）
+            scored_cells = len(cell_scores)
+            for cell_ref, cell_data in cell_scores.items():
+                self._color_cell(ws, cell_ref, cell_data, color_stats)
+        elif has_scores:
+            # 新格式：scores数组，逐条读取边读边涂色，不整体加载打分文件
+            for value in iter_records(score_file, 'scores'):
+                scored_cells += 1
+                cell_ref = value.get('cell')
                 if cell_ref:
                     cell_data = {
-                        'risk_level': item.get('risk_assessment', {}).get('risk_level', 'LOW'),
-                        'column_level': item.get('column_level', 'L3'),  # 添加列级别
-                        'score': item.get('scoring_details', {}).get('final_score', 0),
-                        'old_value': item.get('old_value'),
-                        'new_value': item.get('new_value'),
-                        'column_name': item.get('column_name'),
-                        'ai_analysis': item.get('ai_analysis', {})
+                        'risk_level': value.get('risk_assessment', {}).get('risk_level', 'LOW'),
+                        'column_level': value.get('column_level', 'L3'),  # 添加列级别
+                        'score': value.get('scoring_details', {}).get('final_score', 0),
+                        'old_value': value.get('old_value'),
+                        'new_value': value.get('new_value'),
+                        'column_name': value.get('column_name'),
+                        'ai_analysis': value.get('ai_analysis', {})
                     }
-                    scores_to_process.append((cell_ref, cell_data))
-        else:
+                    self._color_cell(ws, cell_ref, cell_data, color_stats)
+
+        if not (has_scores or has_cell_scores):
+            wb.close()
             logger.error("打分数据格式不正确：缺少cell_scores或scores字段")
             raise ValueError("打分数据格式不正确")
         
-        # 遍历所有变更的单元格
-        for cell_ref, cell_data in scores_to_process:
-            try:
-                # 获取单元格
-                cell = ws[cell_ref]
-                
-                # 根据配置决定使用哪种涂色模式
-                if self.use_column_level_coloring:
-                    # 使用列级别涂色（L1红、L2黄、L3绿）
-                    column_level = str(cell_data.get('column_level', 'L3')).upper()
-
-                    # 获取对应的颜色
-                    if column_level in self.column_level_colors:
-                        colors = self.column_level_colors[column_level]
-                        # 用于统计的键
-                        stat_key = column_level
-                    else:
-                        logger.warning(f"未知的列级别: {column_level}，跳过单元格 {cell_ref}")
-                        continue
-                else:
-                    # 使用风险等级涂色（备用模式）
-                    risk_level = str(cell_data.get('risk_level', 'LOW')).upper()
-
-                    if risk_level in self.risk_level_colors:
-                        colors = self.risk_level_colors[risk_level]
-                        stat_key = risk_level
-                    else:
-                        logger.warning(f"未知的风险等级: {risk_level}，跳过单元格 {cell_ref}")
-                        continue
-                
-                # 创建纯色填充（使用新语法，腾讯文档兼容）
-                fill = PatternFill(
-                    start_color=colors,
-                    end_color=colors,
-                    fill_type='solid'  # 必须使用solid，腾讯文档唯一支持
-                )
-                
-                # 应用填充
-                cell.fill = fill
-                
-                # 腾讯文档不支持Excel注释，已移除注释功能
-                # 仅使用颜色标记风险等级
-                
-                color_stats[stat_key] += 1
-                
-            except Exception as e:
-                logger.warning(f"无法涂色单元格 {cell_ref}: {e}")
-        
         # 生成输出文件名
         if output_file is None:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            week_num = score_data['metadata'].get('week_number', '00')
+            week_num = metadata.get('week_number', '00')
             base_name = os.path.basename(excel_file).replace('_fixed.xlsx', '')
             output_file = os.path.join(
                 self.output_dir, 
@@ -431,6 +424,10 @@ class IntelligentExcelMarker:
         # 保存文件
         wb.save(output_file)
         wb.close()
+
+        # 供调用方统计阶段输入/输出量
+        self.last_scored_cells = scored_cells
+        self.last_colored_cells = sum(color_stats.values())
         
         # 输出统计信息
         logger.info(f"✓ 涂色完成（纯色模式，腾讯文档兼容）！")
@@ -449,6 +446,54 @@ class IntelligentExcelMarker:
         
         return output_file
     
+    def _color_cell(self, ws, cell_ref: str, cell_data: Dict, color_stats: Dict):
+        """按列级别（或风险等级）给单个变更单元格涂纯色"""
+        try:
+            # 获取单元格
+            cell = ws[cell_ref]
+            
+            # 根据配置决定使用哪种涂色模式
+            if self.use_column_level_coloring:
+                # 使用列级别涂色（L1红、L2黄、L3绿）
+                column_level = str(cell_data.get('column_level', 'L3')).upper()
+
+                # 获取对应的颜色
+                if column_level in self.column_level_colors:
+                    colors = self.column_level_colors[column_level]
+                    # 用于统计的键
+                    stat_key = column_level
+                else:
+                    logger.warning(f"未知的列级别: {column_level}，跳过单元格 {cell_ref}")
+                    return
+            else:
+                # 使用风险等级涂色（备用模式）
+                risk_level = str(cell_data.get('risk_level', 'LOW')).upper()
+
+                if risk_level in self.risk_level_colors:
+                    colors = self.risk_level_colors[risk_level]
+                    stat_key = risk_level
+                else:
+                    logger.warning(f"未知的风险等级: {risk_level}，跳过单元格 {cell_ref}")
+                    return
+            
+            # 创建纯色填充（使用新语法，腾讯文档兼容）
+            fill = PatternFill(
+                start_color=colors,
+                end_color=colors,
+                fill_type='solid'  # 必须使用solid，腾讯文档唯一支持
+            )
+            
+            # 应用填充
+            cell.fill = fill
+            
+            # 腾讯文档不支持Excel注释，已移除注释功能
+            # 仅使用颜色标记风险等级
+            
+            color_stats[stat_key] += 1
+            
+        except Exception as e:
+            logger.warning(f"无法涂色单元格 {cell_ref}: {e}")
+    
     def process_excel_with_auto_match(self, excel_file: str) -> Optional[str]:
         """
         自动匹配打分文件并处理Excel
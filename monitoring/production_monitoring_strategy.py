@@ -7,6 +7,7 @@ DevOps 稳定性监控和告警系统
 
 import asyncio
 import json
+import os
 import time
 import logging
 from datetime import datetime, timedelta
@@ -82,11 +83,24 @@ class ProductionMonitor:
             "average_download_time": {
                 "threshold": 60.0,  # 60秒
                 "check_interval": 600,
-                "alert_level": AlertLevel.WARNING
+                "alert_level": AlertLevel.WARNING,
+                "higher_is_better": False
+            },
+            "download_p95_time": {
+                "threshold": 120.0,  # 95分位不超过120秒
+                "check_interval": 600,
+                "alert_level": AlertLevel.WARNING,
+                "higher_is_better": False
             },
             "download_timeout_rate": {
                 "threshold": 0.1,  # 10% 超时率
                 "check_interval": 600,
+                "alert_level": AlertLevel.WARNING,
+                "higher_is_better": False
+            },
+            "upload_success_rate": {
+                "threshold": 0.85,  # 85% 成功率
+                "check_interval": 600,
                 "alert_level": AlertLevel.WARNING
             },
             
@@ -94,12 +108,14 @@ class ProductionMonitor:
             "memory_usage": {
                 "threshold": 0.8,  # 80% 内存使用率
                 "check_interval": 120,  # 2分钟
-                "alert_level": AlertLevel.WARNING
+                "alert_level": AlertLevel.WARNING,
+                "higher_is_better": False
             },
             "disk_usage": {
                 "threshold": 0.85,  # 85% 磁盘使用率
                 "check_interval": 300,
-                "alert_level": AlertLevel.WARNING
+                "alert_level": AlertLevel.WARNING,
+                "higher_is_better": False
             },
             
             # API兼容性指标
@@ -137,7 +153,9 @@ class ProductionMonitor:
             "thresholds": {
                 "critical_alert_cooldown": 300,  # 5分钟冷却
                 "warning_alert_cooldown": 600   # 10分钟冷却
-            }
+            },
+            # 下载/上传遥测台账的统计窗口（秒）
+            "telemetry_window_seconds": 3600
         }
         
         if config_path and os.path.exists(config_path):
@@ -185,12 +203,16 @@ class ProductionMonitor:
                 metric_value = await self._collect_metric(metric_name)
                 
                 if metric_value is not None:
-                    # 创建健康指标
+                    # 创建健康指标（耗时、超时率、资源占用类指标越低越好）
+                    if config.get("higher_is_better", True):
+                        healthy = metric_value >= config["threshold"]
+                    else:
+                        healthy = metric_value <= config["threshold"]
                     metric = HealthMetric(
                         name=metric_name,
                         value=metric_value,
                         threshold=config["threshold"],
-                        status="healthy" if metric_value >= config["threshold"] else "unhealthy",
+                        status="healthy" if healthy else "unhealthy",
                         timestamp=datetime.now()
                     )
                     
@@ -227,8 +249,12 @@ class ProductionMonitor:
                 return await self._check_download_success_rate()
             elif metric_name == "average_download_time":
                 return await self._check_average_download_time()
+            elif metric_name == "download_p95_time":
+                return await self._check_download_p95_time()
             elif metric_name == "download_timeout_rate":
                 return await self._check_download_timeout_rate()
+            elif metric_name == "upload_success_rate":
+                return await self._check_upload_success_rate()
             elif metric_name == "memory_usage":
                 return await self._check_memory_usage()
             elif metric_name == "disk_usage":
@@ -277,30 +303,52 @@ class ProductionMonitor:
             logger.error(f"认证成功率检查失败: {e}")
             return 0.0
     
-    async def _check_download_success_rate(self) -> float:
-        """检查下载成功率"""
+    def _transfer_stats(self, kind: str = "download") -> Dict:
+        """从遥测台账读取滚动窗口统计（台账增量读取，不重扫历史）"""
+        from production.core_modules.transfer_telemetry import get_telemetry_ledger
+
+        window = self.config.get("telemetry_window_seconds", 3600)
+        return get_telemetry_ledger().window_stats(kind, window)
+    
+    async def _check_download_success_rate(self) -> Optional[float]:
+        """检查下载成功率（窗口内无下载记录时不产出指标）"""
         try:
-            # 基于最近的下载历史计算成功率
-            # 这里需要从日志或数据库中读取最近的下载记录
-            # 简化实现：返回模拟数据
-            return 0.95  # 95% 成功率
-        except Exception:
-            return 0.0
+            return self._transfer_stats("download")["success_rate"]
+        except Exception as e:
+            logger.error(f"下载成功率统计失败: {e}")
+            return None
     
-    async def _check_average_download_time(self) -> float:
-        """检查平均下载时间"""
+    async def _check_average_download_time(self) -> Optional[float]:
+        """检查平均下载时间（成功下载的平均耗时）"""
         try:
-            # 基于最近的下载历史计算平均时间
-            return 42.0  # 42秒平均下载时间
-        except Exception:
-            return 999.0  # 返回一个很大的值表示异常
+            return self._transfer_stats("download")["mean"]
+        except Exception as e:
+            logger.error(f"下载耗时统计失败: {e}")
+            return None
     
-    async def _check_download_timeout_rate(self) -> float:
+    async def _check_download_p95_time(self) -> Optional[float]:
+        """检查下载耗时95分位"""
+        try:
+            return self._transfer_stats("download")["p95"]
+        except Exception as e:
+            logger.error(f"下载耗时统计失败: {e}")
+            return None
+    
+    async def _check_download_timeout_rate(self) -> Optional[float]:
         """检查下载超时率"""
         try:
-            return 0.05  # 5% 超时率
-        except Exception:
-            return 1.0
+            return self._transfer_stats("download")["timeout_rate"]
+        except Exception as e:
+            logger.error(f"下载超时率统计失败: {e}")
+            return None
+    
+    async def _check_upload_success_rate(self) -> Optional[float]:
+        """检查上传成功率"""
+        try:
+            return self._transfer_stats("upload")["success_rate"]
+        except Exception as e:
+            logger.error(f"上传成功率统计失败: {e}")
+            return None
     
     async def _check_memory_usage(self) -> float:
         """检查内存使用率"""
@@ -503,7 +551,10 @@ class ProductionMonitor:
             current_value = await self._collect_metric(alert.metric_name)
             
             if current_value is not None:
-                return current_value >= alert.threshold
+                config = self.metrics_config.get(alert.metric_name, {})
+                if config.get("higher_is_better", True):
+                    return current_value >= alert.threshold
+                return current_value <= alert.threshold
             
             return False
         except Exception:
@@ -575,6 +626,17 @@ class ProductionMonitor:
                     avg_success = sum(m.value for m in recent_downloads) / len(recent_downloads)
                     report["performance_summary"]["avg_download_success_rate"] = avg_success
             
+            # 下载/上传遥测窗口统计
+            try:
+                for kind in ("download", "upload"):
+                    stats = self._transfer_stats(kind)
+                    report["performance_summary"][f"{kind}_telemetry"] = {
+                        key: stats[key] for key in
+                        ("count", "success_rate", "timeout_rate", "p50", "p95", "bytes", "retries", "by_method")
+                    }
+            except Exception as e:
+                logger.warning(f"遥测统计读取失败: {e}")
+            
             # 生成建议
             if report["system_status"] == "critical":
                 report["recommendations"].append("系统处于严重告警状态，建议立即检查Cookie和网络连接")
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线端到端性能基准测试
+不依赖腾讯文档和真实AI服务，使用本地替身完整计时：
+对比 → 列标准化 → 打分 → 涂色 → 综合汇总
+
+- SyntheticTencentTable: 生成腾讯文档格式的合成表格（标题行 + 列名行 + N行数据），
+  可控制修改率和插入行数
+- MockChatServer: 本地模拟DeepSeek/Claude聊天接口，可配置延迟
+- 结果输出为JSON，便于跨版本跟踪
+
+用法:
+    python3 offline_pipeline_benchmark.py --rows 1000 10000 100000 --ai-latency 0.02
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.append(str(BASE_DIR / 'production'))
+
+# 与生产表格一致的列名（19个标准列 + 可选扩展列）
+TENCENT_HEADERS = [
+    "序号", "项目类型", "来源", "任务发起时间", "目标对齐",
+    "关键KR对齐", "具体计划内容", "邓总指导登记（日更新）", "负责人",
+    "协助人", "监督人", "重要程度", "预计完成时间", "完成进度",
+    "形成计划清单", "复盘时间", "对上汇报", "应用情况", "进度分析总结"
+]
+
+SAMPLE_VALUES = {
+    "项目类型": ["目标管理", "体系建设", "固定计划", "专项任务"],
+    "来源": ["部门规划", "目标复盘待解决", "上级指派", "周会决议"],
+    "目标对齐": ["内容定位", "流量增长", "转化提升", "品牌建设"],
+    "负责人": ["张三", "李四", "王五", "赵六", "钱七"],
+    "协助人": ["张三,李四", "王五", "赵六,钱七", ""],
+    "监督人": ["徐志杰", "周八", "吴九"],
+    "重要程度": ["1", "2", "3", "4", "5"],
+    "完成进度": ["0%", "25%", "50%", "75%", "100%"],
+    "对上汇报": ["已汇报", "未汇报", "已汇报但未结项"],
+    "应用情况": ["已应用", "待应用", "已对接下一步计划"],
+}
+
+
+class SyntheticTencentTable:
+    """合成腾讯文档格式表格生成器"""
+
+    def __init__(self, rows: int, extra_columns: int = 0, seed: int = 42):
+        self.rows = rows
+        self.headers = TENCENT_HEADERS + [f"扩展列{i + 1}" for i in range(extra_columns)]
+        self.random = random.Random(seed)
+
+    def _cell_value(self, row_idx: int, header: str) -> str:
+        if header == "序号":
+            return str(row_idx + 1)
+        if header in ("任务发起时间", "预计完成时间", "复盘时间"):
+            return f"2025/{self.random.randint(1, 12)}/{self.random.randint(1, 28)}"
+        if header in SAMPLE_VALUES:
+            return self.random.choice(SAMPLE_VALUES[header])
+        if header in ("具体计划内容", "进度分析总结", "邓总指导登记（日更新）", "形成计划清单"):
+            return f"第{row_idx + 1}项计划：按周推进并复盘优化，编号{self.random.randint(1000, 9999)}"
+        return f"{header}-{row_idx + 1}"
+
+    def generate_baseline(self) -> List[List[str]]:
+        """生成基线表格（含标题行和列名行）"""
+        title = ["2025年项目计划与安排表（基准测试）"] + [""] * (len(self.headers) - 1)
+        data = [title, list(self.headers)]
+        for row_idx in range(self.rows):
+            data.append([self._cell_value(row_idx, h) for h in self.headers])
+        return data
+
+    def derive_target(self, baseline: List[List[str]], edit_rate: float,
+                      inserted_rows: int = 0) -> Dict[str, Any]:
+        """
+        基于基线生成目标表格
+
+        Args:
+            baseline: 基线表格
+            edit_rate: 数据单元格修改比例（0-1）
+            inserted_rows: 随机插入的新行数
+
+        Returns:
+            {"table": 目标表格, "edited_cells": 修改数, "inserted_rows": 插入数}
+        """
+        target = [list(row) for row in baseline]
+        column_count = len(self.headers)
+        total_cells = self.rows * column_count
+        edit_count = int(total_cells * edit_rate)
+
+        for cell_index in self.random.sample(range(total_cells), edit_count):
+            row_idx = 2 + cell_index // column_count
+            col_idx = cell_index % column_count
+            old_value = target[row_idx][col_idx]
+            header = self.headers[col_idx]
+            choices = [v for v in SAMPLE_VALUES.get(header, []) if v != old_value]
+            target[row_idx][col_idx] = self.random.choice(choices) if choices else f"{old_value}（已修改）"
+
+        for i in range(inserted_rows):
+            position = self.random.randint(2, len(target))
+            target.insert(position, [self._cell_value(self.rows + i, h) for h in self.headers])
+
+        return {"table": target, "edited_cells": edit_count, "inserted_rows": inserted_rows}
+
+    @staticmethod
+    def write_csv(table: List[List[str]], path: Path):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(table)
+
+    @staticmethod
+    def write_xlsx(table: List[List[str]], path: Path):
+        import openpyxl
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        for row in table:
+            sheet.append(row)
+        workbook.save(path)
+        workbook.close()
+
+
+class MockChatServer:
+    """
+    本地模拟聊天接口（兼容DeepSeek/SiliconFlow的OpenAI格式和Claude封装服务的/chat）
+
+    根据提示词内容返回对应格式：
+    - 列名标准化提示词 → column_mapping JSON（同名标准列直接映射）
+    - L2第一层提示词 → 每个修改一行 "ID|SAFE|95|基准测试"
+    - L2第二层批量提示词 → JSON数组
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.call_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                with mock._lock:
+                    mock.call_count += 1
+                if mock.latency:
+                    time.sleep(mock.latency)
+
+                prompt = ''.join(m.get('content', '') for m in payload.get('messages', []))
+                body = json.dumps({
+                    "id": f"mock-{mock.call_count}",
+                    "object": "chat.completion",
+                    "model": payload.get('model', 'mock'),
+                    "choices": [{"index": 0, "message": {"role": "assistant",
+                                                          "content": mock.respond(prompt)}}],
+                    "usage": {"prompt_tokens": len(prompt), "completion_tokens": 0}
+                }, ensure_ascii=False).encode('utf-8')
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @staticmethod
+    def respond(prompt: str) -> str:
+        if 'column_mapping' in prompt:
+            mapping = {}
+            for col_id, col_name in re.findall(r'^列([A-Z]+): (.*)$', prompt, re.MULTILINE):
+                if col_name in TENCENT_HEADERS:
+                    mapping[col_id] = col_name
+            return json.dumps({
+                "success": True,
+                "column_mapping": mapping,
+                "confidence_scores": {k: 0.99 for k in mapping},
+                "statistics": {"mapped_count": len(mapping), "average_confidence": 0.99}
+            }, ensure_ascii=False)
+        if 'ID|判断' in prompt:
+            count = len(re.findall(r'^\d+\. ', prompt, re.MULTILINE))
+            return '\n'.join(f"{i}|SAFE|95|基准测试" for i in range(1, count + 1))
+        if '### 修改' in prompt:
+            count = len(re.findall(r'^### 修改 \d+', prompt, re.MULTILINE))
+            return json.dumps([{"index": i, "risk_level": "LOW", "decision": "APPROVE",
+                                "confidence": 90, "reason": "基准测试"} for i in range(1, count + 1)],
+                              ensure_ascii=False)
+        return json.dumps({"risk_level": "LOW", "decision": "APPROVE", "confidence": 90,
+                           "key_risks": [], "recommendation": "基准测试"}, ensure_ascii=False)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class OfflinePipelineBenchmark:
+    """离线端到端基准测试"""
+
+    STAGES = ["compare", "standardize", "score", "mark", "aggregate"]
+
+    def __init__(self, work_dir: Path, ai_latency: float = 0.0, edit_rate: float = 0.005,
+                 inserted_rows: int = 0, extra_columns: int = 0, seed: int = 42):
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.ai_latency = ai_latency
+        self.edit_rate = edit_rate
+        self.inserted_rows = inserted_rows
+        self.extra_columns = extra_columns
+        self.seed = seed
+        self.mock = MockChatServer(latency=ai_latency)
+
+    def _timed(self, stage_results: Dict, stage: str, func):
+        calls_before = self.mock.call_count
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            value = func()
+            stage_results[stage] = {"status": "ok"}
+        except Exception as e:
+            value = None
+            stage_results[stage] = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        stage_results[stage].update({
+            "wall_seconds": round(time.perf_counter() - start, 4),
+            "cpu_seconds": round(time.process_time() - cpu_start, 4),
+            "ai_calls": self.mock.call_count - calls_before
+        })
+        print(f"    {stage:<12} {stage_results[stage]['status']:<6} "
+              f"{stage_results[stage]['wall_seconds']:.3f}s  AI调用 {stage_results[stage]['ai_calls']}")
+        return value
+
+    def run_size(self, rows: int) -> Dict:
+        """对指定行数运行一次完整流程"""
+        print(f"\n📊 {rows} 行 × {len(TENCENT_HEADERS) + self.extra_columns} 列")
+        size_dir = self.work_dir / f"rows_{rows}"
+        size_dir.mkdir(parents=True, exist_ok=True)
+
+        generator = SyntheticTencentTable(rows, self.extra_columns, self.seed)
+        gen_start = time.perf_counter()
+        baseline = generator.generate_baseline()
+        derived = generator.derive_target(baseline, self.edit_rate, self.inserted_rows)
+        baseline_csv = size_dir / "tencent_基准测试表_baseline.csv"
+        target_csv = size_dir / "tencent_基准测试表_midweek.csv"
+        generator.write_csv(baseline, baseline_csv)
+        generator.write_csv(derived["table"], target_csv)
+        generate_seconds = time.perf_counter() - gen_start
+
+        stages = {}
+        context = {}
+
+        def compare():
+            from unified_csv_comparator import UnifiedCSVComparator
+            result = UnifiedCSVComparator().compare(str(baseline_csv), str(target_csv))
+            result['table_name'] = f"benchmark_{rows}"
+            comparison_file = size_dir / "comparison.json"
+            with open(comparison_file, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+            context['comparison'] = result
+            context['comparison_file'] = comparison_file
+
+        def standardize():
+            import asyncio
+            from column_standardization_processor_v3 import ColumnStandardizationProcessorV3
+            processor = ColumnStandardizationProcessorV3(os.environ['DEEPSEEK_API_KEY'], use_memo=False)
+            return asyncio.run(processor.standardize_column_names(
+                context['comparison'].get('modified_columns', {})))
+
+        def score():
+            from scoring_engine.integrated_scorer import IntegratedScorer
+            scorer = IntegratedScorer(use_ai=True, cache_enabled=False)
+            context['score_file'] = scorer.process_file(str(context['comparison_file']),
+                                                        output_dir=str(size_dir / 'detailed'))
+
+        def mark():
+            from intelligent_excel_marker import IntelligentExcelMarker
+            excel_file = size_dir / "target.xlsx"
+            generator.write_xlsx(derived["table"], excel_file)
+            return IntelligentExcelMarker().apply_striped_coloring(
+                str(excel_file), context['score_file'], str(size_dir / "target_marked.xlsx"))
+
+        def aggregate():
+            from core_modules.auto_comprehensive_generator import AutoComprehensiveGenerator
+            accumulator = AutoComprehensiveGenerator(scoring_dir=size_dir / 'scoring').start_batch(expected_count=1)
+            accumulator.add_table(context['score_file'], table_name=f"benchmark_{rows}")
+            return accumulator.flush()
+
+        for stage, func in zip(self.STAGES, [compare, standardize, score, mark, aggregate]):
+            if stage != "compare" and 'comparison_file' not in context:
+                stages[stage] = {"status": "skipped", "reason": "compare failed"}
+                continue
+            if stage in ("mark", "aggregate") and 'score_file' not in context:
+                stages[stage] = {"status": "skipped", "reason": "score failed"}
+                continue
+            self._timed(stages, stage, func)
+
+        comparison = context.get('comparison') or {}
+        return {
+            "rows": rows,
+            "columns": len(generator.headers),
+            "edited_cells": derived["edited_cells"],
+            "inserted_rows": derived["inserted_rows"],
+            "detected_modifications": comparison.get('statistics', {}).get('total_modifications'),
+            "generate_seconds": round(generate_seconds, 4),
+            "stages": stages,
+            "total_seconds": round(sum(s.get('wall_seconds', 0) for s in stages.values()), 4)
+        }
+
+    def run(self, row_counts: List[int]) -> Dict:
+        self.mock.start()
+        # 所有AI客户端指向本地模拟服务
+        os.environ['DEEPSEEK_BASE_URL'] = self.mock.base_url
+        os.environ.setdefault('DEEPSEEK_API_KEY', 'offline-benchmark')
+        print(f"🤖 模拟AI服务: {self.mock.base_url} (延迟 {self.ai_latency}s)")
+
+        try:
+            results = [self.run_size(rows) for rows in row_counts]
+        finally:
+            self.mock.stop()
+
+        return {
+            "benchmark": "offline_pipeline",
+            "version": "1.0",
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count()
+            },
+            "parameters": {
+                "edit_rate": self.edit_rate,
+                "inserted_rows": self.inserted_rows,
+                "extra_columns": self.extra_columns,
+                "ai_latency": self.ai_latency,
+                "seed": self.seed
+            },
+            "results": results
+        }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=BASE_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线端到端性能基准测试')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000], help='数据行数')
+    parser.add_argument('--edit-rate', type=float, default=0.005, help='单元格修改比例')
+    parser.add_argument('--inserted-rows', type=int, default=0, help='插入行数')
+    parser.add_argument('--extra-columns', type=int, default=0, help='19列之外的扩展列数')
+    parser.add_argument('--ai-latency', type=float, default=0.0, help='模拟AI接口延迟（秒）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--work-dir', help='工作目录（默认临时目录）')
+    parser.add_argument('--output', help='结果JSON路径（默认benchmark_results/offline_pipeline_<时间戳>.json）')
+    args = parser.parse_args()
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix='offline_benchmark_'))
+    benchmark = OfflinePipelineBenchmark(work_dir, ai_latency=args.ai_latency, edit_rate=args.edit_rate,
+                                         inserted_rows=args.inserted_rows,
+                                         extra_columns=args.extra_columns, seed=args.seed)
+    report = benchmark.run(args.rows)
+
+    output = Path(args.output) if args.output else (
+        BASE_DIR / 'benchmark_results' / f"offline_pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n✅ 基准测试结果已保存: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,17 +3,33 @@
 配置中心 - 统一配置管理系统
 实现单一真相源（Single Source of Truth）架构
 创建日期：2025-09-17
+
+除列定义/打分参数外，还缓存 config/ 下的运行时JSON配置（下载链接、Cookie、
+定时任务、UI配置）：首次访问时解析一次，之后每次读取只stat一次文件，
+mtime/大小变化（包括其他进程写入）时立即重新加载；save_json 原子写入并同步更新缓存。
+文件损坏时 load_json 抛出 ValueError，不会静默返回默认值。
 """
 
+import copy
 import json
 import os
+import threading
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 运行时JSON配置（8089/8093共用）
+RUNTIME_CONFIG_DIR = Path('/root/projects/tencent-doc-manager/config')
+RUNTIME_CONFIG_FILES = {
+    'download': 'download_config.json',
+    'cookies': 'cookies.json',
+    'schedule': 'schedule_tasks.json',
+    'ui': 'ui_config.json',
+}
+
 
 class ConfigCenter:
     """
@@ -24,6 +40,8 @@ class ConfigCenter:
     _instance = None
     _config_cache = {}
     _initialized = False
+    _runtime_cache = {}   # 路径 -> (文件签名, 解析后的数据, 解析错误)
+    _runtime_lock = threading.RLock()
 
     def __new__(cls):
         """单例模式实现"""
@@ -232,6 +250,117 @@ class ConfigCenter:
         logger.info(f"🔄 重新加载配置: {config_type or '全部'}")
         self._load_all_configs()
         self.validate_config_consistency()
+        self.invalidate()
+
+    # ==================== 运行时JSON配置 ====================
+
+    @staticmethod
+    def _runtime_path(name: str) -> str:
+        """配置名（download/cookies/schedule/ui）或文件路径 → 绝对路径"""
+        if name in RUNTIME_CONFIG_FILES:
+            return str(RUNTIME_CONFIG_DIR / RUNTIME_CONFIG_FILES[name])
+        return os.path.abspath(name)
+
+    @staticmethod
+    def _signature(path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_runtime(self, path: str, signature):
+        """从磁盘解析并写入缓存；文件不存在时缓存None，损坏时缓存解析错误"""
+        data, error = None, None
+        if signature is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                error = str(e)
+                logger.error(f"❌ 配置文件读取失败 {path}: {e}")
+        self._runtime_cache[path] = (signature, data, error)
+        return self._runtime_cache[path]
+
+    def load_json(self, name: str, default: Any = None) -> Any:
+        """
+        读取运行时JSON配置（返回副本，调用方可自由修改）
+
+        Args:
+            name: 'download' / 'cookies' / 'schedule' / 'ui' 或JSON文件路径
+            default: 文件不存在时的返回值
+
+        Raises:
+            ValueError: 文件存在但无法读取或解析
+        """
+        path = self._runtime_path(name)
+        signature = self._signature(path)
+        with self._runtime_lock:
+            cached = self._runtime_cache.get(path)
+            if cached is None or cached[0] != signature:
+                cached = self._read_runtime(path, signature)
+            _, data, error = cached
+        if error:
+            raise ValueError(f"配置文件无法解析 {os.path.basename(path)}: {error}")
+        if data is None:
+            return default
+        return copy.deepcopy(data)
+
+    def save_json(self, name: str, data: Any):
+        """原子写入运行时JSON配置，并同步更新缓存"""
+        path = self._runtime_path(name)
+        with self._runtime_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+            self._runtime_cache[path] = (self._signature(path), copy.deepcopy(data), None)
+
+    def update_json(self, name: str, updater: Callable[[Any], Any], default: Any = None) -> Any:
+        """读-改-写：updater 接收当前配置（副本），返回值（或就地修改后的对象）被写回"""
+        with self._runtime_lock:
+            data = self.load_json(name, default)
+            result = updater(data)
+            data = data if result is None else result
+            self.save_json(name, data)
+            return data
+
+    def invalidate(self, name: Optional[str] = None):
+        """丢弃运行时配置缓存，下次访问时重新读取"""
+        with self._runtime_lock:
+            if name is None:
+                self._runtime_cache.clear()
+            else:
+                self._runtime_cache.pop(self._runtime_path(name), None)
+
+    def get_download_config(self) -> Dict[str, Any]:
+        """download_config.json"""
+        return self.load_json('download', {})
+
+    def get_document_links(self, enabled_only: bool = False) -> List[Dict[str, Any]]:
+        """下载链接列表，enabled_only时只返回启用的链接"""
+        links = self.get_download_config().get('document_links', [])
+        if enabled_only:
+            links = [link for link in links if link.get('enabled', True)]
+        return links
+
+    def get_cookies_config(self) -> Dict[str, Any]:
+        """cookies.json"""
+        return self.load_json('cookies', {})
+
+    def get_cookie_string(self) -> str:
+        """当前Cookie字符串（兼容旧键名 cookie_string）"""
+        config = self.get_cookies_config()
+        return config.get('current_cookies', '') or config.get('cookie_string', '')
+
+    def get_schedule_tasks(self) -> Dict[str, Any]:
+        """schedule_tasks.json"""
+        return self.load_json('schedule', {})
+
+    def get_ui_config(self) -> Dict[str, Any]:
+        """ui_config.json"""
+        return self.load_json('ui', {})
 
     def get_config_stats(self) -> Dict[str, Any]:
         """获取配置统计信息"""
@@ -241,7 +370,8 @@ class ConfigCenter:
             "l2_columns": len(self.get('l2_columns', [])),
             "l3_columns": len(self.get('l3_columns', [])),
             "weighted_columns": len(self.get('column_weights', {})),
-            "config_items": len(self._config_cache)
+            "config_items": len(self._config_cache),
+            "cached_runtime_files": len(self._runtime_cache)
         }
 
 
@@ -79,6 +79,156 @@ def safe_mean(values) -> float:
 logger = logging.getLogger(__name__)
 
 
+def bit_parallel_edit_distance(pattern_masks: Dict[str, int], pattern_length: int,
+                               text: str, max_distance: Optional[int] = None) -> Optional[int]:
+    """
+    位并行编辑距离（Myers/Hyyrö算法），与levenshtein_distance结果一致
+    
+    Args:
+        pattern_masks: 模式串每个字符的位置掩码（见build_pattern_masks）
+        pattern_length: 模式串长度
+        text: 文本串
+        max_distance: 距离上界，超过时提前返回None
+    
+    Returns:
+        编辑距离；超过max_distance时返回None
+    """
+    if pattern_length == 0:
+        distance = len(text)
+        return distance if max_distance is None or distance <= max_distance else None
+    
+    full = (1 << pattern_length) - 1
+    high_bit = 1 << (pattern_length - 1)
+    pv = full
+    mv = 0
+    score = pattern_length
+    remaining = len(text)
+    
+    for char in text:
+        eq = pattern_masks.get(char, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & full) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high_bit:
+            score += 1
+        elif mh & high_bit:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+        
+        remaining -= 1
+        # 剩余每个字符最多让距离减1
+        if max_distance is not None and score - remaining > max_distance:
+            return None
+    
+    return score
+
+
+def build_pattern_masks(pattern: str) -> Dict[str, int]:
+    """构建位并行编辑距离所需的字符位置掩码"""
+    masks = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+def text_similarity(text1: str, text2: str) -> float:
+    """文本相似度：0.7 × 编辑距离相似度 + 0.3 × 字符集合Jaccard"""
+    max_len = max(len(text1), len(text2))
+    if max_len == 0:
+        return 1.0
+    
+    edit_distance = bit_parallel_edit_distance(build_pattern_masks(text1), len(text1), text2)
+    edit_similarity = 1 - (edit_distance / max_len)
+    
+    set1 = set(text1)
+    set2 = set(text2)
+    overlap_similarity = len(set1 & set2) / len(set1 | set2) if set1 | set2 else 0
+    
+    return 0.7 * edit_similarity + 0.3 * overlap_similarity
+
+
+class ColumnVariationIndex:
+    """
+    列名变异词表的字符倒排索引
+    
+    预先为每个变异形式计算字符集合和位并行掩码，查询时：
+    1. 通过字符倒排索引只取与实际列名有共同字符的候选（无共同字符的相似度不可能超过0.7）
+    2. 用长度差和Jaccard计算相似度上界，低于当前最优值的候选直接跳过
+    3. 对剩余候选用有界位并行编辑距离精确计算
+    结果与逐一计算_calculate_text_similarity完全一致，并按列名缓存
+    """
+    
+    def __init__(self, column_variations: Dict[str, List[str]], min_similarity: float = 0.7):
+        self.min_similarity = min_similarity
+        self.entries = []  # (variation, standard_col, char_set, masks)
+        self.char_index = defaultdict(list)
+        self._best_match_cache = {}
+        
+        for standard_col, variations in column_variations.items():
+            for variation in variations:
+                entry_id = len(self.entries)
+                char_set = frozenset(variation)
+                self.entries.append((variation, standard_col, char_set, build_pattern_masks(variation)))
+                for char in char_set:
+                    self.char_index[char].append(entry_id)
+    
+    def best_match(self, actual_col: str) -> Tuple[Optional[str], float]:
+        """
+        查找相似度最高且超过min_similarity的变异形式
+        
+        Returns:
+            (标准列名, 相似度)；没有满足条件的候选时返回(None, 0.0)
+        """
+        cached = self._best_match_cache.get(actual_col)
+        if cached is not None:
+            return cached
+        
+        actual_set = set(actual_col)
+        shared_counts = defaultdict(int)
+        for char in actual_set:
+            for entry_id in self.char_index.get(char, ()):
+                shared_counts[entry_id] += 1
+        
+        # 按与原实现相同的遍历顺序处理候选，保证并列时结果一致
+        best_match = None
+        best_confidence = 0.0
+        actual_len = len(actual_col)
+        
+        for entry_id in sorted(shared_counts):
+            variation, standard_col, char_set, masks = self.entries[entry_id]
+            shared = shared_counts[entry_id]
+            overlap_similarity = shared / (len(actual_set) + len(char_set) - shared)
+            max_len = max(actual_len, len(variation))
+            
+            # 编辑距离下界为长度差，得到相似度上界
+            threshold = max(best_confidence, self.min_similarity)
+            upper_bound = 0.7 * (1 - abs(actual_len - len(variation)) / max_len) + 0.3 * overlap_similarity
+            if upper_bound <= threshold:
+                continue
+            
+            # 相似度需严格大于threshold时允许的最大编辑距离
+            max_distance = int(max_len * (1 - (threshold - 0.3 * overlap_similarity) / 0.7) + 1e-9)
+            edit_distance = bit_parallel_edit_distance(masks, len(variation), actual_col, max_distance)
+            if edit_distance is None:
+                continue
+            
+            similarity = 0.7 * (1 - edit_distance / max_len) + 0.3 * overlap_similarity
+            if similarity > best_confidence:
+                best_match = standard_col
+                best_confidence = similarity
+        
+        if best_confidence <= self.min_similarity:
+            result = (None, 0.0)
+        else:
+            result = (best_match, best_confidence)
+        self._best_match_cache[actual_col] = result
+        return result
+
+
 class IntelligentColumnMatcher:
     """智能列匹配引擎"""
     
@@ -111,9 +261,16 @@ class IntelligentColumnMatcher:
             "进度分析总结": ["分析总结", "总结", "进度总结", "分析报告", "summary"]
         }
         
+        # 变异词表倒排索引（一次构建，多表复用）
+        self.variation_index = ColumnVariationIndex(self.column_variations)
+        
         # 语义相似度计算器
         self.similarity_calculator = SemanticSimilarityCalculator()
         
+        # 相似度缓存（宽表和多表之间列名高度重复）
+        self._text_similarity_cache = {}
+        self._semantic_match_cache = {}
+        
         # 匹配历史记录（用于学习和改进）
         self.matching_history = []
         
@@ -215,22 +372,13 @@ class IntelligentColumnMatcher:
         return exact_matches
     
     def _find_variation_matches(self, remaining_columns: List[str]) -> Dict[str, Tuple[str, float]]:
-        """变异匹配：已知变异形式的列名"""
+        """变异匹配：已知变异形式的列名（通过倒排索引 + 有界编辑距离）"""
         variation_matches = {}
         
         for actual_col in remaining_columns:
-            best_match = None
-            best_confidence = 0.0
-            
-            for standard_col, variations in self.column_variations.items():
-                for variation in variations:
-                    # 计算文本相似度
-                    similarity = self._calculate_text_similarity(actual_col, variation)
-                    if similarity > best_confidence:
-                        best_match = standard_col
-                        best_confidence = similarity
-            
-            if best_match and best_confidence > 0.7:  # 变异匹配需要较高置信度
+            # 变异匹配需要较高置信度（>0.7），由索引保证
+            best_match, best_confidence = self.variation_index.best_match(actual_col)
+            if best_match:
                 variation_matches[actual_col] = (best_match, best_confidence)
         
         return variation_matches
@@ -241,16 +389,21 @@ class IntelligentColumnMatcher:
         semantic_matches = {}
         
         for actual_col in remaining_columns:
-            # 为每个剩余列计算与所有标准列的语义相似度
-            similarities = []
-            for standard_col in self.standard_columns:
-                semantic_score = self.similarity_calculator.calculate_semantic_similarity(
-                    actual_col, standard_col, context=table_name
-                )
-                similarities.append((standard_col, semantic_score))
+            cache_key = (actual_col, table_name)
+            best_match = self._semantic_match_cache.get(cache_key)
+            if best_match is None:
+                # 为每个剩余列计算与所有标准列的语义相似度
+                similarities = []
+                for standard_col in self.standard_columns:
+                    semantic_score = self.similarity_calculator.calculate_semantic_similarity(
+                        actual_col, standard_col, context=table_name
+                    )
+                    similarities.append((standard_col, semantic_score))
+                
+                # 选择最高相似度的匹配
+                best_match = max(similarities, key=lambda x: x[1])
+                self._semantic_match_cache[cache_key] = best_match
             
-            # 选择最高相似度的匹配
-            best_match = max(similarities, key=lambda x: x[1])
             if best_match[1] >= threshold:
                 semantic_matches[actual_col] = best_match
         
@@ -278,45 +431,17 @@ class IntelligentColumnMatcher:
         return position_matches
     
     def _calculate_text_similarity(self, text1: str, text2: str) -> float:
-        """计算文本相似度（基于编辑距离和字符相似度）"""
-        # Levenshtein距离
-        edit_distance = self._levenshtein_distance(text1, text2)
-        max_len = max(len(text1), len(text2))
-        if max_len == 0:
-            return 1.0
-        
-        # 基于编辑距离的相似度
-        edit_similarity = 1 - (edit_distance / max_len)
-        
-        # 字符重叠相似度
-        set1 = set(text1)
-        set2 = set(text2)
-        overlap_similarity = len(set1 & set2) / len(set1 | set2) if set1 | set2 else 0
-        
-        # 综合相似度
-        final_similarity = 0.7 * edit_similarity + 0.3 * overlap_similarity
-        
-        return final_similarity
+        """计算文本相似度（基于编辑距离和字符相似度，结果缓存）"""
+        cache_key = (text1, text2)
+        similarity = self._text_similarity_cache.get(cache_key)
+        if similarity is None:
+            similarity = text_similarity(text1, text2)
+            self._text_similarity_cache[cache_key] = similarity
+        return similarity
     
     def _levenshtein_distance(self, s1: str, s2: str) -> int:
-        """计算Levenshtein编辑距离"""
-        if len(s1) < len(s2):
-            return self._levenshtein_distance(s2, s1)
-        
-        if len(s2) == 0:
-            return len(s1)
-        
-        previous_row = list(range(len(s2) + 1))
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-        
-        return previous_row[-1]
+        """计算Levenshtein编辑距离（位并行实现）"""
+        return bit_parallel_edit_distance(build_pattern_masks(s1), len(s1), s2)
     
     def _calculate_position_confidence(self, actual_col: str, expected_col: str, position: int) -> float:
         """计算位置匹配置信度"""
@@ -399,6 +524,10 @@ class SemanticSimilarityCalculator:
             "任务追踪": ["任务", "跟踪", "追踪", "监督", "检查"],
             "绩效评估": ["绩效", "评估", "考核", "评价", "分析"]
         }
+        
+        # 标准列名的词汇和领域固定不变，缓存避免重复计算
+        self._words_cache = {}
+        self._domains_cache = {}
     
     def calculate_semantic_similarity(self, actual_column: str, standard_column: str, 
                                     context: str = None) -> float:
@@ -450,6 +579,10 @@ class SemanticSimilarityCalculator:
     
     def _extract_meaningful_words(self, text: str) -> List[str]:
         """提取有意义的词汇"""
+        words = self._words_cache.get(text)
+        if words is not None:
+            return words
+        
         # 简单的中英文词汇分割
         import re
         
@@ -457,7 +590,9 @@ class SemanticSimilarityCalculator:
         chinese_words = re.findall(r'[\u4e00-\u9fff]+', text)
         english_words = re.findall(r'[a-zA-Z]+', text.lower())
         
-        return chinese_words + english_words
+        words = chinese_words + english_words
+        self._words_cache[text] = words
+        return words
     
     def _calculate_domain_similarity(self, actual: str, standard: str) -> float:
         """计算领域语义相似度"""
@@ -475,6 +610,10 @@ class SemanticSimilarityCalculator:
     
     def _identify_domains(self, column_name: str) -> set:
         """识别列名所属的业务领域"""
+        cached = self._domains_cache.get(column_name)
+        if cached is not None:
+            return cached
+        
         identified_domains = set()
         
         for domain, keywords in self.domain_vocabulary.items():
@@ -482,6 +621,8 @@ class SemanticSimilarityCalculator:
                 if keyword in column_name:
                     identified_domains.add(domain)
         
+        identified_domains = frozenset(identified_domains)
+        self._domains_cache[column_name] = identified_domains
         return identified_domains
     
     def _calculate_context_boost(self, actual: str, standard: str, context: str) -> float:
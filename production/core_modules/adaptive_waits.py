@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+导出自动化的条件等待
+用"元素可见 / 指定接口网络空闲 / 下载事件"代替按最坏情况调好的固定sleep，
+页面就绪后立即进入下一步。
+
+每一步的实际耗时写入 StepTimingStore（持久化JSON，每步保留最近N次），
+超时时间可由近期p95推导：learned_timeout = clamp(p95 × 安全系数, 下限, 默认上限)，
+样本不足时使用默认值，因此新环境下的行为与原来的固定上限一致。
+
+    waiter = AdaptiveWaiter(page)
+    await waiter.wait_visible('menu_open', selectors, default_ms=3000)
+    await waiter.settle('page_ready', default_ms=3000, url_pattern=r'/dop-api/')
+    waiter.step_timings          # 本文档各步耗时，写入遥测台账
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMINGS_PATH = Path('/root/projects/tencent-doc-manager/config/export_step_timings.json')
+MAX_SAMPLES_PER_STEP = 50
+MIN_SAMPLES_FOR_LEARNING = 5
+SAFETY_FACTOR = 1.5
+POLL_INTERVAL = 0.1
+
+
+def _p95(values: List[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+class StepTimingStore:
+    """各导出步骤的近期耗时样本（只保留成功样本用于推导超时）"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else DEFAULT_TIMINGS_PATH
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._samples = {k: list(v)[-MAX_SAMPLES_PER_STEP:] for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            self._samples = {}
+
+    def observe(self, step: str, seconds: float, success: bool = True):
+        """记录一次步骤耗时，超时（条件未满足）的样本不参与学习"""
+        if not success:
+            return
+        with self._lock:
+            samples = self._samples.setdefault(step, [])
+            samples.append(round(seconds, 3))
+            del samples[:-MAX_SAMPLES_PER_STEP]
+            self._dirty = True
+
+    def learned_timeout_ms(self, step: str, default_ms: int, floor_ms: int = 500) -> int:
+        """按近期p95推导超时（毫秒），不超过默认上限"""
+        with self._lock:
+            samples = list(self._samples.get(step, []))
+        if len(samples) < MIN_SAMPLES_FOR_LEARNING:
+            return default_ms
+        learned = int(_p95(samples) * SAFETY_FACTOR * 1000)
+        return max(floor_ms, min(default_ms, learned))
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """各步骤样本数、中位数和p95"""
+        with self._lock:
+            items = {k: list(v) for k, v in self._samples.items()}
+        return {
+            step: {
+                'count': len(values),
+                'p50': sorted(values)[len(values) // 2],
+                'p95': _p95(values),
+            }
+            for step, values in items.items() if values
+        }
+
+    def save(self):
+        """写回磁盘（原子替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {k: list(v) for k, v in self._samples.items()}
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"步骤耗时写入失败: {e}")
+
+
+_store_instance: Optional[StepTimingStore] = None
+_store_lock = threading.Lock()
+
+
+def get_step_timing_store() -> StepTimingStore:
+    """进程内共享的步骤耗时存储"""
+    global _store_instance
+    if _store_instance is None:
+        with _store_lock:
+            if _store_instance is None:
+                _store_instance = StepTimingStore()
+    return _store_instance
+
+
+class AdaptiveWaiter:
+    """基于条件的页面等待，附带每步耗时记录"""
+
+    def __init__(self, page, store: Optional[StepTimingStore] = None):
+        self.page = page
+        self.store = store or get_step_timing_store()
+        self.step_timings: Dict[str, float] = {}
+        self._inflight: Dict[Any, str] = {}
+        self._activity = deque(maxlen=256)  # 最近的 (时间, URL) 请求事件
+        page.on('request', self._on_request)
+        page.on('requestfinished', self._on_request_done)
+        page.on('requestfailed', self._on_request_done)
+
+    def reset(self):
+        """开始新文档时清空本文档的步骤耗时"""
+        self.step_timings = {}
+
+    def _on_request(self, request):
+        self._inflight[request] = request.url
+        self._activity.append((time.monotonic(), request.url))
+
+    def _on_request_done(self, request):
+        self._inflight.pop(request, None)
+        self._activity.append((time.monotonic(), request.url))
+
+    def timeout_ms(self, step: str, default_ms: int, learn: bool = True) -> int:
+        return self.store.learned_timeout_ms(step, default_ms) if learn else default_ms
+
+    def _record(self, step: str, started: float, success: bool):
+        elapsed = time.monotonic() - started
+        self.step_timings[step] = round(self.step_timings.get(step, 0) + elapsed, 3)
+        self.store.observe(step, elapsed, success)
+
+    async def _visible(self, selector: str) -> bool:
+        try:
+            element = await self.page.query_selector(selector)
+            return bool(element and await element.is_visible())
+        except Exception:
+            return False
+
+    async def wait_visible(self, step: str, selectors: Iterable[str], default_ms: int) -> Optional[str]:
+        """
+        等待任一选择器对应元素可见
+
+        Returns:
+            首个可见的选择器，超时返回None（调用方按原逻辑继续尝试）
+        """
+        selectors = list(selectors)
+        started = time.monotonic()
+        deadline = started + self.timeout_ms(step, default_ms) / 1000
+        while True:
+            for selector in selectors:
+                if await self._visible(selector):
+                    self._record(step, started, True)
+                    return selector
+            if time.monotonic() >= deadline:
+                self._record(step, started, False)
+                return None
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def settle(self, step: str, default_ms: int, url_pattern: Optional[str] = None,
+                     quiet_ms: int = 300) -> bool:
+        """
+        等待网络安静：url_pattern匹配的请求全部结束且持续quiet_ms无新请求
+        （未指定url_pattern时看全部请求）
+        """
+        pattern = re.compile(url_pattern) if url_pattern else None
+        started = time.monotonic()
+        deadline = started + self.timeout_ms(step, default_ms) / 1000
+        while True:
+            now = time.monotonic()
+            pending = any(not pattern or pattern.search(u) for u in self._inflight.values())
+            recent = any(now - t < quiet_ms / 1000 and (not pattern or pattern.search(u))
+                         for t, u in reversed(self._activity))
+            if not pending and not recent:
+                self._record(step, started, True)
+                return True
+            if time.monotonic() >= deadline:
+                self._record(step, started, False)
+                return False
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def wait_event(self, step: str, event: asyncio.Event, default_ms: int, learn: bool = False) -> bool:
+        """等待异步事件（如下载完成），耗时与文件大小相关，默认不缩短超时"""
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(event.wait(), timeout=self.timeout_ms(step, default_ms, learn) / 1000)
+            self._record(step, started, True)
+            return True
+        except asyncio.TimeoutError:
+            self._record(step, started, False)
+            return False
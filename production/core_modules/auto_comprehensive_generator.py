@@ -10,13 +10,22 @@ from datetime import datetime
 from pathlib import Path
 import logging
 
+try:
+    from .result_file_index import record_result_file
+    from .comprehensive_sections import write_sections
+    from .score_stream import write_json_document
+except ImportError:
+    from production.core_modules.result_file_index import record_result_file
+    from production.core_modules.comprehensive_sections import write_sections
+    from production.core_modules.score_stream import write_json_document
+
 logger = logging.getLogger(__name__)
 
 class AutoComprehensiveGenerator:
     """自动综合打分生成器"""
 
-    def __init__(self):
-        self.scoring_dir = Path('/root/projects/tencent-doc-manager/scoring_results')
+    def __init__(self, scoring_dir=None):
+        self.scoring_dir = Path(scoring_dir) if scoring_dir else Path('/root/projects/tencent-doc-manager/scoring_results')
         self.comparison_dir = Path('/root/projects/tencent-doc-manager/comparison_results')
         self.detailed_dir = self.scoring_dir / 'detailed'
         self.comprehensive_dir = self.scoring_dir / 'comprehensive'
@@ -376,23 +385,33 @@ class AutoComprehensiveGenerator:
         # 确保目录存在
         self.week_dir.mkdir(parents=True, exist_ok=True)
 
-        # 保存文件
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # 保存文件（按行流式格式，只序列化一次）
+        write_json_document(output_path, data)
 
-        # 同时保存到comprehensive目录作为latest文件（保持兼容）
+        # 同时保存到comprehensive目录作为latest文件（保持兼容），直接复制已写出的文件
         self.comprehensive_dir.mkdir(parents=True, exist_ok=True)
         latest_path = self.comprehensive_dir / f"comprehensive_score_W{self.current_week}_latest.json"
-        with open(latest_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self._copy_file_atomic(output_path, latest_path)
 
         # 同时保存到周目录作为latest
         week_latest_path = self.week_dir / f"comprehensive_score_W{self.current_week}_latest.json"
-        with open(week_latest_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self._copy_file_atomic(output_path, week_latest_path)
+
+        # 追加目录索引摘要，列表接口无需再加载完整文件；同时生成按表格分段的明细
+        for path in (output_path, latest_path, week_latest_path):
+            record_result_file(path, data)
+            write_sections(path, data)
 
         return output_path
 
+    @staticmethod
+    def _copy_file_atomic(src: Path, dst: Path):
+        """复制到临时文件后替换，读取方不会读到写了一半的latest文件"""
+        import shutil
+        tmp_path = dst.with_name(f'{dst.name}.{os.getpid()}.tmp')
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+
     def clean_old_detailed_files(self, keep_hours=2):
         """
         清理旧的详细打分文件，防止累积
@@ -427,21 +446,36 @@ class AutoComprehensiveGenerator:
         except Exception as e:
             logger.warning(f"清理历史文件时出错: {e}")
 
-    def generate_from_all_detailed_results(self, excel_urls=None, expected_count=None) -> str:
+    def start_batch(self, expected_count=None, batch_id=None, excel_urls=None):
         """
-        批量处理：从所有详细打分结果生成综合打分
-        支持多文档聚合，生成N×19矩阵热力图
+        开启一个批次，返回批次累加器
+        每个表格打分完成后调用 accumulator.add_table() 即时折叠，
+        批次结束时调用 accumulator.flush() 直接生成综合打分，无需重新扫描detailed目录
 
         Args:
+            expected_count: 期望的文档数量
+            batch_id: 批次ID（默认使用当前时间戳）
             excel_urls: 字典，格式 {表格名: URL}
-            expected_count: 期望的文档数量（如果提供，只处理最新的N个文件）
         """
-        import re
-        from datetime import datetime
+        return ComprehensiveBatchAccumulator(self, batch_id=batch_id,
+                                             expected_count=expected_count,
+                                             excel_urls=excel_urls)
 
-        # 0. 首先清理超过2小时的历史文件
-        self.clean_old_detailed_files(keep_hours=2)
+    def generate_from_manifest(self, manifest_path, excel_urls=None) -> str:
+        """
+        根据批次清单生成综合打分（用于批次中断后的恢复）
 
+        Args:
+            manifest_path: 批次清单文件路径
+            excel_urls: 字典，格式 {表格名: URL}（会覆盖清单中的URL）
+        """
+        accumulator = ComprehensiveBatchAccumulator.from_manifest(self, manifest_path)
+        for table_name, url in (excel_urls or {}).items():
+            accumulator.set_excel_url(table_name, url)
+        return accumulator.flush()
+
+    def _select_batch_files_by_mtime(self, expected_count=None):
+        """按修改时间推断批次文件（没有批次清单时的兼容方案）"""
         # 1. 查找当前时间段内的所有详细打分文件
         detailed_files = sorted(self.detailed_dir.glob('detailed_score_*.json'),
                               key=lambda x: x.stat().st_mtime, reverse=True)
@@ -495,128 +529,344 @@ class AutoComprehensiveGenerator:
             elif not batch_files:
                 logger.error("❌ 没有找到任何30分钟内的详细打分文件")
 
-        logger.info(f"批量处理 {len(batch_files)} 个详细打分文件")
+        return batch_files
+
+    def generate_from_all_detailed_results(self, excel_urls=None, expected_count=None,
+                                           manifest_path=None) -> str:
+        """
+        批量处理：从所有详细打分结果生成综合打分
+        支持多文档聚合，生成N×19矩阵热力图
+
+        优先使用批次清单（manifest_path）确定批次成员；
+        未提供清单时按修改时间窗口推断（兼容旧调用方式）
+
+        Args:
+            excel_urls: 字典，格式 {表格名: URL}
+            expected_count: 期望的文档数量（如果提供，只处理最新的N个文件）
+            manifest_path: 批次清单文件路径（可选）
+        """
+        if manifest_path:
+            return self.generate_from_manifest(manifest_path, excel_urls)
 
-        # 3. 处理每个文件，收集数据
-        all_table_data = []
-        all_heatmap_rows = []
-        total_l1 = 0
-        total_l2 = 0
-        total_l3 = 0
-        total_mods = 0
+        # 0. 首先清理超过2小时的历史文件
+        self.clean_old_detailed_files(keep_hours=2)
+
+        batch_files = self._select_batch_files_by_mtime(expected_count)
+        logger.info(f"批量处理 {len(batch_files)} 个详细打分文件")
 
+        # 3. 逐个折叠到批次累加器
+        accumulator = self.start_batch(expected_count=expected_count, excel_urls=excel_urls)
         for detailed_file in batch_files:
             logger.info(f"处理文件: {detailed_file.name}")
+            accumulator.add_table(str(detailed_file))
 
-            with open(detailed_file, 'r', encoding='utf-8') as f:
-                detailed_data = json.load(f)
+        # 4. 落盘
+        return accumulator.flush()
 
-            # 提取表格信息
-            table_name = self._extract_table_name(detailed_data)
-
-            # 生成热力图矩阵和列修改数据
-            heatmap_matrix, column_modifications = self._process_detailed_scores(detailed_data)
-
-            # 累加热力图行（每个文档一行）
-            if heatmap_matrix and len(heatmap_matrix) > 0:
-                all_heatmap_rows.append(heatmap_matrix[0])  # 取第一行（单文档只有一行）
-
-            # 统计风险分布
-            risk_stats = self._calculate_risk_stats(detailed_data)
-            total_l1 += risk_stats['l1_count']
-            total_l2 += risk_stats['l2_count']
-            total_l3 += risk_stats['l3_count']
-            total_mods += risk_stats['total']
-
-            # 收集表格数据
-            table_info = {
-                'table_name': table_name,
-                'modified_rows': risk_stats['total'],
-                'column_modifications': column_modifications,
-                'excel_url': excel_urls.get(table_name) if excel_urls else None
+    def _build_hover_entry(self, table_index, table_name, detailed_data, column_modifications):
+        """生成单个表格的悬浮数据（格式与ComparisonToScoringAdapter._generate_hover_data一致）"""
+        # 按标准列收集前5条修改详情
+        details_by_column = {}
+        for score in detailed_data.get('scores', []):
+            col = score.get('column_name', '')
+            details = details_by_column.setdefault(col, [])
+            if len(details) < 5:
+                cell = score.get('cell', '')
+                row_digits = ''.join(filter(str.isdigit, cell))
+                details.append({
+                    'row': int(row_digits) if row_digits else 0,
+                    'old_value': str(score.get('old_value', '')),
+                    'new_value': str(score.get('new_value', '')),
+                    'change_type': 'modified'
+                })
+
+        column_details = []
+        for col_idx, col in enumerate(self.STANDARD_COLUMNS):
+            col_mods = column_modifications.get(col, {})
+            mod_count = col_mods.get('modification_count', 0)
+            col_detail = {
+                'column_name': col,
+                'column_index': col_idx,
+                'column_level': col_mods.get('risk_level', ''),
+                'modification_count': mod_count,
+                'modified_rows': col_mods.get('modified_rows', [])[:5],
+                'modification_details': details_by_column.get(col, [])
             }
-            all_table_data.append(table_info)
+            if mod_count > 5:
+                col_detail['has_more'] = True
+                col_detail['remaining_count'] = mod_count - 5
+            column_details.append(col_detail)
+
+        return {
+            'table_index': table_index,
+            'table_name': table_name,
+            'total_modifications': len(detailed_data.get('scores', [])),
+            'column_details': column_details
+        }
+
+    def _calculate_color_distribution(self, matrix):
+        """计算颜色分布统计"""
+        distribution = {
+            "red_0.9": 0,
+            "orange_0.6": 0,
+            "green_0.3": 0,
+            "blue_0.05": 0
+        }
+
+        for row in matrix:
+            distribution["red_0.9"] += row.count(0.90)
+            distribution["orange_0.6"] += row.count(0.60)
+            distribution["green_0.3"] += row.count(0.30)
+            distribution["blue_0.05"] += row.count(0.05)
+
+        return distribution
+
 
-        # 4. 构建综合打分数据结构（多文档版本）
-        comprehensive_data = {
+
+class ComprehensiveBatchAccumulator:
+    """
+    批次综合打分累加器
+
+    批次成员由显式清单（manifest）记录，不再依赖文件修改时间推断。
+    每个表格打分完成后立即把热力图行、列修改数据和悬浮数据折叠进运行中的聚合结果，
+    批次结束时flush()只需序列化已有结果。
+    """
+
+    def __init__(self, generator, batch_id=None, expected_count=None, excel_urls=None, persist=True):
+        self.generator = generator
+        self.batch_id = batch_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.expected_count = expected_count
+        self.batches_dir = generator.scoring_dir / 'batches'
+        self.batches_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.batches_dir / f"batch_manifest_{self.batch_id}.json"
+
+        # 清单条目（按加入顺序）
+        self.entries = []
+        self.excel_urls = dict(excel_urls or {})
+        self._reset_aggregates()
+
+        # persist为False时不写清单（从清单恢复期间，避免用不完整的条目覆盖原清单）
+        self._persist = persist
+        self._save_manifest(status='open')
+
+    def _reset_aggregates(self):
+        """清空运行中的聚合结果"""
+        self.table_names = []
+        self.matrix_rows = []
+        self.column_modifications_by_table = {}
+        self.hover_rows = []
+        self.table_details = {}
+        self.risk_totals = {'l1_count': 0, 'l2_count': 0, 'l3_count': 0, 'total': 0}
+        self.risk_distribution = {}
+
+    @classmethod
+    def from_manifest(cls, generator, manifest_path):
+        """从已保存的批次清单重建累加器；全部条目折叠成功后才改写清单"""
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        accumulator = cls(generator, batch_id=manifest.get('batch_id'),
+                          expected_count=manifest.get('expected_count'),
+                          excel_urls=manifest.get('excel_urls'), persist=False)
+        for entry in manifest.get('tables', []):
+            accumulator.add_table(entry['score_file'],
+                                  table_name=entry.get('table_name'),
+                                  excel_url=entry.get('excel_url'))
+        accumulator._persist = True
+        accumulator._save_manifest(status='open')
+        return accumulator
+
+    def add_table(self, score_file, table_name=None, excel_url=None, detailed_data=None):
+        """
+        折叠一个表格的详细打分结果
+
+        Args:
+            score_file: 详细打分文件路径
+            table_name: 表格名称（调用方已知时传入，避免从workflow历史反查）
+            excel_url: 上传后的腾讯文档URL
+            detailed_data: 已加载的详细打分数据（可选，避免重复读取）
+
+        Returns:
+            折叠后的表格名称；重复加入同一文件时返回None。
+            同名表格再次加入时以新的打分文件替换原有的行
+        """
+        score_file = str(score_file)
+        if any(entry['score_file'] == score_file for entry in self.entries):
+            logger.warning(f"⚠️ 详细打分文件已在批次中，跳过: {os.path.basename(score_file)}")
+            return None
+
+        if detailed_data is None:
+            with open(score_file, 'r', encoding='utf-8') as f:
+                detailed_data = json.load(f)
+
+        if not table_name:
+            table_name = self.generator._extract_table_name(detailed_data)
+
+        if table_name in self.table_details:
+            logger.warning(f"⚠️ 表格 {table_name} 已在批次中，以新的打分文件替换: {os.path.basename(score_file)}")
+            self._drop_table(table_name)
+
+        risk_stats = self._fold(table_name, detailed_data)
+        self.entries.append({
+            'table_name': table_name,
+            'score_file': score_file,
+            'excel_url': None,
+            'modifications': risk_stats['total'],
+            'added_at': datetime.now().isoformat()
+        })
+
+        url = excel_url or self.excel_urls.get(table_name)
+        if url:
+            self.set_excel_url(table_name, url)
+        else:
+            self._save_manifest(status='open')
+
+        logger.info(f"📥 批次 {self.batch_id} 已折叠表格: {table_name} "
+                    f"({len(self.entries)}/{self.expected_count or '?'})")
+        return table_name
+
+    def _drop_table(self, table_name):
+        """移除同名表格：聚合结果按剩余条目重新折叠（仅在重复表名时发生）"""
+        self.entries = [entry for entry in self.entries if entry['table_name'] != table_name]
+        self._reset_aggregates()
+        for entry in self.entries:
+            with open(entry['score_file'], 'r', encoding='utf-8') as f:
+                self._fold(entry['table_name'], json.load(f))
+            if entry.get('excel_url'):
+                self.table_details[entry['table_name']]["excel_url"] = entry['excel_url']
+
+    def _fold(self, table_name, detailed_data):
+        """把一个表格的打分结果折叠进聚合结果，返回其风险统计"""
+        generator = self.generator
+        heatmap_matrix, column_modifications = generator._process_detailed_scores(detailed_data)
+        risk_stats = generator._calculate_risk_stats(detailed_data)
+
+        table_index = len(self.table_names)
+        self.table_names.append(table_name)
+        if heatmap_matrix:
+            self.matrix_rows.append(heatmap_matrix[0])  # 单文档只有一行
+        self.column_modifications_by_table[table_name] = {
+            "column_modifications": column_modifications,
+            "total_rows": 270
+        }
+        self.hover_rows.append(generator._build_hover_entry(
+            table_index, table_name, detailed_data, column_modifications))
+        self.table_details[table_name] = {
+            "total_rows": 270,
+            "modified_rows": risk_stats['total'],
+            "added_rows": 0,
+            "deleted_rows": 0
+        }
+
+        for key in self.risk_totals:
+            self.risk_totals[key] += risk_stats[key]
+        for level, count in detailed_data.get('summary', {}).get('risk_distribution', {}).items():
+            self.risk_distribution[level] = self.risk_distribution.get(level, 0) + count
+        return risk_stats
+
+    def set_excel_url(self, table_name, excel_url):
+        """记录表格上传后的URL"""
+        if not excel_url:
+            return
+        self.excel_urls[table_name] = excel_url
+        if table_name in self.table_details:
+            self.table_details[table_name]["excel_url"] = excel_url
+        for entry in self.entries:
+            if entry['table_name'] == table_name:
+                entry['excel_url'] = excel_url
+        self._save_manifest(status='open')
+
+    def build(self):
+        """根据运行中的聚合结果构建综合打分数据结构"""
+        generator = self.generator
+        totals = self.risk_totals
+        total_cells = len(self.table_names) * 270 * 19
+
+        result = {
             "metadata": {
                 "version": "2.0",
                 "timestamp": datetime.now().isoformat(),
-                "week": f"W{self.current_week}",
+                "week": f"W{generator.current_week}",
                 "generator": "auto_comprehensive_generator_batch",
                 "source_type": "multi_document_scoring",
-                "baseline_week": f"W{self._get_baseline_week()}",
-                "comparison_week": f"W{self.current_week}"
+                "baseline_week": f"W{generator._get_baseline_week()}",
+                "comparison_week": f"W{generator.current_week}",
+                "batch_id": self.batch_id,
+                "batch_manifest": str(self.manifest_path)
             },
             "summary": {
-                "total_tables": len(all_table_data),  # 动态计算表格数量
+                "total_tables": len(self.table_names),
                 "total_columns": 19,
-                "total_modifications": total_mods,
-                "l1_modifications": total_l1,
-                "l2_modifications": total_l2,
-                "l3_modifications": total_l3,
-                "overall_risk_score": self._calculate_overall_risk({
-                    'l1_count': total_l1,
-                    'l2_count': total_l2,
-                    'l3_count': total_l3,
-                    'total': total_mods
-                }),
+                "total_modifications": totals['total'],
+                "l1_modifications": totals['l1_count'],
+                "l2_modifications": totals['l2_count'],
+                "l3_modifications": totals['l3_count'],
+                "overall_risk_score": generator._calculate_overall_risk(totals),
                 "processing_status": "complete",
                 "data_source": "batch_auto_generated"
             },
-            "table_names": [item['table_name'] for item in all_table_data],
-            "column_names": self.STANDARD_COLUMNS,
+            "table_names": list(self.table_names),
+            "column_names": generator.STANDARD_COLUMNS,
             "heatmap_data": {
-                "matrix": all_heatmap_rows,  # N×19矩阵
-                "rows": len(all_heatmap_rows),  # 动态行数
+                "matrix": list(self.matrix_rows),  # N×19矩阵
+                "rows": len(self.matrix_rows),
                 "cols": 19,
                 "generation_method": "batch_risk_based_auto",
-                "color_distribution": self._calculate_color_distribution(all_heatmap_rows)
+                "color_distribution": generator._calculate_color_distribution(self.matrix_rows)
+            },
+            "table_details": self.table_details,
+            "statistics": {
+                "total_cells": total_cells,
+                "modified_cells": totals['total'],
+                "modification_rate": round(totals['total'] / total_cells, 4) if total_cells and totals['total'] > 0 else 0,
+                "risk_distribution": self.risk_distribution
             },
-            "table_details": {}
+            "column_modifications_by_table": self.column_modifications_by_table,
+            "hover_data": {
+                "description": "增强版鼠标悬浮显示数据",
+                "version": "2.0",
+                "data": self.hover_rows
+            }
         }
 
-        # 5. 添加每个表格的详细信息
-        for table_info in all_table_data:
-            table_name = table_info['table_name']
-            comprehensive_data["table_details"][table_name] = {
-                "total_rows": 270,  # 可以从详细文件中获取
-                "modified_rows": table_info['modified_rows'],
-                "added_rows": 0,
-                "deleted_rows": 0
-            }
-            if table_info['excel_url']:
-                comprehensive_data["table_details"][table_name]["excel_url"] = table_info['excel_url']
+        if self.excel_urls:
+            result["excel_urls"] = dict(self.excel_urls)
 
-        # 6. 如果提供了excel_urls，添加到数据中
-        if excel_urls:
-            comprehensive_data["excel_urls"] = excel_urls
+        return result
 
-        # 7. 保存文件
-        output_path = self._save_comprehensive_file(comprehensive_data)
+    def flush(self) -> str:
+        """保存综合打分文件并关闭批次清单"""
+        if self.expected_count and len(self.entries) < self.expected_count:
+            logger.warning(f"⚠️ 批次 {self.batch_id} 期望 {self.expected_count} 个表格，"
+                           f"实际折叠 {len(self.entries)} 个")
 
-        logger.info(f"✅ 批量综合打分已生成: {output_path}")
-        logger.info(f"   包含 {len(all_table_data)} 个表格，热力图矩阵: {len(all_heatmap_rows)}×19")
+        output_path = self.generator._save_comprehensive_file(self.build())
+        self._save_manifest(status='flushed', comprehensive_file=str(output_path))
 
+        logger.info(f"✅ 批量综合打分已生成: {output_path}")
+        logger.info(f"   包含 {len(self.table_names)} 个表格，热力图矩阵: {len(self.matrix_rows)}×19")
         return str(output_path)
 
-    def _calculate_color_distribution(self, matrix):
-        """计算颜色分布统计"""
-        distribution = {
-            "red_0.9": 0,
-            "orange_0.6": 0,
-            "green_0.3": 0,
-            "blue_0.05": 0
+    def _save_manifest(self, status, comprehensive_file=None):
+        """保存批次清单"""
+        if not self._persist:
+            return
+        manifest = {
+            'batch_id': self.batch_id,
+            'status': status,
+            'week': f"W{self.generator.current_week}",
+            'expected_count': self.expected_count,
+            'updated_at': datetime.now().isoformat(),
+            'tables': self.entries,
+            'excel_urls': self.excel_urls
         }
+        if comprehensive_file:
+            manifest['comprehensive_file'] = comprehensive_file
 
-        for row in matrix:
-            distribution["red_0.9"] += row.count(0.90)
-            distribution["orange_0.6"] += row.count(0.60)
-            distribution["green_0.3"] += row.count(0.30)
-            distribution["blue_0.05"] += row.count(0.05)
-
-        return distribution
-
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
 
 if __name__ == "__main__":
     generator = AutoComprehensiveGenerator()
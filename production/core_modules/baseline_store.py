@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+基线列式存储
+一周内基线CSV固定不变，却要与周四、周六以及每次手动刷新的目标文件反复对比。
+这里把基线解析一次为列式结构，并在CSV旁边写一个可内存映射的旁路文件
+（<基线>.csv.colstore），之后的对比只需要解析目标文件：
+
+    table = load_baseline(baseline_path)
+    rows = table.rows()                       # 与 list(csv.reader(f)) 相同
+    if table.row_hash(i) == normalized_row_hash(target_row):
+        ...                                   # 该行（去首尾空白后）无变化，跳过逐格对比
+
+列式结构:
+- 每列一个字典（列内去重的字符串）和 uint32 编码数组
+- 每行原始长度和规范化行哈希（去首尾空白后的blake2b-64，末尾空单元格不计）
+
+旁路文件记录源文件大小、mtime和sha256，源文件变化后自动重建；
+进程内按路径缓存已加载的表。
+"""
+
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .ejs_workbook_decoder import is_ejs_file
+except ImportError:
+    try:
+        from production.core_modules.ejs_workbook_decoder import is_ejs_file
+    except ImportError:
+        # 作为 core_modules 下的顶层模块导入（对比器把该目录加入了sys.path）
+        from ejs_workbook_decoder import is_ejs_file
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = '.colstore'
+MAGIC = b'BLSTORE1'
+FORMAT_VERSION = 2
+ENCODINGS = ('utf-8', 'gbk')
+MAX_CACHED_TABLES = 64
+FIELD_SEPARATOR = '\x1f'
+
+
+def normalized_row_hash(row: List[Any]) -> int:
+    """整行规范化哈希：逐格去首尾空白并忽略末尾空单元格，哈希相同即逐格对比无差异"""
+    cells = [str(cell).strip() for cell in row]
+    while cells and not cells[-1]:
+        cells.pop()
+    return int.from_bytes(
+        hashlib.blake2b(FIELD_SEPARATOR.join(cells).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _decode_csv(raw: bytes) -> Tuple[List[List[str]], str]:
+    for encoding in ENCODINGS:
+        try:
+            text = raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+        # newline=None 与文本模式open()一致，统一换行符
+        return list(csv.reader(io.StringIO(text, newline=None))), encoding
+    raise ValueError(f"无法使用 {'/'.join(ENCODINGS)} 解码文件")
+
+
+class ColumnarTable:
+    """一份基线的列式表示（数组来自内存映射的旁路文件或刚解析的数据）"""
+
+    def __init__(self, meta: Dict[str, Any], row_lengths, row_hashes,
+                 codes: List[Any], dictionaries: List[List[str]],
+                 mapped: Optional[mmap.mmap] = None):
+        self.meta = meta
+        self.n_rows = meta['n_rows']
+        self.n_cols = meta['n_cols']
+        self.encoding = meta.get('encoding')
+        self.checksum = meta.get('sha256')
+        self._row_lengths = row_lengths
+        self._row_hashes = row_hashes
+        self._codes = codes
+        self._dictionaries = dictionaries
+        self._mapped = mapped
+        self._rows: Optional[List[List[str]]] = None
+        self._lock = threading.Lock()
+
+    def dictionary(self, col: int) -> List[str]:
+        """列内去重后的字符串，下标即编码"""
+        return self._dictionaries[col]
+
+    def codes(self, col: int):
+        """该列每行的字典编码（uint32）"""
+        return self._codes[col]
+
+    def column(self, col: int) -> List[str]:
+        dictionary = self._dictionaries[col]
+        return list(map(dictionary.__getitem__, self._codes[col]))
+
+    def cell(self, row: int, col: int) -> str:
+        return self._dictionaries[col][self._codes[col][row]] if col < self._row_lengths[row] else ''
+
+    def row_hash(self, row: int) -> int:
+        return self._row_hashes[row]
+
+    def row_length(self, row: int) -> int:
+        return self._row_lengths[row]
+
+    def rows(self) -> List[List[str]]:
+        """还原为行列表（首次调用时按列批量还原并缓存，调用方不应修改）"""
+        if self._rows is None:
+            with self._lock:
+                if self._rows is None:
+                    columns = [self.column(c) for c in range(self.n_cols)]
+                    rows = list(map(list, zip(*columns))) if columns else [[] for _ in range(self.n_rows)]
+                    if self.n_rows and min(self._row_lengths) < self.n_cols:
+                        for index, length in enumerate(self._row_lengths):
+                            if length < self.n_cols:
+                                del rows[index][length:]
+                    self._rows = rows
+        return self._rows
+
+
+def _build(rows: List[List[str]]) -> Tuple[array, array, List[array], List[List[str]]]:
+    n_cols = max((len(row) for row in rows), default=0)
+    row_lengths = array('I', (len(row) for row in rows))
+    row_hashes = array('Q', (normalized_row_hash(row) for row in rows))
+    codes, dictionaries = [], []
+    for col in range(n_cols):
+        mapping: Dict[str, int] = {}
+        column_codes = array('I')
+        append = column_codes.append
+        for row in rows:
+            value = row[col] if col < len(row) else ''
+            code = mapping.get(value)
+            if code is None:
+                code = mapping[value] = len(mapping)
+            append(code)
+        dictionary = list(mapping)
+        codes.append(column_codes)
+        dictionaries.append(dictionary)
+    return row_lengths, row_hashes, codes, dictionaries
+
+
+def _pad(buffer: bytearray):
+    buffer.extend(b'\0' * (-len(buffer) % 8))
+
+
+def _write_sidecar(sidecar_path: str, meta: Dict[str, Any], row_lengths: array, row_hashes: array,
+                   codes: List[array], dictionaries: List[List[str]]):
+    """
+    文件格式: MAGIC | uint32 元数据长度 | 元数据JSON | 各段（8字节对齐）
+    元数据 sections 记录每段的 [偏移, 字节数]，偏移相对文件开头
+    """
+    body = bytearray()
+    sections: Dict[str, List[int]] = {}
+
+    def add(name: str, data: bytes):
+        _pad(body)
+        sections[name] = [len(body), len(data)]
+        body.extend(data)
+
+    add('row_lengths', row_lengths.tobytes())
+    add('row_hashes', row_hashes.tobytes())
+    for col, dictionary in enumerate(dictionaries):
+        encoded = [value.encode('utf-8') for value in dictionary]
+        offsets = array('I', [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        add(f'codes.{col}', codes[col].tobytes())
+        add(f'dict_offsets.{col}', offsets.tobytes())
+        add(f'dict_blob.{col}', b''.join(encoded))
+
+    meta = dict(meta, sections=sections, byteorder=sys.byteorder, version=FORMAT_VERSION)
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    header = bytearray(MAGIC + struct.pack('<I', len(meta_bytes)) + meta_bytes)
+    _pad(header)
+    for section in sections.values():
+        section[0] += len(header)
+    # 偏移量变化后重新生成元数据（长度可能变化，循环直到稳定）
+    while True:
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        new_header = bytearray(MAGIC + struct.pack('<I', len(meta_bytes)) + meta_bytes)
+        _pad(new_header)
+        if len(new_header) == len(header):
+            header = new_header
+            break
+        delta = len(new_header) - len(header)
+        for section in sections.values():
+            section[0] += delta
+        header = new_header
+
+    tmp_path = f'{sidecar_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(body)
+    os.replace(tmp_path, sidecar_path)
+
+
+def _open_sidecar(sidecar_path: str, size: int, mtime_ns: int) -> Optional[ColumnarTable]:
+    """映射旁路文件，源文件签名不符或格式不符时返回None"""
+    try:
+        with open(sidecar_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        meta = None
+        if mapped[:len(MAGIC)] == MAGIC:
+            meta_len = struct.unpack_from('<I', mapped, len(MAGIC))[0]
+            start = len(MAGIC) + 4
+            meta = json.loads(mapped[start:start + meta_len].decode('utf-8'))
+        if (not meta or meta.get('version') != FORMAT_VERSION or meta.get('byteorder') != sys.byteorder
+                or meta.get('source_size') != size or meta.get('source_mtime_ns') != mtime_ns):
+            mapped.close()
+            return None
+
+        view = memoryview(mapped)
+        sections = meta['sections']
+
+        def section(name: str, fmt: Optional[str] = None):
+            offset, length = sections[name]
+            part = view[offset:offset + length]
+            return part.cast(fmt) if fmt else part
+
+        codes, dictionaries = [], []
+        for col in range(meta['n_cols']):
+            offsets = section(f'dict_offsets.{col}', 'I')
+            blob = section(f'dict_blob.{col}')
+            dictionaries.append([str(blob[offsets[i]:offsets[i + 1]], 'utf-8')
+                                 for i in range(len(offsets) - 1)])
+            codes.append(section(f'codes.{col}', 'I'))
+        return ColumnarTable(meta, section('row_lengths', 'I'), section('row_hashes', 'Q'),
+                             codes, dictionaries, mapped=mapped)
+    except (KeyError, ValueError, TypeError, struct.error) as e:
+        logger.warning(f"基线旁路文件损坏，将重建 {sidecar_path}: {e}")
+        return None
+
+
+def build_table(path: str, persist: bool = True) -> ColumnarTable:
+    """解析CSV并构建列式表，persist时写入旁路文件"""
+    st = os.stat(path)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    rows, encoding = _decode_csv(raw)
+    arrays = _build(rows)
+    meta = {
+        'source_size': st.st_size,
+        'source_mtime_ns': st.st_mtime_ns,
+        'sha256': hashlib.sha256(raw).hexdigest(),
+        'encoding': encoding,
+        'n_rows': len(rows),
+        'n_cols': len(arrays[3]),
+    }
+    if persist:
+        try:
+            _write_sidecar(path + SIDECAR_SUFFIX, meta, *arrays)
+        except OSError as e:
+            logger.warning(f"基线旁路文件写入失败 {path}: {e}")
+    table = ColumnarTable(meta, *arrays)
+    table._rows = rows
+    return table
+
+
+_tables: "OrderedDict[str, Tuple[Tuple[int, int], ColumnarTable]]" = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+def load_baseline(path: str) -> ColumnarTable:
+    """
+    取基线的列式表：进程内缓存 → 旁路文件 → 解析CSV（并写旁路文件）
+
+    Raises:
+        OSError: 文件不存在或不可读
+        ValueError: 无法解码
+    """
+    abs_path = os.path.abspath(path)
+    st = os.stat(abs_path)
+    signature = (st.st_size, st.st_mtime_ns)
+    with _tables_lock:
+        cached = _tables.get(abs_path)
+        if cached is not None and cached[0] == signature:
+            _tables.move_to_end(abs_path)
+            return cached[1]
+
+    table = _open_sidecar(abs_path + SIDECAR_SUFFIX, *signature)
+    if table is None:
+        table = build_table(abs_path)
+        logger.info(f"📦 基线已建立列式存储: {os.path.basename(abs_path)} "
+                    f"({table.n_rows}行×{table.n_cols}列)")
+
+    with _tables_lock:
+        _tables[abs_path] = (signature, table)
+        _tables.move_to_end(abs_path)
+        while len(_tables) > MAX_CACHED_TABLES:
+            _tables.popitem(last=False)
+    return table
+
+
+def is_plain_csv(path: str) -> bool:
+    """扩展名为.csv且不是EJS导出（EJS由ejs_workbook_decoder处理）"""
+    return str(path).lower().endswith('.csv') and not is_ejs_file(path)
@@ -16,9 +16,14 @@ import concurrent.futures
 import sys
 sys.path.append('/root/projects/tencent-doc-manager')
 from production_integrated_test_system_8093 import run_complete_workflow
+from production.core_modules.table_process_pool import TASK_TIMEOUT, get_table_process_pool
 
 logger = logging.getLogger(__name__)
 
+# 单个文档的最长等待时间：对比、打分两个进程池任务各自最多TASK_TIMEOUT，
+# 另留10分钟给下载、涂色、上传等网络阶段，避免在进程池仍会完成时提前放弃
+DOCUMENT_TIMEOUT = 2 * TASK_TIMEOUT + 600
+
 class BatchWorkflowOrchestrator:
     """批量工作流协调器 - 向后兼容的扩展"""
 
@@ -27,7 +32,8 @@ class BatchWorkflowOrchestrator:
         Args:
             mode: 处理模式
                 - "sequential": 串行处理（安全，默认）
-                - "parallel": 并行处理（快速）
+                - "parallel": 并行处理（快速）：下载/上传等网络阶段在线程中重叠，
+                  对比/打分等CPU阶段分散到按核数开的表格进程池
                 - "single": 单文档模式（完全兼容旧版）
         """
         self.mode = mode
@@ -103,7 +109,9 @@ class BatchWorkflowOrchestrator:
 
         # 并行处理（更快但需要更多资源）
         elif self.mode == "parallel":
-            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            # 每个线程驱动一张表，线程数与进程池规模一致，保证CPU阶段能占满各核
+            max_workers = max(1, min(len(document_pairs), max(3, get_table_process_pool().max_workers)))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
                 futures = []
                 for idx, pair in enumerate(document_pairs, 1):
                     future = executor.submit(
@@ -114,7 +122,7 @@ class BatchWorkflowOrchestrator:
 
                 for future, pair, idx in futures:
                     try:
-                        result = future.result(timeout=300)  # 5分钟超时
+                        result = future.result(timeout=DOCUMENT_TIMEOUT)
                         self.results.append(result)
                         if result["status"] == "success" and "detailed_score_file" in result.get("result", {}):
                             self.detailed_files.append(result["result"]["detailed_score_file"])
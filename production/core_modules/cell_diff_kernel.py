@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+单元格差异内核
+先求变化掩码、再只为命中的单元格生成记录，代替逐行逐格的 str().strip() 循环：
+
+    for row, col in changed_cells(baseline_rows, target_rows, start_row=2):
+        ...                                          # 只为有差异的单元格生成修改记录
+
+- 行掩码: map(operator.ne) 在C层整行比较原始值，原始值相同的行去空白后必然相同，直接跳过
+- 单元格掩码: 只对掩码命中的行按列比较原始值（itertools.compress 取下标），
+  原始值不同的少量单元格再做 str().strip() 比较
+- 结果按行优先排序，与原逐格循环一致
+- skip_row: 调用方可提供更快的整行判定（如基线列式存储的规范化行哈希），
+  只对行掩码命中的行调用，返回True的行不再逐格比较
+
+大部分单元格未变化的表格，耗时主要是一次C层的整表比较。
+"""
+
+import operator
+from itertools import compress, islice
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+
+def _padded(row: Sequence[Any], width: int) -> Sequence[Any]:
+    if len(row) == width:
+        return row
+    return list(row[:width]) + [''] * (width - len(row))
+
+
+def changed_rows(base_rows: Sequence[Sequence[Any]], target_rows: Sequence[Sequence[Any]],
+                 start_row: int = 0) -> List[int]:
+    """
+    原始值不完全相同的行号（行掩码），只有一侧存在的行都算作变化
+
+    同值的list与tuple按类型视为不同，只会多出候选行，不影响 changed_cells 的结果。
+    """
+    paired = min(len(base_rows), len(target_rows))
+    rows = list(compress(range(start_row, paired),
+                         map(operator.ne, islice(base_rows, start_row, paired),
+                             islice(target_rows, start_row, paired))))
+    rows.extend(range(max(start_row, paired), max(len(base_rows), len(target_rows))))
+    return rows
+
+
+def changed_cells(base_rows: Sequence[Sequence[Any]], target_rows: Sequence[Sequence[Any]],
+                  start_row: int = 0, strip: bool = True,
+                  n_cols: Optional[int] = None,
+                  skip_row: Optional[Callable[[int], bool]] = None) -> List[Tuple[int, int]]:
+    """
+    比较两组行，返回有差异的 (行号, 列号)，按行优先排序
+
+    两侧的行数、行长可以不同，缺失部分按''参与比较；行号从0开始计，start_row之前的行不比较。
+    n_cols为None时每行比较到两侧较长者，否则只比较前n_cols列。
+    strip为True时按 str(值).strip() 判断差异，否则按原值。
+    skip_row(行号)返回True表示该行按上述规则无差异，跳过逐格比较。
+    """
+    cells = []
+    for row in changed_rows(base_rows, target_rows, start_row):
+        if skip_row is not None and skip_row(row):
+            continue
+        base = base_rows[row] if row < len(base_rows) else ()
+        target = target_rows[row] if row < len(target_rows) else ()
+        width = max(len(base), len(target)) if n_cols is None else n_cols
+        base, target = _padded(base, width), _padded(target, width)
+        for col in compress(range(width), map(operator.ne, base, target)):
+            if not strip or str(base[col]).strip() != str(target[col]).strip():
+                cells.append((row, col))
+    return cells
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+热力图响应紧凑编码
+客户端在 Accept 中声明 COMPACT_MEDIA_TYPE 时，API响应中的大数组改为紧凑表示，
+未声明的旧客户端保持原有JSON不变：
+
+    热力图矩阵     {"__enc": "matrix", "dtype": "u8"|"f16", "shape": [行, 列], "data": base64, ...}
+                   u8: 不同取值不超过256个时附带调色板(palette)无损编码，
+                       否则按 [lo, hi] 线性量化（lossy=true）
+                   f16: IEEE半精度，行优先小端
+    修改掩码       {"__enc": "bitset", "shape": [行, 列], "data": base64}  行优先，低位在前
+    修改行号列表   {"__enc": "delta", "count": n, "data": base64}  差值zigzag后按varint编码
+
+示例请求头:
+    Accept: application/vnd.heatmap.compact+json; matrix=f16
+"""
+
+import base64
+import struct
+from typing import Any, Dict, List, Optional
+
+COMPACT_MEDIA_TYPE = 'application/vnd.heatmap.compact+json'
+
+MATRIX_DTYPES = ('u8', 'f16')
+DEFAULT_MATRIX_DTYPE = 'u8'
+
+# 按键名识别需要编码的字段
+MATRIX_KEYS = ('heatmap_data', 'matrix')
+MASK_KEYS = ('modification_mask',)
+ROW_LIST_KEYS = ('modified_rows', 'row_numbers')
+
+# 小数组编码收益有限，保持原样
+MIN_ROW_LIST_LENGTH = 8
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode('ascii')
+
+
+def negotiate(accept_header: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    解析Accept头，客户端接受紧凑编码时返回编码参数，否则返回None
+
+    Returns:
+        {'matrix': 'u8'|'f16'}
+    """
+    if not accept_header:
+        return None
+    for media_range in accept_header.split(','):
+        parts = [p.strip() for p in media_range.split(';')]
+        if parts[0].lower() != COMPACT_MEDIA_TYPE:
+            continue
+        params = dict(p.split('=', 1) for p in parts[1:] if '=' in p)
+        if params.get('q', '1').strip() in ('0', '0.0', '0.00', '0.000'):
+            return None
+        dtype = params.get('matrix', DEFAULT_MATRIX_DTYPE).strip().lower()
+        return {'matrix': dtype if dtype in MATRIX_DTYPES else DEFAULT_MATRIX_DTYPE}
+    return None
+
+
+def _is_matrix(value: Any) -> bool:
+    if not isinstance(value, list) or not value or not all(isinstance(row, list) for row in value):
+        return False
+    width = len(value[0])
+    return width > 0 and all(len(row) == width and all(_is_number(v) for v in row) for row in value)
+
+
+def encode_matrix(matrix: List[List[float]], dtype: str = DEFAULT_MATRIX_DTYPE) -> Dict[str, Any]:
+    """把数值矩阵编码为行优先的u8/f16缓冲区"""
+    flat = [float(v) for row in matrix for v in row]
+    encoded: Dict[str, Any] = {
+        '__enc': 'matrix',
+        'dtype': dtype,
+        'shape': [len(matrix), len(matrix[0]) if matrix else 0],
+    }
+
+    if dtype == 'f16':
+        encoded['data'] = _b64(struct.pack(f'<{len(flat)}e', *flat))
+        return encoded
+
+    distinct = sorted(set(flat))
+    if len(distinct) <= 256:
+        # 热力值通常只有少量离散取值，调色板编码可逐值还原，阈值比较不受影响
+        position = {v: i for i, v in enumerate(distinct)}
+        encoded['palette'] = distinct
+        encoded['data'] = _b64(bytes(position[v] for v in flat))
+        return encoded
+
+    lo, hi = (distinct[0], distinct[-1]) if distinct else (0.0, 0.0)
+    span = (hi - lo) or 1.0
+    encoded.update({
+        'lo': lo,
+        'hi': hi,
+        'lossy': True,
+        'data': _b64(bytes(int(round((v - lo) / span * 255)) for v in flat)),
+    })
+    return encoded
+
+
+def encode_bitset(mask: List[List[Any]]) -> Dict[str, Any]:
+    """把布尔矩阵编码为行优先位图"""
+    flat = [bool(v) for row in mask for v in row]
+    packed = bytearray((len(flat) + 7) // 8)
+    for i, bit in enumerate(flat):
+        if bit:
+            packed[i >> 3] |= 1 << (i & 7)
+    return {
+        '__enc': 'bitset',
+        'shape': [len(mask), len(mask[0]) if mask else 0],
+        'data': _b64(bytes(packed)),
+    }
+
+
+def encode_row_list(rows: List[int]) -> Dict[str, Any]:
+    """行号列表差值编码（保持原顺序，差值zigzag后varint）"""
+    out = bytearray()
+    previous = 0
+    for row in rows:
+        delta = int(row) - previous
+        previous = int(row)
+        value = (delta << 1) ^ (delta >> 63)  # zigzag，负差值同样紧凑
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return {'__enc': 'delta', 'count': len(rows), 'data': _b64(bytes(out))}
+
+
+def compact_payload(payload: Any, matrix_dtype: str = DEFAULT_MATRIX_DTYPE) -> Any:
+    """递归替换响应中的矩阵、掩码和行号列表，其他字段原样保留"""
+    if isinstance(payload, list):
+        return [compact_payload(item, matrix_dtype) for item in payload]
+    if not isinstance(payload, dict):
+        return payload
+
+    result = {}
+    for key, value in payload.items():
+        if key in MASK_KEYS and isinstance(value, list) and value and all(isinstance(r, list) for r in value):
+            result[key] = encode_bitset(value)
+        elif key in MATRIX_KEYS and _is_matrix(value):
+            result[key] = encode_matrix(value, matrix_dtype)
+        elif (key in ROW_LIST_KEYS and isinstance(value, list)
+              and len(value) >= MIN_ROW_LIST_LENGTH and all(isinstance(v, int) and not isinstance(v, bool) for v in value)):
+            result[key] = encode_row_list(value)
+        else:
+            result[key] = compact_payload(value, matrix_dtype)
+    return result
+
+
+# ---------- 解码（供Python客户端和校验使用，前端有对应的JS实现） ----------
+
+def _decode_matrix(node: Dict[str, Any]) -> List[List[float]]:
+    rows, cols = node['shape']
+    raw = base64.b64decode(node['data'])
+    if node['dtype'] == 'f16':
+        flat = list(struct.unpack(f'<{rows * cols}e', raw))
+    elif 'palette' in node:
+        flat = [node['palette'][b] for b in raw]
+    else:
+        lo, hi = node['lo'], node['hi']
+        flat = [lo + b / 255 * (hi - lo) for b in raw]
+    return [flat[r * cols:(r + 1) * cols] for r in range(rows)]
+
+
+def _decode_bitset(node: Dict[str, Any]) -> List[List[bool]]:
+    rows, cols = node['shape']
+    raw = base64.b64decode(node['data'])
+    return [[bool(raw[(i := r * cols + c) >> 3] >> (i & 7) & 1) for c in range(cols)] for r in range(rows)]
+
+
+def _decode_row_list(node: Dict[str, Any]) -> List[int]:
+    raw = base64.b64decode(node['data'])
+    rows, previous, value, shift = [], 0, 0, 0
+    for byte in raw:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte & 0x80:
+            continue
+        previous += (value >> 1) ^ -(value & 1)
+        rows.append(previous)
+        value, shift = 0, 0
+    return rows
+
+
+_DECODERS = {'matrix': _decode_matrix, 'bitset': _decode_bitset, 'delta': _decode_row_list}
+
+
+def decode_payload(payload: Any) -> Any:
+    """还原 compact_payload 的输出"""
+    if isinstance(payload, list):
+        return [decode_payload(item) for item in payload]
+    if not isinstance(payload, dict):
+        return payload
+    decoder = _DECODERS.get(payload.get('__enc'))
+    if decoder:
+        return decoder(payload)
+    return {key: decode_payload(value) for key, value in payload.items()}
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+综合打分分段存储
+把综合打分文件拆成一个小的头部段(head)和按表格独立寻址的明细段：
+
+    comprehensive_score_W39_xxx.json            # 原始完整文件（保持兼容）
+    comprehensive_score_W39_xxx.json.sections/
+        head.json                                # 矩阵、表名、列名、汇总、每列修改计数
+        tables.json                              # 表名 → 明细段文件名
+        .source_<size>_<mtime_ns>                # 源文件签名标记（stat即可判断是否过期）
+        t0000.json, t0001.json, ...              # 单个表格的明细、悬浮数据、修改行号
+
+头部段只保留首屏渲染需要的数据，体积只与 表格数×19 的矩阵成正比；
+表格明细在用户悬浮查看时按需读取。分段目录以源文件的 size/mtime 校验，
+源文件被覆盖或分段缺失时自动重建，因此旧文件无需迁移。
+"""
+
+import json
+import os
+import shutil
+import threading
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+SECTIONS_SUFFIX = '.sections'
+HEAD_FILENAME = 'head.json'
+TABLES_FILENAME = 'tables.json'          # 表名 → 明细段文件名
+STAMP_PREFIX = '.source_'                # 源文件签名标记：.source_<size>_<mtime_ns>
+
+# 按表格拆分到明细段的顶层字段
+SECTIONED_KEYS = ('table_details', 'hover_data', 'column_modifications_by_table', 'table_scores')
+
+
+def _strip_lists(entry: Any) -> Any:
+    """去掉列级修改记录中的列表字段（行号等），保留计数等标量"""
+    if not isinstance(entry, dict):
+        return entry
+    return {k: v for k, v in entry.items() if not isinstance(v, list)}
+
+
+def _head_column_modifications(table_entry: Dict[str, Any]) -> Dict[str, Any]:
+    """column_modifications_by_table 的单表条目：保留每列计数，去掉行号列表"""
+    head_entry = {k: v for k, v in table_entry.items() if k != 'column_modifications'}
+    column_mods = table_entry.get('column_modifications')
+    if isinstance(column_mods, dict):
+        head_entry['column_modifications'] = {
+            col: _strip_lists(mods) for col, mods in column_mods.items()
+        }
+    return head_entry
+
+
+def _head_table_score(table_score: Dict[str, Any]) -> Dict[str, Any]:
+    """旧格式 table_scores 的单表条目：保留列级汇总，去掉行号列表"""
+    head_entry = {k: v for k, v in table_score.items() if k != 'column_scores'}
+    column_scores = table_score.get('column_scores')
+    if isinstance(column_scores, dict):
+        head_entry['column_scores'] = {
+            col: _strip_lists(scores) for col, scores in column_scores.items()
+        }
+    return head_entry
+
+
+def split_comprehensive(data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    拆分综合打分数据
+
+    Returns:
+        (head, sections)：sections 按表格顺序排列，每段包含
+        table_name、index 以及该表的 table_details / hover / column_modifications / table_score
+    """
+    head = {k: v for k, v in data.items() if k not in SECTIONED_KEYS}
+
+    table_names = list(data.get('table_names') or [])
+    table_scores = data.get('table_scores') or []
+    if not table_names and table_scores:
+        table_names = [t.get('table_name', f'表格_{i + 1}') for i, t in enumerate(table_scores)]
+
+    details = data.get('table_details')
+    hover_rows = (data.get('hover_data') or {}).get('data', []) if isinstance(data.get('hover_data'), dict) else []
+    hover_by_name = {row.get('table_name'): row for row in hover_rows if isinstance(row, dict)}
+    column_mods = data.get('column_modifications_by_table') or {}
+
+    sections = []
+    for index, name in enumerate(table_names):
+        section: Dict[str, Any] = {'table_name': name, 'index': index}
+        if isinstance(details, dict) and name in details:
+            section['table_details'] = details[name]
+        elif isinstance(details, list) and index < len(details):
+            section['table_details'] = details[index]
+        hover = hover_by_name.get(name)
+        if hover is None and index < len(hover_rows) and hover_rows[index].get('table_index') == index:
+            hover = hover_rows[index]
+        if hover is not None:
+            section['hover'] = hover
+        if name in column_mods:
+            section['column_modifications'] = column_mods[name]
+        if index < len(table_scores):
+            section['table_score'] = table_scores[index]
+        sections.append(section)
+
+    # 头部保留首屏需要的轻量信息
+    if isinstance(details, dict):
+        head['table_details'] = {name: _strip_lists(d) for name, d in details.items()}
+    if column_mods:
+        head['column_modifications_by_table'] = {
+            name: _head_column_modifications(entry) if isinstance(entry, dict) else entry
+            for name, entry in column_mods.items()
+        }
+    if table_scores:
+        head['table_scores'] = [_head_table_score(t) for t in table_scores]
+    if isinstance(data.get('hover_data'), dict):
+        head['hover_data'] = {k: v for k, v in data['hover_data'].items() if k != 'data'}
+
+    return head, sections
+
+
+class SectionedComprehensiveStore:
+    """单个综合打分文件的分段视图"""
+
+    def __init__(self, file_path: Union[str, Path]):
+        self.file_path = Path(file_path)
+        self.sections_dir = Path(str(self.file_path) + SECTIONS_SUFFIX)
+        self.head_path = self.sections_dir / HEAD_FILENAME
+        self.tables_path = self.sections_dir / TABLES_FILENAME
+
+    def _source_signature(self) -> Dict[str, Any]:
+        stat = self.file_path.stat()
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def _stamp_name(self) -> str:
+        """以源文件 size/mtime 命名的标记文件，新鲜度只需一次stat"""
+        stat = self.file_path.stat()
+        return f"{STAMP_PREFIX}{stat.st_size}_{stat.st_mtime_ns}"
+
+    def _is_fresh(self) -> bool:
+        try:
+            return (self.sections_dir / self._stamp_name()).exists()
+        except OSError:
+            return False
+
+    def write(self, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """根据完整数据（省略时读取源文件）重建分段目录，返回头部段"""
+        stamp = self._stamp_name()
+        if data is None:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+        head, sections = split_comprehensive(data)
+        tables = {s['table_name']: f"t{s['index']:04d}.json" for s in sections}
+        head['sections'] = {
+            'lazy': True,
+            'file': self.file_path.name,
+            'source': self._source_signature(),
+            'tables': tables,
+        }
+
+        # 先写到本进程/线程独占的临时目录再整体替换，读取方不会看到半成品，
+        # 并发重建同一文件时也不会删掉对方的输出
+        suffix = f".{os.getpid()}.{threading.get_ident()}"
+        tmp_dir = Path(f"{self.sections_dir}{suffix}.tmp")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+        for section in sections:
+            with open(tmp_dir / tables[section['table_name']], 'w', encoding='utf-8') as f:
+                json.dump(section, f, ensure_ascii=False)
+        with open(tmp_dir / HEAD_FILENAME, 'w', encoding='utf-8') as f:
+            json.dump(head, f, ensure_ascii=False)
+        with open(tmp_dir / TABLES_FILENAME, 'w', encoding='utf-8') as f:
+            json.dump(tables, f, ensure_ascii=False)
+        (tmp_dir / stamp).touch()
+
+        old_dir = Path(f"{self.sections_dir}{suffix}.old")
+        try:
+            if self.sections_dir.exists():
+                os.replace(self.sections_dir, old_dir)
+            os.replace(tmp_dir, self.sections_dir)
+        except OSError as e:
+            # 另一个写入方抢先完成了替换，其内容来自同一源文件，保留对方的结果
+            logger.info(f"综合打分分段已由其他写入方重建 {self.sections_dir}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if old_dir.exists():
+            shutil.rmtree(old_dir, ignore_errors=True)
+        return head
+
+    def load_head(self) -> Dict[str, Any]:
+        """读取头部段（分段缺失或过期时先重建）"""
+        if not self._is_fresh():
+            return self.write()
+        with open(self.head_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _section_file(self, table_name: str) -> Optional[str]:
+        """表名 → 明细段文件名，只读取小的表名索引，不解析头部段"""
+        if not self._is_fresh():
+            return self.write()['sections']['tables'].get(table_name)
+        try:
+            with open(self.tables_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get(table_name)
+        except FileNotFoundError:
+            return self.write()['sections']['tables'].get(table_name)
+
+    def load_section(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """读取单个表格的明细段，表格不存在时返回None"""
+        section_file = self._section_file(table_name)
+        if not section_file:
+            return None
+        with open(self.sections_dir / section_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def write_sections(file_path: Union[str, Path], data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """写入方便捷入口：为刚保存的综合打分文件生成分段，失败不影响主流程"""
+    try:
+        return SectionedComprehensiveStore(file_path).write(data)
+    except Exception as e:
+        logger.warning(f"综合打分分段写入失败 {file_path}: {e}")
+        return None
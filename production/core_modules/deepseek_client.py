@@ -10,6 +10,15 @@ import requests
 from typing import Dict, Optional
 import logging
 
+try:
+    from .workflow_stage_metrics import count_external_call
+except ImportError:
+    try:
+        from production.core_modules.workflow_stage_metrics import count_external_call
+    except ImportError:
+        def count_external_call(kind: str, n: int = 1):
+            """指标模块不可用时不计数"""
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,8 +37,8 @@ class DeepSeekClient:
             raise ValueError("DeepSeek API密钥未配置，请设置DEEPSEEK_API_KEY环境变量")
         
         # 使用硅基流动(SiliconFlow)的API端点
-        # 硅基流动是DeepSeek的官方代理服务
-        self.base_url = "https://api.siliconflow.cn/v1"
+        # 硅基流动是DeepSeek的官方代理服务（可通过DEEPSEEK_BASE_URL指向本地模拟服务）
+        self.base_url = os.getenv('DEEPSEEK_BASE_URL', "https://api.siliconflow.cn/v1")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -72,6 +81,7 @@ class DeepSeekClient:
         
         for attempt in range(max_retries):
             try:
+                count_external_call('deepseek')
                 response = requests.post(
                     endpoint,
                     headers=self.headers,
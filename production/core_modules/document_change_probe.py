@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+文档变更探测
+完整导出前先用 dop-api/opendoc 取文档的修订号/最后修改时间（只返回元数据，
+不触发导出），与上次完整处理时记录的签名比较：
+
+- 签名一致、基线未变且上次的目标文件和处理结果仍在 → 复用上次结果，
+  跳过下载、对比、打分、涂色和上传
+- 签名不同、取不到签名或没有历史记录 → 按原流程完整处理
+
+记录文件: config/document_revisions.json
+    {doc_id: {"signature", "baseline_file", "target_file", "results", "recorded_at"}}
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+try:
+    from .transfer_telemetry import doc_id_from_url
+except ImportError:
+    from production.core_modules.transfer_telemetry import doc_id_from_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REVISIONS_PATH = Path('/root/projects/tencent-doc-manager/config/document_revisions.json')
+OPENDOC_URL = 'https://docs.qq.com/dop-api/opendoc'
+PROBE_TIMEOUT = 10
+
+# opendoc响应中版本指示字段的确切位置（按优先级）。只在这些路径上取值，
+# 避免误取嵌套在单元格、评论等无关子对象里的同名字段；都取不到时视为已变化
+REVISION_PATHS = (
+    ('clientVars', 'collab_client_vars', 'rev'),
+    ('clientVars', 'collab_client_vars', 'maxRev'),
+    ('clientVars', 'rev'),
+)
+MODIFIED_PATHS = (
+    ('bodyData', 'lastModifyTime'),
+    ('clientVars', 'lastModifyTime'),
+    ('bodyData', 'modifyTime'),
+)
+
+_JSONP_PATTERN = re.compile(r'^[\w$.]+\((.*)\)\s*;?\s*$', re.DOTALL)
+
+
+def _value_at(payload: Any, paths) -> Optional[Any]:
+    """按优先级取第一个存在的路径上的标量值"""
+    for path in paths:
+        node = payload
+        for key in path:
+            node = node.get(key) if isinstance(node, dict) else None
+        if isinstance(node, (int, float, str)) and not isinstance(node, bool) and node not in ('', 0):
+            return node
+    return None
+
+
+def _request_opendoc(doc_url: str, cookie: str, timeout: int = PROBE_TIMEOUT):
+    """请求opendoc元数据，返回 requests 响应；请求失败时抛出 requests.RequestException"""
+    params = {
+        'id': doc_id_from_url(doc_url),
+        'normal': '1',
+        'outformat': '1',
+        'noEscape': '1',
+        't': str(int(time.time() * 1000)),
+    }
+    headers = {
+        'Cookie': cookie,
+        'Referer': doc_url,
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    }
+    return requests.get(OPENDOC_URL, params=params, headers=headers, timeout=timeout)
+
+
+def _parse_payload(response) -> Any:
+    text = response.text.strip()
+    match = _JSONP_PATTERN.match(text)
+    return json.loads(match.group(1) if match else text)
+
+
+def fetch_revision_signature(doc_url: str, cookie: str, timeout: int = PROBE_TIMEOUT) -> Optional[str]:
+    """
+    获取文档的轻量版本签名
+
+    Returns:
+        形如 "rev:1234" 或 "mtime:1695000000" 的签名，无法确定时返回None
+    """
+    doc_id = doc_id_from_url(doc_url)
+    if not doc_id or not cookie:
+        return None
+
+    try:
+        response = _request_opendoc(doc_url, cookie, timeout)
+        if response.status_code != 200:
+            logger.info(f"变更探测返回 {response.status_code}: {doc_id}")
+            return None
+        payload = _parse_payload(response)
+    except (requests.RequestException, ValueError) as e:
+        logger.info(f"变更探测失败 {doc_id}: {e}")
+        return None
+
+    revision = _value_at(payload, REVISION_PATHS)
+    if revision is not None:
+        return f'rev:{revision}'
+    modified = _value_at(payload, MODIFIED_PATHS)
+    if modified is not None:
+        return f'mtime:{modified}'
+    logger.info(f"变更探测未找到版本字段，按已变化处理: {doc_id}")
+    return None
+
+
+def check_cookie(doc_url: str, cookie: str, timeout: int = PROBE_TIMEOUT) -> Tuple[Optional[bool], str]:
+    """
+    用一次opendoc元数据请求检查Cookie登录态，只看HTTP状态和登录态，不依赖版本字段
+
+    Returns:
+        (是否有效, 说明)；网络异常等无法判断时为 (None, 说明)
+    """
+    if not doc_id_from_url(doc_url) or not cookie:
+        return None, "缺少文档链接或Cookie"
+    try:
+        response = _request_opendoc(doc_url, cookie, timeout)
+    except requests.RequestException as e:
+        return None, f"探测请求失败: {e}"
+    if response.status_code in (401, 403) or 'login' in response.url.lower():
+        return False, f"未登录 (HTTP {response.status_code})"
+    if response.status_code != 200:
+        return None, f"探测返回 HTTP {response.status_code}"
+    try:
+        payload = _parse_payload(response)
+    except ValueError:
+        # 返回了HTML页面（通常是登录页）而不是文档元数据
+        return False, "返回内容不是文档元数据，登录态可能已失效"
+    if isinstance(payload, dict) and payload.get('retcode', payload.get('ret', 0)) not in (0, None):
+        return False, f"接口拒绝访问 (retcode {payload.get('retcode', payload.get('ret'))})"
+    return True, "登录态有效"
+
+
+class DocumentRevisionStore:
+    """各文档上次完整处理时的版本签名和产物"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else DEFAULT_REVISIONS_PATH
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self._read().get(doc_id)
+
+    def remember(self, doc_id: str, signature: str, baseline_file: Optional[str],
+                 target_file: str, results: Dict[str, Any]):
+        """完整处理成功后记录签名和产物"""
+        with self._lock:
+            data = self._read()
+            data[doc_id] = {
+                'signature': signature,
+                'baseline_file': baseline_file,
+                'target_file': target_file,
+                'results': results,
+                'recorded_at': datetime.now().isoformat(),
+            }
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_suffix('.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"文档版本记录写入失败: {e}")
+
+
+def probe_document(doc_url: str, cookie: str, baseline_file: Optional[str],
+                   store: Optional[DocumentRevisionStore] = None) -> Dict[str, Any]:
+    """
+    探测文档自上次完整处理后是否变化
+
+    Returns:
+        {'doc_id', 'signature', 'unchanged': bool, 'previous': 上次记录或None}
+        unchanged 仅在签名一致、基线相同且上次产物仍存在时为True
+    """
+    store = store or DocumentRevisionStore()
+    doc_id = doc_id_from_url(doc_url)
+    signature = fetch_revision_signature(doc_url, cookie)
+    previous = store.get(doc_id) if doc_id else None
+
+    unchanged = bool(
+        signature
+        and previous
+        and previous.get('signature') == signature
+        and previous.get('baseline_file') == baseline_file
+        and previous.get('target_file') and os.path.exists(previous['target_file'])
+        and (previous.get('results') or {}).get('score_file')
+        and os.path.exists(previous['results']['score_file'])
+    )
+    return {
+        'doc_id': doc_id,
+        'signature': signature,
+        'unchanged': unchanged,
+        'previous': previous,
+    }
@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+"""
+腾讯文档EJS导出的流式解码
+EJS文件由若干 "名称/长度/内容" 行组成，其中一行是URL编码的JSON:
+
+    %7B%22workbook%22%3A%22<base64>%22%2C%22related_sheet%22%3A%22<base64>%22%2C%22max_row%22...
+
+workbook / related_sheet 为 base64 编码的（可能压缩的）protobuf。本模块按块读取文件，
+URL解码 → base64解码 → 解压 → protobuf解析 全程增量进行：
+- 压缩格式只在首批字节上按魔数判断一次（zlib 78xx / gzip 1f8b / 未压缩）
+- 解压使用 zlib.decompressobj，不再依次尝试各种解压方式
+- 文本单元格在解析过程中直接收集，不生成中间CSV，内存中不保留整段payload
+
+    rows = read_ejs_rows(path)     # List[List[str]]，与CSV对比器读取的行格式一致
+
+protobuf的单元格schema未公开：按文档顺序取文本叶子节点，滤掉样式表中的版本号、
+颜色和字体名、工作表ID以及JSON选项串，再按 max_col 分行。文本叶子不含单元格坐标，
+空单元格和共享字符串表都会使分行错位，因此只有单元格数恰好等于 max_row×max_col、
+且第2行（表头）大半非空时才认为对齐；否则抛出 EJSDecodeError，调用方不应使用。
+"""
+
+import binascii
+import json
+import logging
+import re
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote_to_bytes
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+DECOMPRESS_CHUNK = 256 * 1024
+WORKBOOK_LINE_PREFIX = b'%7B%22workbook%22'
+PAYLOAD_KEYS = ('workbook', 'related_sheet')
+
+# 超过该长度的length-delimited字段视为嵌套消息，边读边解析，不等待整段到齐
+STREAM_DESCEND_BYTES = 4096
+
+_VERSION_PATTERN = re.compile(r'^\d+\.\d+\.\d+$')
+_COLOR_PATTERN = re.compile(r'^#?[0-9A-Fa-f]{6}([0-9A-Fa-f]{2})?$')
+STYLE_KEYWORDS = (
+    'calibri', 'arial', 'times new roman', 'font', 'microsoft', '宋体', '微软雅黑',
+    '等线', 'jpan', 'hans', 'hant', 'arab', 'hebr', 'thai', 'xmlns', 'http',
+)
+_STYLE_PATTERN = re.compile('|'.join(re.escape(k) for k in STYLE_KEYWORDS), re.IGNORECASE)
+_CONTROL_PATTERN = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class EJSDecodeError(ValueError):
+    """EJS内容无法解码"""
+
+
+def detect_payload_format(head: bytes) -> str:
+    """按魔数判断payload格式：gzip / zlib / zip / raw"""
+    if head[:2] == b'\x1f\x8b':
+        return 'gzip'
+    if len(head) >= 2 and head[0] & 0x0F == 8 and ((head[0] << 8) | head[1]) % 31 == 0:
+        return 'zlib'
+    if head[:4] == b'PK\x03\x04':
+        return 'zip'
+    return 'raw'
+
+
+def is_style_string(text: str) -> bool:
+    """样式表中的版本号、颜色值、字体/语言名"""
+    stripped = text.strip()
+    if not stripped:
+        return True
+    if _VERSION_PATTERN.match(stripped) or _COLOR_PATTERN.match(stripped):
+        return True
+    return bool(_STYLE_PATTERN.search(stripped))
+
+
+def _read_varint(buf, pos: int) -> Tuple[Optional[int], int]:
+    """读取varint，数据不完整时返回(None, pos)"""
+    value = shift = 0
+    end = len(buf)
+    while pos < end:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise EJSDecodeError('varint过长')
+    return None, pos
+
+
+def _as_text(payload: bytes) -> Optional[str]:
+    try:
+        text = payload.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    if _CONTROL_PATTERN.search(text):
+        return None
+    return text
+
+
+def _parse_message(payload: bytes, path: Tuple[int, ...], depth: int = 0) -> Optional[List[Tuple[Tuple[int, ...], str]]]:
+    """完整解析一段已到齐的小消息，返回文本叶子节点；结构不合法时返回None"""
+    if depth > 32:
+        return None
+    leaves = []
+    pos, end = 0, len(payload)
+    try:
+        while pos < end:
+            tag, pos = _read_varint(payload, pos)
+            if tag is None or tag >> 3 == 0:
+                return None
+            wire = tag & 0x07
+            if wire == 0:
+                value, pos = _read_varint(payload, pos)
+                if value is None:
+                    return None
+            elif wire == 1:
+                pos += 8
+            elif wire == 5:
+                pos += 4
+            elif wire == 2:
+                length, pos = _read_varint(payload, pos)
+                if length is None or pos + length > end:
+                    return None
+                leaves.extend(_classify(payload[pos:pos + length], path + (tag >> 3,), depth + 1))
+                pos += length
+            elif wire not in (3, 4):
+                return None
+    except EJSDecodeError:
+        return None
+    return leaves if pos == end else None
+
+
+def _classify(child: bytes, path: Tuple[int, ...], depth: int) -> List[Tuple[Tuple[int, ...], str]]:
+    """length-delimited字段：文本或嵌套消息，两者都不是（二进制）时忽略"""
+    text = _as_text(child)
+    if text is not None and child[:1] != b'\n':
+        return [(path, text)]
+    nested = _parse_message(child, path, depth) if child else None
+    if nested is not None:
+        return nested
+    return [(path, text)] if text is not None else []
+
+
+class ProtoStreamParser:
+    """增量protobuf解析：只保留未消费的字节，文本叶子节点通过 on_text(path, text) 回调输出"""
+
+    def __init__(self, on_text: Callable[[Tuple[int, ...], str], None]):
+        self.on_text = on_text
+        self._buf = bytearray()
+        self._offset = 0                                   # _buf[0] 的绝对位置
+        self._frames: List[Tuple[int, Tuple[int, ...]]] = []  # (结束绝对位置, 字段路径)
+
+    def _path(self) -> Tuple[int, ...]:
+        return self._frames[-1][1] if self._frames else ()
+
+    def feed(self, data: bytes):
+        self._buf += data
+        pos = 0
+        buf = self._buf
+        while True:
+            absolute = self._offset + pos
+            while self._frames and absolute >= self._frames[-1][0]:
+                self._frames.pop()
+            tag, next_pos = _read_varint(buf, pos)
+            if tag is None:
+                break
+            field, wire = tag >> 3, tag & 0x07
+            if field == 0:
+                raise EJSDecodeError(f'非法字段号 @ {absolute}')
+            if wire == 0:
+                value, next_pos = _read_varint(buf, next_pos)
+                if value is None:
+                    break
+            elif wire in (1, 5):
+                next_pos += 8 if wire == 1 else 4
+                if next_pos > len(buf):
+                    break
+            elif wire == 2:
+                length, body = _read_varint(buf, next_pos)
+                if length is None:
+                    break
+                field_path = self._path() + (field,)
+                if length >= STREAM_DESCEND_BYTES:
+                    self._frames.append((self._offset + body + length, field_path))
+                    next_pos = body
+                else:
+                    if body + length > len(buf):
+                        break
+                    for leaf_path, text in _classify(bytes(buf[body:body + length]), field_path, len(self._frames) + 1):
+                        self.on_text(leaf_path, text)
+                    next_pos = body + length
+            elif wire in (3, 4):
+                pass
+            else:
+                raise EJSDecodeError(f'非法wire type {wire} @ {absolute}')
+            pos = next_pos
+        del buf[:pos]
+        self._offset += pos
+
+    def close(self):
+        if self._buf:
+            logger.warning(f"protobuf末尾有 {len(self._buf)} 字节不完整数据被忽略")
+            self._buf.clear()
+
+
+class PayloadStream:
+    """单个base64字段：base64 → (解压) → protobuf，全部增量处理"""
+
+    def __init__(self, on_text: Callable[[Tuple[int, ...], str], None]):
+        self.parser = ProtoStreamParser(on_text)
+        self.format: Optional[str] = None
+        self.encoded_bytes = 0
+        self.decoded_bytes = 0
+        self._b64_tail = b''
+        self._head = b''
+        self._decompressor = None
+
+    def feed_base64(self, chunk: bytes):
+        self.encoded_bytes += len(chunk)
+        data = self._b64_tail + chunk.translate(None, b' \t\r\n')
+        usable = len(data) - len(data) % 4
+        self._b64_tail = data[usable:]
+        if usable:
+            try:
+                self._feed_binary(binascii.a2b_base64(data[:usable]))
+            except binascii.Error as e:
+                raise EJSDecodeError(f'base64解码失败: {e}')
+
+    def _feed_binary(self, data: bytes):
+        if self.format is None:
+            self._head += data
+            if len(self._head) < 4:
+                return
+            data, self._head = self._head, b''
+            self.format = detect_payload_format(data)
+            if self.format == 'zip':
+                raise EJSDecodeError('payload是ZIP/XLSX，不是protobuf')
+            if self.format in ('zlib', 'gzip'):
+                self._decompressor = zlib.decompressobj(31 if self.format == 'gzip' else 15)
+        if not self._decompressor:
+            self.decoded_bytes += len(data)
+            self.parser.feed(data)
+            return
+        # 限制单次解压输出，高压缩比时也不会一次展开整段数据
+        while data:
+            try:
+                out = self._decompressor.decompress(data, DECOMPRESS_CHUNK)
+            except zlib.error as e:
+                raise EJSDecodeError(f'{self.format}解压失败: {e}')
+            data = self._decompressor.unconsumed_tail
+            self.decoded_bytes += len(out)
+            self.parser.feed(out)
+
+    def close(self):
+        if self._b64_tail:
+            self._b64_tail += b'=' * (-len(self._b64_tail) % 4)
+            self.feed_base64(b'')
+        if self.format is None and self._head:
+            data, self._head = self._head, b''
+            self.format = 'raw'
+            self.decoded_bytes += len(data)
+            self.parser.feed(data)
+        if self._decompressor:
+            tail = self._decompressor.flush()
+            self.decoded_bytes += len(tail)
+            self.parser.feed(tail)
+        self.parser.close()
+
+
+class _WorkbookLineReader:
+    """
+    URL编码JSON行的增量解析：payload字段的字符串值流式送入 PayloadStream，
+    其它（很小的）字段缓冲后作为元数据
+    """
+
+    def __init__(self, on_text_factory: Callable[[str], Callable]):
+        self.on_text_factory = on_text_factory
+        self.metadata: Dict[str, Any] = {}
+        self.streams: Dict[str, PayloadStream] = {}
+        self._pct_tail = b''
+        self._state = 'seek_key'
+        self._key = bytearray()
+        self._value = bytearray()
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._stream: Optional[PayloadStream] = None
+
+    def feed(self, raw: bytes):
+        data = self._pct_tail + raw
+        cut = data.rfind(b'%', max(0, len(data) - 2))
+        if cut != -1:
+            data, self._pct_tail = data[:cut], data[cut:]
+        else:
+            self._pct_tail = b''
+        self._consume(unquote_to_bytes(data))
+
+    def close(self):
+        if self._pct_tail:
+            self._consume(unquote_to_bytes(self._pct_tail))
+            self._pct_tail = b''
+        if self._state == 'scalar':
+            self._finish_scalar()
+        for stream in self.streams.values():
+            stream.close()
+
+    def _finish_scalar(self):
+        text = bytes(self._value).decode('utf-8', errors='replace').strip()
+        try:
+            self.metadata[self._key.decode('utf-8', errors='replace')] = json.loads(text)
+        except ValueError:
+            self.metadata[self._key.decode('utf-8', errors='replace')] = text
+        self._state = 'seek_key'
+
+    def _consume(self, data: bytes):
+        pos, end = 0, len(data)
+        while pos < end:
+            state = self._state
+            if state == 'seek_key':
+                quote = data.find(b'"', pos)
+                if quote == -1:
+                    return
+                self._key = bytearray()
+                self._state, pos = 'key', quote + 1
+            elif state == 'key':
+                quote = data.find(b'"', pos)
+                if quote == -1:
+                    self._key += data[pos:]
+                    return
+                self._key += data[pos:quote]
+                self._state, pos = 'colon', quote + 1
+            elif state == 'colon':
+                colon = data.find(b':', pos)
+                if colon == -1:
+                    return
+                self._state, pos = 'value', colon + 1
+            elif state == 'value':
+                byte = data[pos:pos + 1]
+                pos += 1
+                if byte in b' \t\r\n':
+                    continue
+                key = self._key.decode('utf-8', errors='replace')
+                if byte == b'"' and key in PAYLOAD_KEYS:
+                    self._stream = self.streams[key] = PayloadStream(self.on_text_factory(key))
+                    self._state = 'payload'
+                else:
+                    self._value = bytearray(byte)
+                    self._depth = 1 if byte in b'{[' else 0
+                    self._in_str = byte == b'"'
+                    self._escape = False
+                    self._state = 'scalar'
+            elif state == 'payload':
+                # base64不含需要转义的字符，仅处理JSON中可能出现的 \/
+                quote = data.find(b'"', pos)
+                segment = data[pos:quote if quote != -1 else end]
+                self._stream.feed_base64(segment.replace(b'\\', b''))
+                if quote == -1:
+                    return
+                self._stream = None
+                self._state, pos = 'seek_key', quote + 1
+            elif state == 'scalar':
+                byte = data[pos]
+                if self._in_str:
+                    if self._escape:
+                        self._escape = False
+                    elif byte == 0x5C:
+                        self._escape = True
+                    elif byte == 0x22:
+                        self._in_str = False
+                elif byte == 0x22:
+                    self._in_str = True
+                elif byte in b'{[':
+                    self._depth += 1
+                elif byte in b'}]':
+                    if self._depth == 0:
+                        self._finish_scalar()
+                        continue
+                    self._depth -= 1
+                elif byte == 0x2C and self._depth == 0:
+                    self._finish_scalar()
+                    continue
+                self._value.append(byte)
+                pos += 1
+
+
+def is_ejs_file(path) -> bool:
+    """
+    按文件开头判断是否为EJS导出（腾讯文档有时以.csv/.xlsx扩展名返回EJS）
+    被当作CSV处理过的EJS各行末尾可能追加了逗号分隔的列，只比较每行第一个字段
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(256)
+    except OSError:
+        return False
+    if WORKBOOK_LINE_PREFIX in head:
+        return True
+    lines = head.split(b'\n', 2)
+    if len(lines) < 3:
+        return False
+    first_fields = [line.rstrip(b'\r').split(b',', 1)[0] for line in lines[:2]]
+    return first_fields == [b'head', b'json']
+
+
+class EJSWorkbookDecoder:
+    """按块读取EJS文件，解码workbook/related_sheet中的文本单元格"""
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, keep_text: Callable[[str], bool] = None):
+        self.chunk_size = chunk_size
+        self.keep_text = keep_text or (lambda text: not is_style_string(text))
+
+    def decode_file(self, path) -> Dict[str, Any]:
+        """
+        Returns:
+            {'metadata': JSON中的其它字段(max_row/max_col等),
+             'cells': {payload字段: [文本单元格...]},
+             'formats': {payload字段: {'format', 'encoded_bytes', 'decoded_bytes'}}}
+        """
+        cells: Dict[str, List[str]] = {}
+
+        def on_text_factory(key: str):
+            bucket = cells.setdefault(key, [])
+
+            def on_text(_path, text):
+                if self.keep_text(text):
+                    bucket.append(text)
+            return on_text
+
+        reader: Optional[_WorkbookLineReader] = None
+        line_state = 'start'      # start / workbook / skip
+        line_head = b''
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                pos = 0
+                while pos < len(chunk):
+                    newline = chunk.find(b'\n', pos)
+                    segment = chunk[pos:newline if newline != -1 else len(chunk)]
+                    if line_state == 'start':
+                        line_head += segment
+                        if line_head.startswith(WORKBOOK_LINE_PREFIX) and reader is None:
+                            reader = _WorkbookLineReader(on_text_factory)
+                            reader.feed(line_head)
+                            line_state = 'workbook'
+                        elif len(line_head) >= len(WORKBOOK_LINE_PREFIX) or newline != -1:
+                            line_state = 'skip'
+                    elif line_state == 'workbook':
+                        reader.feed(segment)
+                    if newline == -1:
+                        break
+                    if line_state == 'workbook':
+                        reader.close()
+                        line_state = 'done'
+                    if line_state != 'done':
+                        line_state, line_head = 'start', b''
+                    pos = newline + 1
+                if line_state == 'done':
+                    break
+        if reader is None:
+            raise EJSDecodeError(f'未找到workbook数据行: {path}')
+        if line_state == 'workbook':
+            reader.close()
+
+        return {
+            'metadata': reader.metadata,
+            'cells': cells,
+            'formats': {
+                key: {
+                    'format': stream.format,
+                    'encoded_bytes': stream.encoded_bytes,
+                    'decoded_bytes': stream.decoded_bytes,
+                }
+                for key, stream in reader.streams.items()
+            },
+        }
+
+
+def cells_to_rows(cells: List[str], max_col: int) -> List[List[str]]:
+    """按列数把单元格序列分行，末行补齐空串"""
+    if max_col <= 0:
+        return [cells] if cells else []
+    rows = [cells[i:i + max_col] for i in range(0, len(cells), max_col)]
+    if rows and len(rows[-1]) < max_col:
+        rows[-1] = rows[-1] + [''] * (max_col - len(rows[-1]))
+    return rows
+
+
+def filter_cell_texts(texts: List[str]) -> List[str]:
+    """去掉非单元格文本：工作表ID（payload中的第一个文本，随各记录重复出现）和JSON选项串"""
+    if not texts:
+        return []
+    sheet_id = texts[0]
+    cells = []
+    for text in texts:
+        if text == sheet_id:
+            continue
+        stripped = text.strip()
+        if stripped[:1] in ('[', '{') and stripped[-1:] in (']', '}'):
+            try:
+                json.loads(stripped)
+                continue
+            except ValueError:
+                pass
+        cells.append(text)
+    return cells
+
+
+def check_alignment(cells: List[str], max_row: int, max_col: int):
+    """确认单元格序列能按 max_col 正确分行，不能时抛出 EJSDecodeError"""
+    if max_row <= 0 or max_col <= 0:
+        raise EJSDecodeError(f'缺少行列数 (max_row={max_row}, max_col={max_col})')
+    if len(cells) != max_row * max_col:
+        raise EJSDecodeError(
+            f'单元格数 {len(cells)} ≠ {max_row}×{max_col}，无法确认行列对齐（存在空单元格或共享字符串表）')
+    if max_row > 1:
+        header = cells[max_col:2 * max_col]
+        if sum(1 for text in header if text.strip()) * 2 < max_col:
+            raise EJSDecodeError('第2行不像表头，行列未对齐')
+
+
+def read_ejs_rows(path, decoder: Optional[EJSWorkbookDecoder] = None) -> List[List[str]]:
+    """
+    读取EJS导出为行列表，格式与 csv.reader 读取的结果一致
+    业务数据优先取 related_sheet，没有时使用 workbook；行列无法确认对齐时抛出 EJSDecodeError
+    """
+    result = (decoder or EJSWorkbookDecoder()).decode_file(path)
+    cells = filter_cell_texts(result['cells'].get('related_sheet') or result['cells'].get('workbook') or [])
+    try:
+        max_row = int(result['metadata'].get('max_row') or 0)
+        max_col = int(result['metadata'].get('max_col') or 0)
+    except (TypeError, ValueError):
+        max_row = max_col = 0
+    check_alignment(cells, max_row, max_col)
+    rows = cells_to_rows(cells, max_col)
+    logger.info(f"EJS解码完成: {Path(path).name} → {len(rows)}行 "
+                f"(max_col={max_col}, 格式={ {k: v['format'] for k, v in result['formats'].items()} })")
+    return rows
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+导出策略成功记忆
+按文档类型（_analyze_document_url 的 url_type）持久化每种导出方法的
+尝试次数、成功次数、成功耗时和连续失败次数，并据此动态排序导出方法：
+
+- Thompson采样：从 Beta(成功+1, 失败+1) 抽取成功率，除以预期耗时得到得分，
+  又快又稳的方法排在前面，同时保留少量探索，UI恢复后旧方法能重新上位
+- 退避：连续失败达到阈值的方法在退避窗口内排到末尾，窗口随连续失败指数增长；
+  窗口内的兜底重试失败不延长窗口，窗口结束后的重试失败才会使窗口翻倍
+
+统计文件: config/export_strategy_stats.json
+多个进程共享同一统计文件：save() 在文件锁内重新读取磁盘数据，回放本进程
+自上次保存以来的尝试记录后原子替换，不会覆盖其他进程写入的结果。
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # 非POSIX平台，退化为仅进程内加锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATS_PATH = Path('/root/projects/tencent-doc-manager/config/export_strategy_stats.json')
+
+BACKOFF_AFTER_FAILURES = 3
+BACKOFF_BASE_SECONDS = 3600        # 首次退避1小时
+BACKOFF_MAX_SECONDS = 24 * 3600    # 最长退避1天
+DEFAULT_EXPECTED_SECONDS = 30.0    # 无成功样本时的预期耗时
+DECAY = 0.98                       # 旧样本衰减，适应腾讯文档UI变化
+
+
+class ExportStrategyStats:
+    """按文档类型记录导出方法表现并给出尝试顺序"""
+
+    def __init__(self, path: Optional[Path] = None, rng: Optional[random.Random] = None):
+        self.path = Path(path) if path else DEFAULT_STATS_PATH
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # 自上次保存以来的尝试记录 (doc_type, method, success, seconds, 时间戳)
+        self._pending: List[Tuple[str, str, bool, float, float]] = []
+        self._stats = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _entry_in(stats: Dict[str, Dict[str, Dict[str, Any]]], doc_type: str, method: str) -> Dict[str, Any]:
+        return stats.setdefault(doc_type, {}).setdefault(method, {
+            'successes': 0.0,
+            'failures': 0.0,
+            'success_seconds': 0.0,
+            'consecutive_failures': 0,
+            'last_attempt': 0.0,
+            'last_success': 0.0,
+        })
+
+    def _entry(self, doc_type: str, method: str) -> Dict[str, Any]:
+        return self._entry_in(self._stats, doc_type, method)
+
+    def _apply(self, stats: Dict[str, Dict[str, Dict[str, Any]]], doc_type: str, method: str,
+               success: bool, seconds: float, now: float):
+        entry = self._entry_in(stats, doc_type, method)
+        for key in ('successes', 'failures', 'success_seconds'):
+            entry[key] *= DECAY
+        if success:
+            entry['successes'] += 1
+            entry['success_seconds'] += seconds
+            entry['consecutive_failures'] = 0
+            entry['last_attempt'] = now
+            entry['last_success'] = now
+        else:
+            entry['failures'] += 1
+            # 退避窗口内的兜底重试失败不刷新窗口起点，也不增加连续失败次数
+            if not self._backed_off(entry, now):
+                entry['consecutive_failures'] += 1
+                entry['last_attempt'] = now
+
+    def record(self, doc_type: str, method: str, success: bool, seconds: float):
+        """记录一次方法尝试结果"""
+        now = time.time()
+        with self._lock:
+            self._apply(self._stats, doc_type, method, success, seconds, now)
+            self._pending.append((doc_type, method, success, seconds, now))
+
+    def _backed_off(self, entry: Dict[str, Any], now: float) -> bool:
+        failures = entry.get('consecutive_failures', 0)
+        if failures < BACKOFF_AFTER_FAILURES:
+            return False
+        window = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (failures - BACKOFF_AFTER_FAILURES))
+        return now - entry.get('last_attempt', 0) < window
+
+    def _score(self, entry: Dict[str, Any]) -> float:
+        successes, failures = entry['successes'], entry['failures']
+        # 未尝试过的方法取先验均值，保持推荐顺序不被随机打乱
+        if successes + failures < 0.5:
+            success_rate = 0.5
+        else:
+            success_rate = self._rng.betavariate(successes + 1, failures + 1)
+        expected_seconds = entry['success_seconds'] / successes if successes >= 0.5 else DEFAULT_EXPECTED_SECONDS
+        return success_rate / (expected_seconds + 1.0)
+
+    def order(self, doc_type: str, methods: List[str]) -> List[str]:
+        """
+        返回本次尝试顺序：未退避的方法按得分降序，退避中的方法按原顺序排在最后。
+        没有统计的方法使用先验得分，并以原顺序作为并列时的次序。
+        """
+        now = time.time()
+        with self._lock:
+            entries = {m: dict(self._entry(doc_type, m)) for m in methods}
+        active = [m for m in methods if not self._backed_off(entries[m], now)]
+        backed_off = [m for m in methods if m not in active]
+        scores = {m: self._score(entries[m]) for m in active}
+        active.sort(key=lambda m: (-scores[m], methods.index(m)))
+        if backed_off:
+            logger.info(f"导出方法退避中({doc_type}): {backed_off}")
+        return active + backed_off
+
+    def summary(self, doc_type: Optional[str] = None) -> Dict[str, Any]:
+        """各方法的成功率、平均耗时和退避状态"""
+        now = time.time()
+        with self._lock:
+            stats = {k: {m: dict(e) for m, e in v.items()} for k, v in self._stats.items()
+                     if doc_type is None or k == doc_type}
+        return {
+            dt: {
+                method: {
+                    'success_rate': round(e['successes'] / (e['successes'] + e['failures']), 3)
+                    if e['successes'] + e['failures'] else None,
+                    'mean_seconds': round(e['success_seconds'] / e['successes'], 2) if e['successes'] >= 0.5 else None,
+                    'consecutive_failures': e['consecutive_failures'],
+                    'backed_off': self._backed_off(e, now),
+                }
+                for method, e in methods.items()
+            }
+            for dt, methods in stats.items()
+        }
+
+    def save(self):
+        """在文件锁内合并磁盘上的最新统计并原子替换写回"""
+        with self._lock:
+            pending = list(self._pending)
+        if not pending:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.with_suffix('.lock'), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    merged = self._read()
+                    for doc_type, method, success, seconds, ts in pending:
+                        self._apply(merged, doc_type, method, success, seconds, ts)
+                    tmp_path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        json.dump(merged, f, ensure_ascii=False, indent=2)
+                    os.replace(tmp_path, self.path)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.warning(f"导出策略统计写入失败: {e}")
+            return
+        with self._lock:
+            # 保存期间新增的记录留到下次保存，并叠加到合并结果上
+            newer = self._pending[len(pending):]
+            for doc_type, method, success, seconds, ts in newer:
+                self._apply(merged, doc_type, method, success, seconds, ts)
+            self._stats = merged
+            self._pending = newer
+
+
+_stats_instance: Optional[ExportStrategyStats] = None
+_stats_lock = threading.Lock()
+
+
+def get_export_strategy_stats() -> ExportStrategyStats:
+    """进程内共享的导出策略统计"""
+    global _stats_instance
+    if _stats_instance is None:
+        with _stats_lock:
+            if _stats_instance is None:
+                _stats_instance = ExportStrategyStats()
+    return _stats_instance
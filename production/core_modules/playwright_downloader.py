@@ -16,11 +16,13 @@ import logging
 # 导入现有的实现
 try:
     from .tencent_export_automation import TencentDocAutoExporter
+    from .transfer_telemetry import get_telemetry_ledger
 except ImportError:
     # 直接运行时使用绝对导入
     import sys
     sys.path.insert(0, '/root/projects/tencent-doc-manager')
     from production.core_modules.tencent_export_automation import TencentDocAutoExporter
+    from production.core_modules.transfer_telemetry import get_telemetry_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -186,6 +188,8 @@ class PlaywrightDownloader:
             }
         """
         start_time = datetime.now()
+        url_analysis = {}
+        result_info = None
 
         try:
             # 1. URL分析
@@ -220,7 +224,7 @@ class PlaywrightDownloader:
                 file_path = result[0]
                 file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
 
-                return {
+                result_info = {
                     'success': True,
                     'file_path': file_path,
                     'file_size': file_size,
@@ -229,7 +233,7 @@ class PlaywrightDownloader:
                     'error': None
                 }
             else:
-                return {
+                result_info = {
                     'success': False,
                     'file_path': None,
                     'file_size': 0,
@@ -237,10 +241,11 @@ class PlaywrightDownloader:
                     'methods_attempted': self.export_methods,  # 尝试了所有方法
                     'error': '所有4重备用导出方法都失败了'
                 }
+            return result_info
 
         except Exception as e:
             logger.error(f"下载异常: {e}")
-            return {
+            result_info = {
                 'success': False,
                 'file_path': None,
                 'file_size': 0,
@@ -248,7 +253,9 @@ class PlaywrightDownloader:
                 'methods_attempted': [],
                 'error': str(e)
             }
+            return result_info
         finally:
+            self._record_telemetry(url_analysis.get('document_id'), result_info, start_time)
             # 清理资源
             if self._exporter:
                 try:
@@ -256,6 +263,23 @@ class PlaywrightDownloader:
                 except:
                     pass
 
+    def _record_telemetry(self, doc_id: Optional[str], result_info: Optional[Dict], start_time: datetime):
+        """把本次下载写入遥测台账（方法和重试次数取自内部导出器）"""
+        result_info = result_info or {}
+        attempts = getattr(self._exporter, 'last_export_attempts', 0) if self._exporter else 0
+        get_telemetry_ledger().record(
+            kind='download',
+            source='PlaywrightDownloader',
+            success=bool(result_info.get('success')),
+            duration=(datetime.now() - start_time).total_seconds(),
+            doc_id=doc_id,
+            method=getattr(self._exporter, 'last_export_method', None) if self._exporter else None,
+            bytes_count=result_info.get('file_size', 0),
+            retries=max(0, attempts - 1),
+            error=result_info.get('error'),
+            extra=self._exporter.telemetry_extra() if self._exporter else None
+        )
+
     async def _execute_with_fallback(self, url: str, format: str, url_analysis: Dict) -> Optional[List[str]]:
         """
         执行4重备用导出机制（架构核心要求）
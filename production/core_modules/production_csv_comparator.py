@@ -31,6 +31,12 @@ import re
 import hashlib
 from cookie_manager import get_cookie_manager
 
+try:
+    from baseline_store import load_baseline, is_plain_csv
+except ImportError:
+    load_baseline = None
+from cell_diff_kernel import changed_cells
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -209,6 +215,41 @@ class ProductionCSVComparator:
             logger.error(f"安全加载CSV失败: {e}")
             raise
     
+    def _load_baseline_secure(self, file_path: str) -> Tuple[List[List[str]], Dict]:
+        """加载基线：CSV走列式存储（一周内只解析一次，校验和记录在旁路文件中），其它情况同 _load_csv_secure"""
+        if load_baseline is None or not is_plain_csv(file_path):
+            return self._load_csv_secure(file_path)
+        
+        valid, message = self._security_validate_file(file_path)
+        if not valid:
+            raise ValueError(message)
+        try:
+            table = load_baseline(file_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"基线列式存储不可用，直接读取: {e}")
+            return self._load_csv_secure(file_path)
+        
+        data = table.rows()
+        encoding = table.encoding
+        if data and data[0] and data[0][0].startswith('\ufeff'):
+            # 与 utf-8-sig 读取结果保持一致（不修改缓存中的行）
+            data = [[data[0][0][1:]] + data[0][1:]] + data[1:]
+            encoding = 'utf-8-sig'
+        
+        if len(data) > self.security_config.max_rows:
+            raise ValueError(f"文件行数过多: {len(data)} (最大: {self.security_config.max_rows})")
+        if data and len(data[0]) > self.security_config.max_columns:
+            raise ValueError(f"文件列数过多: {len(data[0])} (最大: {self.security_config.max_columns})")
+        
+        metadata = {
+            'encoding': encoding,
+            'rows': len(data),
+            'columns': len(data[0]) if data else 0,
+            'file_size': os.path.getsize(file_path),
+            'checksum': table.checksum if self.security_config.require_checksum else None
+        }
+        return data, metadata
+    
     def _intelligent_column_mapping(self, columns1: List[str], columns2: List[str]) -> Dict[str, Dict]:
         """智能列名映射"""
         try:
@@ -628,8 +669,8 @@ class ProductionCSVComparator:
                 'output': output_file
             })
             
-            # 安全加载文件
-            data1, meta1 = self._load_csv_secure(file1_path)
+            # 安全加载文件（基线取列式存储，只需解析当前文件）
+            data1, meta1 = self._load_baseline_secure(file1_path)
             data2, meta2 = self._load_csv_secure(file2_path)
             
             # 预处理数据（处理多行标题等）
@@ -780,35 +821,33 @@ class ProductionCSVComparator:
                                          headers1[i] if headers1[i] else f"列{chr(65+i)}",
                                          headers2[i] if headers2[i] else f"列{chr(65+i)}"))
             
-            # 逐行对比
+            # 先求变化掩码，只为有差异的单元格生成记录
             min_rows = min(len(data1) - 1, len(data2) - 1)
             diff_count = 0
-            
-            for row_idx in range(min_rows):
-                row1 = data1[row_idx + 1]
-                row2 = data2[row_idx + 1]
+            compared_at = datetime.now().isoformat()
+            
+            rows1 = data1[1:1 + min_rows]
+            rows2 = data2[1:1 + min_rows]
+            for row_idx, col_idx in changed_cells(rows1, rows2, n_cols=len(common_columns)):
+                row1 = rows1[row_idx]
+                row2 = rows2[row_idx]
+                # 任一侧缺少该单元格时不参与对比
+                if col_idx >= len(row1) or col_idx >= len(row2):
+                    continue
+                _, _, col1_name, col2_name = common_columns[col_idx]
+                diff_count += 1
                 
-                for col1_idx, col2_idx, col1_name, col2_name in common_columns:
-                    if col1_idx < len(row1) and col2_idx < len(row2):
-                        old_val = str(row1[col1_idx]).strip()
-                        new_val = str(row2[col2_idx]).strip()
-                        
-                        if old_val != new_val:
-                            diff_count += 1
-                            
-                            difference = {
-                                "序号": diff_count,
-                                "行号": row_idx + 1,
-                                "列名": col1_name,
-                                "列索引": col1_idx + 1,
-                                "原值": old_val,
-                                "新值": new_val,
-                                "位置": f"行{row_idx+1}列{col1_idx+1}({col1_name})",
-                                "映射列名": col2_name if col2_name != col1_name else None,
-                                "比较时间": datetime.now().isoformat()
-                            }
-                            
-                            differences.append(difference)
+                differences.append({
+                    "序号": diff_count,
+                    "行号": row_idx + 1,
+                    "列名": col1_name,
+                    "列索引": col_idx + 1,
+                    "原值": str(row1[col_idx]).strip(),
+                    "新值": str(row2[col_idx]).strip(),
+                    "位置": f"行{row_idx+1}列{col_idx+1}({col1_name})",
+                    "映射列名": col2_name if col2_name != col1_name else None,
+                    "比较时间": compared_at
+                })
             
             return differences
             
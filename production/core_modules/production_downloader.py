@@ -19,6 +19,7 @@ import hashlib
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from cookie_manager import get_cookie_manager
+from shared_browser_service import acquire_browser
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -98,7 +99,8 @@ class ProductionTencentDownloader:
                 ]
             }
             
-            self.browser = await self.playwright.chromium.launch(**browser_config)
+            # 优先连接共享浏览器服务，不可用时按上述配置本地启动
+            self.browser, self.browser_shared = await acquire_browser(self.playwright, **browser_config)
             
             # 页面上下文配置
             context_config = {
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+自动导出/上传时的资源拦截
+通过 Playwright 路由拦截对导出路径无用的请求（图片、字体、媒体、统计上报），
+导出、登录鉴权相关的接口始终放行。
+
+    blocker = ResourceBlocker()
+    await blocker.install(context)      # 也可以传入page
+    blocker.begin_document()            # 每个文档开始时重置计数
+    blocker.mark('page_ready')          # 记录阶段耗时（相对begin_document）
+    blocker.stats()                     # 写入遥测台账的拦截统计
+
+路由只注册在可能被拦截的URL上（统计上报类URL、静态图片/字体/媒体扩展名），
+其余请求不经过路由处理，上下文内的HTTP缓存对它们照常生效。
+没有扩展名的图片等资源不会被拦截。
+
+被拦截的请求没有响应，无从得知实际大小；saved_bytes_rough 只是按资源类型的
+固定平均体积给出的粗略估计，仅用于开启/关闭拦截的对照。
+设置环境变量 EXPORT_RESOURCE_BLOCKING=0 可关闭拦截（统计仍会记录，便于对照）。
+"""
+
+import os
+import re
+import time
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 按资源类型拦截
+DEFAULT_BLOCKED_TYPES = ('image', 'font', 'media')
+
+# 导出、鉴权相关接口：始终放行（优先于拦截规则）
+DEFAULT_ALLOW_PATTERNS = (
+    r'/dop-api/',
+    r'/v1/export',
+    r'export',
+    r'/cgi-bin/',
+    r'login',
+    r'passport',
+    r'xsrf',
+    r'/auth',
+    r'/api/',
+)
+
+# 统计上报、监控类请求：按URL拦截
+DEFAULT_BLOCK_PATTERNS = (
+    r'aegis',
+    r'beacon',
+    r'btrace',
+    r'/report',
+    r'analytics',
+    r'sentry',
+    r'rumt-',
+    r'//tj\.',
+    r'//stat\.',
+    r'pingjs',
+    r'hm\.baidu',
+    r'google-analytics',
+    r'googletagmanager',
+)
+
+# 需要经过路由的静态资源扩展名（与 DEFAULT_BLOCKED_TYPES 对应）
+BLOCKABLE_EXTENSIONS = (
+    'png', 'jpe?g', 'gif', 'webp', 'svg', 'ico', 'bmp', 'avif',
+    'woff2?', 'ttf', 'otf', 'eot',
+    'mp4', 'webm', 'mp3', 'ogg', 'wav', 'm4a',
+)
+
+# 被拦截资源的粗略平均体积（字节），只用于 saved_bytes_rough
+ESTIMATED_BYTES = {
+    'image': 30 * 1024,
+    'font': 150 * 1024,
+    'media': 300 * 1024,
+    'telemetry': 2 * 1024,
+}
+
+
+class ResourceBlocker:
+    """基于路由的资源拦截器，同时统计每个文档的拦截数量和阶段耗时"""
+
+    def __init__(self, blocked_types: Optional[Iterable[str]] = None,
+                 allow_patterns: Optional[Iterable[str]] = None,
+                 block_patterns: Optional[Iterable[str]] = None,
+                 enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv('EXPORT_RESOURCE_BLOCKING', '1').lower() not in ('0', 'false', 'off')
+        self.enabled = enabled
+        self.blocked_types = frozenset(blocked_types if blocked_types is not None else DEFAULT_BLOCKED_TYPES)
+        self._allow = re.compile('|'.join(allow_patterns or DEFAULT_ALLOW_PATTERNS), re.IGNORECASE)
+        self._block = re.compile('|'.join(block_patterns or DEFAULT_BLOCK_PATTERNS), re.IGNORECASE)
+        # 路由匹配：统计上报URL或静态资源扩展名，其他请求不拦截处理
+        self.route_pattern = re.compile(
+            '|'.join(block_patterns or DEFAULT_BLOCK_PATTERNS)
+            + r'|\.(?:' + '|'.join(BLOCKABLE_EXTENSIONS) + r')(?:[?#]|$)',
+            re.IGNORECASE)
+        self.begin_document()
+
+    def begin_document(self):
+        """开始一个新文档，重置计数和计时"""
+        self._started = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self.blocked_by_type: Dict[str, int] = {}
+        self.total_requests = 0
+
+    def mark(self, name: str):
+        """记录阶段完成时间（秒，相对begin_document）"""
+        self.marks[name] = round(time.perf_counter() - self._started, 3)
+
+    def classify(self, url: str, resource_type: str) -> Optional[str]:
+        """返回拦截类别，放行时返回None"""
+        if self._allow.search(url) and resource_type not in self.blocked_types:
+            return None
+        if resource_type in self.blocked_types:
+            return resource_type
+        if self._block.search(url):
+            return 'telemetry'
+        return None
+
+    async def install(self, target):
+        """在context或page上注册路由（只匹配可能拦截的URL），并通过request事件统计请求总数"""
+        target.on('request', self._count_request)
+        await target.route(self.route_pattern, self._handle_route)
+
+    def _count_request(self, request):
+        self.total_requests += 1
+
+    async def _handle_route(self, route):
+        request = route.request
+        category = self.classify(request.url, request.resource_type)
+        if category is None:
+            await route.continue_()
+            return
+
+        self.blocked_by_type[category] = self.blocked_by_type.get(category, 0) + 1
+        if not self.enabled:
+            await route.continue_()
+            return
+        try:
+            await route.abort('blockedbyclient')
+        except Exception as e:
+            # 页面已关闭等情况下abort会失败，不影响主流程
+            logger.debug(f"资源拦截失败 {request.url}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """当前文档的拦截统计"""
+        blocked = sum(self.blocked_by_type.values())
+        return {
+            'blocking': self.enabled,
+            'blocked': blocked if self.enabled else 0,
+            'blocked_by_type': dict(self.blocked_by_type) if self.enabled else {},
+            'blockable': blocked,
+            'allowed': max(0, self.total_requests - blocked),
+            'saved_bytes_rough': sum(
+                ESTIMATED_BYTES.get(category, 0) * count
+                for category, count in self.blocked_by_type.items()
+            ) if self.enabled else 0,
+            'marks': dict(self.marks),
+        }
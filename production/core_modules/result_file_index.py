@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+结果文件元数据索引
+每个结果目录维护一个只追加的 .result_index.jsonl，每写出一个综合打分、
+详细打分或风险评分JSON就追加一条摘要（周数、时间戳、表格数、汇总数、文件大小）。
+
+列表接口只读取索引即可返回文件列表，用户选中某个文件时才加载完整JSON。
+索引条目用 (size, mtime) 校验，文件被覆盖或索引缺失时自动回填，
+因此未接入索引的旧文件和旧写入方依然能被正确列出。
+
+详细打分目录另有一个 .score_lookup.jsonl，打分阶段写出文件时登记
+(doc_id, 周, 版本) → 打分文件，涂色和UI按文档查打分文件时直接查内存中的
+字典，不再随历史文件增多而glob整个目录：
+
+    register_score_file(score_file, parse_document_key(target_file))
+    score_file = find_score_file(score_dir, doc_id=..., week=..., version=...)
+"""
+
+import fnmatch
+import json
+import os
+import re
+import threading
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = '.result_index.jsonl'
+COMPACT_RATIO = 2                 # 索引行数超过现存文件数的这一倍数（加上余量）时压缩
+COMPACT_SLACK = 50
+
+KIND_COMPREHENSIVE = 'comprehensive'
+KIND_DETAILED = 'detailed'
+KIND_RISK_SCORING = 'risk_scoring'
+
+_WEEK_PATTERN = re.compile(r'_W(\d{1,2})(?:_|\.|$)')
+
+LOOKUP_FILENAME = '.score_lookup.jsonl'
+
+# 标准文件名：tencent_{文档名}_{doc_id}_{YYYYMMDD_HHMM}_{版本类型}_W{周数}.{扩展名}
+# 涂色流程中的 _fixed/_marked 等后缀一并识别
+_DOCUMENT_PATTERN = re.compile(
+    r'^tencent_(?P<doc_name>.+)_(?P<doc_id>[A-Za-z0-9]+)_\d{8}_\d{4}_'
+    r'(?P<version>baseline|midweek|weekend)_W(?P<week>\d{1,2})(?:_[A-Za-z0-9_]*)?\.\w+$')
+
+
+def detect_kind(filename: str) -> Optional[str]:
+    """根据文件名判断结果文件类型"""
+    name = os.path.basename(filename)
+    if not name.endswith('.json'):
+        return None
+    if 'comprehensive_score' in name:
+        return KIND_COMPREHENSIVE
+    if name.startswith('detailed_score_'):
+        return KIND_DETAILED
+    if name.endswith('_risk_scoring_final.json'):
+        return KIND_RISK_SCORING
+    return None
+
+
+def summarize_result(data: Dict[str, Any], kind: str, filename: str = '') -> Dict[str, Any]:
+    """从结果JSON中提取列表展示所需的摘要字段"""
+    metadata = data.get('metadata', {}) or {}
+    summary = data.get('summary', {}) or {}
+    record: Dict[str, Any] = {'kind': kind}
+
+    if kind == KIND_COMPREHENSIVE:
+        table_names = data.get('table_names')
+        if table_names is None:
+            table_names = data.get('table_scores', [])
+        record.update({
+            'week': metadata.get('week'),
+            'timestamp': metadata.get('timestamp') or data.get('generation_time'),
+            'table_count': len(table_names),
+            'totals': {
+                'modifications': summary.get('total_modifications', 0),
+                'l1': summary.get('l1_modifications', 0),
+                'l2': summary.get('l2_modifications', 0),
+                'l3': summary.get('l3_modifications', 0),
+                'overall_risk_score': summary.get('overall_risk_score'),
+            },
+        })
+    elif kind == KIND_DETAILED:
+        record.update({
+            'table_name': metadata.get('table_name'),
+            'timestamp': metadata.get('scoring_time'),
+            'table_count': 1,
+            'totals': {
+                'modifications': metadata.get('total_modifications', len(data.get('scores', []))),
+                'total_score': summary.get('total_score'),
+                'risk_distribution': summary.get('risk_distribution', {}),
+            },
+        })
+    elif kind == KIND_RISK_SCORING:
+        record.update({
+            'timestamp': data.get('timestamp') or data.get('processing_timestamp'),
+            'table_count': 1,
+            'totals': {
+                'modifications': len(data.get('risk_scoring_results', [])),
+                'l1': summary.get('l1_high_risk_count', 0),
+                'l2': summary.get('l2_medium_risk_count', 0),
+                'l3': summary.get('l3_low_risk_count', 0),
+            },
+        })
+
+    if not record.get('week') and filename:
+        match = _WEEK_PATTERN.search(os.path.basename(filename))
+        if match:
+            record['week'] = f"W{int(match.group(1)):02d}"
+    return record
+
+
+class ResultFileIndex:
+    """单个结果目录的摘要索引"""
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.index_path = self.directory / INDEX_FILENAME
+        self._lock = threading.Lock()
+
+    def record(self, file_path: Union[str, Path], data: Optional[Dict[str, Any]] = None,
+               kind: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        为刚写出的结果文件追加摘要
+
+        Args:
+            file_path: 结果文件路径（须位于本目录）
+            data: 已在内存中的文件内容，省略时从磁盘读取
+            kind: 文件类型，省略时按文件名判断
+        """
+        file_path = Path(file_path)
+        kind = kind or detect_kind(file_path.name)
+        if not kind:
+            return None
+        try:
+            stat = file_path.stat()
+            if data is None:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"结果文件索引跳过 {file_path.name}: {e}")
+            return None
+
+        entry = summarize_result(data, kind, file_path.name)
+        entry.update({
+            'name': file_path.name,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+        })
+        self._append(entry)
+        return entry
+
+    def _append(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            fd = os.open(str(self.index_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+
+    def _load(self) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        """读取索引，同名文件以最后一条为准；同时返回索引行数"""
+        entries: Dict[str, Dict[str, Any]] = {}
+        lines = 0
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries[entry.get('name')] = entry
+        except FileNotFoundError:
+            pass
+        return entries, lines
+
+    def entries(self, pattern: str = '*.json', kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        列出目录中现存的结果文件摘要
+
+        只对目录做一次scandir取大小和修改时间；索引缺失或过期的文件会
+        读取一次并回填索引，下次列出时不再打开。
+        """
+        if not self.directory.is_dir():
+            return []
+
+        indexed, index_lines = self._load()
+        results = []
+        present = set()
+        stale = 0
+        for item in os.scandir(self.directory):
+            if not item.is_file():
+                continue
+            present.add(item.name)
+            if not fnmatch.fnmatch(item.name, pattern):
+                continue
+            file_kind = detect_kind(item.name)
+            if not file_kind or (kind and file_kind != kind):
+                continue
+
+            stat = item.stat()
+            entry = indexed.get(item.name)
+            if not entry or entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime:
+                entry = self.record(item.path, kind=file_kind)
+                if not entry:
+                    continue
+                indexed[item.name] = entry
+                stale += 1
+            results.append(dict(entry, path=item.path))
+
+        # 已删除文件或重复写入（如 *_latest 覆盖）导致索引冗余时压缩；
+        # 按目录中全部现存文件压缩，不限于本次列出的文件
+        live = [entry for name, entry in indexed.items() if name in present]
+        if index_lines + stale > COMPACT_RATIO * len(live) + COMPACT_SLACK:
+            self.compact(live)
+        return results
+
+    def compact(self, entries: List[Dict[str, Any]]):
+        """用现存文件的最新摘要重写索引"""
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    entry = {k: v for k, v in entry.items() if k != 'path'}
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+            os.replace(tmp_path, self.index_path)
+
+
+def record_result_file(file_path: Union[str, Path], data: Optional[Dict[str, Any]] = None,
+                       kind: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """写入方便捷入口：为结果文件追加索引摘要，失败不影响主流程"""
+    try:
+        return ResultFileIndex(Path(file_path).parent).record(file_path, data, kind)
+    except Exception as e:
+        logger.warning(f"结果文件索引写入失败 {file_path}: {e}")
+        return None
+
+
+def list_result_files(directory: Union[str, Path], pattern: str = '*.json',
+                      kind: Optional[str] = None) -> List[Dict[str, Any]]:
+    """读取方便捷入口：按索引列出目录中的结果文件摘要"""
+    return ResultFileIndex(directory).entries(pattern, kind)
+
+
+def format_mtime(entry: Dict[str, Any], fmt: str = '%Y-%m-%d %H:%M') -> str:
+    """格式化索引条目的修改时间"""
+    return datetime.fromtimestamp(entry['mtime']).strftime(fmt)
+
+
+def parse_document_key(filename: Union[str, Path, None]) -> Optional[Dict[str, Any]]:
+    """从标准文件名中解析文档标识 {doc_id, doc_name, week, version}，不符合时返回None"""
+    if not filename:
+        return None
+    match = _DOCUMENT_PATTERN.match(os.path.basename(str(filename)))
+    if not match:
+        return None
+    return {
+        'doc_id': match.group('doc_id'),
+        'doc_name': match.group('doc_name'),
+        'week': int(match.group('week')),
+        'version': match.group('version'),
+    }
+
+
+class ScoreFileLookup:
+    """
+    详细打分目录的文档 → 打分文件索引
+
+    .score_lookup.jsonl 只追加，内存中按 (doc_id, 周, 版本)、doc_id、文档名
+    各维护一张字典，同一键以最后登记的文件为准。读取前只stat一次索引文件，
+    有新内容时从上次读到的位置继续读，不重新加载。索引行数超过
+    (doc_id, 周, 版本) 键数的 COMPACT_RATIO 倍（加上余量）时，按每个键最后
+    一条、且文件仍存在的条目重写索引。
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.index_path = self.directory / LOOKUP_FILENAME
+        self._lock = threading.Lock()
+        self._by_key: Dict[Tuple[str, int, str], str] = {}
+        self._by_doc: Dict[str, str] = {}
+        self._by_name: Dict[str, str] = {}
+        # 每个 (doc_id, 周, 版本) 键最后登记的条目，按登记先后排列，用于压缩
+        self._entries: Dict[Tuple[str, Optional[int], Optional[str]], Dict[str, Any]] = {}
+        self._lines = 0
+        self._offset = 0
+        self._inode = None
+
+    def register(self, file_path: Union[str, Path], document: Dict[str, Any],
+                 table_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """登记刚写出的打分文件；document为 parse_document_key 的结果"""
+        if not document or not document.get('doc_id'):
+            return None
+        entry = {
+            'name': Path(file_path).name,
+            'doc_id': document['doc_id'],
+            'doc_name': document.get('doc_name'),
+            'table_name': table_name,
+            'week': document.get('week'),
+            'version': document.get('version'),
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            fd = os.open(str(self.index_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+        return entry
+
+    def _add(self, entry: Dict[str, Any]):
+        name = entry.get('name')
+        doc_id = entry.get('doc_id')
+        if not name or not doc_id:
+            return
+        week = entry.get('week')
+        if week is not None:
+            self._by_key[(doc_id, int(week), entry.get('version'))] = name
+        key = (doc_id, int(week) if week is not None else None, entry.get('version'))
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        self._by_doc[doc_id] = name
+        for alias in (entry.get('doc_name'), entry.get('table_name')):
+            if alias:
+                self._by_name[alias] = name
+
+    def _refresh(self):
+        """读入索引文件新追加的条目；文件被替换或截断时重新加载"""
+        try:
+            stat = self.index_path.stat()
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._by_key.clear()
+            self._by_doc.clear()
+            self._by_name.clear()
+            self._entries.clear()
+            self._lines = 0
+            self._offset = 0
+            self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break                 # 写入中的半行，下次再读
+                self._offset += len(line)
+                self._lines += 1
+                try:
+                    self._add(json.loads(line))
+                except ValueError:
+                    continue
+        if self._lines > COMPACT_RATIO * len(self._entries) + COMPACT_SLACK:
+            try:
+                self._compact()
+            except OSError as e:
+                logger.warning(f"打分文件查找索引压缩失败 {self.index_path}: {e}")
+
+    def _compact(self):
+        """用每个键最后一条、文件仍存在的条目重写索引（调用方持有锁）"""
+        entries = [entry for entry in self._entries.values()
+                   if (self.directory / entry['name']).is_file()]
+        tmp_path = self.index_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        # 其他进程在读取之后又追加了条目时放弃本次压缩，下次查找时重试
+        stat = self.index_path.stat()
+        if stat.st_ino != self._inode or stat.st_size != self._offset:
+            os.unlink(tmp_path)
+            return
+        os.replace(tmp_path, self.index_path)
+        stat = self.index_path.stat()
+        self._inode = stat.st_ino
+        self._offset = stat.st_size
+        self._lines = len(entries)
+
+    def find(self, doc_id: Optional[str] = None, week: Optional[int] = None,
+             version: Optional[str] = None, name: Optional[str] = None) -> Optional[str]:
+        """
+        查找打分文件路径
+
+        给出doc_id、周和版本时精确匹配；只给doc_id时返回该文档最后登记的文件；
+        只给name时按文档名/表名查找。登记过但已被删除的文件视为未找到。
+        """
+        with self._lock:
+            self._refresh()
+            if doc_id and week is not None and version:
+                file_name = self._by_key.get((doc_id, int(week), version))
+            elif doc_id:
+                file_name = self._by_doc.get(doc_id)
+            elif name:
+                file_name = self._by_name.get(name)
+            else:
+                file_name = None
+        if not file_name:
+            return None
+        path = self.directory / file_name
+        return str(path) if path.is_file() else None
+
+
+_lookup_instances: Dict[str, ScoreFileLookup] = {}
+_lookup_lock = threading.Lock()
+
+
+def get_score_lookup(directory: Union[str, Path]) -> ScoreFileLookup:
+    """进程内每个打分目录共享一个查找索引，内存中的字典跨请求复用"""
+    key = os.path.realpath(str(directory))
+    with _lookup_lock:
+        lookup = _lookup_instances.get(key)
+        if lookup is None:
+            lookup = _lookup_instances[key] = ScoreFileLookup(key)
+        return lookup
+
+
+def register_score_file(file_path: Union[str, Path], document: Optional[Dict[str, Any]],
+                        table_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """写入方便捷入口：登记打分文件对应的文档，失败不影响主流程"""
+    if not document:
+        return None
+    try:
+        return get_score_lookup(Path(file_path).parent).register(file_path, document, table_name)
+    except Exception as e:
+        logger.warning(f"打分文件查找索引写入失败 {file_path}: {e}")
+        return None
+
+
+def find_score_file(directory: Union[str, Path], doc_id: Optional[str] = None,
+                    week: Optional[int] = None, version: Optional[str] = None,
+                    name: Optional[str] = None) -> Optional[str]:
+    """读取方便捷入口：按文档标识查找打分文件，未登记时返回None"""
+    try:
+        return get_score_lookup(directory).find(doc_id, week, version, name)
+    except OSError as e:
+        logger.warning(f"打分文件查找索引读取失败 {directory}: {e}")
+        return None
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+打分文件的流式读写
+详细打分、综合打分文件仍是合法JSON（旧的 json.load 读取方不受影响），
+但按行组织：每个顶层字段一行，大数组（如scores）每个元素一行：
+
+    {"metadata": {...}
+    ,"scores": [
+    {...}
+    ,{...}
+    ]
+    ,"summary": {...}
+    }
+
+写入方边算边写，不必在内存中攒齐整个结果：
+
+    with ScoreFileWriter(output_file) as writer:
+        writer.section('metadata', metadata)
+        writer.open_array('scores')
+        for score in scores:
+            writer.append(score)
+        writer.close_array()
+        writer.section('summary', summary)
+
+读取方逐行解析，同样不必整体加载；写入未完成时内容先写在 <文件名>.partial，
+完成后改名为正式文件名，读取方不会读到写了一半的文件：
+
+    metadata = read_sections(score_file)['metadata']      # 跳过scores数组，不逐条解析
+    for score in iter_records(score_file, 'scores'):
+        ...
+
+旧格式（indent=2 整体写出）的文件自动退回整体加载。
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+PARTIAL_SUFFIX = '.partial'
+FLUSH_EVERY = 200                 # 每写出多少个数组元素刷新一次，限制写缓冲占用
+
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+
+PathLike = Union[str, Path]
+
+
+class ScoreFileWriter:
+    """按行写出打分文件，完成前写在 .partial 文件中"""
+
+    def __init__(self, path: PathLike, flush_every: int = FLUSH_EVERY):
+        self.path = Path(path)
+        self.partial_path = Path(f'{self.path}{PARTIAL_SUFFIX}')
+        self.flush_every = flush_every
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.partial_path, 'w', encoding='utf-8')
+        self._started = False
+        self._array: Optional[str] = None
+        self._count = 0
+
+    def _begin_line(self) -> str:
+        prefix = ',' if self._started else '{'
+        self._started = True
+        return prefix
+
+    def section(self, key: str, value: Any):
+        """写出一个顶层字段"""
+        if self._array is not None:
+            raise ValueError(f"数组 {self._array} 尚未关闭")
+        self._file.write(f'{self._begin_line()}{_encode(key)}: {_encode(value)}\n')
+
+    def open_array(self, key: str):
+        """开始一个逐元素写出的顶层数组"""
+        if self._array is not None:
+            raise ValueError(f"数组 {self._array} 尚未关闭")
+        self._file.write(f'{self._begin_line()}{_encode(key)}: [\n')
+        self._array = key
+        self._count = 0
+
+    def append(self, item: Any):
+        """向当前数组追加一个元素"""
+        self._file.write(f'{"," if self._count else ""}{_encode(item)}\n')
+        self._count += 1
+        if self._count % self.flush_every == 0:
+            self._file.flush()
+
+    def extend(self, items: Iterable[Any]):
+        for item in items:
+            self.append(item)
+
+    def close_array(self):
+        self._file.write(']\n')
+        self._array = None
+        self._file.flush()
+
+    def close(self):
+        """写完文档并改名为正式文件名"""
+        if self._array is not None:
+            self.close_array()
+        self._file.write('}\n' if self._started else '{}\n')
+        self._file.close()
+        os.replace(self.partial_path, self.path)
+
+    def abort(self):
+        """放弃写入，删除 .partial 文件"""
+        self._file.close()
+        try:
+            os.unlink(self.partial_path)
+        except OSError:
+            pass
+
+    def __enter__(self) -> 'ScoreFileWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_json_document(path: PathLike, document: Dict[str, Any]) -> Path:
+    """按流式格式写出已在内存中的文档，顶层的列表字段逐元素一行"""
+    with ScoreFileWriter(path) as writer:
+        for key, value in document.items():
+            if isinstance(value, list):
+                writer.open_array(key)
+                writer.extend(value)
+                writer.close_array()
+            else:
+                writer.section(key, value)
+    return Path(path)
+
+
+def _is_stream_format(first_line: str) -> bool:
+    if not first_line.startswith('{"'):
+        return False
+    try:
+        json.loads(first_line)        # 单行写出的旧格式文件本身就是完整JSON
+        return False
+    except ValueError:
+        return True
+
+
+def iter_events(path: PathLike, parse_items: bool = True) -> Iterator[Tuple[str, str, Any]]:
+    """
+    逐行解析打分文件，产出 ('section', 字段名, 值)、数组开始时的 ('array', 数组名, None)
+    和数组元素 ('item', 数组名, 元素)
+
+    parse_items为False时数组元素不解析，产出的元素为None。
+    旧格式文件整体加载后按同样的事件产出（顶层列表字段视为数组）。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        first = f.readline()
+        if not _is_stream_format(first):
+            # 旧格式（整体写出）：整体加载
+            text = first + f.read()
+            document = json.loads(text) if text.strip() else {}
+            for key, value in document.items():
+                if isinstance(value, list):
+                    yield 'array', key, None
+                    for item in value:
+                        yield 'item', key, item
+                else:
+                    yield 'section', key, value
+            return
+
+        array = None
+        for line in _chain_first(first, f):
+            line = line.rstrip('\n')
+            if array is not None:
+                if line == ']':
+                    array = None
+                elif parse_items:
+                    yield 'item', array, json.loads(line[1:] if line.startswith(',') else line)
+                else:
+                    yield 'item', array, None
+            elif line == '}':
+                return
+            elif line.endswith(': ['):
+                array = json.loads(line[1:-3])
+                yield 'array', array, None
+            else:
+                (key, value), = json.loads('{' + line[1:] + '}').items()
+                yield 'section', key, value
+
+
+def _chain_first(first: str, rest: Iterable[str]) -> Iterator[str]:
+    yield first
+    yield from rest
+
+
+def iter_records(path: PathLike, key: str = 'scores') -> Iterator[Any]:
+    """逐条读取某个数组字段的元素"""
+    for kind, name, value in iter_events(path):
+        if kind == 'item' and name == key:
+            yield value
+
+
+def count_records(path: PathLike, key: str = 'scores') -> int:
+    """统计某个数组字段的元素个数（元素只跳过不解析）"""
+    return sum(1 for kind, name, _ in iter_events(path, parse_items=False)
+               if kind == 'item' and name == key)
+
+
+def read_sections(path: PathLike) -> Dict[str, Any]:
+    """读取全部非数组字段，数组元素只跳过不解析"""
+    return {name: value
+            for kind, name, value in iter_events(path, parse_items=False)
+            if kind == 'section'}
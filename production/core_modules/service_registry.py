@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+服务注册与服务间调用
+各服务启动时把自己的地址写入注册文件并定期心跳，调用方直接按注册地址访问，
+不再每次轮询探测 8093–8097 等端口：
+
+    # 服务端（如8093，app.run 之前）
+    register_service('8093', port)
+    start_heartbeat('8093')
+
+    # 调用端（如8089）
+    backend = get_service_client('8093', fallback_ports=[8093, 8094, 8095, 8096, 8097])
+    response = backend.get('/api/status', timeout=5)
+
+ServiceClient 使用带连接池和keep-alive的 requests.Session，并带熔断：
+连续连接失败达到阈值后在冷却期内直接抛出 ServiceUnavailable，不再阻塞请求线程。
+注册信息缺失或心跳过期时才按 fallback_ports 探测一次，结果缓存到下次连接失败为止。
+
+注册文件: config/service_registry.json
+    {name: {"url", "port", "pid", "started_at", "heartbeat_at"}}
+"""
+
+import json
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_PATH = Path('/root/projects/tencent-doc-manager/config/service_registry.json')
+HEARTBEAT_INTERVAL = 15           # 秒
+HEARTBEAT_MAX_AGE = 60            # 超过该时长无心跳视为失效
+FAILURE_THRESHOLD = 3             # 连续连接失败次数达到后熔断
+COOLDOWN_SECONDS = 15             # 熔断冷却期
+PROBE_TIMEOUT = 0.5               # 回退探测端口时的超时
+
+_registry_lock = threading.Lock()
+
+
+class ServiceUnavailable(requests.exceptions.ConnectionError):
+    """目标服务未注册、不可达或处于熔断期"""
+
+
+def _read_registry(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _update_registry(path: Path, name: str, **fields):
+    with _registry_lock:
+        data = _read_registry(path)
+        entry = data.setdefault(name, {})
+        entry.update(fields)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"服务注册写入失败: {e}")
+
+
+def register_service(name: str, port: int, host: str = '127.0.0.1', path: Optional[Path] = None):
+    """登记服务地址（端口变化时重复调用即可覆盖）"""
+    now = datetime.now().isoformat()
+    _update_registry(
+        Path(path) if path else DEFAULT_REGISTRY_PATH, name,
+        url=f'http://{host}:{port}', port=port, pid=os.getpid(),
+        started_at=now, heartbeat_at=time.time(),
+    )
+    logger.info(f"📇 服务已注册: {name} → http://{host}:{port}")
+
+
+def start_heartbeat(name: str, interval: float = HEARTBEAT_INTERVAL,
+                    path: Optional[Path] = None) -> threading.Thread:
+    """后台线程定期刷新心跳时间"""
+    registry_path = Path(path) if path else DEFAULT_REGISTRY_PATH
+
+    def beat():
+        while True:
+            time.sleep(interval)
+            _update_registry(registry_path, name, pid=os.getpid(), heartbeat_at=time.time())
+
+    thread = threading.Thread(target=beat, name=f'heartbeat-{name}', daemon=True)
+    thread.start()
+    return thread
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def lookup_service(name: str, max_age: float = HEARTBEAT_MAX_AGE,
+                   path: Optional[Path] = None) -> Optional[str]:
+    """返回心跳未过期且进程存活的服务地址"""
+    entry = _read_registry(Path(path) if path else DEFAULT_REGISTRY_PATH).get(name)
+    if not entry or not entry.get('url'):
+        return None
+    if time.time() - entry.get('heartbeat_at', 0) > max_age or not _pid_alive(entry.get('pid')):
+        return None
+    return entry['url']
+
+
+class ServiceClient:
+    """指向单个服务的连接池客户端，带熔断"""
+
+    def __init__(self, name: str, fallback_ports: Iterable[int] = (),
+                 registry_path: Optional[Path] = None, pool_size: int = 8):
+        self.name = name
+        self.fallback_ports = list(fallback_ports)
+        self.registry_path = Path(registry_path) if registry_path else DEFAULT_REGISTRY_PATH
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._base_url: Optional[str] = None
+        self._failures = 0
+        self._open_until = 0.0
+
+    def _probe_fallback(self) -> Optional[str]:
+        for port in self.fallback_ports:
+            url = f'http://127.0.0.1:{port}'
+            try:
+                if self.session.get(f'{url}/api/status', timeout=PROBE_TIMEOUT).status_code == 200:
+                    logger.info(f"未找到 {self.name} 的注册信息，探测到端口 {port}")
+                    return url
+            except requests.RequestException:
+                continue
+        return None
+
+    def base_url(self) -> str:
+        """解析服务地址：缓存 → 注册文件 → 回退端口探测"""
+        with self._lock:
+            if time.time() < self._open_until:
+                raise ServiceUnavailable(f"{self.name} 服务熔断中，{int(self._open_until - time.time())}秒后重试")
+            if self._base_url:
+                return self._base_url
+        url = lookup_service(self.name, path=self.registry_path) or self._probe_fallback()
+        if not url:
+            self._record_failure()
+            raise ServiceUnavailable(f"{self.name} 服务未注册或无法连接")
+        with self._lock:
+            self._base_url = url
+        return url
+
+    def _record_failure(self):
+        with self._lock:
+            self._base_url = None
+            self._failures += 1
+            if self._failures >= FAILURE_THRESHOLD:
+                self._open_until = time.time() + COOLDOWN_SECONDS
+                logger.warning(f"⚡ {self.name} 连续 {self._failures} 次连接失败，熔断 {COOLDOWN_SECONDS} 秒")
+
+    def _record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', 5)
+        url = self.base_url()
+        try:
+            response = self.session.request(method, f'{url}{path}', **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout):
+            self._record_failure()
+            raise
+        self._record_success()
+        return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def state(self) -> Dict[str, Any]:
+        """当前解析地址和熔断状态"""
+        with self._lock:
+            return {
+                'service': self.name,
+                'base_url': self._base_url,
+                'consecutive_failures': self._failures,
+                'circuit_open': time.time() < self._open_until,
+            }
+
+
+_clients: Dict[str, ServiceClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_service_client(name: str, fallback_ports: Iterable[int] = ()) -> ServiceClient:
+    """进程内共享的服务客户端"""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = ServiceClient(name, fallback_ports)
+        return _clients[name]
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+共享浏览器服务
+常驻一个Chromium进程并开放CDP端口，下载器和上传器通过 connect_over_cdp
+连接后各自创建独立的上下文，不再每次任务都启动一个新的浏览器：
+
+    python -m production.core_modules.shared_browser_service --port 9222
+
+客户端:
+    browser, shared = await acquire_browser(self.playwright, headless=True, args=[...])
+    context = await browser.new_context(...)
+    ...
+    await browser.close()   # 共享模式下只关闭本次创建的上下文并断开连接
+
+收益只是省去每次任务的浏览器启动：browser.new_context() 创建的上下文相互隔离，
+各自使用内存中的缓存和Cookie，不读写 profile 目录，任务之间不共享HTTP缓存或登录态。
+Cookie 仍由各任务按原方式注入。
+
+服务不可达时 acquire_browser 按原参数本地启动浏览器，行为与接入前一致。
+设置环境变量 BROWSER_SERVICE_ENDPOINT 指定服务地址，设为 off 时始终本地启动。
+
+定时任务预热时可调用 ensure_service_running()，服务未运行则在当前进程内启动并守护。
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 9222
+DEFAULT_ENDPOINT = f'http://127.0.0.1:{DEFAULT_PORT}'
+DEFAULT_PROFILE_DIR = Path('/root/projects/tencent-doc-manager/browser_profile')
+CONNECT_TIMEOUT_MS = 3000
+
+# 常驻进程的启动参数：单进程模型下限制渲染进程数量，降低服务器常驻内存
+SERVICE_ARGS = [
+    '--headless=new',
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-blink-features=AutomationControlled',
+    '--disable-background-networking',
+    '--disable-default-apps',
+    '--disable-features=TranslateUI,site-per-process',
+    '--renderer-process-limit=4',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--mute-audio',
+]
+
+
+def service_endpoint() -> Optional[str]:
+    """读取共享浏览器服务地址，显式关闭时返回None"""
+    endpoint = os.getenv('BROWSER_SERVICE_ENDPOINT', DEFAULT_ENDPOINT).strip()
+    if endpoint.lower() in ('', 'off', 'none', '0'):
+        return None
+    return endpoint
+
+
+def probe_endpoint(endpoint: str, timeout: float = 0.5) -> Optional[dict]:
+    """探测CDP端点，返回 /json/version 信息，不可达时返回None"""
+    try:
+        with urllib.request.urlopen(f"{endpoint.rstrip('/')}/json/version", timeout=timeout) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+    except Exception:
+        return None
+
+
+async def acquire_browser(playwright, **launch_kwargs) -> Tuple[Any, bool]:
+    """
+    优先连接共享浏览器服务，失败时按 launch_kwargs 本地启动
+
+    Returns:
+        (browser, shared)：shared为True表示连接的是共享服务。
+        两种情况下调用方都用 browser.close() 释放——共享模式下它只关闭
+        本连接创建的上下文并断开，不会结束常驻进程。
+    """
+    endpoint = service_endpoint()
+    if endpoint and probe_endpoint(endpoint):
+        try:
+            browser = await playwright.chromium.connect_over_cdp(endpoint, timeout=CONNECT_TIMEOUT_MS)
+            logger.info(f"♻️ 已连接共享浏览器服务: {endpoint}")
+            return browser, True
+        except Exception as e:
+            logger.warning(f"共享浏览器服务连接失败，改为本地启动: {e}")
+
+    browser = await playwright.chromium.launch(**launch_kwargs)
+    return browser, False
+
+
+class SharedBrowserService:
+    """常驻Chromium进程的守护器，进程退出后自动重启"""
+
+    def __init__(self, port: int = DEFAULT_PORT, profile_dir: Path = DEFAULT_PROFILE_DIR,
+                 headless: bool = True, executable_path: Optional[str] = None):
+        self.port = port
+        self.profile_dir = Path(profile_dir)
+        self.headless = headless
+        self.executable_path = executable_path
+        self.endpoint = f'http://127.0.0.1:{port}'
+        self.process: Optional[subprocess.Popen] = None
+        self._stopping = False
+
+    def _resolve_executable(self) -> str:
+        if self.executable_path:
+            return self.executable_path
+        from playwright.sync_api import sync_playwright
+        with sync_playwright() as p:
+            self.executable_path = p.chromium.executable_path
+        return self.executable_path
+
+    def start(self, ready_timeout: float = 20.0) -> bool:
+        """启动Chromium并等待CDP端口就绪"""
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        args = [
+            self._resolve_executable(),
+            f'--remote-debugging-port={self.port}',
+            '--remote-debugging-address=127.0.0.1',
+            # 固定profile目录，避免每次重启生成临时目录；仅默认上下文使用它，
+            # 客户端 new_context() 创建的上下文不落盘，不共享缓存
+            f'--user-data-dir={self.profile_dir}',
+        ] + [a for a in SERVICE_ARGS if self.headless or a != '--headless=new']
+        args.append('about:blank')
+
+        self.process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.time() + ready_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                logger.error(f"❌ Chromium启动后立即退出，返回码 {self.process.returncode}")
+                return False
+            info = probe_endpoint(self.endpoint)
+            if info:
+                logger.info(f"✅ 共享浏览器已就绪: {info.get('Browser')} @ {self.endpoint} (pid={self.process.pid})")
+                return True
+            time.sleep(0.2)
+        logger.error("❌ 等待CDP端口就绪超时")
+        self.stop()
+        return False
+
+    def stop(self):
+        """结束Chromium进程"""
+        self._stopping = True
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def serve_forever(self, check_interval: float = 5.0):
+        """前台运行，进程退出或端口无响应时重启"""
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        signal.signal(signal.SIGINT, lambda *_: self.stop())
+        self.supervise(check_interval)
+
+    def supervise(self, check_interval: float = 5.0):
+        """守护循环：进程退出或端口无响应时重启（可在后台线程中运行）"""
+        restart_delay = 1.0
+        while not self._stopping:
+            if not self.start():
+                time.sleep(restart_delay)
+                restart_delay = min(restart_delay * 2, 60.0)
+                continue
+            restart_delay = 1.0
+            while not self._stopping:
+                time.sleep(check_interval)
+                if self._stopping:
+                    break
+                if self.process.poll() is not None or not probe_endpoint(self.endpoint, timeout=3):
+                    logger.warning("⚠️ 共享浏览器无响应，准备重启")
+                    if self.process and self.process.poll() is None:
+                        self.process.kill()
+                    break
+
+
+_supervisor: Optional[SharedBrowserService] = None
+_supervisor_lock = threading.Lock()
+
+
+def ensure_service_running(ready_timeout: float = 30.0) -> Dict[str, Any]:
+    """
+    确保共享浏览器服务可用：本机端点不可达时在当前进程内启动并守护
+
+    Returns:
+        {'status': 'running' | 'started' | 'unavailable' | 'disabled', 'endpoint'}
+    """
+    global _supervisor
+    endpoint = service_endpoint()
+    if not endpoint:
+        return {'status': 'disabled', 'endpoint': None}
+    if probe_endpoint(endpoint):
+        return {'status': 'running', 'endpoint': endpoint}
+
+    parsed = urlparse(endpoint)
+    if parsed.hostname not in ('127.0.0.1', 'localhost'):
+        return {'status': 'unavailable', 'endpoint': endpoint}
+
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = SharedBrowserService(port=parsed.port or DEFAULT_PORT)
+            threading.Thread(target=_supervisor.supervise, name='shared-browser', daemon=True).start()
+
+    deadline = time.time() + ready_timeout
+    while time.time() < deadline:
+        if probe_endpoint(endpoint):
+            return {'status': 'started', 'endpoint': endpoint}
+        time.sleep(0.5)
+    return {'status': 'unavailable', 'endpoint': endpoint}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='共享浏览器服务（CDP）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='CDP端口')
+    parser.add_argument('--profile-dir', default=str(DEFAULT_PROFILE_DIR), help='浏览器profile目录')
+    parser.add_argument('--headful', action='store_true', help='有界面模式（调试用）')
+    parser.add_argument('--executable', help='Chromium可执行文件路径，默认使用Playwright自带版本')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    service = SharedBrowserService(
+        port=args.port,
+        profile_dir=Path(args.profile_dir),
+        headless=not args.headful,
+        executable_path=args.executable,
+    )
+    service.serve_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+表格级CPU任务进程池
+CSV解析、单元格对比、规则打分都是纯Python计算，线程受GIL限制无法并行。
+每张表的对比/打分阶段提交到按CPU核数开的进程池，输入输出只传文件路径：
+
+    pool = get_table_process_pool()
+    _, usage = pool.compare(baseline_file, target_file, comparison_file)   # 对比结果写入comparison_file
+    score_file, usage = pool.score(comparison_file, output_dir)          # 返回详细打分文件路径
+
+usage 为任务在工作进程中测得的CPU耗时、RSS峰值、磁盘读写和外部调用次数
+（workflow_stage_metrics.usage_since），调用方用 StageMetricsRecorder.merge_usage
+并入当前阶段，父进程自身的计量看不到工作进程的消耗。
+
+下载、浏览器、上传等网络阶段仍留在调用线程中；批量并行时多张表的CPU阶段
+分散到各工作进程，随核数扩展。基线列式存储的旁路文件（baseline_store）由
+预热阶段在磁盘上建好，工作进程直接mmap加载，不必重新解析。
+
+工作进程用forkserver启动（不从多线程的Flask进程直接fork），常驻复用；
+进程池无法创建时自动退回在当前进程执行，工作进程异常退出时重建进程池重试一次。
+单个任务超时时终止该进程池的工作进程并重建（卡住的任务不再占用工作进程），
+超时任务抛出 TableTaskTimeout，由批量编排按单表失败记录，其余表格照常完成；
+同时在该进程池中运行的其他任务会收到 BrokenProcessPool，按上面的规则重试一次。
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from .workflow_stage_metrics import usage_since, usage_snapshot
+except ImportError:
+    try:
+        from production.core_modules.workflow_stage_metrics import usage_since, usage_snapshot
+    except ImportError:
+        from workflow_stage_metrics import usage_since, usage_snapshot
+
+logger = logging.getLogger(__name__)
+
+TASK_TIMEOUT = 600                # 单个CPU任务的最长等待时间（秒）
+
+
+class TableTaskTimeout(TimeoutError):
+    """表格CPU任务超时（工作进程已被终止，进程池已重建）"""
+
+
+def _write_json(path: str, data: Any):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compare_tables(baseline_file: str, target_file: str, output_file: str) -> Tuple[str, Dict[str, Any]]:
+    """（工作进程）统一对比器对比两份表格，结果写入output_file；返回 (output_file, 用量)"""
+    snapshot = usage_snapshot()
+    from unified_csv_comparator import UnifiedCSVComparator
+    _write_json(output_file, UnifiedCSVComparator().compare(baseline_file, target_file))
+    return output_file, usage_since(snapshot)
+
+
+def score_comparison(comparison_file: str, output_dir: str, use_ai: bool = True) -> Tuple[str, Dict[str, Any]]:
+    """（工作进程）对对比结果文件做L1/L2/L3打分；返回 (详细打分文件路径, 用量)"""
+    snapshot = usage_snapshot()
+    from production.scoring_engine.integrated_scorer import IntegratedScorer
+    scorer = IntegratedScorer(use_ai=use_ai, cache_enabled=False)
+    score_file = scorer.process_file(input_file=comparison_file, output_dir=output_dir)
+    return score_file, usage_since(snapshot)
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class TableProcessPool:
+    """按CPU核数开的常驻进程池，只承担表格级CPU任务"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._disabled = False
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._executor is None and not self._disabled:
+                try:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                         mp_context=_mp_context())
+                    logger.info(f"⚙️ 表格进程池已创建: {self.max_workers} 个工作进程")
+                except (OSError, ValueError, NotImplementedError) as e:
+                    self._disabled = True
+                    logger.warning(f"表格进程池不可用，CPU任务改在当前进程执行: {e}")
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """终止进程池的全部工作进程并丢弃，下次提交时重建"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        # shutdown不会中断正在运行的任务，需要直接终止工作进程
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_inline(self, fn: Callable, *args) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _submit(self, fn: Callable, *args):
+        executor = self._get_executor()
+        if executor is not None:
+            try:
+                return executor, executor.submit(fn, *args)
+            except (BrokenProcessPool, RuntimeError) as e:
+                logger.warning(f"表格进程池已失效，重建后再用: {e}")
+                self._discard(executor)
+                executor = self._get_executor()
+                if executor is not None:
+                    return executor, executor.submit(fn, *args)
+        return None, self._run_inline(fn, *args)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """提交任务；进程池不可用时在当前线程执行并返回已完成的Future"""
+        return self._submit(fn, *args)[1]
+
+    def run(self, fn: Callable, *args, timeout: float = TASK_TIMEOUT) -> Any:
+        """同步执行任务；工作进程异常退出时重建进程池重试一次（不在本进程重试，免得拖垮服务）"""
+        for attempt in (1, 2):
+            executor, future = self._submit(fn, *args)
+            try:
+                return future.result(timeout=timeout)
+            except BrokenProcessPool as e:
+                if executor is not None:
+                    self._discard(executor)
+                if attempt == 2:
+                    raise
+                logger.warning(f"表格工作进程异常退出，重建进程池后重试: {e}")
+            except FutureTimeoutError:
+                future.cancel()
+                if executor is not None:
+                    self._recycle(executor)
+                task = ', '.join(os.path.basename(str(a)) for a in args if isinstance(a, str))
+                logger.error(f"表格CPU任务超时({timeout}s)，已终止工作进程并重建进程池: {fn.__name__}({task})")
+                raise TableTaskTimeout(f"表格任务 {fn.__name__} 超时({timeout}s): {task}")
+
+    def compare(self, baseline_file: str, target_file: str, output_file: str) -> Tuple[str, Dict[str, Any]]:
+        return self.run(compare_tables, str(baseline_file), str(target_file), str(output_file))
+
+    def score(self, comparison_file: str, output_dir: str, use_ai: bool = True) -> Tuple[str, Dict[str, Any]]:
+        return self.run(score_comparison, str(comparison_file), str(output_dir), use_ai)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_pool_instance: Optional[TableProcessPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_table_process_pool() -> TableProcessPool:
+    """进程内共享的表格进程池"""
+    global _pool_instance
+    if _pool_instance is None:
+        with _pool_lock:
+            if _pool_instance is None:
+                _pool_instance = TableProcessPool()
+    return _pool_instance
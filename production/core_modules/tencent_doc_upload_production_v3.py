@@ -9,11 +9,21 @@ import asyncio
 import json
 import logging
 import re
+import time
 from pathlib import Path
 from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Response
 
+try:
+    from .transfer_telemetry import get_telemetry_ledger, doc_id_from_url
+    from .shared_browser_service import acquire_browser
+    from .resource_blocking import ResourceBlocker
+except ImportError:
+    from production.core_modules.transfer_telemetry import get_telemetry_ledger, doc_id_from_url
+    from production.core_modules.shared_browser_service import acquire_browser
+    from production.core_modules.resource_blocking import ResourceBlocker
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -52,7 +62,9 @@ class TencentDocProductionUploaderV3:
         try:
             self.playwright = await async_playwright().start()
             
-            self.browser = await self.playwright.chromium.launch(
+            # 优先连接共享浏览器服务，不可用时本地启动
+            self.browser, self.browser_shared = await acquire_browser(
+                self.playwright,
                 headless=self.headless,
                 args=[
                     '--no-sandbox',
@@ -71,6 +83,9 @@ class TencentDocProductionUploaderV3:
                 user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
                 locale='zh-CN'
             )
+            # 上传只依赖导入菜单和上传接口，拦截图片/字体/统计上报等资源
+            self.resource_blocker = ResourceBlocker()
+            await self.resource_blocker.install(self.context)
             
             self.page = await self.context.new_page()
             self.page.set_default_timeout(30000)
@@ -276,6 +291,9 @@ class TencentDocProductionUploaderV3:
             'storage_info': None,
             'api_response': None
         }
+        started = time.time()
+        if getattr(self, 'resource_blocker', None):
+            self.resource_blocker.begin_document()
         
         try:
             file_path = Path(file_path).resolve()
@@ -339,8 +357,31 @@ class TencentDocProductionUploaderV3:
         except Exception as e:
             result['message'] = f"上传异常: {str(e)}"
             logger.error(f"❌ 上传异常: {e}")
-            
+        finally:
+            # 提前返回的失败（文件不存在、未找到导入按钮）同样记入台账
+            self._record_telemetry(file_path, result, time.time() - started)
+
         return result
+
+    def _record_telemetry(self, file_path, result: Dict[str, Any], duration: float):
+        """把本次上传写入遥测台账"""
+        # 链接来源：上传API响应（网络监听）或页面DOM扫描
+        if result.get('url'):
+            method = 'network' if result['url'] == self.upload_response_url else 'dom'
+        else:
+            method = None
+        file_path = Path(file_path)
+        get_telemetry_ledger().record(
+            kind='upload',
+            source='TencentDocProductionUploaderV3',
+            success=result.get('success', False),
+            duration=duration,
+            doc_id=doc_id_from_url(result.get('url')),
+            method=method,
+            bytes_count=file_path.stat().st_size if file_path.exists() else 0,
+            error=None if result.get('success') else result.get('message'),
+            extra=self.resource_blocker.stats() if getattr(self, 'resource_blocker', None) else None
+        )
     
     async def click_import_button(self) -> bool:
         """点击导入按钮"""
@@ -12,6 +12,54 @@ import argparse
 from pathlib import Path
 from playwright.async_api import async_playwright
 from production.core_modules.csv_version_manager import CSVVersionManager
+from production.core_modules.transfer_telemetry import get_telemetry_ledger, doc_id_from_url
+from production.core_modules.shared_browser_service import acquire_browser
+from production.core_modules.resource_blocking import ResourceBlocker
+from production.core_modules.adaptive_waits import AdaptiveWaiter
+from production.core_modules.export_strategy_stats import get_export_strategy_stats
+
+# 页面渲染完成的判定：菜单按钮或编辑区出现
+PAGE_READY_SELECTORS = [
+    '.titlebar-icon-more',
+    '.desktop-icon-more-menu',
+    '[data-testid="more-menu-button"]',
+    'button[aria-label*="更多"]',
+    '.edit-area',
+    '.doc-list-item',
+]
+
+# 主菜单展开的判定
+MENU_OPEN_SELECTORS = [
+    '.mainmenu-submenu-exportAs',
+    '.dui-menu-item',
+    '[role="menuitem"]',
+    '.dropdown-item',
+    '.context-menu-item',
+]
+
+# "导出为"子菜单展开的判定
+EXPORT_SUBMENU_SELECTORS = [
+    '.mainmenu-item-export-local',
+    '.mainmenu-item-export-csv',
+    'li[role="menuitem"]:has-text("本地")',
+]
+
+# 导出对话框
+DIALOG_SELECTORS = [
+    '.dialog',
+    '.modal',
+    '[class*="export-dialog"]',
+    '[class*="download-dialog"]',
+    '[role="dialog"]',
+]
+
+# 导出对话框确认按钮
+CONFIRM_SELECTORS = [
+    'button:has-text("确定")',
+    'button:has-text("下载")',
+    'button:has-text("导出")',
+    '.btn-primary',
+]
 
 
 class TencentDocAutoExporter:
@@ -26,6 +74,17 @@ class TencentDocAutoExporter:
         # 始终启用版本管理器 - 不再作为可选项
         from production.core_modules.csv_version_manager import CSVVersionManager
         self.version_manager = CSVVersionManager()
+
+        # 最近一次导出使用的方法和尝试次数（写入遥测台账）
+        self.last_export_method = None
+        self.last_export_attempts = 0
+
+        # 导出路径只需要菜单和导出接口，拦截图片/字体/统计上报等资源
+        self.resource_blocker = ResourceBlocker()
+
+        # 各导出方法的历史表现，用于动态调整尝试顺序
+        self.strategy_stats = get_export_strategy_stats()
+        self._export_method_started = None
         
     async def start_browser(self, headless=False):
         """启动浏览器 - 2025增强版反检测配置"""
@@ -69,8 +128,9 @@ class TencentDocAutoExporter:
             '--no-pings'
         ]
         
-        # 启动浏览器，设置下载目录和反检测参数
-        self.browser = await self.playwright.chromium.launch(
+        # 优先连接共享浏览器服务，不可用时本地启动（设置下载目录和反检测参数）
+        self.browser, self.browser_shared = await acquire_browser(
+            self.playwright,
             headless=headless,
             downloads_path=self.download_dir,
             args=launch_args,
@@ -101,11 +161,14 @@ class TencentDocAutoExporter:
             has_touch=False,
             is_mobile=False
         )
+        await self.resource_blocker.install(context)
         
         self.page = await context.new_page()
+        self.waiter = AdaptiveWaiter(self.page)
         
         # 监听下载事件
         self.downloaded_files = []
+        self.download_event = asyncio.Event()
         self.page.on("download", self._handle_download)
     
     async def _handle_download(self, download):
@@ -171,6 +234,7 @@ class TencentDocAutoExporter:
         filepath = final_filepath
         
         self.downloaded_files.append(str(filepath))
+        self.download_event.set()
         print(f"下载完成: {filepath}")
     
     async def login_with_cookies(self, cookies):
@@ -324,6 +388,11 @@ class TencentDocAutoExporter:
         try:
             # 设置当前URL供_handle_download使用
             self.current_url = doc_url
+            self.last_export_method = None
+            self.last_export_attempts = 0
+            self.resource_blocker.begin_document()
+            self.waiter.reset()
+            self.download_event.clear()
             
             # 阶段4新功能：智能URL分析
             url_analysis = self._analyze_document_url(doc_url)
@@ -335,35 +404,27 @@ class TencentDocAutoExporter:
             await self.page.goto(doc_url, wait_until='domcontentloaded', timeout=load_timeout)
             print("✅ DOM加载完成")
             
-            # 智能等待策略
+            # 智能等待策略：菜单/编辑区出现即继续，原固定等待时长作为上限
             base_wait = 8000
             if url_analysis["url_type"] == "desktop_general":
                 base_wait = 12000  # 桌面页面需要更多时间加载文档列表
             elif url_analysis.get("adaptive_config", {}).get("has_tab_parameter"):
                 base_wait = 10000  # 多标签页文档需要更多加载时间
                 
-            print(f"⏳ 智能等待策略: {base_wait}ms")
-            await self.page.wait_for_timeout(base_wait)
+            print(f"⏳ 等待页面渲染（上限 {base_wait}ms）")
+            await self.waiter.wait_visible('page_render', PAGE_READY_SELECTORS, default_ms=base_wait)
             print("✅ 页面智能渲染完成")
             
             # 增强状态检测逻辑
             await self._enhanced_page_status_detection(url_analysis)
             
-            # 等待页面完全渲染和所有元素可交互
-            print("⚙️ 等待页面元素完全加载...")
-            await self.page.wait_for_timeout(5000)
-            
-            # 网络状态检测 - 根据URL类型调整超时
-            # 增加网络超时时间以避免页面加载问题
+            # 网络状态检测 - 只看文档数据接口（协作长连接使全局networkidle很难达到）
             network_timeout = 30000 if url_analysis["url_type"] == "desktop_general" else 20000
-            try:
-                await self.page.wait_for_load_state('networkidle', timeout=network_timeout)
+            if await self.waiter.settle('network_idle', network_timeout, url_pattern=r'docs\.qq\.com/(dop-api|cgi-bin)'):
                 print("🌐 网络请求完成")
-            except:
+            else:
                 print("⚠️ 网络等待超时，继续...")
-                
-            # 确保交互元素准备就绪
-            await self.page.wait_for_timeout(3000)
+            self.resource_blocker.mark('page_ready')
             
             # 阶段4核心：智能方法选择和执行
             success = await self._execute_smart_export_strategy(url_analysis, export_format)
@@ -374,7 +435,9 @@ class TencentDocAutoExporter:
             # 等待下载完成
             print("📥 等待下载完成...")
             # 增加下载超时时间以适应大文件
-            await self._wait_for_download(timeout=60)
+            downloaded = await self._wait_for_download(timeout=60)
+            self.resource_blocker.mark('export_done')
+            self._record_strategy_outcome(url_analysis, downloaded)
             
             if self.downloaded_files:
                 print(f"🎉 成功下载文件: {self.downloaded_files}")
@@ -385,6 +448,11 @@ class TencentDocAutoExporter:
         except Exception as e:
             print(f"❌ 智能文档导出失败: {e}")
             return None
+        finally:
+            # 8093经PlaywrightDownloader直接调用本方法，按文档持久化方法统计和步骤耗时样本
+            self.strategy_stats.save()
+            if getattr(self, 'waiter', None):
+                self.waiter.store.save()
     
     async def _enhanced_page_status_detection(self, url_analysis):
         """
@@ -483,15 +551,22 @@ class TencentDocAutoExporter:
                     "_try_api_download"
                 ]
             
+            # 按历史成功率和耗时重排，连续失败的方法退避到末尾
+            doc_type = url_analysis["url_type"]
+            recommended_methods = self.strategy_stats.order(doc_type, recommended_methods)
             print(f"📋 推荐方法顺序: {recommended_methods}")
             
             # 智能重试策略
             max_attempts_per_method = 2 if url_analysis["url_type"] == "desktop_general" else 1
+            self.last_export_method = None
+            self.last_export_attempts = 0
+            self._export_method_started = None
             
             for attempt in range(max_attempts_per_method):
                 print(f"🔄 第{attempt + 1}轮尝试 (最多{max_attempts_per_method}轮)")
                 
                 for method_name in recommended_methods:
+                    method_started = time.monotonic()
                     try:
                         print(f"⚙️ 尝试方法: {method_name}")
                         
@@ -506,11 +581,15 @@ class TencentDocAutoExporter:
                             await self._handle_pre_processing(url_analysis, method_name)
                         
                         # 执行导出方法
+                        self.last_export_attempts += 1
                         if await method(export_format):
                             print(f"✅ 方法 {method_name} 执行成功!")
+                            self.last_export_method = method_name
+                            self._export_method_started = method_started
                             return True
                         else:
                             print(f"❌ 方法 {method_name} 执行失败")
+                            self.strategy_stats.record(doc_type, method_name, False, time.monotonic() - method_started)
                             
                         # 执行后置处理（失败时的恢复措施）
                         if method_config.get("post_processing_on_failure"):
@@ -518,6 +597,7 @@ class TencentDocAutoExporter:
                             
                     except Exception as e:
                         print(f"❌ 方法 {method_name} 异常: {e}")
+                        self.strategy_stats.record(doc_type, method_name, False, time.monotonic() - method_started)
                         continue
                 
                 # 如果所有方法都失败了，在重试之前执行页面恢复
@@ -533,6 +613,17 @@ class TencentDocAutoExporter:
             print(f"❌ 智能导出策略执行异常: {e}")
             return False
     
+    def _record_strategy_outcome(self, url_analysis, downloaded):
+        """以是否真正拿到下载文件作为导出方法成功的标准，耗时计到下载完成"""
+        if not self.last_export_method or self._export_method_started is None:
+            return
+        self.strategy_stats.record(
+            url_analysis["url_type"],
+            self.last_export_method,
+            downloaded,
+            time.monotonic() - self._export_method_started
+        )
+    
     def _get_method_adaptive_config(self, url_analysis, method_name):
         """获取方法的自适应配置"""
         config = {
@@ -570,7 +661,7 @@ class TencentDocAutoExporter:
                     if element:
                         print(f"✅ 找到文档元素: {selector}")
                         await element.click()
-                        await self.page.wait_for_timeout(2000)
+                        await self.waiter.settle('doc_select', 2000)
                         break
                         
         except Exception as e:
@@ -686,11 +777,9 @@ class TencentDocAutoExporter:
                         
                         if is_visible and bbox:  # 确保元素真正可交互
                             try:
-                                # 滚动到视图中并hover激活
+                                # 滚动到视图中并hover激活（Playwright操作自带可操作性等待）
                                 await menu_btn.scroll_into_view_if_needed()
-                                await self.page.wait_for_timeout(1000)
                                 await menu_btn.hover()
-                                await self.page.wait_for_timeout(800)
                                 print(f"    ✅ 成功激活菜单按钮: {selector}")
                                 break
                             except Exception as e:
@@ -708,19 +797,16 @@ class TencentDocAutoExporter:
                 
                 # 滚动到元素可见位置
                 await menu_btn.scroll_into_view_if_needed()
-                await self.page.wait_for_timeout(1000)
                 
                 # 🆕 强制点击策略
                 try:
                     await menu_btn.click(force=True)  # 强制点击
-                    await self.page.wait_for_timeout(2000)
                     print("✅ 强制点击成功")
                 except Exception as click_error:
                     print(f"强制点击失败: {click_error}")
                     # 🆕 JavaScript备用点击
                     try:
                         await self.page.evaluate('(element) => element.click()', menu_btn)
-                        await self.page.wait_for_timeout(2000)
                         print("✅ JavaScript点击成功")
                     except Exception as js_error:
                         print(f"JavaScript点击失败: {js_error}")
@@ -775,8 +861,8 @@ class TencentDocAutoExporter:
                 export_as_btn = None
                 print(f"测试 {len(export_as_selectors)} 个导出选择器...")
                 
-                # 等待菜单完全展开
-                await self.page.wait_for_timeout(3000)
+                # 等待菜单展开（原固定等待2s+3s作为上限）
+                await self.waiter.wait_visible('menu_open', MENU_OPEN_SELECTORS, default_ms=5000)
                 
                 for i, selector in enumerate(export_as_selectors, 1):
                     try:
@@ -810,7 +896,7 @@ class TencentDocAutoExporter:
                 
                 if export_as_btn:
                     await export_as_btn.click()
-                    await self.page.wait_for_timeout(2000)  # 等待子菜单展开
+                    await self.waiter.wait_visible('submenu_open', EXPORT_SUBMENU_SELECTORS, default_ms=2000)
                     
                     # 步骤3: 根据格式选择对应的导出选项
                     print(f"步骤3: 选择导出格式 ({export_format})...")
@@ -890,7 +976,7 @@ class TencentDocAutoExporter:
                 if btn:
                     print(f"找到工具栏导出按钮: {selector}")
                     await btn.click()
-                    await self.page.wait_for_timeout(1000)
+                    await self.waiter.wait_visible('toolbar_menu', MENU_OPEN_SELECTORS + DIALOG_SELECTORS, default_ms=1000)
                     
                     if await self._select_export_format(export_format):
                         return True
@@ -910,10 +996,9 @@ class TencentDocAutoExporter:
             for shortcut in shortcuts:
                 print(f"尝试快捷键: {shortcut}")
                 await self.page.keyboard.press(shortcut)
-                await self.page.wait_for_timeout(2000)
                 
                 # 检查是否弹出导出对话框
-                if await self._check_export_dialog():
+                if await self.waiter.wait_visible('shortcut_dialog', DIALOG_SELECTORS, default_ms=2000):
                     if await self._select_export_format(export_format):
                         return True
                         
@@ -929,7 +1014,7 @@ class TencentDocAutoExporter:
             table_area = await self.page.query_selector('.edit-area, [class*="table"], [class*="sheet"], #app')
             if table_area:
                 await table_area.click(button='right')
-                await self.page.wait_for_timeout(1000)
+                await self.waiter.wait_visible('context_menu', MENU_OPEN_SELECTORS, default_ms=1000)
                 
                 # 寻找上下文菜单中的导出选项
                 context_menu_selectors = [
@@ -944,7 +1029,7 @@ class TencentDocAutoExporter:
                     if export_option:
                         print(f"找到右键菜单导出选项: {selector}")
                         await export_option.click()
-                        await self.page.wait_for_timeout(1000)
+                        await self.waiter.wait_visible('context_submenu', EXPORT_SUBMENU_SELECTORS + DIALOG_SELECTORS, default_ms=1000)
                         
                         if await self._select_export_format(export_format):
                             return True
@@ -956,15 +1041,7 @@ class TencentDocAutoExporter:
     
     async def _check_export_dialog(self):
         """检查是否有导出对话框出现"""
-        dialog_selectors = [
-            '.dialog',
-            '.modal',
-            '[class*="export-dialog"]',
-            '[class*="download-dialog"]',
-            '[role="dialog"]'
-        ]
-        
-        for selector in dialog_selectors:
+        for selector in DIALOG_SELECTORS:
             if await self.page.query_selector(selector):
                 return True
         return False
@@ -997,7 +1074,7 @@ class TencentDocAutoExporter:
                 if format_btn:
                     print(f"选择导出格式: {selector}")
                     await format_btn.click()
-                    await self.page.wait_for_timeout(1000)
+                    await self.waiter.wait_visible('confirm_dialog', CONFIRM_SELECTORS, default_ms=1000)
                     
                     # 寻找确认按钮
                     confirm_selectors = [
@@ -1019,14 +1096,7 @@ class TencentDocAutoExporter:
                             return True
                             
             # 如果没有找到格式选择，直接寻找确认按钮
-            confirm_selectors = [
-                'button:has-text("确定")',
-                'button:has-text("下载")',
-                'button:has-text("导出")',
-                '.btn-primary'
-            ]
-            
-            for confirm_selector in confirm_selectors:
+            for confirm_selector in CONFIRM_SELECTORS:
                 confirm_btn = await self.page.query_selector(confirm_selector)
                 if confirm_btn:
                     print(f"点击确认按钮: {confirm_selector}")
@@ -1039,25 +1109,15 @@ class TencentDocAutoExporter:
         return False
     
     async def _wait_for_download(self, timeout=30):
-        """等待下载完成"""
-        start_time = time.time()
-        initial_count = len(self.downloaded_files)
+        """等待下载完成（_handle_download保存文件后触发事件，无需轮询）"""
+        print(f"开始等待下载，当前文件数: {len(self.downloaded_files)}")
         
-        print(f"开始等待下载，当前文件数: {initial_count}")
-        
-        while time.time() - start_time < timeout:
-            current_count = len(self.downloaded_files)
-            if current_count > initial_count:
-                print(f"检测到新文件通过下载事件，总数: {current_count}")
-                # 再等待2秒确保下载完成
-                await self.page.wait_for_timeout(2000)
-                return True
-            
-            await self.page.wait_for_timeout(1000)
-            print(f"等待中... ({int(time.time() - start_time)}/{timeout}s)")
+        if await self.waiter.wait_event('download', self.download_event, default_ms=timeout * 1000):
+            print(f"检测到新文件通过下载事件，总数: {len(self.downloaded_files)}")
+            return True
             
         print(f"下载等待超时，最终文件数: {len(self.downloaded_files)}")
-        return len(self.downloaded_files) > initial_count
+        return False
     
     def export_document(self, url: str, cookies: str = None, format: str = 'csv', download_dir: str = None) -> dict:
         """
@@ -1081,6 +1141,8 @@ class TencentDocAutoExporter:
             """
             异步导出的内部实现
             """
+            started = time.time()
+            result = None
             try:
                 print(f"📥 统一下载接口启动: {url}")
                 
@@ -1123,7 +1185,7 @@ class TencentDocAutoExporter:
                 if result_files and len(result_files) > 0:
                     first_file = result_files[0]
                     print(f"✅ 下载成功: {first_file}")
-                    return {
+                    result = {
                         'success': True,
                         'file_path': first_file,
                         'files': result_files,
@@ -1135,7 +1197,7 @@ class TencentDocAutoExporter:
                 else:
                     error_msg = "所有4重备用导出方法都失败了"
                     print(f"❌ {error_msg}")
-                    return {
+                    result = {
                         'success': False,
                         'file_path': None,
                         'files': [],
@@ -1143,18 +1205,21 @@ class TencentDocAutoExporter:
                         'backup_methods_used': True,
                         'methods_attempted': ['menu_export', 'toolbar_export', 'keyboard_shortcut', 'right_click_export']
                     }
+                return result
                     
             except Exception as e:
                 error_msg = f"统一接口导出异常: {e}"
                 print(f"💥 {error_msg}")
-                return {
+                result = {
                     'success': False,
                     'file_path': None,
                     'files': [],
                     'error': error_msg,
                     'backup_methods_used': False
                 }
+                return result
             finally:
+                self._record_telemetry(url, result, time.time() - started)
                 # 确保清理资源
                 try:
                     await self.cleanup()
@@ -1191,6 +1256,29 @@ class TencentDocAutoExporter:
                 'interface_error': True
             }
     
+    def telemetry_extra(self):
+        """本次文档导出的资源拦截统计、阶段标记和各步骤等待耗时，写入遥测台账的附加字段"""
+        waiter = getattr(self, 'waiter', None)
+        return dict(self.resource_blocker.stats(), steps=waiter.step_timings if waiter else {})
+
+    def _record_telemetry(self, url, result, duration):
+        """把一次导出尝试写入遥测台账"""
+        result = result or {}
+        file_path = result.get('file_path')
+        bytes_count = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0
+        get_telemetry_ledger().record(
+            kind='download',
+            source='TencentDocAutoExporter',
+            success=bool(result.get('success')),
+            duration=duration,
+            doc_id=doc_id_from_url(url),
+            method=self.last_export_method,
+            bytes_count=bytes_count,
+            retries=max(0, self.last_export_attempts - 1),
+            error=result.get('error'),
+            extra=self.telemetry_extra()
+        )
+
     async def _try_api_download(self, export_format):
         """方法5: API直接下载 - 终极备用方案"""
         try:
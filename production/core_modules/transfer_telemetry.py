@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+下载/上传遥测台账
+每次导出或上传尝试追加一条紧凑记录到本地JSONL台账（只追加，不改写），
+ProductionMonitor 基于滚动时间窗口计算 p50/p95 耗时、成功率和超时率。
+
+记录格式（短键名，单行JSON）:
+    {"t": 时间戳, "k": "download"/"upload", "src": 组件, "d": doc_id,
+     "m": 使用的方法, "s": 耗时秒, "b": 字节数, "o": "ok"/"fail"/"timeout",
+     "r": 重试次数, "e": 错误摘要, "x": 附加统计(资源拦截、阶段耗时)}
+
+读取端按文件偏移增量读取新追加的行，内存中只保留最大窗口内的记录，
+因此不会反复扫描历史文件。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER_PATH = Path('/root/projects/tencent-doc-manager/logs/transfer_telemetry.jsonl')
+MAX_LEDGER_BYTES = 20 * 1024 * 1024  # 超过20MB轮转为 .1
+DEFAULT_RETENTION_SECONDS = 24 * 3600  # 内存中保留的最大窗口
+
+OUTCOME_OK = 'ok'
+OUTCOME_FAIL = 'fail'
+OUTCOME_TIMEOUT = 'timeout'
+
+_TIMEOUT_PATTERN = re.compile(r'timeout|timed out|超时', re.IGNORECASE)
+_DOC_ID_PATTERN = re.compile(r'/(?:sheet|doc|slide|form)/([A-Za-z0-9]+)')
+
+
+def doc_id_from_url(url: Optional[str]) -> Optional[str]:
+    """从腾讯文档URL提取doc_id"""
+    if not url:
+        return None
+    match = _DOC_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def classify_outcome(success: bool, error: Optional[str] = None) -> str:
+    """根据成功标志和错误信息判定结果类型"""
+    if success:
+        return OUTCOME_OK
+    if error and _TIMEOUT_PATTERN.search(str(error)):
+        return OUTCOME_TIMEOUT
+    return OUTCOME_FAIL
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    """线性插值百分位数（输入已排序）"""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return float(sorted_values[0])
+    pos = (len(sorted_values) - 1) * pct
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    frac = pos - lower
+    return float(sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * frac)
+
+
+class TransferTelemetryLedger:
+    """只追加的下载/上传遥测台账"""
+
+    def __init__(self, ledger_path: Optional[Path] = None,
+                 retention_seconds: int = DEFAULT_RETENTION_SECONDS):
+        self.ledger_path = Path(ledger_path) if ledger_path else DEFAULT_LEDGER_PATH
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._records: Deque[Dict[str, Any]] = deque()
+        self._offset = 0
+        self._inode = None
+        self._loaded = False
+
+    # ---------- 写入 ----------
+
+    def record(self, kind: str, source: str, success: bool, duration: float,
+               doc_id: Optional[str] = None, method: Optional[str] = None,
+               bytes_count: int = 0, retries: int = 0, error: Optional[str] = None,
+               outcome: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """追加一条遥测记录，写入失败只记日志不影响业务流程"""
+        entry = {
+            't': round(time.time(), 3),
+            'k': kind,
+            'src': source,
+            'd': doc_id,
+            'm': method,
+            's': round(float(duration or 0), 3),
+            'b': int(bytes_count or 0),
+            'o': outcome or classify_outcome(success, error),
+            'r': int(retries or 0),
+        }
+        if error:
+            entry['e'] = str(error)[:200]
+        if extra:
+            entry['x'] = extra
+
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            self.ledger_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                self._rotate_if_needed()
+                # O_APPEND保证多进程追加时单行不被截断交错
+                fd = os.open(str(self.ledger_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line.encode('utf-8'))
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            logger.warning(f"遥测记录写入失败: {e}")
+        return entry
+
+    def _rotate_if_needed(self):
+        try:
+            if self.ledger_path.stat().st_size < MAX_LEDGER_BYTES:
+                return
+        except FileNotFoundError:
+            return
+        os.replace(self.ledger_path, self.ledger_path.with_suffix(self.ledger_path.suffix + '.1'))
+
+    # ---------- 读取 ----------
+
+    def refresh(self):
+        """增量读取自上次读取后追加的记录，并淘汰超出保留窗口的旧记录"""
+        with self._lock:
+            try:
+                stat = self.ledger_path.stat()
+            except FileNotFoundError:
+                self._prune()
+                return
+
+            # 文件被轮转或截断时从头读取新文件
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                self._inode = stat.st_ino
+                self._offset = 0 if self._loaded else self._initial_offset(stat.st_size)
+            self._loaded = True
+
+            if stat.st_size > self._offset:
+                with open(self.ledger_path, 'rb') as f:
+                    f.seek(self._offset)
+                    chunk = f.read()
+                # 只消费完整的行，半行留待下次读取
+                end = chunk.rfind(b'\n') + 1
+                for raw in chunk[:end].splitlines():
+                    try:
+                        self._records.append(json.loads(raw))
+                    except ValueError:
+                        continue
+                self._offset += end
+
+            self._prune()
+
+    def _initial_offset(self, size: int) -> int:
+        """首次加载时只回读文件尾部，避免扫描完整历史"""
+        # 每条记录约150字节，尾部4MB足以覆盖保留窗口内的正常流量
+        tail = 4 * 1024 * 1024
+        if size <= tail:
+            return 0
+        with open(self.ledger_path, 'rb') as f:
+            f.seek(size - tail)
+            f.readline()  # 跳过被截断的半行
+            return f.tell()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        while self._records and self._records[0].get('t', 0) < cutoff:
+            self._records.popleft()
+
+    def window_stats(self, kind: str = 'download', window_seconds: int = 3600) -> Dict[str, Any]:
+        """
+        计算滚动窗口内的统计指标
+
+        Returns:
+            {'count', 'success_rate', 'timeout_rate', 'p50', 'p95', 'mean',
+             'bytes', 'retries', 'by_method', 'blocking'}，窗口内无记录时 count 为0
+        """
+        self.refresh()
+        cutoff = time.time() - window_seconds
+        with self._lock:
+            window = [r for r in self._records if r.get('k') == kind and r.get('t', 0) >= cutoff]
+
+        stats = {
+            'kind': kind,
+            'window_seconds': window_seconds,
+            'count': len(window),
+            'success_rate': None,
+            'timeout_rate': None,
+            'p50': None,
+            'p95': None,
+            'mean': None,
+            'bytes': 0,
+            'retries': 0,
+            'by_method': {},
+            'blocking': None,
+        }
+        if not window:
+            return stats
+
+        # 耗时分位数只统计成功的传输，失败/超时由成功率和超时率反映
+        durations = sorted(r.get('s', 0.0) for r in window if r.get('o') == OUTCOME_OK)
+        ok = sum(1 for r in window if r.get('o') == OUTCOME_OK)
+        timeouts = sum(1 for r in window if r.get('o') == OUTCOME_TIMEOUT)
+
+        stats.update({
+            'success_rate': ok / len(window),
+            'timeout_rate': timeouts / len(window),
+            'p50': _percentile(durations, 0.5) if durations else None,
+            'p95': _percentile(durations, 0.95) if durations else None,
+            'mean': sum(durations) / len(durations) if durations else None,
+            'bytes': sum(r.get('b', 0) for r in window),
+            'retries': sum(r.get('r', 0) for r in window),
+        })
+        for r in window:
+            method = r.get('m') or 'unknown'
+            entry = stats['by_method'].setdefault(method, {'count': 0, 'ok': 0})
+            entry['count'] += 1
+            entry['ok'] += 1 if r.get('o') == OUTCOME_OK else 0
+        stats['blocking'] = _blocking_summary(window)
+        return stats
+
+
+def _blocking_summary(window) -> Optional[Dict[str, Any]]:
+    """
+    资源拦截效果：按是否开启拦截分组对比页面就绪/导出耗时，
+    两组都有数据时给出每个文档节省的时间
+    """
+    groups = {True: [], False: []}
+    for r in window:
+        extra = r.get('x') or {}
+        if 'blocking' in extra:
+            groups[bool(extra['blocking'])].append(extra)
+    if not groups[True] and not groups[False]:
+        return None
+
+    def mean_mark(entries, name):
+        values = [e['marks'][name] for e in entries if name in e.get('marks', {})]
+        return round(sum(values) / len(values), 3) if values else None
+
+    summary: Dict[str, Any] = {
+        'documents_blocked': len(groups[True]),
+        'documents_unblocked': len(groups[False]),
+        'blocked_requests_per_doc': round(sum(e.get('blocked', 0) for e in groups[True]) / len(groups[True]), 1) if groups[True] else 0,
+        # 按资源类型固定体积的粗略估计（旧记录字段名为 saved_bytes_est）
+        'saved_bytes_rough_per_doc': int(sum(e.get('saved_bytes_rough', e.get('saved_bytes_est', 0))
+                                             for e in groups[True]) / len(groups[True])) if groups[True] else 0,
+    }
+    for name in ('page_ready', 'export_done'):
+        blocked, unblocked = mean_mark(groups[True], name), mean_mark(groups[False], name)
+        summary[f'{name}_seconds'] = {'blocked': blocked, 'unblocked': unblocked}
+        summary[f'{name}_saved_seconds'] = round(unblocked - blocked, 3) if blocked is not None and unblocked is not None else None
+    return summary
+
+
+_ledger_instance: Optional[TransferTelemetryLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_telemetry_ledger() -> TransferTelemetryLedger:
+    """获取进程内共享的遥测台账"""
+    global _ledger_instance
+    if _ledger_instance is None:
+        with _ledger_lock:
+            if _ledger_instance is None:
+                path = os.getenv('TRANSFER_TELEMETRY_PATH')
+                _ledger_instance = TransferTelemetryLedger(Path(path) if path else None)
+    return _ledger_instance
@@ -17,6 +17,7 @@ sys.path.append('/root/projects/tencent-doc-manager/production/core_modules')
 sys.path.append('/root/projects/tencent-doc-manager')
 
 from week_time_manager import WeekTimeManager
+from result_file_index import list_result_files
 
 
 class VerificationTableGenerator:
@@ -70,27 +71,27 @@ class VerificationTableGenerator:
                 print(f"⚠️ 风险评分目录不存在: {self.risk_scoring_dir}")
                 return []
             
-            for filename in os.listdir(self.risk_scoring_dir):
-                if filename.endswith('_risk_scoring_final.json'):
-                    file_path = os.path.join(self.risk_scoring_dir, filename)
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                        
-                        # 检查文件时间戳是否在本周范围内
-                        file_timestamp = data.get('timestamp', '')
-                        if self._is_within_week(file_timestamp, week_start, week_end):
-                            week_data.append({
-                                'filename': filename,
-                                'data': data,
-                                'timestamp': file_timestamp
-                            })
-                            print(f"✅ 发现本周数据: {filename}")
-                    
-                    except Exception as e:
-                        print(f"⚠️ 读取文件失败 {filename}: {e}")
-                        continue
+            # 先用目录索引中的时间戳筛选，只加载本周范围内的文件
+            for entry in list_result_files(self.risk_scoring_dir, '*_risk_scoring_final.json'):
+                filename = entry['name']
+                file_timestamp = entry.get('timestamp') or ''
+                if not self._is_within_week(file_timestamp, week_start, week_end):
+                    continue
+
+                try:
+                    with open(entry['path'], 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+
+                    week_data.append({
+                        'filename': filename,
+                        'data': data,
+                        'timestamp': file_timestamp
+                    })
+                    print(f"✅ 发现本周数据: {filename}")
+
+                except Exception as e:
+                    print(f"⚠️ 读取文件失败 {filename}: {e}")
+                    continue
             
             print(f"📊 本周数据总数: {len(week_data)}个文件")
             return week_data
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+工作流事件推送
+8093在阶段开始、单个文档完成、批量完成/失败时把事件POST到调用方登记的回调地址，
+调用方（8089）收到事件即更新状态，不再每3秒拉取完整的 /api/status。
+
+    publisher = get_event_publisher()
+    publisher.publish(callback_url, {'type': 'stage', 'execution_id': ..., ...})
+
+发送在后台线程中进行，不阻塞工作流；回调不可达时短暂重试后丢弃，
+调用方仍可通过 /api/status 查询状态兜底。
+
+事件格式:
+    {"type": "stage" | "document" | "completed" | "error",
+     "execution_id", "status", "progress", "current_task", "timestamp", ...}
+"""
+
+import queue
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+SEND_TIMEOUT = 5
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 1.0
+QUEUE_SIZE = 1000
+
+
+class EventPublisher:
+    """回调事件的后台发送器，按入队顺序逐个发送"""
+
+    def __init__(self):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=2, pool_maxsize=2, max_retries=0))
+        self.sent = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='workflow-events', daemon=True)
+        self._thread.start()
+
+    def publish(self, callback_url: Optional[str], event: Dict[str, Any]):
+        """入队一个事件，未登记回调地址时忽略"""
+        if not callback_url:
+            return
+        event.setdefault('timestamp', time.time())
+        try:
+            self._queue.put_nowait((callback_url, event))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"工作流事件队列已满，丢弃事件: {event.get('type')}")
+
+    def _send(self, callback_url: str, event: Dict[str, Any]) -> bool:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                response = self.session.post(callback_url, json=event, timeout=SEND_TIMEOUT)
+                if response.status_code < 500:
+                    return response.status_code < 400
+            except requests.RequestException as e:
+                logger.debug(f"工作流事件发送失败({attempt}/{MAX_ATTEMPTS}): {e}")
+            time.sleep(RETRY_DELAY * attempt)
+        return False
+
+    def _run(self):
+        while True:
+            callback_url, event = self._queue.get()
+            if self._send(callback_url, event):
+                self.sent += 1
+            else:
+                self.dropped += 1
+                logger.warning(f"⚠️ 工作流事件未送达 {callback_url}: {event.get('type')}")
+
+    def stats(self) -> Dict[str, int]:
+        return {'sent': self.sent, 'dropped': self.dropped, 'pending': self._queue.qsize()}
+
+
+_publisher_instance: Optional[EventPublisher] = None
+_publisher_lock = threading.Lock()
+
+
+def get_event_publisher() -> EventPublisher:
+    """进程内共享的事件发送器"""
+    global _publisher_instance
+    if _publisher_instance is None:
+        with _publisher_lock:
+            if _publisher_instance is None:
+                _publisher_instance = EventPublisher()
+    return _publisher_instance
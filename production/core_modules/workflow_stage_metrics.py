@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+工作流阶段指标采集
+为8093工作流的每个阶段记录: 墙钟耗时、CPU耗时、阶段前后RSS变化、
+磁盘读写字节数以及外部调用次数（AI接口/下载/上传）。
+
+使用方式:
+    recorder = StageMetricsRecorder(execution_id)
+    recorder.begin("compare")      # 开始新阶段，自动结束上一个阶段
+    ...
+    recorder.finish()              # 结束当前阶段
+    recorder.to_dict()             # 写入workflow_history
+
+外部调用计数:
+    count_external_call("deepseek")  # 在客户端发出请求处调用
+
+在进程池工作进程中执行的任务，父进程的CPU、RSS、IO和调用计数看不到，
+由任务自己测量后随结果带回，再并入父进程的当前阶段:
+    snapshot = usage_snapshot()      # 工作进程中，任务开始前
+    usage = usage_since(snapshot)    # 任务结束后，随结果返回
+    recorder.merge_usage(usage)      # 父进程中
+
+Prometheus文本格式输出由 render_prometheus() 提供，供 /api/metrics 使用。
+"""
+
+import os
+import time
+import threading
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # 非POSIX平台
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# 外部调用计数器（进程级，单调递增）
+_external_calls: Dict[str, int] = {}
+_external_lock = threading.Lock()
+
+
+def count_external_call(kind: str, n: int = 1):
+    """记录一次外部调用（AI接口、文档下载、上传等）"""
+    with _external_lock:
+        _external_calls[kind] = _external_calls.get(kind, 0) + n
+
+
+def external_call_snapshot() -> Dict[str, int]:
+    """返回外部调用计数快照"""
+    with _external_lock:
+        return dict(_external_calls)
+
+
+def _peak_rss_kb() -> int:
+    """进程生命周期内的峰值RSS（KB），只增不减"""
+    if resource is None:
+        return 0
+    try:
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    except Exception:
+        return 0
+
+
+def _current_rss_kb() -> int:
+    """从 /proc/self/statm 读取当前RSS（KB），不可用时返回0"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _reset_task_peak_rss():
+    """重置本进程的RSS峰值(VmHWM)，使常驻工作进程能测量单个任务的峰值"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _task_peak_rss_kb() -> int:
+    """自上次重置以来的RSS峰值（KB），不可用时退回进程峰值"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return _peak_rss_kb()
+
+
+def _io_bytes() -> Dict[str, int]:
+    """从 /proc/self/io 读取进程累计磁盘读写字节数，不可用时返回0"""
+    counters = {'read_bytes': 0, 'write_bytes': 0}
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                # read_bytes/write_bytes 只统计落到块设备的读写；rchar/wchar 还包含socket收发
+                if key == 'read_bytes':
+                    counters['read_bytes'] = int(value)
+                elif key == 'write_bytes':
+                    counters['write_bytes'] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+def usage_snapshot() -> Dict[str, Any]:
+    """（工作进程）任务开始前的资源快照，同时重置RSS峰值"""
+    _reset_task_peak_rss()
+    return {
+        'pid': os.getpid(),
+        'cpu': time.process_time(),
+        'io': _io_bytes(),
+        'calls': external_call_snapshot(),
+    }
+
+
+def usage_since(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """（工作进程）任务自快照以来的CPU耗时、RSS峰值、磁盘读写和外部调用次数"""
+    io_end = _io_bytes()
+    calls_end = external_call_snapshot()
+    return {
+        'pid': snapshot['pid'],
+        'cpu_seconds': round(time.process_time() - snapshot['cpu'], 4),
+        'peak_rss_kb': _task_peak_rss_kb(),
+        'bytes_read': max(0, io_end['read_bytes'] - snapshot['io']['read_bytes']),
+        'bytes_written': max(0, io_end['write_bytes'] - snapshot['io']['write_bytes']),
+        'external_calls': {
+            kind: count - snapshot['calls'].get(kind, 0)
+            for kind, count in calls_end.items()
+            if count - snapshot['calls'].get(kind, 0) > 0
+        },
+    }
+
+
+class StageSpan:
+    """单个阶段的指标区间"""
+
+    def __init__(self, stage: str, label: Optional[str] = None):
+        self.stage = stage
+        self.label = label
+        self.started_at = datetime.now()
+        self.success = True
+        self.error: Optional[str] = None
+        self.input_count = 1
+        self.output_count = 1
+        self.extra: Dict[str, Any] = {}
+
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._rss_start = _current_rss_kb()
+        self._io_start = _io_bytes()
+        self._calls_start = external_call_snapshot()
+        # 在工作进程中执行的任务用量（CPU、磁盘读写、RSS峰值）
+        self.offloaded = {'cpu_seconds': 0.0, 'bytes_read': 0, 'bytes_written': 0, 'peak_rss_kb': 0}
+        self.result: Optional[Dict[str, Any]] = None
+
+    def add_offloaded(self, usage: Dict[str, Any]):
+        for key in ('cpu_seconds', 'bytes_read', 'bytes_written'):
+            self.offloaded[key] += usage.get(key, 0)
+        self.offloaded['peak_rss_kb'] = max(self.offloaded['peak_rss_kb'], usage.get('peak_rss_kb', 0))
+
+    def close(self, success: bool = True, error: Optional[str] = None) -> Dict[str, Any]:
+        """结束区间并计算指标"""
+        if self.result is not None:
+            return self.result
+
+        io_end = _io_bytes()
+        calls_end = external_call_snapshot()
+        calls = {
+            kind: count - self._calls_start.get(kind, 0)
+            for kind, count in calls_end.items()
+            if count - self._calls_start.get(kind, 0) > 0
+        }
+
+        self.success = success and self.success
+        self.error = error or self.error
+        self.result = {
+            'stage': self.stage,
+            'label': self.label,
+            'started_at': self.started_at.isoformat(),
+            'wall_seconds': round(time.perf_counter() - self._wall_start, 4),
+            'cpu_seconds': round(time.process_time() - self._cpu_start + self.offloaded['cpu_seconds'], 4),
+            # 阶段结束与开始时的当前RSS之差，可为负（阶段内释放了内存）
+            'rss_delta_kb': _current_rss_kb() - self._rss_start,
+            'worker_peak_rss_kb': self.offloaded['peak_rss_kb'],
+            'bytes_read': max(0, io_end['read_bytes'] - self._io_start['read_bytes']) + self.offloaded['bytes_read'],
+            'bytes_written': (max(0, io_end['write_bytes'] - self._io_start['write_bytes'])
+                              + self.offloaded['bytes_written']),
+            'external_calls': calls,
+            'input_count': self.input_count,
+            'output_count': self.output_count,
+            'success': self.success,
+            'error': self.error,
+        }
+        if self.extra:
+            self.result['extra'] = self.extra
+        return self.result
+
+
+class StageMetricsRecorder:
+    """
+    按顺序记录工作流各阶段指标
+
+    阶段是串行的: begin() 会先结束上一个阶段，工作流代码只需在
+    每个步骤开头调用一次 begin()，无需改动原有的步骤结构。
+    """
+
+    def __init__(self, execution_id: Optional[str] = None,
+                 on_stage_complete: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.execution_id = execution_id
+        self.on_stage_complete = on_stage_complete
+        self.label: Optional[str] = None  # 批量模式下标识当前文档
+        self.spans: List[Dict[str, Any]] = []
+        self.current: Optional[StageSpan] = None
+        self._lock = threading.Lock()
+
+    def begin(self, stage: str, label: Optional[str] = None) -> StageSpan:
+        """开始新阶段（自动结束上一阶段）"""
+        with self._lock:
+            self._close_current()
+            self.current = StageSpan(stage, label or self.label)
+            return self.current
+
+    def annotate(self, input_count: Optional[int] = None, output_count: Optional[int] = None, **extra):
+        """为当前阶段补充数据量等信息"""
+        with self._lock:
+            if not self.current:
+                return
+            if input_count is not None:
+                self.current.input_count = input_count
+            if output_count is not None:
+                self.current.output_count = output_count
+            self.current.extra.update(extra)
+
+    def merge_usage(self, usage: Optional[Dict[str, Any]]):
+        """
+        把工作进程中执行的任务用量并入当前阶段
+        进程池退回在本进程执行时用量已被本进程计入，不重复合并
+        """
+        if not usage or usage.get('pid') == os.getpid():
+            return
+        # 外部调用计入本进程计数器，阶段和进程累计值都能看到
+        for kind, n in usage.get('external_calls', {}).items():
+            count_external_call(kind, n)
+        with self._lock:
+            if self.current:
+                self.current.add_offloaded(usage)
+
+    def finish(self, success: bool = True, error: Optional[str] = None):
+        """结束当前阶段（失败时记录错误）"""
+        with self._lock:
+            self._close_current(success, error)
+
+    def _close_current(self, success: bool = True, error: Optional[str] = None):
+        if not self.current:
+            return
+        result = self.current.close(success, error)
+        self.current = None
+        self.spans.append(result)
+        _registry.observe(result)
+        if self.on_stage_complete:
+            try:
+                self.on_stage_complete(result)
+            except Exception as e:
+                logger.warning(f"阶段指标回调失败: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """汇总为可写入历史记录的结构"""
+        spans = list(self.spans)
+        return {
+            'execution_id': self.execution_id,
+            'stages': spans,
+            'totals': {
+                'wall_seconds': round(sum(s['wall_seconds'] for s in spans), 4),
+                'cpu_seconds': round(sum(s['cpu_seconds'] for s in spans), 4),
+                'bytes_read': sum(s['bytes_read'] for s in spans),
+                'bytes_written': sum(s['bytes_written'] for s in spans),
+                'external_calls': sum(sum(s['external_calls'].values()) for s in spans),
+            }
+        }
+
+
+def monitor_forwarder(monitor) -> Callable[[Dict[str, Any]], None]:
+    """
+    生成把阶段结果转发给 DataFlowMonitor.record_stage_metrics 的回调
+    """
+    def _forward(result: Dict[str, Any]):
+        monitor.record_stage_metrics(
+            stage=result['stage'],
+            input_count=result['input_count'],
+            output_count=result['output_count'],
+            processing_time=result['wall_seconds'],
+            success=result['success'],
+            errors=[result['error']] if result.get('error') else None,
+            additional_data={
+                'cpu_seconds': result['cpu_seconds'],
+                'rss_delta_kb': result['rss_delta_kb'],
+                'worker_peak_rss_kb': result['worker_peak_rss_kb'],
+                'bytes_read': result['bytes_read'],
+                'bytes_written': result['bytes_written'],
+                'external_calls': result['external_calls'],
+            }
+        )
+    return _forward
+
+
+class _StageMetricsRegistry:
+    """进程级累计指标，用于Prometheus导出"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._stage_calls: Dict[tuple, int] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+
+    def observe(self, result: Dict[str, Any]):
+        stage = result['stage']
+        with self._lock:
+            agg = self._stages.setdefault(stage, {
+                'count': 0, 'failures': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                'bytes_read': 0, 'bytes_written': 0,
+            })
+            agg['count'] += 1
+            agg['failures'] += 0 if result['success'] else 1
+            agg['wall_seconds'] += result['wall_seconds']
+            agg['cpu_seconds'] += result['cpu_seconds']
+            agg['bytes_read'] += result['bytes_read']
+            agg['bytes_written'] += result['bytes_written']
+            for kind, n in result['external_calls'].items():
+                key = (stage, kind)
+                self._stage_calls[key] = self._stage_calls.get(key, 0) + n
+            self._last[stage] = result
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def family(name, mtype, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {mtype}")
+            for labels, value in samples:
+                label_str = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+        with self._lock:
+            stages = sorted(self._stages.items())
+            family('workflow_stage_runs_total', 'counter', '阶段执行次数',
+                   [({'stage': s}, int(a['count'])) for s, a in stages])
+            family('workflow_stage_failures_total', 'counter', '阶段失败次数',
+                   [({'stage': s}, int(a['failures'])) for s, a in stages])
+            family('workflow_stage_wall_seconds_total', 'counter', '阶段累计墙钟耗时',
+                   [({'stage': s}, round(a['wall_seconds'], 4)) for s, a in stages])
+            family('workflow_stage_cpu_seconds_total', 'counter', '阶段累计CPU耗时',
+                   [({'stage': s}, round(a['cpu_seconds'], 4)) for s, a in stages])
+            family('workflow_stage_read_bytes_total', 'counter', '阶段累计读取字节',
+                   [({'stage': s}, int(a['bytes_read'])) for s, a in stages])
+            family('workflow_stage_written_bytes_total', 'counter', '阶段累计写入字节',
+                   [({'stage': s}, int(a['bytes_written'])) for s, a in stages])
+            family('workflow_stage_external_calls_total', 'counter', '阶段外部调用次数',
+                   [({'stage': s, 'kind': k}, n) for (s, k), n in sorted(self._stage_calls.items())])
+            family('workflow_stage_last_wall_seconds', 'gauge', '最近一次阶段墙钟耗时',
+                   [({'stage': s}, r['wall_seconds']) for s, r in sorted(self._last.items())])
+            family('workflow_stage_last_rss_delta_kb', 'gauge', '最近一次阶段前后RSS变化',
+                   [({'stage': s}, r['rss_delta_kb']) for s, r in sorted(self._last.items())])
+            family('workflow_stage_last_worker_peak_rss_kb', 'gauge', '最近一次阶段工作进程RSS峰值',
+                   [({'stage': s}, r['worker_peak_rss_kb']) for s, r in sorted(self._last.items())])
+
+        family('workflow_external_calls_total', 'counter', '进程累计外部调用次数',
+               [({'kind': k}, n) for k, n in sorted(external_call_snapshot().items())])
+        family('process_peak_rss_kb', 'gauge', '进程峰值RSS', [({}, _peak_rss_kb())])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+_registry = _StageMetricsRegistry()
+
+
+def render_prometheus() -> str:
+    """以Prometheus文本格式(0.0.4)输出累计阶段指标"""
+    return _registry.render()
@@ -16,6 +16,8 @@ import glob
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core_modules.path_manager import path_manager
 from core_modules.all_tables_discoverer import AllTablesDiscoverer
+from core_modules.result_file_index import record_result_file
+from core_modules.score_stream import write_json_document
 
 
 class ComprehensiveAggregator:
@@ -428,12 +430,56 @@ class ComprehensiveAggregator:
         
         return column_modified_rows
 
-    def aggregate_files(self, detailed_files: List[str], week: str = None) -> Dict:
+    def add_detailed_score(self, detailed: Dict, file_path: str = '') -> Dict:
         """
-        汇总多个详细打分文件
+        折叠单个详细打分结果（表格打分完成后即可调用）
+        
+        Args:
+            detailed: 详细打分数据
+            file_path: 详细打分文件路径（表名缺失时用作备用）
+            
+        Returns:
+            该表格的打分汇总
+        """
+        # 提取表名
+        table_name = detailed['metadata'].get('table_name', 
+                                              os.path.basename(file_path))
+        
+        # 获取CSV文件的真实总行数
+        total_rows = self.get_csv_total_rows(table_name)
+        
+        # 提取每列的修改行号
+        column_modified_rows = self.extract_modified_rows(detailed['scores'])
+        
+        # 计算列级汇总（增强版，包含修改行号）
+        column_scores = self.calculate_column_aggregates(detailed['scores'])
+        
+        # 为每列添加修改行号信息
+        for col_name in column_scores:
+            if col_name in column_modified_rows:
+                column_scores[col_name]['modified_rows'] = column_modified_rows[col_name]
+            else:
+                column_scores[col_name]['modified_rows'] = []
+        
+        # 计算表格汇总
+        table_summary = self.calculate_table_summary(column_scores)
+        
+        table_score = {
+            'table_name': table_name,
+            'table_url': self.extract_table_url(table_name),
+            'total_rows': total_rows,  # 新增：总行数
+            'modifications_count': detailed['metadata']['total_modifications'],
+            'column_scores': column_scores,
+            'table_summary': table_summary
+        }
+        self.table_scores.append(table_score)
+        return table_score
+    
+    def build_report(self, week: str = None) -> Dict:
+        """
+        根据已折叠的表格打分构建综合报告
         
         Args:
-            detailed_files: 详细打分文件路径列表
             week: 周数标识（可选）
             
         Returns:
@@ -442,48 +488,6 @@ class ComprehensiveAggregator:
         if not week:
             week = datetime.now().strftime('W%V')
         
-        # 处理每个详细文件
-        for file_path in detailed_files:
-            if not os.path.exists(file_path):
-                print(f"警告: 文件不存在 {file_path}")
-                continue
-            
-            # 加载详细打分
-            detailed = self.load_detailed_score(file_path)
-            
-            # 提取表名
-            table_name = detailed['metadata'].get('table_name', 
-                                                  os.path.basename(file_path))
-            
-            # 获取CSV文件的真实总行数
-            total_rows = self.get_csv_total_rows(table_name)
-            
-            # 提取每列的修改行号
-            column_modified_rows = self.extract_modified_rows(detailed['scores'])
-            
-            # 计算列级汇总（增强版，包含修改行号）
-            column_scores = self.calculate_column_aggregates(detailed['scores'])
-            
-            # 为每列添加修改行号信息
-            for col_name in column_scores:
-                if col_name in column_modified_rows:
-                    column_scores[col_name]['modified_rows'] = column_modified_rows[col_name]
-                else:
-                    column_scores[col_name]['modified_rows'] = []
-            
-            # 计算表格汇总
-            table_summary = self.calculate_table_summary(column_scores)
-            
-            # 添加到结果
-            self.table_scores.append({
-                'table_name': table_name,
-                'table_url': self.extract_table_url(table_name),
-                'total_rows': total_rows,  # 新增：总行数
-                'modifications_count': detailed['metadata']['total_modifications'],
-                'column_scores': column_scores,
-                'table_summary': table_summary
-            })
-        
         # 获取所有配置的表格（包括未修改的）
         all_tables_discovery = self.tables_discoverer.discover_all_tables_with_status()
         processed_table_names = {t['table_name'] for t in self.table_scores}
@@ -518,6 +522,44 @@ class ComprehensiveAggregator:
         }
         
         return report
+
+    def aggregate_files(self, detailed_files: List[str], week: str = None) -> Dict:
+        """
+        汇总多个详细打分文件
+        
+        Args:
+            detailed_files: 详细打分文件路径列表
+            week: 周数标识（可选）
+            
+        Returns:
+            综合打分报告
+        """
+        # 处理每个详细文件
+        for file_path in detailed_files:
+            if not os.path.exists(file_path):
+                print(f"警告: 文件不存在 {file_path}")
+                continue
+            
+            self.add_detailed_score(self.load_detailed_score(file_path), file_path)
+        
+        return self.build_report(week)
+    
+    def aggregate_manifest(self, manifest_path: str, week: str = None) -> Dict:
+        """
+        按批次清单汇总（批次成员由清单显式给出，不扫描detailed目录）
+        
+        Args:
+            manifest_path: AutoComprehensiveGenerator生成的批次清单路径
+            week: 周数标识（可选，默认使用清单中的周数）
+            
+        Returns:
+            综合打分报告
+        """
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        detailed_files = [entry['score_file'] for entry in manifest.get('tables', [])]
+        return self.aggregate_files(detailed_files, week or manifest.get('week'))
     
     def save_report(self, report: Dict, output_dir: str = None) -> str:
         """
@@ -544,9 +586,9 @@ class ComprehensiveAggregator:
             f"comprehensive_score_{week}_{timestamp}.json"
         )
         
-        # 保存
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        # 保存（按行流式格式，顶层列表逐元素一行）
+        write_json_document(output_file, report)
+        record_result_file(output_file, report)
         
         print(f"综合报告已保存: {output_file}")
         return output_file
@@ -559,13 +601,16 @@ def main():
     parser = argparse.ArgumentParser(description='综合打分引擎 - 汇总模块')
     parser.add_argument('--input-dir', help='详细打分文件目录')
     parser.add_argument('--files', nargs='+', help='详细打分文件列表')
+    parser.add_argument('--manifest', help='批次清单文件')
     parser.add_argument('--week', help='周数标识（如W36）')
     parser.add_argument('--output-dir', help='输出目录')
     
     args = parser.parse_args()
     
     # 获取输入文件
-    if args.files:
+    if args.manifest:
+        detailed_files = None
+    elif args.files:
         detailed_files = args.files
     elif args.input_dir:
         # 从目录读取所有详细打分文件
@@ -575,7 +620,7 @@ def main():
         print("错误: 请指定输入文件或目录")
         sys.exit(1)
     
-    if not detailed_files:
+    if detailed_files is not None and not detailed_files:
         print("错误: 没有找到详细打分文件")
         sys.exit(1)
     
@@ -584,7 +629,10 @@ def main():
     
     # 处理文件
     try:
-        report = aggregator.aggregate_files(detailed_files, args.week)
+        if args.manifest:
+            report = aggregator.aggregate_manifest(args.manifest, args.week)
+        else:
+            report = aggregator.aggregate_files(detailed_files, args.week)
         output_file = aggregator.save_report(report, args.output_dir)
         print(f"成功生成综合报告: {output_file}")
     except Exception as e:
@@ -21,6 +21,8 @@ from core_modules.l2_semantic_analysis_two_layer import L2SemanticAnalyzer
 # 导入路径管理器
 from core_modules.path_manager import path_manager
 from core_modules.deepseek_client import get_deepseek_client
+from core_modules.result_file_index import record_result_file, register_score_file
+from core_modules.score_stream import ScoreFileWriter, write_json_document
 
 # L1/L2/L3列定义
 L1_COLUMNS = [
@@ -70,6 +72,53 @@ AI_DECISION_FACTORS = {
     'UNSURE': 1.0
 }
 
+# process_file 每次打分并写出的修改条数，内存中只保留当前这一块
+SCORE_CHUNK_SIZE = 1000
+
+# 各等级基础分
+BASE_SCORES = {
+    "L1": 0.8,  # L1任何变更最低0.8（红色警告）
+    "L2": 0.5,  # L2任何变更最低0.6（橙色警告）
+    "L3": 0.2   # L3保持原有逻辑
+}
+
+# 风险分段：(分数下限, 风险等级, 颜色, 图标, 所需操作, 优先级)，按下限从高到低
+RISK_BANDS = (
+    (0.8, "EXTREME_HIGH", "red", "🔴", "immediate_review", 1),
+    (0.6, "HIGH", "orange", "🟠", "manual_review", 2),
+    (0.4, "MEDIUM", "yellow", "🟡", "periodic_check", 3),
+    (0.2, "LOW", "green", "🟢", "log_only", 4),
+    (float('-inf'), "EXTREME_LOW", "blue", "🔵", "none", 5),
+)
+
+
+def compile_scoring_table() -> Dict[str, Tuple[str, float, float]]:
+    """
+    编译列打分表：列名 → (列级别, 基础分, 权重)
+
+    与 get_column_level / get_base_score / get_column_weight 的逐次查找结果一致，
+    同名列按L1 > L2 > L3取级别；未收录的列按 DEFAULT_COLUMN_ENTRY（L3、权重1.0）处理。
+    """
+    table = {}
+    for level, columns in (("L3", L3_COLUMNS), ("L2", L2_COLUMNS), ("L1", L1_COLUMNS)):
+        for name in columns:
+            table[name] = (level, BASE_SCORES[level], COLUMN_WEIGHTS.get(name, 1.0))
+    for name, weight in COLUMN_WEIGHTS.items():
+        table.setdefault(name, ("L3", BASE_SCORES["L3"], weight))
+    return table
+
+
+SCORING_TABLE = compile_scoring_table()
+DEFAULT_COLUMN_ENTRY = ("L3", BASE_SCORES["L3"], 1.0)
+RISK_ACTIONS = {band[1]: band[4:] for band in RISK_BANDS}
+
+
+def _risk_band(score: float) -> tuple:
+    for band in RISK_BANDS:
+        if score >= band[0]:
+            return band
+    return RISK_BANDS[-1]
+
 
 class IntegratedScorer:
     """综合打分引擎"""
@@ -99,16 +148,8 @@ class IntegratedScorer:
                 raise Exception(f"L2语义分析器初始化失败，无法继续: {e}")
     
     def get_column_level(self, column_name: str) -> str:
-        """获取列的风险等级"""
-        if column_name in L1_COLUMNS:
-            return "L1"
-        elif column_name in L2_COLUMNS:
-            return "L2"
-        elif column_name in L3_COLUMNS:
-            return "L3"
-        else:
-            # 未分类的列默认为L3
-            return "L3"
+        """获取列的风险等级（未分类的列默认为L3）"""
+        return SCORING_TABLE.get(column_name, DEFAULT_COLUMN_ENTRY)[0]
     
     def get_base_score(self, column_level: str) -> float:
         """获取基础风险分
@@ -116,12 +157,7 @@ class IntegratedScorer:
         注意：L1和L2的实际最低分数在process_l1_modification和
         process_l2_modification中有特殊保障机制
         """
-        scores = {
-            "L1": 0.8,  # L1任何变更最低0.8（红色警告）
-            "L2": 0.5,  # L2任何变更最低0.6（橙色警告）
-            "L3": 0.2   # L3保持原有逻辑
-        }
-        return scores.get(column_level, 0.2)
+        return BASE_SCORES.get(column_level, 0.2)
     
     def calculate_change_factor(self, old_value: str, new_value: str) -> float:
         """
@@ -321,16 +357,7 @@ class IntegratedScorer:
         Returns:
             (risk_level, color, icon)
         """
-        if score >= 0.8:
-            return ("EXTREME_HIGH", "red", "🔴")
-        elif score >= 0.6:
-            return ("HIGH", "orange", "🟠")
-        elif score >= 0.4:
-            return ("MEDIUM", "yellow", "🟡")
-        elif score >= 0.2:
-            return ("LOW", "green", "🟢")
-        else:
-            return ("EXTREME_LOW", "blue", "🔵")
+        return _risk_band(score)[1:4]
     
     def get_action_required(self, risk_level: str) -> Tuple[str, int]:
         """
@@ -339,14 +366,7 @@ class IntegratedScorer:
         Returns:
             (action, priority)
         """
-        actions = {
-            "EXTREME_HIGH": ("immediate_review", 1),
-            "HIGH": ("manual_review", 2),
-            "MEDIUM": ("periodic_check", 3),
-            "LOW": ("log_only", 4),
-            "EXTREME_LOW": ("none", 5)
-        }
-        return actions.get(risk_level, ("none", 5))
+        return RISK_ACTIONS.get(risk_level, ("none", 5))
     
     def score_modification(self, mod: Dict, mod_id: str) -> Dict:
         """
@@ -417,6 +437,54 @@ class IntegratedScorer:
         
         return result
     
+    def score_rule_batch(self, batch: List[Tuple]) -> List[Dict]:
+        """
+        L1/L3规则列批量打分，逐格结果与 score_modification 相同
+
+        Args:
+            batch: [(mod_id, cell, column_name, 列打分表条目, old_value, new_value), ...]
+        """
+        change_factors = list(map(self.calculate_change_factor,
+                                  [item[4] for item in batch], [item[5] for item in batch]))
+        results = []
+        for (mod_id, cell, column_name, entry, old_value, new_value), change_factor in zip(batch, change_factors):
+            level, base_score, importance_weight = entry
+            if level == "L1":
+                # 有变更时最低0.8，确保触发红色警告
+                final_score = max(0.8, min(base_score * change_factor * importance_weight, 1.0)) \
+                    if change_factor > 0 else 0.0
+            else:
+                final_score = min(base_score * change_factor * importance_weight, 1.0)
+            _, risk_level, risk_color, risk_icon, action_required, priority = _risk_band(final_score)
+            results.append({
+                'modification_id': mod_id,
+                'cell': cell,
+                'column_name': column_name,
+                'column_level': level,
+                'old_value': old_value,
+                'new_value': new_value,
+                'scoring_details': {
+                    'base_score': base_score,
+                    'change_factor': change_factor,
+                    'importance_weight': importance_weight,
+                    'ai_adjustment': 1.0,
+                    'confidence_weight': 1.0,
+                    'final_score': final_score
+                },
+                'ai_analysis': {
+                    'ai_used': False,
+                    'reason': f'{level}_column_rule_based'
+                },
+                'risk_assessment': {
+                    'risk_level': risk_level,
+                    'risk_color': risk_color,
+                    'risk_icon': risk_icon,
+                    'action_required': action_required,
+                    'priority': priority
+                }
+            })
+        return results
+
     def process_file(self, input_file: str, output_dir: str = None) -> str:
         """
         处理简化对比文件，生成详细打分
@@ -435,9 +503,12 @@ class IntegratedScorer:
         # 提取修改列表
         modifications = data.get('modifications', [])
 
+        # 文档标识（对比阶段按目标文件名解析后附带），用于登记打分文件查找索引
+        document = data.get('document')
+
         # 获取表名
-        table_name = data.get('table_name',
-                              os.path.basename(input_file).replace('.json', ''))
+        table_name = (data.get('table_name') or (document or {}).get('doc_name')
+                      or os.path.basename(input_file).replace('.json', ''))
 
         # 如果没有modifications，生成一个"无变更"的输出
         if not modifications:
@@ -478,83 +549,15 @@ class IntegratedScorer:
                 f"detailed_score_{table_name}_{timestamp}.json"
             )
 
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output, f, ensure_ascii=False, indent=2)
+            if document:
+                output['metadata']['document'] = document
+            write_json_document(output_file, output)
+            record_result_file(output_file, output)
+            register_score_file(output_file, document, table_name)
 
             print(f"无变更详细打分完成: {output_file}")
             return output_file
 
-        # 打分结果
-        scores = []
-        risk_distribution = defaultdict(int)
-        ai_usage = {
-            'total_ai_calls': 0,
-            'layer1_passes': 0,
-            'layer2_analyses': 0
-        }
-        
-        # 处理每个修改
-        for i, mod in enumerate(modifications):
-            mod_id = f"M{i+1:03d}"
-            
-            # 数据格式兼容性处理：将'old'/'new'转换为'old_value'/'new_value'
-            if 'old' in mod and 'old_value' not in mod:
-                mod['old_value'] = mod['old']
-            if 'new' in mod and 'new_value' not in mod:
-                mod['new_value'] = mod['new']
-            
-            # 处理'column'到'column_name'的兼容性
-            if 'column' in mod and 'column_name' not in mod:
-                mod['column_name'] = mod['column']
-            
-            # 处理'cell'字段 - 如果没有cell，基于row生成一个默认值
-            if 'cell' not in mod:
-                row = mod.get('row', i+1)
-                mod['cell'] = f"A{row}"
-            
-            # 确保必需字段存在
-            if 'old_value' not in mod:
-                mod['old_value'] = ''
-            if 'new_value' not in mod:
-                mod['new_value'] = ''
-            if 'column_name' not in mod:
-                mod['column_name'] = 'unknown'
-            
-            # 打分
-            score_result = self.score_modification(mod, mod_id)
-            scores.append(score_result)
-            
-            # 统计
-            risk_distribution[score_result['risk_assessment']['risk_level']] += 1
-            if score_result['ai_analysis']['ai_used']:
-                ai_usage['total_ai_calls'] += 1
-                if score_result['ai_analysis'].get('layer2_result'):
-                    ai_usage['layer2_analyses'] += 1
-                else:
-                    ai_usage['layer1_passes'] += 1
-        
-        # 计算汇总
-        total_score = sum(s['scoring_details']['final_score'] for s in scores)
-        avg_score = total_score / len(scores) if scores else 0
-        
-        # 构建输出
-        output = {
-            'metadata': {
-                'table_name': table_name,
-                'source_file': input_file,
-                'scoring_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'total_modifications': len(modifications),
-                'scoring_version': 'v1.0'
-            },
-            'scores': scores,
-            'summary': {
-                'total_score': round(total_score, 3),
-                'average_score': round(avg_score, 3),
-                'risk_distribution': dict(risk_distribution),
-                'ai_usage': ai_usage
-            }
-        }
-        
         # 保存结果
         if not output_dir:
             # 使用统一路径管理器获取正确路径
@@ -568,12 +571,104 @@ class IntegratedScorer:
             f"detailed_score_{table_name}_{timestamp}.json"
         )
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        metadata = {
+            'table_name': table_name,
+            'source_file': input_file,
+            'scoring_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'total_modifications': len(modifications),
+            'scoring_version': 'v1.0'
+        }
+        if document:
+            metadata['document'] = document
+        risk_distribution = defaultdict(int)
+        ai_usage = {
+            'total_ai_calls': 0,
+            'layer1_passes': 0,
+            'layer2_analyses': 0
+        }
+        total_score = 0
+        
+        # 逐块打分并写出，打分结果不在内存中攒齐
+        with ScoreFileWriter(output_file) as writer:
+            writer.section('metadata', metadata)
+            writer.open_array('scores')
+            for start in range(0, len(modifications), SCORE_CHUNK_SIZE):
+                for score_result in self._score_chunk(modifications, start, start + SCORE_CHUNK_SIZE):
+                    # 统计
+                    total_score += score_result['scoring_details']['final_score']
+                    risk_distribution[score_result['risk_assessment']['risk_level']] += 1
+                    if score_result['ai_analysis']['ai_used']:
+                        ai_usage['total_ai_calls'] += 1
+                        if score_result['ai_analysis'].get('layer2_result'):
+                            ai_usage['layer2_analyses'] += 1
+                        else:
+                            ai_usage['layer1_passes'] += 1
+                    writer.append(score_result)
+            writer.close_array()
+            
+            # 计算汇总
+            avg_score = total_score / len(modifications)
+            summary = {
+                'total_score': round(total_score, 3),
+                'average_score': round(avg_score, 3),
+                'risk_distribution': dict(risk_distribution),
+                'ai_usage': ai_usage
+            }
+            writer.section('summary', summary)
+        record_result_file(output_file, {'metadata': metadata, 'summary': summary})
+        register_score_file(output_file, document, table_name)
         
         print(f"详细打分完成: {output_file}")
         return output_file
 
+    def _score_chunk(self, modifications: List[Dict], start: int, stop: int) -> List[Dict]:
+        """
+        对 modifications[start:stop] 打分，结果按原顺序返回
+
+        L1/L3规则列按编译好的列打分表批量处理，L2列逐个调用AI。
+        """
+        stop = min(stop, len(modifications))
+        scores: List[Optional[Dict]] = [None] * (stop - start)
+        rule_indices = []
+        rule_batch = []
+        for i in range(start, stop):
+            mod = modifications[i]
+            mod_id = f"M{i+1:03d}"
+            
+            # 数据格式兼容性处理：'old'/'new' → 'old_value'/'new_value'，'column' → 'column_name'，
+            # 没有cell时基于row生成一个默认值
+            column_name = mod['column_name'] if 'column_name' in mod else mod.get('column', 'unknown')
+            entry = SCORING_TABLE.get(column_name, DEFAULT_COLUMN_ENTRY)
+            if entry[0] != "L2":
+                rule_indices.append(i - start)
+                rule_batch.append((
+                    mod_id,
+                    mod['cell'] if 'cell' in mod else f"A{mod.get('row', i+1)}",
+                    column_name,
+                    entry,
+                    mod['old_value'] if 'old_value' in mod else mod.get('old', ''),
+                    mod['new_value'] if 'new_value' in mod else mod.get('new', '')
+                ))
+                continue
+            
+            # L2列原样交给AI分析器，保持原有的字段补全
+            if 'old' in mod and 'old_value' not in mod:
+                mod['old_value'] = mod['old']
+            if 'new' in mod and 'new_value' not in mod:
+                mod['new_value'] = mod['new']
+            if 'column' in mod and 'column_name' not in mod:
+                mod['column_name'] = mod['column']
+            if 'cell' not in mod:
+                mod['cell'] = f"A{mod.get('row', i+1)}"
+            mod.setdefault('old_value', '')
+            mod.setdefault('new_value', '')
+            mod.setdefault('column_name', 'unknown')
+            scores[i - start] = self.score_modification(mod, mod_id)
+        
+        for i, score_result in zip(rule_indices, self.score_rule_batch(rule_batch)):
+            scores[i] = score_result
+        return scores
+
 
 def main():
     """主函数（测试用）"""
@@ -11,6 +11,7 @@ import sys
 import glob
 import time
 import re
+import threading
 import requests
 
 # 添加缺失的导入
@@ -92,6 +93,32 @@ app = Flask(__name__)
 app.secret_key = 'tencent_doc_monitor_secret_key_2025'  # 用于session
 CORS(app)
 
+from compact_encoding import COMPACT_MEDIA_TYPE, negotiate as negotiate_compact, compact_payload
+from service_registry import get_service_client, ServiceUnavailable
+from score_stream import iter_events
+from result_file_index import find_score_file
+
+# 8093后端：按服务注册文件直连，连接池复用，连续失败时熔断
+BACKEND_FALLBACK_PORTS = [8093, 8094, 8095, 8096, 8097]
+backend_8093 = get_service_client('8093', fallback_ports=BACKEND_FALLBACK_PORTS)
+
+@app.after_request
+def apply_compact_encoding(response):
+    """Accept声明紧凑编码时，把JSON响应中的矩阵、掩码和行号列表替换为紧凑表示"""
+    if not request.path.startswith('/api/') or response.mimetype != 'application/json':
+        return response
+    response.vary.add('Accept')
+    options = negotiate_compact(request.headers.get('Accept'))
+    if not options or response.direct_passthrough:
+        return response
+    payload = response.get_json(silent=True)
+    if payload is None:
+        return response
+    response.set_data(json.dumps(compact_payload(payload, options['matrix']),
+                                 ensure_ascii=False, separators=(',', ':')))
+    response.mimetype = COMPACT_MEDIA_TYPE
+    return response
+
 # 全局变量：是否使用默认列顺序
 USE_DEFAULT_COLUMN_ORDER = False  # 默认使用智能聚类（False=智能聚类，True=默认顺序）
 
@@ -313,6 +340,32 @@ CONFIG_DIR = '/root/projects/tencent-doc-manager/config'
 COOKIES_CONFIG_FILE = os.path.join(CONFIG_DIR, 'cookies.json')
 DOWNLOAD_CONFIG_FILE = os.path.join(CONFIG_DIR, 'download_config.json')  # 修正文件名
 
+# 运行时配置缓存：ConfigCenter在内存中缓存JSON配置，文件变化时自动重新加载
+try:
+    sys.path.append('/root/projects/tencent-doc-manager')
+    from production.config.config_center import get_config_center
+    config_center = get_config_center()
+except Exception as e:
+    config_center = None
+    print(f"⚠️ 配置中心不可用，直接读取配置文件: {e}")
+
+def read_config_json(path, default=None):
+    """读取配置JSON（优先走ConfigCenter缓存，返回副本）；文件不存在时返回default，损坏时抛出ValueError"""
+    if config_center:
+        return config_center.load_json(path, default)
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_config_json(path, data):
+    """写入配置JSON（原子写入并同步缓存）"""
+    if config_center:
+        config_center.save_json(path, data)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
 # 导入配置管理器
 try:
     from production.core_modules.config_manager import get_config_manager
@@ -1423,6 +1476,8 @@ def get_heatmap_data():
     try:
         from flask import request
         sorting_mode = request.args.get('sorting', 'default')
+        # lazy=1 时只返回头部段（矩阵、表名、列级计数），表格明细通过 /api/data/section 按需获取
+        lazy = request.args.get('lazy') == '1'
 
         # 导入标准列配置
         import sys
@@ -1446,8 +1501,12 @@ def get_heatmap_data():
         latest_file = max(files, key=os.path.getmtime)
 
         # 加载文件
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if lazy:
+            from production.core_modules.comprehensive_sections import SectionedComprehensiveStore
+            data = SectionedComprehensiveStore(latest_file).load_head()
+        else:
+            with open(latest_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
 
         # 验证是否符合规范（只检查核心必需字段）
         required_fields = ['metadata', 'table_names', 'column_names', 'heatmap_data']
@@ -1540,6 +1599,45 @@ def get_heatmap_data():
             "error": str(e)
         }), 500
 
+def _resolve_comprehensive_file(file_param):
+    """把请求中的文件参数解析为scoring_results下的综合打分文件路径，越界时返回None"""
+    scoring_base_dir = os.path.realpath('/root/projects/tencent-doc-manager/scoring_results')
+    if not file_param:
+        return None
+    if os.path.isabs(file_param):
+        candidate = os.path.realpath(file_param)
+    else:
+        candidate = os.path.realpath(os.path.join(scoring_base_dir, 'comprehensive', os.path.basename(file_param)))
+    if not candidate.startswith(scoring_base_dir + os.sep) or not os.path.isfile(candidate):
+        return None
+    return candidate
+
+@app.route('/api/data/section')
+def get_heatmap_data_section():
+    """按需获取综合打分中单个表格的明细段（修改行号、悬浮数据、表格详情）"""
+    try:
+        from production.core_modules.comprehensive_sections import SectionedComprehensiveStore
+
+        file_path = _resolve_comprehensive_file(request.args.get('file'))
+        table_name = request.args.get('table')
+        if not file_path or not table_name:
+            return jsonify({"success": False, "error": "缺少或无效的file/table参数"}), 400
+
+        section = SectionedComprehensiveStore(file_path).load_section(table_name)
+        if section is None:
+            return jsonify({"success": False, "error": f"表格不存在: {table_name}"}), 404
+
+        return jsonify({
+            "success": True,
+            "file": os.path.basename(file_path),
+            "data": section
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @app.route('/api/update', methods=['POST'])
 def update_heatmap_data():
     """接收真实测试数据更新"""
@@ -1808,8 +1906,7 @@ def save_cookies():
             "last_test_time": ""
         }
         
-        with open(COOKIES_CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, ensure_ascii=False, indent=2)
+        write_config_json(COOKIES_CONFIG_FILE, config_data)
         
         return jsonify({
             "success": True, 
@@ -1824,9 +1921,8 @@ def save_cookies():
 def get_cookies():
     """获取当前存储的Cookie和状态"""
     try:
-        if os.path.exists(COOKIES_CONFIG_FILE):
-            with open(COOKIES_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
+        config_data = read_config_json(COOKIES_CONFIG_FILE)
+        if config_data is not None:
             return jsonify({"success": True, "data": config_data})
         else:
             return jsonify({
@@ -1851,10 +1947,7 @@ def test_cookies():
         
         if not cookies:
             # 从配置文件读取
-            if os.path.exists(COOKIES_CONFIG_FILE):
-                with open(COOKIES_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
-                cookies = config_data.get('current_cookies', '')
+            cookies = read_config_json(COOKIES_CONFIG_FILE, {}).get('current_cookies', '')
         
         if not cookies:
             return jsonify({"success": False, "error": "没有可测试的Cookie"})
@@ -1864,18 +1957,15 @@ def test_cookies():
         is_valid = len(cookies) > 50 and 'uid=' in cookies and 'SID=' in cookies
         
         # 更新配置文件中的验证状态
-        if os.path.exists(COOKIES_CONFIG_FILE):
-            with open(COOKIES_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
-            
+        config_data = read_config_json(COOKIES_CONFIG_FILE)
+        if config_data is not None:
             config_data.update({
                 "is_valid": is_valid,
                 "validation_message": "✅ Cookie格式正确" if is_valid else "❌ Cookie格式不正确",
                 "last_test_time": datetime.datetime.now().isoformat()
             })
             
-            with open(COOKIES_CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, ensure_ascii=False, indent=2)
+            write_config_json(COOKIES_CONFIG_FILE, config_data)
         
         return jsonify({
             "success": True,
@@ -2019,13 +2109,10 @@ def save_download_links():
             return jsonify({"success": False, "error": "链接列表不能为空"})
         
         # 读取现有配置以保留软删除的链接
-        existing_config = {}
-        if os.path.exists(DOWNLOAD_CONFIG_FILE):
-            try:
-                with open(DOWNLOAD_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    existing_config = json.load(f)
-            except:
-                existing_config = {}
+        try:
+            existing_config = read_config_json(DOWNLOAD_CONFIG_FILE, {})
+        except Exception:
+            existing_config = {}
         
         # 获取已软删除的链接
         deleted_links = existing_config.get('deleted_links', [])
@@ -2047,6 +2134,9 @@ def save_download_links():
                 'deleted_links': deleted_links,
                 'last_update': datetime.datetime.now().isoformat()
             })
+            if config_center:
+                # 配置管理器直接写文件，立即丢弃缓存而不是等待文件监测
+                config_center.invalidate(DOWNLOAD_CONFIG_FILE)
             if not success:
                 # 回退到传统方式
                 config_data = {
@@ -2055,8 +2145,7 @@ def save_download_links():
                     "download_format": "csv",
                     "schedule": {}
                 }
-                with open(DOWNLOAD_CONFIG_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(config_data, f, ensure_ascii=False, indent=2)
+                write_config_json(DOWNLOAD_CONFIG_FILE, config_data)
         else:
             # 传统方式
             config_data = {
@@ -2067,8 +2156,7 @@ def save_download_links():
                 "last_update": datetime.datetime.now().isoformat()
             }
             
-            with open(DOWNLOAD_CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, ensure_ascii=False, indent=2)
+            write_config_json(DOWNLOAD_CONFIG_FILE, config_data)
         
         print(f"✅ 保存了 {len(links)} 个活跃文档链接")
         if deleted_links:
@@ -2087,9 +2175,8 @@ def save_download_links():
 def get_download_links():
     """获取下载链接配置"""
     try:
-        if os.path.exists(DOWNLOAD_CONFIG_FILE):
-            with open(DOWNLOAD_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
+        config_data = read_config_json(DOWNLOAD_CONFIG_FILE)
+        if config_data is not None:
             return jsonify({"success": True, "data": config_data})
         else:
             return jsonify({
@@ -2324,7 +2411,7 @@ def handle_comprehensive_files():
         if request.method == 'GET':
             # 获取指定周的综合打分文件
             files = []
-            import glob
+            from production.core_modules.result_file_index import list_result_files, format_mtime, KIND_COMPREHENSIVE
 
             # 确保目录存在
             if not os.path.exists(scoring_dir):
@@ -2337,31 +2424,22 @@ def handle_comprehensive_files():
                 'realistic_comprehensive_score_*.json'
             ]
 
-            matching_files = []
-            for pattern in week_patterns:
-                matching_files.extend(glob.glob(os.path.join(scoring_dir, pattern)))
-
-            for file_path in matching_files:
-                filename = os.path.basename(file_path)
-                file_info = {
+            # 从目录索引读取摘要（只列出一次目录），不再逐个加载完整JSON
+            import fnmatch
+            for entry in list_result_files(scoring_dir, kind=KIND_COMPREHENSIVE):
+                filename = entry['name']
+                if not any(fnmatch.fnmatch(filename, pattern) for pattern in week_patterns):
+                    continue
+                files.append({
                     'name': filename,
-                    'path': file_path,
-                    'size': f'{os.path.getsize(file_path) / 1024:.1f} KB',
-                    'modified': datetime.datetime.fromtimestamp(
-                        os.path.getmtime(file_path)
-                    ).strftime('%Y-%m-%d %H:%M'),
-                    'is_realistic': 'realistic' in filename.lower()
-                }
-
-                # 尝试读取文件获取表格数量
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        file_info['table_count'] = len(data.get('table_scores', []))
-                except:
-                    file_info['table_count'] = 0
-
-                files.append(file_info)
+                    'path': entry['path'],
+                    'size': f"{entry['size'] / 1024:.1f} KB",
+                    'modified': format_mtime(entry),
+                    'is_realistic': 'realistic' in filename.lower(),
+                    'table_count': entry.get('table_count', 0),
+                    'timestamp': entry.get('timestamp'),
+                    'totals': entry.get('totals', {})
+                })
 
             # 按修改时间排序，最新的在前
             files.sort(key=lambda x: x['modified'], reverse=True)
@@ -2504,9 +2582,15 @@ def load_comprehensive_data():
                 'error': f'文件不存在: {file_path}'
             })
 
-        # 读取JSON文件
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # lazy=1 时只读取头部段（分段缺失或过期时才整体解析一次并重建），
+        # 表格行号明细通过 /api/data/section 按需获取
+        lazy = request.args.get('lazy') == '1'
+        if lazy:
+            from production.core_modules.comprehensive_sections import SectionedComprehensiveStore
+            data = SectionedComprehensiveStore(file_path).load_head()
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
 
         # 验证文件内容有效性
         table_scores = data.get('table_scores', [])
@@ -2533,6 +2617,17 @@ def load_comprehensive_data():
         comprehensive_scoring_data = data
                 # DATA_SOURCE已移除，只使用综合打分
 
+        if lazy:
+            return jsonify({
+                'success': True,
+                'table_scores': table_scores,
+                'metadata': data.get('metadata', {}),
+                'total_modifications': total_modifications,
+                'table_count': len(table_scores),
+                'is_valid': has_valid_scores or total_modifications > 0,
+                'sections': data.get('sections', {})
+            })
+
         # 返回数据
         return jsonify({
             'success': True,
@@ -2554,19 +2649,16 @@ def load_comprehensive_data():
 def start_download():
     """启动完整工作流 - 串行处理多个URL"""
     try:
-        import requests
         data = request.get_json() or {}
         task_type = data.get('task_type', 'full')  # baseline/midweek/weekend/full
         
         print(f"🔥 开始工作流任务，类型: {task_type}")
         
         # 读取下载配置
-        if not os.path.exists(DOWNLOAD_CONFIG_FILE):
+        config_data = read_config_json(DOWNLOAD_CONFIG_FILE)
+        if config_data is None:
             return jsonify({"success": False, "error": "未找到下载配置，请先导入链接"})
         
-        with open(DOWNLOAD_CONFIG_FILE, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
-        
         links = config_data.get('document_links', [])
         enabled_links = [link for link in links if link.get('enabled', True)]
         
@@ -2574,312 +2666,297 @@ def start_download():
             return jsonify({"success": False, "error": "没有可下载的链接，请先导入链接"})
         
         # 读取Cookie配置
-        cookies = ""
-        if os.path.exists(COOKIES_CONFIG_FILE):
-            with open(COOKIES_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                cookie_config = json.load(f)
-            cookies = cookie_config.get('current_cookies', '')
+        cookies = read_config_json(COOKIES_CONFIG_FILE, {}).get('current_cookies', '')
         
         if not cookies:
             return jsonify({"success": False, "error": "没有有效的Cookie，请先更新Cookie"})
         
-        # 初始化工作流状态存储
-        workflow_status_file = '/tmp/workflow_status_8089.json'
-        workflow_status = {
-            "is_running": True,
-            "start_time": datetime.datetime.now().isoformat(),
-            "total_urls": len(enabled_links),
-            "current_index": 0,
-            "logs": [],
-            "results": [],
-            "uploaded_urls": {}
-        }
-        
-        # 保存初始状态
-        with open(workflow_status_file, 'w') as f:
-            json.dump(workflow_status, f)
-        
-        # 启动后台线程调用批量处理API
-        import threading
-        def process_urls_batch():
-            try:
-                # 记录8093的执行信息
-                workflow_status['8093_executions'] = {}  # 存储批量执行信息
-
-                # 更新处理状态
-                workflow_status['current_index'] = 0
-                workflow_status['current_doc'] = "批量处理所有文档"
-                workflow_status['logs'].append({
-                    "time": datetime.datetime.now().isoformat(),
-                    "level": "info",
-                    "message": f"开始批量处理 {len(enabled_links)} 个文档"
-                })
-
-                # 保存状态
-                with open(workflow_status_file, 'w') as f:
-                    json.dump(workflow_status, f)
-
-                # 调用8093批量处理API
-                try:
-                    print(f"📋 准备调用8093批量处理工作流", flush=True)
-
-                    # 批量处理请求数据
-                    request_data = {
-                        'cookie': cookies,
-                        'advanced_settings': {
-                            'task_type': task_type,
-                            'auto_download': True,
-                            # 不再强制下载，让8093根据时间智能判断
-                            'enable_ai_analysis': True,
-                            'enable_excel_marking': True,
-                            'enable_upload': True,
-                            'use_ai_standardization': True
-                        }
-                    }
-
-                    # 尝试多个端口找到8093服务
-                    ports_to_try = [8093, 8094, 8095, 8096, 8097]
-                    service_url = None
+        # 8093完成各阶段时回调本服务，不再占用线程轮询
+        callback_url = f"http://127.0.0.1:{request.environ.get('SERVER_PORT', 8089)}/api/workflow-events"
+        _start_workflow_run(
+            cookies,
+            {
+                'task_type': task_type,
+                'auto_download': True,
+                # 不再强制下载，让8093根据时间智能判断
+                'enable_ai_analysis': True,
+                'enable_excel_marking': True,
+                'enable_upload': True,
+                'use_ai_standardization': True
+            },
+            callback_url,
+            total_urls=len(enabled_links),
+        )
 
-                    for port in ports_to_try:
-                        try:
-                            test_url = f'http://localhost:{port}/api/status'
-                            test_response = requests.get(test_url, timeout=1)
-                            if test_response.status_code == 200:
-                                service_url = f'http://localhost:{port}'
-                                print(f"✅ 找到8093服务在端口 {port}", flush=True)
-                                break
-                        except:
-                            continue
+        return jsonify({
+            "success": True,
+            "message": f"批量处理工作流已启动，正在处理 {len(enabled_links)} 个文档",
+            "total_urls": len(enabled_links)
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": f"工作流启动失败: {str(e)}"})
 
-                    if not service_url:
-                        raise Exception("找不到8093服务，请确保服务已启动")
+WORKFLOW_STATUS_FILE = '/tmp/workflow_status_8089.json'
+workflow_status_lock = threading.Lock()
 
-                    # 调用批量处理API
-                    response = requests.post(
-                        f'{service_url}/api/start-batch',  # 使用批量处理API
-                        json=request_data,
-                        timeout=10
-                    )
+def _load_workflow_status():
+    """读取8089侧的工作流状态"""
+    try:
+        with open(WORKFLOW_STATUS_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_workflow_status(status):
+    """原子写入工作流状态（调用方持有 workflow_status_lock）"""
+    tmp_path = WORKFLOW_STATUS_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, WORKFLOW_STATUS_FILE)
+
+def _append_workflow_log(status, level, message):
+    status.setdefault('logs', []).append({
+        "time": datetime.datetime.now().isoformat(),
+        "level": level,
+        "message": message
+    })
 
-                    if response.status_code == 200:
-                        result = response.json()
-                        execution_id = result.get('execution_id', f'batch_{int(time.time())}')
+WORKFLOW_POLL_INTERVAL = 3           # 8093未启用回调时查询 /api/status 的间隔（秒）
+WORKFLOW_EVENT_CHECK_INTERVAL = 60   # 启用回调时看门狗的兜底查询间隔（秒）
+WORKFLOW_RUN_DEADLINE = 3 * 3600     # 单次批量最长等待时间，超时后强制结束本次工作流
 
-                        # 记录批量执行信息
-                        workflow_status['8093_executions']['batch'] = {
-                            'execution_id': execution_id,
-                            'service_url': service_url,
-                            'start_time': datetime.datetime.now().isoformat(),
-                            'status': 'running'
-                        }
+def _start_workflow_run(cookie, advanced_settings, callback_url, total_urls=0):
+    """
+    初始化本地工作流状态并在后台触发8093批量处理，触发后立即返回；
+    进度由8093推送的事件更新，看门狗兜底收尾（见 _watch_workflow_run）
+    """
+    import requests
+
+    # 初始化工作流状态存储（后续由8093推送的事件更新）
+    workflow_status = {
+        "is_running": True,
+        "start_time": datetime.datetime.now().isoformat(),
+        "total_urls": total_urls,
+        "current_index": 0,
+        "current_doc": "批量处理所有文档",
+        "logs": [],
+        "results": [],
+        "uploaded_urls": {},
+        "8093_executions": {}
+    }
+    _append_workflow_log(workflow_status, "info", f"开始批量处理 {total_urls} 个文档" if total_urls else "开始批量处理")
+    with workflow_status_lock:
+        _save_workflow_status(workflow_status)
+
+    # 后台线程只负责触发8093批量处理，触发后立即结束
+    def trigger_batch():
+        error_logs = []
+        try:
+            print(f"📋 准备调用8093批量处理工作流", flush=True)
 
-                        workflow_status['logs'].append({
-                            "time": datetime.datetime.now().isoformat(),
-                            "level": "info",
-                            "message": f"✅ 已启动批量处理工作流，执行ID: {execution_id}"
-                        })
+            # 批量处理请求数据
+            request_data = {
+                'cookie': cookie,
+                'callback_url': callback_url,
+                'advanced_settings': advanced_settings
+            }
 
-                        # 等待批量处理完成（轮询状态）
-                        max_wait = 300  # 批量处理需要更长时间
-                        wait_count = 0
-
-                        while wait_count < max_wait:
-                            time.sleep(3)  # 每3秒检查一次
-
-                            try:
-                                status_response = requests.get(f'{service_url}/api/status', timeout=5)
-                                if status_response.status_code == 200:
-                                    status_data = status_response.json()
-
-                                    # 更新批量执行状态
-                                    workflow_status['8093_executions']['batch']['status'] = status_data.get('status', 'running')
-                                    workflow_status['8093_executions']['batch']['progress'] = status_data.get('progress', 0)
-                                    workflow_status['8093_executions']['batch']['current_task'] = status_data.get('current_task', '')
-
-                                    # 记录当前进度
-                                    current_task = status_data.get('current_task', '')
-                                    if current_task and wait_count % 10 == 0:  # 每30秒记录一次进度
-                                        workflow_status['logs'].append({
-                                            "time": datetime.datetime.now().isoformat(),
-                                            "level": "info",
-                                            "message": f"📊 批量处理进度: {current_task}"
-                                        })
-
-                                    # 检查是否完成
-                                    if status_data.get('status') == 'completed':
-                                        # 批量处理完成，提取所有文档的结果
-                                        results = status_data.get('results', {})
-                                        processed_documents = results.get('processed_documents', [])
-                                        comprehensive_file = results.get('batch_comprehensive_file', '')
-
-                                        # 记录每个文档的处理结果
-                                        for doc in processed_documents:
-                                            doc_name = doc.get('name', 'unknown')
-                                            upload_url = doc.get('upload_url', '')
-                                            if upload_url:
-                                                workflow_status['uploaded_urls'][doc_name] = upload_url
-                                                workflow_status['logs'].append({
-                                                    "time": datetime.datetime.now().isoformat(),
-                                                    "level": "success",
-                                                    "message": f"✅ [{doc_name}] 处理完成，文档链接: {upload_url}"
-                                                })
-
-                                            workflow_status['results'].append({
-                                                "name": doc_name,
-                                                "score_file": doc.get('score_file'),
-                                                "marked_file": doc.get('marked_file'),
-                                                "upload_url": upload_url,
-                                                "status": "completed"
-                                            })
-
-                                        # 记录综合评分文件
-                                        if comprehensive_file:
-                                            workflow_status['logs'].append({
-                                                "time": datetime.datetime.now().isoformat(),
-                                                "level": "success",
-                                                "message": f"✅ 批量综合评分已生成: {comprehensive_file}"
-                                            })
-                                            workflow_status['comprehensive_file'] = comprehensive_file
-
-                                        break
-                                    elif status_data.get('status') == 'error':
-                                        workflow_status['logs'].append({
-                                            "time": datetime.datetime.now().isoformat(),
-                                            "level": "error",
-                                            "message": f"❌ 批量处理失败"
-                                        })
-                                        break
-                            except Exception as e:
-                                print(f"查询8093状态失败: {e}", flush=True)
-
-                            wait_count += 1
-
-                        # 记录最终状态
-                        final_status = workflow_status['8093_executions']['batch'].get('status', 'unknown')
-                        if final_status != 'completed':
-                            workflow_status['logs'].append({
-                                "time": datetime.datetime.now().isoformat(),
-                                "level": "warning",
-                                "message": f"⚠️ 批量处理可能超时，最终状态: {final_status}"
-                            })
+            # 调用批量处理API（服务地址来自注册文件）
+            response = backend_8093.post(
+                '/api/start-batch',  # 使用批量处理API
+                json=request_data,
+                timeout=10
+            )
 
-                    else:
-                        workflow_status['logs'].append({
-                            "time": datetime.datetime.now().isoformat(),
-                            "level": "error",
-                            "message": f"❌ 批量处理失败: HTTP {response.status_code}"
-                        })
-                            
-                except requests.exceptions.Timeout as e:
-                    error_msg = "调用8093服务超时（连接超时10秒）"
-                    workflow_status['logs'].append({
-                        "time": datetime.datetime.now().isoformat(),
-                        "level": "error",
-                        "message": f"⏱️ 批量处理 {error_msg}"
+            if response.status_code == 200:
+                result = response.json()
+                execution_id = result.get('execution_id', f'batch_{int(time.time())}')
+                with workflow_status_lock:
+                    status = _load_workflow_status()
+                    batch = status.setdefault('8093_executions', {}).setdefault('batch', {})
+                    batch.setdefault('status', 'running')
+                    batch.update({
+                        'execution_id': execution_id,
+                        'service_url': backend_8093.base_url(),
+                        'start_time': datetime.datetime.now().isoformat(),
+                        'callback': bool(result.get('callback'))
                     })
-                    print(f"⏱️ 批量处理: {error_msg}", flush=True)
+                    _append_workflow_log(status, "info", f"✅ 已启动批量处理工作流，执行ID: {execution_id}")
+                    if not result.get('callback'):
+                        _append_workflow_log(status, "warning", "⚠️ 8093未启用事件回调，改为定时查询8093状态")
+                    _save_workflow_status(status)
+                # 回调关闭或终态事件丢失时由看门狗查询8093状态收尾
+                _watch_workflow_run(execution_id, bool(result.get('callback')))
+                return
+            error_logs.append(("error", f"❌ 批量处理失败: HTTP {response.status_code}"))
+
+        except requests.exceptions.Timeout:
+            error_msg = "调用8093服务超时（连接超时10秒）"
+            print(f"⏱️ 批量处理: {error_msg}", flush=True)
+            error_logs.append(("error", f"⏱️ 批量处理 {error_msg}"))
+            error_logs.append(("warning", "⚠️ 8093服务可能正忙或未响应，请检查服务状态"))
+
+        except requests.exceptions.ConnectionError:
+            error_msg = "无法连接到8093服务"
+            print(f"🔌 批量处理: {error_msg}", flush=True)
+            error_logs.append(("error", f"🔌 批量处理 {error_msg}"))
+            error_logs.append(("warning", "💡 请确保8093服务正在运行: cd /root/projects/tencent-doc-manager && ./start_8093_optimized.sh"))
 
-                    # 🔥 添加提示信息
-                    workflow_status['logs'].append({
-                        "time": datetime.datetime.now().isoformat(),
-                        "level": "warning",
-                        "message": "⚠️ 8093服务可能正忙或未响应，请检查服务状态"
-                    })
+        except Exception as e:
+            print(f"❌ 批量处理: {str(e)}", flush=True)
+            error_logs.append(("error", f"❌ 批量处理异常: {str(e)}"))
+
+        # 触发失败：直接结束本次工作流
+        with workflow_status_lock:
+            status = _load_workflow_status()
+            for level, message in error_logs:
+                _append_workflow_log(status, level, message)
+            status['is_running'] = False
+            status['end_time'] = datetime.datetime.now().isoformat()
+            _save_workflow_status(status)
+
+    thread = threading.Thread(target=trigger_batch)
+    thread.daemon = True
+    thread.start()
+
+def _claim_workflow_finish(execution_id=None):
+    """抢占本次工作流的收尾权，事件回调与看门狗只有一方会执行收尾"""
+    with workflow_status_lock:
+        status = _load_workflow_status()
+        batch = status.get('8093_executions', {}).get('batch', {})
+        if not status.get('is_running') or status.get('finishing'):
+            return False
+        if execution_id and batch.get('execution_id') not in (None, execution_id):
+            return False
+        status['finishing'] = True
+        _save_workflow_status(status)
+        return True
+
+def _watch_workflow_run(execution_id, callback_enabled):
+    """
+    看门狗：回调关闭时按短间隔查询8093状态，回调开启时按长间隔兜底，
+    发现8093已结束而本地仍在运行（终态事件未送达）时收尾；超过最长等待时间强制结束
+    """
+    interval = WORKFLOW_EVENT_CHECK_INTERVAL if callback_enabled else WORKFLOW_POLL_INTERVAL
+    deadline = time.time() + WORKFLOW_RUN_DEADLINE
+
+    def watch():
+        while time.time() < deadline:
+            time.sleep(interval)
+            status = _load_workflow_status()
+            batch = status.get('8093_executions', {}).get('batch', {})
+            if not status.get('is_running') or status.get('finishing') \
+                    or batch.get('execution_id') != execution_id:
+                return                # 已由事件回调收尾，或已开始新的工作流
+            try:
+                response = backend_8093.get('/api/status', timeout=5)
+                remote = response.json().get('status') if response.status_code == 200 else None
+            except Exception as e:
+                print(f"⚠️ 查询8093工作流状态失败: {e}", flush=True)
+                continue
+            if remote in ('completed', 'error', 'idle'):
+                # idle: 8093已被重置或重启，本次批量不会再有结果
+                _finish_workflow_run(remote == 'completed', execution_id,
+                                     note=f"⚠️ 未收到8093终态事件，按8093状态({remote})结束本次工作流")
+                return
+        _finish_workflow_run(False, execution_id,
+                             note=f"⚠️ 等待8093批量处理超过{WORKFLOW_RUN_DEADLINE // 60}分钟，已结束本次工作流")
+
+    threading.Thread(target=watch, daemon=True).start()
+
+def _finish_workflow_run(completed, execution_id=None, note=None):
+    """批量结束后重新加载综合打分文件并关闭本次工作流（重复调用时只执行一次）"""
+    if not _claim_workflow_finish(execution_id):
+        return
+    reloaded = False
+    if completed:
+        print("🔄 工作流完成，重新加载最新综合打分文件...", flush=True)
+        reloaded = load_latest_comprehensive_data()
+
+    with workflow_status_lock:
+        status = _load_workflow_status()
+        status['is_running'] = False
+        status['finishing'] = False
+        status['end_time'] = datetime.datetime.now().isoformat()
+        if note:
+            _append_workflow_log(status, "warning", note)
+        if completed:
+            _append_workflow_log(status, "success", f"🎉 全部处理完成！共处理 {status.get('total_urls', 0)} 个文档")
+            if reloaded:
+                _append_workflow_log(status, "success", "✅ 已重新加载最新的综合打分文件，热力图数据已更新")
+                print("✅ 综合打分文件已重新加载，热力图数据已更新", flush=True)
+            else:
+                _append_workflow_log(status, "warning", "⚠️ 无法重新加载综合打分文件，继续使用之前的数据")
+                print("⚠️ 无法重新加载综合打分文件", flush=True)
+        _save_workflow_status(status)
+
+@app.route('/api/workflow-events', methods=['POST'])
+def receive_workflow_event():
+    """接收8093推送的工作流事件（stage/document/completed/error），更新状态存储"""
+    event = request.get_json(silent=True) or {}
+    event_type = event.get('type')
+
+    with workflow_status_lock:
+        status = _load_workflow_status()
+        batch = status.get('8093_executions', {}).get('batch')
+        if not status.get('is_running') or (
+                batch and batch.get('execution_id') and event.get('execution_id')
+                and batch['execution_id'] != event['execution_id']):
+            return jsonify({"success": True, "ignored": True})
+
+        batch = status.setdefault('8093_executions', {}).setdefault('batch', {})
+        batch['status'] = event.get('status', batch.get('status', 'running'))
+        batch['progress'] = event.get('progress', batch.get('progress', 0))
+        batch['current_task'] = event.get('current_task', batch.get('current_task', ''))
+        batch['last_event'] = event_type
+
+        if event_type == 'stage' and event.get('current_task'):
+            _append_workflow_log(status, "info", f"📊 批量处理进度: {event['current_task']} ({event.get('stage')})")
+
+        elif event_type == 'document':
+            doc = event.get('document') or {}
+            status['current_index'] = event.get('index', status.get('current_index', 0))
+            status['current_doc'] = doc.get('name', '')
+
+        elif event_type == 'completed':
+            # 记录每个文档的处理结果
+            for doc in event.get('processed_documents', []):
+                doc_name = doc.get('name', 'unknown')
+                upload_url = doc.get('upload_url', '')
+                if upload_url:
+                    status['uploaded_urls'][doc_name] = upload_url
+                    _append_workflow_log(status, "success", f"✅ [{doc_name}] 处理完成，文档链接: {upload_url}")
+                status['results'].append({
+                    "name": doc_name,
+                    "score_file": doc.get('score_file'),
+                    "marked_file": doc.get('marked_file'),
+                    "upload_url": upload_url,
+                    "status": "completed"
+                })
 
-                except requests.exceptions.ConnectionError as e:
-                    error_msg = "无法连接到8093服务"
-                    workflow_status['logs'].append({
-                        "time": datetime.datetime.now().isoformat(),
-                        "level": "error",
-                        "message": f"🔌 批量处理 {error_msg}"
-                    })
-                    print(f"🔌 批量处理: {error_msg}", flush=True)
+            # 记录综合评分文件
+            comprehensive_file = event.get('comprehensive_file')
+            if comprehensive_file:
+                _append_workflow_log(status, "success", f"✅ 批量综合评分已生成: {comprehensive_file}")
+                status['comprehensive_file'] = comprehensive_file
 
-                    # 🔥 提供解决方案
-                    workflow_status['logs'].append({
-                        "time": datetime.datetime.now().isoformat(),
-                        "level": "warning",
-                        "message": "💡 请确保8093服务正在运行: cd /root/projects/tencent-doc-manager && ./start_8093_optimized.sh"
-                    })
+        elif event_type == 'error':
+            _append_workflow_log(status, "error", f"❌ 批量处理失败: {event.get('error', '')}")
 
-                except Exception as e:
-                    error_msg = str(e)
-                    workflow_status['logs'].append({
-                        "time": datetime.datetime.now().isoformat(),
-                        "level": "error",
-                        "message": f"❌ 批量处理异常: {error_msg}"
-                    })
-                    print(f"❌ 批量处理: {error_msg}", flush=True)
-                    
-                    # 保存状态
-                    with open(workflow_status_file, 'w') as f:
-                        json.dump(workflow_status, f)
-                
-                # 所有URL处理完成
-                workflow_status['is_running'] = False
-                workflow_status['end_time'] = datetime.datetime.now().isoformat()
-                workflow_status['logs'].append({
-                    "time": datetime.datetime.now().isoformat(),
-                    "level": "success",
-                    "message": f"🎉 全部处理完成！共处理 {len(enabled_links)} 个文档"
-                })
-                
-                # 生成热力图数据（重新加载最新的综合打分文件）
-                print("🔄 工作流完成，重新加载最新综合打分文件...", flush=True)
-
-                # 等待一秒确保文件写入完成
-                time.sleep(1)
-
-                # 重新加载最新的综合打分数据
-                if load_latest_comprehensive_data():
-                    workflow_status['logs'].append({
-                        "time": datetime.datetime.now().isoformat(),
-                        "level": "success",
-                        "message": "✅ 已重新加载最新的综合打分文件，热力图数据已更新"
-                    })
-                    print("✅ 综合打分文件已重新加载，热力图数据已更新", flush=True)
-                else:
-                    workflow_status['logs'].append({
-                        "time": datetime.datetime.now().isoformat(),
-                        "level": "warning",
-                        "message": "⚠️ 无法重新加载综合打分文件，继续使用之前的数据"
-                    })
-                    print("⚠️ 无法重新加载综合打分文件", flush=True)
+        _save_workflow_status(status)
 
-                with open(workflow_status_file, 'w') as f:
-                    json.dump(workflow_status, f)
-                    
-            except Exception as e:
-                workflow_status['is_running'] = False
-                workflow_status['logs'].append({
-                    "time": datetime.datetime.now().isoformat(),
-                    "level": "error",
-                    "message": f"工作流异常终止: {str(e)}"
-                })
-                with open(workflow_status_file, 'w') as f:
-                    json.dump(workflow_status, f)
-        
-        # 启动后台线程执行批量处理
-        thread = threading.Thread(target=process_urls_batch)
-        thread.daemon = True
-        thread.start()
+    if event_type in ('completed', 'error'):
+        # 重新加载综合打分可能较慢，放到后台，立即响应8093
+        threading.Thread(target=_finish_workflow_run,
+                         args=(event_type == 'completed', event.get('execution_id')), daemon=True).start()
 
-        return jsonify({
-            "success": True,
-            "message": f"批量处理工作流已启动，正在处理 {len(enabled_links)} 个文档",
-            "total_urls": len(enabled_links)
-        })
-        
-    except Exception as e:
-        return jsonify({"success": False, "error": f"工作流启动失败: {str(e)}"})
+    return jsonify({"success": True})
 
 @app.route('/api/workflow-status', methods=['GET'])
 def get_workflow_status():
     """获取工作流执行状态（完全代理8093的实时状态）"""
     try:
-        # 尝试多个端口找到8093服务
-        ports_to_try = [8093, 8094, 8095, 8096, 8097]
         service_found = False
         all_logs = []
         current_status = {
@@ -2892,55 +2969,50 @@ def get_workflow_status():
             "8093_status": "offline"
         }
 
-        # 查找8093服务并获取状态
-        for port in ports_to_try:
-            try:
-                status_url = f'http://localhost:{port}/api/status'
-                print(f"🔍 尝试连接8093端口 {port}...", flush=True)
-                response = requests.get(status_url, timeout=2)
-                if response.status_code == 200:
-                    service_found = True
-                    status_data = response.json()
-
-                    # 直接传递8093的完整日志和状态
-                    current_status['8093_status'] = status_data.get('status', 'idle')
-                    current_status['progress'] = status_data.get('progress', 0)
-                    current_status['current_task'] = status_data.get('current_task', '')
-
-                    # 获取完整日志（不截断）
-                    raw_logs = status_data.get('logs', [])
-
-                    # 转换日志格式以适配前端
-                    for log_entry in raw_logs:
-                        # 确保日志条目有正确的格式
-                        if isinstance(log_entry, dict):
-                            formatted_log = {
-                                'timestamp': log_entry.get('timestamp', datetime.datetime.now().strftime('%H:%M:%S')),
-                                'message': log_entry.get('message', ''),
-                                'level': log_entry.get('level', 'INFO')
-                            }
-                        else:
-                            # 如果是字符串，创建格式化的日志对象
-                            formatted_log = {
-                                'timestamp': datetime.datetime.now().strftime('%H:%M:%S'),
-                                'message': str(log_entry),
-                                'level': 'INFO'
-                            }
-                        all_logs.append(formatted_log)
+        # 按注册地址获取8093状态
+        try:
+            response = backend_8093.get('/api/status', timeout=2)
+            if response.status_code == 200:
+                service_found = True
+                status_data = response.json()
+
+                # 直接传递8093的完整日志和状态
+                current_status['8093_status'] = status_data.get('status', 'idle')
+                current_status['progress'] = status_data.get('progress', 0)
+                current_status['current_task'] = status_data.get('current_task', '')
+
+                # 获取完整日志（不截断）
+                raw_logs = status_data.get('logs', [])
+
+                # 转换日志格式以适配前端
+                for log_entry in raw_logs:
+                    # 确保日志条目有正确的格式
+                    if isinstance(log_entry, dict):
+                        formatted_log = {
+                            'timestamp': log_entry.get('timestamp', datetime.datetime.now().strftime('%H:%M:%S')),
+                            'message': log_entry.get('message', ''),
+                            'level': log_entry.get('level', 'INFO')
+                        }
+                    else:
+                        # 如果是字符串，创建格式化的日志对象
+                        formatted_log = {
+                            'timestamp': datetime.datetime.now().strftime('%H:%M:%S'),
+                            'message': str(log_entry),
+                            'level': 'INFO'
+                        }
+                    all_logs.append(formatted_log)
 
-                    # 检查是否正在运行
-                    if status_data.get('status') in ['running', 'processing']:
-                        current_status['is_running'] = True
+                # 检查是否正在运行
+                if status_data.get('status') in ['running', 'processing']:
+                    current_status['is_running'] = True
 
-                    # 获取结果
-                    if status_data.get('results'):
-                        current_status['results'] = status_data['results']
+                # 获取结果
+                if status_data.get('results'):
+                    current_status['results'] = status_data['results']
 
-                    print(f"✅ 从8093端口{port}获取到{len(all_logs)}条日志", flush=True)
-                    break
-            except Exception as e:
-                print(f"❌ 连接端口{port}失败: {str(e)}", flush=True)
-                continue
+                print(f"✅ 从8093获取到{len(all_logs)}条日志", flush=True)
+        except requests.RequestException as e:
+            print(f"❌ 连接8093失败: {str(e)}", flush=True)
 
         # 如果没找到8093服务，返回离线状态
         if not service_found:
@@ -2972,24 +3044,18 @@ def get_workflow_status():
 def get_8093_direct_status():
     """直接查询8093服务的实时状态"""
     try:
-        # 尝试多个端口找到8093服务
-        ports_to_try = [8093, 8094, 8095, 8096, 8097]
-
-        for port in ports_to_try:
-            try:
-                status_url = f'http://localhost:{port}/api/status'
-                response = requests.get(status_url, timeout=2)
-
-                if response.status_code == 200:
-                    status_data = response.json()
+        try:
+            response = backend_8093.get('/api/status', timeout=2)
+            if response.status_code == 200:
+                status_data = response.json()
 
-                    # 添加服务信息
-                    status_data['service_port'] = port
-                    status_data['service_alive'] = True
+                # 添加服务信息
+                status_data['service_port'] = int(backend_8093.base_url().rsplit(':', 1)[-1])
+                status_data['service_alive'] = True
 
-                    return jsonify(status_data)
-            except:
-                continue
+                return jsonify(status_data)
+        except requests.RequestException:
+            pass
 
         return jsonify({
             "service_alive": False,
@@ -3250,18 +3316,14 @@ def update_ui_config():
         os.makedirs(os.path.dirname(config_file), exist_ok=True)
         
         # 读取现有配置
-        current_config = {}
-        if os.path.exists(config_file):
-            with open(config_file, 'r', encoding='utf-8') as f:
-                current_config = json.load(f)
+        current_config = read_config_json(config_file, {})
         
         # 更新配置
         current_config.update(config_updates)
         current_config['last_update'] = datetime.datetime.now().isoformat()
         
         # 保存配置
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(current_config, f, ensure_ascii=False, indent=2)
+        write_config_json(config_file, current_config)
         
         return jsonify({
             "success": True,
@@ -3557,9 +3619,7 @@ def upload_to_tencent_internal(excel_file_path):
         # 获取用户Cookie
         user_cookies = None
         try:
-            with open(COOKIES_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                cookie_config = json.load(f)
-                user_cookies = cookie_config.get('current_cookies', '')
+            user_cookies = read_config_json(COOKIES_CONFIG_FILE, {}).get('current_cookies', '')
         except:
             pass
         
@@ -3655,10 +3715,8 @@ def upload_to_tencent():
         # 获取用户Cookie，优先使用请求中的，否则从配置文件读取
         if not user_cookies:
             try:
-                with open(COOKIES_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    cookie_config = json.load(f)
-                    user_cookies = cookie_config.get('current_cookies', '')
-                    print("📋 使用配置文件中的Cookie")
+                user_cookies = read_config_json(COOKIES_CONFIG_FILE, {}).get('current_cookies', '')
+                print("📋 使用配置文件中的Cookie")
             except:
                 pass
         
@@ -4028,13 +4086,105 @@ def list_verification_tables():
 
 # 🔥 新增：调度管理API接口
 SCHEDULE_TASKS_FILE = '/root/projects/tencent-doc-manager/config/schedule_tasks.json'
+SCHEDULER_DATA_DIR = '/root/projects/tencent-doc-manager/data/scheduler'
+
+# schedule_tasks.json 中 options.task_type → execute_download_with_task_type 的任务类型
+SCHEDULED_TASK_TYPES = {
+    'baseline_download': 'baseline',
+    'midweek_update': 'midweek',
+    'full_update': 'weekend',
+}
+
+# 进程内定时任务调度器（按schedule_tasks.json执行周二/周四/周六任务）
+try:
+    from simple_scheduler import TaskScheduler
+    SCHEDULER_AVAILABLE = True
+except ImportError as e:
+    print(f"⚠️ 定时任务调度器加载失败: {e}")
+    SCHEDULER_AVAILABLE = False
+task_scheduler = None
+
+def scheduled_task_type(task):
+    """调度任务对应的执行类型"""
+    return SCHEDULED_TASK_TYPES.get(task.options.get('task_type'), 'manual')
+
+def run_scheduled_task(task):
+    """调度器到点执行"""
+    task_type = scheduled_task_type(task)
+    print(f"⏰ 定时任务开始: {task.name} ({task_type})")
+    return execute_download_with_task_type(task_type)
+
+def prewarm_scheduled_task(task):
+    """
+    定时任务开始前预热，使任务的关键路径直接从热状态开始：
+    1. 用第一个启用链接做一次文档版本探测，确认Cookie仍可用
+    2. 确保共享浏览器服务已启动
+    3. 对比类任务为本周CSV基线建好列式存储旁路文件（非CSV基线不预热）
+    """
+    report = {}
+
+    # 1. Cookie
+    cookies = read_config_json(COOKIES_CONFIG_FILE, {}).get('current_cookies', '')
+    links = [link for link in read_config_json(DOWNLOAD_CONFIG_FILE, {}).get('document_links', [])
+             if link.get('enabled', True)]
+    cookie_valid, detail = None, "没有可用的Cookie或启用链接"
+    if cookies and links:
+        try:
+            from document_change_probe import check_cookie
+            cookie_valid, detail = check_cookie(links[0].get('url', ''), cookies)
+        except Exception as e:
+            detail = str(e)
+            print(f"⚠️ 预热Cookie探测失败: {e}")
+    if cookie_valid:
+        message = "✅ Cookie预热探测通过"
+    elif cookie_valid is False:
+        message = f"⚠️ Cookie预热探测未通过，请检查Cookie是否过期（{detail}）"
+    else:
+        message = f"⚠️ Cookie预热探测无法判断: {detail}"
+    cookie_config = read_config_json(COOKIES_CONFIG_FILE)
+    if cookie_config is not None:
+        # 无法判断（网络异常等）时不改写上次的有效性结论
+        if cookie_valid is not None:
+            cookie_config["is_valid"] = cookie_valid
+        cookie_config.update({
+            "validation_message": message,
+            "last_test_time": datetime.datetime.now().isoformat()
+        })
+        write_config_json(COOKIES_CONFIG_FILE, cookie_config)
+    report['cookies'] = {'valid': cookie_valid, 'message': message}
+
+    # 2. 共享浏览器
+    try:
+        from shared_browser_service import ensure_service_running
+        report['browser'] = ensure_service_running()
+    except Exception as e:
+        report['browser'] = {'status': 'unavailable', 'error': str(e)}
+
+    # 3. 基线
+    if scheduled_task_type(task) != 'baseline':
+        try:
+            from production.core_modules.week_time_manager import week_time_manager
+            baseline_files, description = week_time_manager.find_baseline_files()
+            response = backend_8093.post('/api/prewarm', json={'files': baseline_files}, timeout=120)
+            preload = response.json()
+            report['baselines'] = {
+                'description': description,
+                'loaded': len(preload.get('loaded', {})),
+                'skipped': len(preload.get('skipped', {})),
+                'failed': preload.get('failed', {}) or preload.get('error'),
+            }
+        except Exception as e:
+            report['baselines'] = {'error': str(e)}
+
+    print(f"🔥 预热完成 {task.name}: {report}")
+    return report
 
 @app.route('/api/get-schedule-config', methods=['GET'])
 def get_schedule_config():
     """获取调度配置状态"""
     try:
-        # 确保配置文件存在
-        if not os.path.exists(SCHEDULE_TASKS_FILE):
+        schedule_data = read_config_json(SCHEDULE_TASKS_FILE)
+        if schedule_data is None:
             # 使用默认配置
             default_config = {
                 "baseline_enabled": False,
@@ -4049,9 +4199,6 @@ def get_schedule_config():
                 "message": "使用默认调度配置"
             })
         
-        with open(SCHEDULE_TASKS_FILE, 'r', encoding='utf-8') as f:
-            schedule_data = json.load(f)
-        
         # 提取三个任务的启用状态
         preset_tasks = schedule_data.get('preset_tasks', [])
         config = {
@@ -4086,6 +4233,7 @@ def get_schedule_config():
         return jsonify({
             "success": True,
             "config": config,
+            "tasks": task_scheduler.status() if task_scheduler else [],
             "message": "调度配置读取成功"
         })
         
@@ -4111,21 +4259,16 @@ def update_schedule_config():
         if 'auto_download_enabled' in data:
             auto_enabled = data.get('auto_download_enabled', False)
 
-            # 确保配置文件存在
-            if not os.path.exists(SCHEDULE_TASKS_FILE):
+            schedule_data = read_config_json(SCHEDULE_TASKS_FILE)
+            if schedule_data is None:
                 # 创建默认配置
-                default_schedule = {
+                schedule_data = {
                     "preset_tasks": [
                         {"task_id": "weekly_baseline_download", "enabled": False},
                         {"task_id": "weekly_midweek_update", "enabled": False},
                         {"task_id": "weekly_full_update", "enabled": False}
                     ]
                 }
-                with open(SCHEDULE_TASKS_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(default_schedule, f, ensure_ascii=False, indent=2)
-
-            with open(SCHEDULE_TASKS_FILE, 'r', encoding='utf-8') as f:
-                schedule_data = json.load(f)
 
             # 更新所有三个任务的启用状态
             preset_tasks = schedule_data.get('preset_tasks', [])
@@ -4133,8 +4276,7 @@ def update_schedule_config():
                 task['enabled'] = auto_enabled
 
             # 保存更新后的配置
-            with open(SCHEDULE_TASKS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(schedule_data, f, ensure_ascii=False, indent=2)
+            write_config_json(SCHEDULE_TASKS_FILE, schedule_data)
 
             return jsonify({
                 "success": True,
@@ -4153,15 +4295,13 @@ def update_schedule_config():
             })
         
         # 确保配置文件存在
-        if not os.path.exists(SCHEDULE_TASKS_FILE):
+        schedule_data = read_config_json(SCHEDULE_TASKS_FILE)
+        if schedule_data is None:
             return jsonify({
                 "success": False,
                 "error": "调度配置文件不存在"
             })
         
-        with open(SCHEDULE_TASKS_FILE, 'r', encoding='utf-8') as f:
-            schedule_data = json.load(f)
-        
         # 更新对应任务的启用状态
         preset_tasks = schedule_data.get('preset_tasks', [])
         task_id_map = {
@@ -4186,8 +4326,7 @@ def update_schedule_config():
             })
         
         # 保存更新后的配置
-        with open(SCHEDULE_TASKS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(schedule_data, f, ensure_ascii=False, indent=2)
+        write_config_json(SCHEDULE_TASKS_FILE, schedule_data)
         
         return jsonify({
             "success": True,
@@ -4242,16 +4381,11 @@ def execute_scheduled_task():
             task_type = force_task_type
             execution_reason = f"强制指定任务类型: {task_type}"
         else:
-            # 根据当前时间自动判断
-            if weekday == 1 and hour == 12:  # 周二12:00
-                task_type = "baseline"
-                execution_reason = "自动检测: 周二12:00基线时间"
-            elif weekday == 3 and hour == 9:  # 周四09:00
-                task_type = "midweek" 
-                execution_reason = "自动检测: 周四09:00周中更新时间"
-            elif weekday == 5 and hour == 19:  # 周六19:00
-                task_type = "weekend"
-                execution_reason = "自动检测: 周六19:00周末完整更新时间"
+            # 按调度配置判断：计划时间在过去一小时内的任务即为本次任务
+            due_task = task_scheduler.due_task() if task_scheduler else None
+            if due_task:
+                task_type = scheduled_task_type(due_task)
+                execution_reason = f"自动检测: {due_task.name}（{due_task.schedule.expression}）"
             else:
                 task_type = "manual"
                 execution_reason = f"手动触发: 周{weekday+1} {hour:02d}:{current_time.minute:02d}"
@@ -5049,15 +5183,13 @@ def execute_download_with_task_type(task_type):
             }
         
         # 读取下载配置
-        if not os.path.exists(DOWNLOAD_CONFIG_FILE):
+        config_data = read_config_json(DOWNLOAD_CONFIG_FILE)
+        if config_data is None:
             return {
                 "success": False,
                 "error": "未找到下载配置"
             }
         
-        with open(DOWNLOAD_CONFIG_FILE, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
-        
         links = config_data.get('document_links', [])
         enabled_links = [link for link in links if link.get('enabled', True)]
         
@@ -5068,11 +5200,7 @@ def execute_download_with_task_type(task_type):
             }
         
         # 读取Cookie
-        cookies = ""
-        if os.path.exists(COOKIES_CONFIG_FILE):
-            with open(COOKIES_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                cookie_config = json.load(f)
-            cookies = cookie_config.get('current_cookies', '')
+        cookies = read_config_json(COOKIES_CONFIG_FILE, {}).get('current_cookies', '')
         
         if not cookies:
             return {
@@ -5319,6 +5447,66 @@ def index():
 
     <script type="text/babel">
         const { useState, useMemo } = React;
+
+        // 紧凑编码：矩阵/掩码/行号列表以base64缓冲区传输，旧客户端不带此Accept仍收到普通JSON
+        const COMPACT_ACCEPT = 'application/vnd.heatmap.compact+json; matrix=u8, application/json;q=0.9';
+
+        const base64ToBytes = (text) => {
+          const binary = atob(text);
+          const bytes = new Uint8Array(binary.length);
+          for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+          return bytes;
+        };
+
+        const halfToFloat = (h) => {
+          const sign = (h & 0x8000) ? -1 : 1;
+          const exponent = (h >> 10) & 0x1f;
+          const fraction = h & 0x3ff;
+          if (exponent === 0) return sign * Math.pow(2, -14) * (fraction / 1024);
+          if (exponent === 0x1f) return fraction ? NaN : sign * Infinity;
+          return sign * Math.pow(2, exponent - 15) * (1 + fraction / 1024);
+        };
+
+        const decodeCompactNode = (node) => {
+          const bytes = base64ToBytes(node.data);
+          if (node.__enc === 'delta') {
+            const rows = [];
+            let previous = 0, value = 0, scale = 1;
+            for (const byte of bytes) {
+              value += (byte & 0x7f) * scale;
+              scale *= 128;
+              if (byte & 0x80) continue;
+              previous += (value % 2) ? -(value + 1) / 2 : value / 2;
+              rows.push(previous);
+              value = 0;
+              scale = 1;
+            }
+            return rows;
+          }
+          const [rowCount, colCount] = node.shape;
+          const cell = (i) => {
+            if (node.__enc === 'bitset') return ((bytes[i >> 3] >> (i & 7)) & 1) === 1;
+            if (node.dtype === 'f16') return halfToFloat(bytes[2 * i] | (bytes[2 * i + 1] << 8));
+            if (node.palette) return node.palette[bytes[i]];
+            return node.lo + bytes[i] / 255 * (node.hi - node.lo);
+          };
+          return Array.from({ length: rowCount }, (_, r) =>
+            Array.from({ length: colCount }, (_, c) => cell(r * colCount + c)));
+        };
+
+        const decodeCompactPayload = (value) => {
+          if (Array.isArray(value)) return value.map(decodeCompactPayload);
+          if (!value || typeof value !== 'object') return value;
+          if (value.__enc) return decodeCompactNode(value);
+          const decoded = {};
+          for (const key of Object.keys(value)) decoded[key] = decodeCompactPayload(value[key]);
+          return decoded;
+        };
+
+        const fetchCompactJson = async (url) => {
+          const response = await fetch(url, { headers: { Accept: COMPACT_ACCEPT } });
+          return decodeCompactPayload(await response.json());
+        };
         
         // 🔥 强制缓存破坏 - 确保Canvas渲染更新 v5.1 - React无限循环修复版本
         console.log(`🚀 热力图UI加载时间戳: ${new Date().toISOString()}`);
@@ -6261,7 +6449,7 @@ def index():
               const filePath = `/root/projects/tencent-doc-manager/scoring_results/2025_W${week}/${file.name}`;
 
               // 加载文件数据
-              const response = await fetch(`/api/load-comprehensive-data?file=${encodeURIComponent(filePath)}`);
+              const response = await fetch(`/api/load-comprehensive-data?file=${encodeURIComponent(filePath)}&lazy=1`);
               const result = await response.json();
 
               if (result.success) {
@@ -7644,7 +7832,8 @@ def index():
                           }
 
                           // 显示成功消息
-                          alert(`✅ 数据已更新！\n已加载最新文件：${result.filename}\n表格数量：${result.table_count}\n修改总数：${result.total_modifications}`);
+                          alert(`✅ 数据已更新！\n已加载最新文件：${result.filename}\n表格数量：${result.table_count}\n修改总数：${result.total_modifications}` +
+                            (result.workflow_started ? '\n批量处理已在后台启动，完成后热力图自动更新' : ''));
 
                           // 关闭设置窗口
                           onClose();
@@ -8255,6 +8444,27 @@ def index():
           const [error, setError] = React.useState(null);
           const [detailedScores, setDetailedScores] = React.useState({});  // 🔥 新增：存储详细打分数据
 
+          // 首屏只渲染头部段（矩阵+计数），某个表格的修改行号在首次悬浮时才读取
+          const lazySectionsRef = React.useRef(null);
+          const loadComprehensiveSection = React.useCallback(async (tableName) => {
+            const lazy = lazySectionsRef.current;
+            if (!lazy || !lazy.tables[tableName] || lazy.requested.has(tableName)) return;
+            lazy.requested.add(tableName);
+            try {
+              const section = await fetchCompactJson(`/api/data/section?file=${encodeURIComponent(lazy.file)}&table=${encodeURIComponent(tableName)}`);
+              const mods = section.success ? section.data.column_modifications : null;
+              if (!mods || lazySectionsRef.current !== lazy) return;
+              setApiData(prev => prev ? {
+                ...prev,
+                column_modifications_by_table: { ...(prev.column_modifications_by_table || {}), [tableName]: mods }
+              } : prev);
+              setDetailedScores(prev => ({ ...(prev || {}), [tableName]: mods }));
+            } catch (err) {
+              lazy.requested.delete(tableName);
+              console.warn('⚠️ 表格明细加载失败:', tableName, err);
+            }
+          }, []);
+
           // 🔥 修复：将fetchApiData提取为组件级函数
           const fetchApiData = React.useCallback(async () => {
               try {
@@ -8296,7 +8506,7 @@ def index():
                 if (isComprehensiveMode) {
                     // 综合打分模式：直接使用 /api/data
                     console.log('🎯 使用综合打分数据，排序模式:', currentSortingMode);
-                    response = await fetch(`/api/data?sorting=${currentSortingMode}`);
+                    response = await fetch(`/api/data?sorting=${currentSortingMode}&lazy=1`, { headers: { Accept: COMPACT_ACCEPT } });
                 } else {
                     // CSV模式：尝试使用真实CSV数据
                     response = await fetch(`/api/real_csv_data?sorting=${currentSortingMode}`);
@@ -8305,7 +8515,7 @@ def index():
                         response = await fetch(`/api/data?sorting=${currentSortingMode}`);
                     }
                 }
-                const result = await response.json();
+                const result = decodeCompactPayload(await response.json());
                 
                 if (result.success && result.data) {
                   console.log('✅ API数据加载成功', result.metadata);
@@ -8322,6 +8532,11 @@ def index():
                     setDetailedScores(result.data.column_modifications_by_table);
                   }
 
+                  // 分段模式：记录明细段索引，悬浮时再按表读取
+                  lazySectionsRef.current = (result.data.sections && result.data.sections.lazy)
+                    ? { file: result.file, tables: result.data.sections.tables || {}, requested: new Set() }
+                    : null;
+
                   setError(null);
                 } else {
                   console.warn('⚠️ API返回无数据，使用备用接口...');
@@ -8745,8 +8960,11 @@ def index():
             }
             
             if (value > 0) {
-              // 🔥 新增：加载详细打分数据
-              if (tableName && !detailedScores[tableName]) {
+              // 分段模式：头部段只有计数，首次悬浮时读取该表明细段
+              if (tableName && lazySectionsRef.current && lazySectionsRef.current.tables[tableName]) {
+                loadComprehensiveSection(tableName);
+              } else if (tableName && !detailedScores[tableName]) {
+                // 🔥 新增：加载详细打分数据
                 try {
                   const response = await fetch(`/api/detailed_scores/${encodeURIComponent(tableName)}`);
                   const data = await response.json();
@@ -9671,11 +9889,15 @@ def get_detailed_scores(table_name):
                     }
                 })
         
-        # 查找对应表格的详细打分文件（原有逻辑）
-        pattern = f"/root/projects/tencent-doc-manager/scoring_results/detailed/detailed_score_*{table_name}*.json"
-        files = glob.glob(pattern)
+        # 查找对应表格的详细打分文件：先查打分时登记的查找索引，
+        # 未登记（索引之前的旧文件、表名只部分匹配）时再按文件名glob
+        detailed_dir = "/root/projects/tencent-doc-manager/scoring_results/detailed"
+        latest_file = find_score_file(detailed_dir, name=table_name)
+        if not latest_file:
+            files = glob.glob(f"{detailed_dir}/detailed_score_*{table_name}*.json")
+            latest_file = sorted(files)[-1] if files else None
         
-        if not files:
+        if not latest_file:
             # 如果没有详细打分文件且不在综合模式，返回空数据而不是虚拟数据
             return jsonify({
                 "success": False,
@@ -9689,16 +9911,17 @@ def get_detailed_scores(table_name):
                 }
             })
         
-        # 读取最新的详细打分文件
-        latest_file = sorted(files)[-1]
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            detailed_data = json.load(f)
-        
+        # 逐条读取最新的详细打分文件，不整体加载
         # 提取修改信息
+        metadata = {}
         modifications = []
         column_modifications = {}
         
-        for score in detailed_data.get('scores', []):
+        for kind, key, score in iter_events(latest_file):
+            if kind == 'section' and key == 'metadata':
+                metadata = score
+            if kind != 'item' or key != 'scores':
+                continue
             cell = score.get('cell', '')
             if cell:
                 # 提取行号（如C4中的4）
@@ -9739,7 +9962,7 @@ def get_detailed_scores(table_name):
                 "total_rows": estimated_total_rows,
                 "modifications": modifications,
                 "column_modifications": column_modifications,
-                "metadata": detailed_data.get('metadata', {})
+                "metadata": metadata
             }
         })
         
@@ -9798,11 +10021,11 @@ def reload_comprehensive_score():
     try:
         import glob
         import os
-        import requests
-        import time
         from datetime import datetime
 
-        # 步骤1: 触发8093批量处理工作流
+        # 步骤1: 在后台触发8093批量处理工作流（与 /api/start-download 同一路径），
+        # 不等待完成：进度经事件回调写入工作流状态，完成后自动重新加载综合打分
+        workflow_started = False
         print("🚀 开始触发批量处理工作流...", flush=True)
 
         try:
@@ -9815,48 +10038,20 @@ def reload_comprehensive_score():
                     # 修复：使用正确的键名 'current_cookies' 而非 'cookie_string'
                     cookie = cookie_config.get('current_cookies', '') or cookie_config.get('cookie_string', '')
 
-            if cookie:
-                # 调用8093的批量处理API
-                response = requests.post('http://localhost:8093/api/start-batch',
-                    json={
-                        'cookie': cookie,
-                        'advanced_settings': {
-                            'skip_baseline': False,  # 使用新的baseline
-                            'use_ai_standardization': True
-                        }
+            if not cookie:
+                print("⚠️ Cookie未配置，跳过批量处理", flush=True)
+            elif _load_workflow_status().get('is_running'):
+                print("⚠️ 已有批量处理工作流在运行，本次只加载现有文件", flush=True)
+            else:
+                _start_workflow_run(
+                    cookie,
+                    {
+                        'skip_baseline': False,  # 使用新的baseline
+                        'use_ai_standardization': True
                     },
-                    timeout=10
+                    f"http://127.0.0.1:{request.environ.get('SERVER_PORT', 8089)}/api/workflow-events",
                 )
-
-                if response.status_code == 200:
-                    result = response.json()
-                    print(f"✅ 批量工作流已启动: {result.get('message', '')}", flush=True)
-
-                    # 等待工作流完成（轮询状态）
-                    max_wait = 120  # 最多等待120秒
-                    wait_interval = 3  # 每3秒检查一次
-                    total_wait = 0
-
-                    while total_wait < max_wait:
-                        time.sleep(wait_interval)
-                        total_wait += wait_interval
-
-                        # 检查工作流状态
-                        status_response = requests.get('http://localhost:8093/api/status')
-                        if status_response.status_code == 200:
-                            status_data = status_response.json()
-                            if status_data.get('status') == 'completed':
-                                print("✅ 批量工作流已完成", flush=True)
-                                break
-                            elif status_data.get('status') == 'error':
-                                print("❌ 批量工作流失败", flush=True)
-                                break
-
-                        print(f"⏳ 等待批量处理完成... ({total_wait}/{max_wait}秒)", flush=True)
-                else:
-                    print(f"⚠️ 8093服务响应异常: {response.status_code}", flush=True)
-            else:
-                print("⚠️ Cookie未配置，跳过批量处理", flush=True)
+                workflow_started = True
 
         except Exception as e:
             print(f"⚠️ 无法触发批量处理: {e}，尝试加载现有文件", flush=True)
@@ -9935,7 +10130,8 @@ def reload_comprehensive_score():
             "table_count": table_count,
             "total_modifications": total_modifications,
             "has_urls": bool(excel_urls),
-            "urls": excel_urls
+            "urls": excel_urls,
+            "workflow_started": workflow_started
         })
 
     except Exception as e:
@@ -9952,6 +10148,16 @@ if __name__ == '__main__':
     # 启动时自动加载最新的综合打分数据
     load_latest_comprehensive_data()
 
+    # 启动定时任务调度器（下次执行时间持久化，停机错过的任务在宽限期内补跑）
+    if SCHEDULER_AVAILABLE:
+        task_scheduler = TaskScheduler(
+            SCHEDULER_DATA_DIR,
+            schedule_file=SCHEDULE_TASKS_FILE,
+            runner=run_scheduled_task,
+            prewarm=prewarm_scheduled_task,
+        )
+        task_scheduler.start()
+
     print("🔥 功能特色:")
     print("   ✅ 高斯平滑算法")
     print("   ✅ 科学热力图颜色映射")
@@ -3,10 +3,22 @@
 """
 简化定时任务调度器 - 专用于热力图服务器集成
 支持 cron 表达式和简化时间格式的任务调度
+
+    scheduler = TaskScheduler(data_dir, schedule_file=SCHEDULE_TASKS_FILE,
+                              runner=run_task, prewarm=prewarm_task)
+    scheduler.start()
+
+- 任务来源: data_dir/tasks/*.json 以及 schedule_file（schedule_tasks.json 的 preset_tasks，
+  文件变化后自动重新加载，enabled=false 的任务不调度）
+- 下次执行时间持久化到 data_dir/scheduler_state.json，重启后沿用
+- 错过执行（服务停机等）: 超时不超过 misfire_grace 时补跑一次，否则跳过并记录为 missed
+- 预热: 执行前 prewarm_lead 秒调用 prewarm(task)，提前完成Cookie校验、浏览器启动等准备
 """
 
 import asyncio
 import json
+import os
+import threading
 import time
 import logging
 from datetime import datetime, timedelta
@@ -36,6 +48,7 @@ class TaskConfig:
     cookies: str
     options: Dict[str, Any]
     notification: Optional[Dict[str, Any]] = None
+    enabled: bool = True
 
 
 @dataclass
@@ -50,13 +63,30 @@ class TaskExecution:
     error: Optional[str] = None
 
 
+TICK_SECONDS = 15                  # 调度检查间隔
+PREWARM_LEAD_SECONDS = 5 * 60      # 提前预热时间
+MISFIRE_GRACE_SECONDS = 3 * 3600   # 错过执行后仍补跑的最长延迟
+MAX_EXECUTION_RECORDS = 50
+
+
 class TaskScheduler:
     """简化任务调度器"""
     
-    def __init__(self, data_dir: str = "./data", max_concurrent: int = 2):
+    def __init__(self, data_dir: str = "./data", max_concurrent: int = 2,
+                 schedule_file: Optional[str] = None,
+                 runner: Optional[Callable[[TaskConfig], Any]] = None,
+                 prewarm: Optional[Callable[[TaskConfig], Any]] = None,
+                 prewarm_lead: float = PREWARM_LEAD_SECONDS,
+                 misfire_grace: float = MISFIRE_GRACE_SECONDS):
         self.data_dir = Path(data_dir)
         self.tasks_dir = self.data_dir / "tasks"
+        self.state_file = self.data_dir / "scheduler_state.json"
+        self.schedule_file = Path(schedule_file) if schedule_file else None
         self.max_concurrent = max_concurrent
+        self.runner = runner
+        self.prewarm = prewarm
+        self.prewarm_lead = prewarm_lead
+        self.misfire_grace = misfire_grace
         self.logger = logging.getLogger(__name__)
         
         # 内部状态
@@ -64,12 +94,20 @@ class TaskScheduler:
         self.executions: Dict[str, TaskExecution] = {}
         self.running = False
         self.executor = ThreadPoolExecutor(max_workers=max_concurrent)
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inflight: set = set()
+        self._schedule_signature = None
+        self._schedule_task_ids: List[str] = []
         
         # 确保目录存在
         self.tasks_dir.mkdir(parents=True, exist_ok=True)
         
-        # 加载已有任务
+        # 加载已有任务和持久化的调度状态
         self._load_tasks()
+        self._state: Dict[str, Dict[str, Any]] = self._load_state()
+        self._load_schedule_file()
     
     def _load_tasks(self):
         """加载任务配置"""
@@ -94,14 +132,74 @@ class TaskScheduler:
         
         return TaskConfig(
             task_id=data["task_id"],
-            name=data["name"],
+            name=data.get("name", data["task_id"]),
             schedule=schedule,
-            urls=data["urls"],
-            cookies=data["cookies"],
-            options=data["options"],
-            notification=data.get("notification")
+            urls=data.get("urls", []),
+            cookies=data.get("cookies", ""),
+            options=data.get("options", {}),
+            notification=data.get("notification"),
+            enabled=data.get("enabled", True)
         )
     
+    def _load_schedule_file(self):
+        """加载 schedule_tasks.json 的 preset_tasks，文件未变化时直接返回"""
+        if not self.schedule_file:
+            return
+        try:
+            st = self.schedule_file.stat()
+            signature = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = None
+        if signature == self._schedule_signature:
+            return
+        self._schedule_signature = signature
+        
+        preset_tasks = []
+        if signature is not None:
+            try:
+                with open(self.schedule_file, 'r', encoding='utf-8') as f:
+                    preset_tasks = json.load(f).get('preset_tasks', [])
+            except (OSError, ValueError) as e:
+                self.logger.error(f"读取调度配置失败: {e}")
+                return
+        
+        with self._lock:
+            for task_id in self._schedule_task_ids:
+                self.tasks.pop(task_id, None)
+            self._schedule_task_ids = []
+            for task_data in preset_tasks:
+                try:
+                    task_config = self._dict_to_task_config(task_data)
+                except (KeyError, TypeError) as e:
+                    self.logger.error(f"调度任务配置不完整: {task_data.get('task_id')} ({e})")
+                    continue
+                if not self._validate_schedule(task_config.schedule):
+                    self.logger.error(f"无效的调度表达式: {task_config.task_id} {task_config.schedule.expression}")
+                    continue
+                self.tasks[task_config.task_id] = task_config
+                self._schedule_task_ids.append(task_config.task_id)
+        enabled = [t for t in self._schedule_task_ids if self.tasks[t].enabled]
+        self.logger.info(f"已加载调度配置: {len(self._schedule_task_ids)}个任务，启用 {enabled}")
+    
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_state(self):
+        """原子写入调度状态"""
+        with self._lock:
+            data = json.dumps(self._state, ensure_ascii=False, indent=2)
+        try:
+            tmp_path = self.state_file.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            self.logger.error(f"调度状态写入失败: {e}")
+    
     def add_task(self, task_config: TaskConfig) -> bool:
         """添加任务"""
         try:
@@ -171,16 +269,18 @@ class TaskScheduler:
             elif expression.startswith("weekly:"):
                 # weekly:monday:09:00
                 parts = expression.split(":")
-                if len(parts) == 3:
+                if len(parts) == 4:
                     weekday, hour, minute = parts[1], parts[2], parts[3]
+                    datetime.strptime(f"{hour}:{minute}", "%H:%M")
                     weekdays = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
                     return weekday.lower() in weekdays
                 return False
             elif expression.startswith("monthly:"):
                 # monthly:1:09:00
                 parts = expression.split(":")
-                if len(parts) == 3:
+                if len(parts) == 4:
                     day, hour, minute = parts[1], parts[2], parts[3]
+                    datetime.strptime(f"{hour}:{minute}", "%H:%M")
                     return 1 <= int(day) <= 31
                 return False
             else:
@@ -188,10 +288,10 @@ class TaskScheduler:
         except:
             return False
     
-    def _get_next_run_time(self, schedule: ScheduleConfig) -> datetime:
-        """获取下次执行时间"""
+    def _get_next_run_time(self, schedule: ScheduleConfig, after: Optional[float] = None) -> datetime:
+        """获取下次执行时间（after为时间戳，默认当前时间）"""
         tz = pytz.timezone(schedule.timezone)
-        now = datetime.now(tz)
+        now = datetime.fromtimestamp(after if after is not None else time.time(), tz)
         
         if schedule.type == "cron":
             cron = croniter.croniter(schedule.expression, now)
@@ -229,12 +329,11 @@ class TaskScheduler:
             weekdays = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
             target_weekday = weekdays.index(weekday_name)
             
-            days_ahead = target_weekday - now.weekday()
-            if days_ahead <= 0:  # 目标日期已过或是今天
-                days_ahead += 7
-            
+            days_ahead = (target_weekday - now.weekday()) % 7
             next_run = now + timedelta(days=days_ahead)
             next_run = next_run.replace(hour=target_time.hour, minute=target_time.minute, second=0, microsecond=0)
+            if next_run <= now:  # 今天的时间点已过
+                next_run += timedelta(days=7)
             return next_run
             
         elif expression.startswith("monthly:"):
@@ -258,17 +357,17 @@ class TaskScheduler:
             raise ValueError(f"不支持的简化调度表达式: {expression}")
     
     def start(self):
-        """启动调度器"""
+        """启动调度器（后台线程）"""
         if self.running:
             self.logger.warning("调度器已在运行")
             return
         
         self.running = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name='task-scheduler', daemon=True)
+        self._thread.start()
         self.logger.info("调度器已启动")
         
-        # 这里可以添加具体的调度逻辑
-        # 简化版本暂时只标记为运行状态
-        
     def stop(self):
         """停止调度器"""
         if not self.running:
@@ -276,46 +375,187 @@ class TaskScheduler:
             return
         
         self.running = False
+        self._stop_event.set()
         self.logger.info("调度器已停止")
     
-    def execute_task(self, task_id: str) -> bool:
-        """手动执行任务"""
-        if task_id not in self.tasks:
-            self.logger.error(f"任务不存在: {task_id}")
-            return False
-        
-        task = self.tasks[task_id]
-        execution_id = f"{task_id}_{int(time.time())}"
-        
-        execution = TaskExecution(
-            task_id=task_id,
-            execution_id=execution_id,
-            start_time=time.time(),
-            status="running"
-        )
+    def _run_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                self.logger.error(f"调度检查失败: {e}")
+            self._stop_event.wait(TICK_SECONDS)
+    
+    def tick(self, now: Optional[float] = None):
+        """检查一次：到期任务派发执行，临近任务派发预热"""
+        now = time.time() if now is None else now
+        self._load_schedule_file()
+        changed = False
         
-        self.executions[execution_id] = execution
+        with self._lock:
+            tasks = list(self.tasks.values())
+        for task in tasks:
+            with self._lock:
+                entry = self._state.setdefault(task.task_id, {})
+                if not task.enabled:
+                    # 停用期间不保留下次时间，重新启用时从当时起算，避免补跑
+                    if entry.pop('next_run', None) is not None:
+                        changed = True
+                    continue
+                if entry.get('next_run') is None or entry.get('expression') != task.schedule.expression:
+                    entry['next_run'] = self._get_next_run_time(task.schedule, after=now).timestamp()
+                    entry['expression'] = task.schedule.expression
+                    changed = True
+                next_run = entry['next_run']
+                
+                if now >= next_run:
+                    lateness = now - next_run
+                    if lateness <= self.misfire_grace:
+                        if lateness > TICK_SECONDS * 2:
+                            self.logger.warning(f"⏰ 任务 {task.name} 延迟 {int(lateness)} 秒，补跑一次")
+                        self._dispatch(task, next_run)
+                    else:
+                        entry['last_status'] = 'missed'
+                        entry['missed_run'] = next_run
+                        self.logger.warning(f"⏰ 任务 {task.name} 错过执行 {int(lateness)} 秒，超过宽限期，跳过")
+                    entry['next_run'] = self._get_next_run_time(task.schedule, after=now).timestamp()
+                    changed = True
+                elif (self.prewarm and next_run - now <= self.prewarm_lead
+                        and entry.get('prewarmed_for') != next_run):
+                    entry['prewarmed_for'] = next_run
+                    self.executor.submit(self._run_prewarm, task, next_run)
+                    changed = True
         
+        if changed:
+            self._save_state()
+    
+    def _dispatch(self, task: TaskConfig, scheduled_for: float):
+        if task.task_id in self._inflight:
+            self.logger.warning(f"任务 {task.name} 上次执行尚未结束，本次跳过")
+            return
+        self._inflight.add(task.task_id)
+        self.executor.submit(self.execute_task, task.task_id, scheduled_for)
+    
+    def _run_prewarm(self, task: TaskConfig, scheduled_for: float):
+        with self._lock:
+            current = self.tasks.get(task.task_id)
+        if current is None or not current.enabled:
+            # 派发预热后任务被停用或移除
+            self.logger.info(f"任务已停用，跳过预热: {task.name}")
+            return
+        started = time.time()
         try:
-            # 这里应该是实际的任务执行逻辑
-            # 简化版本暂时只记录执行状态
-            self.logger.info(f"执行任务: {task.name}")
+            result = self.prewarm(task)
+            status = 'completed'
+        except Exception as e:
+            result = {'error': str(e)}
+            status = 'failed'
+            self.logger.error(f"任务预热失败 {task.name}: {e}")
+        with self._lock:
+            self._state.setdefault(task.task_id, {})['last_prewarm'] = {
+                'scheduled_for': scheduled_for,
+                'status': status,
+                'duration': round(time.time() - started, 2),
+                'result': result,
+            }
+        self._save_state()
+        self.logger.info(f"🔥 任务预热{'完成' if status == 'completed' else '失败'}: {task.name} "
+                         f"({time.time() - started:.1f}秒)")
+    
+    def execute_task(self, task_id: str, scheduled_for: Optional[float] = None) -> bool:
+        """执行任务（调度触发或手动调用）"""
+        try:
+            if task_id not in self.tasks:
+                self.logger.error(f"任务不存在: {task_id}")
+                return False
+            if self.runner is None:
+                self.logger.error(f"未配置任务执行器，无法执行: {task_id}")
+                return False
             
-            # 模拟任务执行
-            time.sleep(1)
+            task = self.tasks[task_id]
+            execution_id = f"{task_id}_{int(time.time())}"
             
-            execution.end_time = time.time()
-            execution.status = "completed"
-            execution.results = {"message": "任务执行成功（模拟）"}
+            execution = TaskExecution(
+                task_id=task_id,
+                execution_id=execution_id,
+                start_time=time.time(),
+                status="running"
+            )
             
-            return True
+            with self._lock:
+                self.executions[execution_id] = execution
+                for old_id in list(self.executions)[:-MAX_EXECUTION_RECORDS]:
+                    del self.executions[old_id]
+            
+            try:
+                self.logger.info(f"执行任务: {task.name}")
+                results = self.runner(task)
+                if isinstance(results, dict):
+                    success = results.get('success', True)
+                    execution.results = results
+                else:
+                    success = bool(results)
+                execution.status = "completed" if success else "failed"
+                if not success and isinstance(results, dict):
+                    execution.error = results.get('error')
+            except Exception as e:
+                execution.status = "failed"
+                execution.error = str(e)
+                self.logger.error(f"任务执行失败: {e}")
             
-        except Exception as e:
             execution.end_time = time.time()
-            execution.status = "failed"
-            execution.error = str(e)
-            self.logger.error(f"任务执行失败: {e}")
-            return False
+            with self._lock:
+                entry = self._state.setdefault(task_id, {})
+                entry.update({
+                    'last_run': execution.start_time,
+                    'last_scheduled_for': scheduled_for,
+                    'last_status': execution.status,
+                    'last_duration': round(execution.end_time - execution.start_time, 2),
+                    'last_error': execution.error,
+                })
+            self._save_state()
+            return execution.status == "completed"
+        finally:
+            self._inflight.discard(task_id)
+    
+    def due_task(self, now: Optional[float] = None, window: float = 3600) -> Optional[TaskConfig]:
+        """返回计划时间落在 (now-window, now] 内的已启用任务（多个时取最近的），用于外部触发时判断任务类型"""
+        now = time.time() if now is None else now
+        latest, latest_time = None, None
+        with self._lock:
+            tasks = [task for task in self.tasks.values() if task.enabled]
+        for task in tasks:
+            run_time = self._get_next_run_time(task.schedule, after=now - window).timestamp()
+            if run_time <= now and (latest_time is None or run_time > latest_time):
+                latest, latest_time = task, run_time
+        return latest
+    
+    def status(self) -> List[Dict[str, Any]]:
+        """各任务的启用状态、下次执行时间和最近执行/预热结果"""
+        def iso(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+        
+        with self._lock:
+            result = []
+            for task in self.tasks.values():
+                entry = self._state.get(task.task_id, {})
+                prewarm = entry.get('last_prewarm') or {}
+                result.append({
+                    'task_id': task.task_id,
+                    'name': task.name,
+                    'enabled': task.enabled,
+                    'next_run': iso(entry.get('next_run')) if task.enabled else None,
+                    'last_run': iso(entry.get('last_run')),
+                    'last_status': entry.get('last_status'),
+                    'last_error': entry.get('last_error'),
+                    'last_prewarm': {
+                        'scheduled_for': iso(prewarm.get('scheduled_for')),
+                        'status': prewarm.get('status'),
+                        'duration': prewarm.get('duration'),
+                    } if prewarm else None,
+                    'running': task.task_id in self._inflight,
+                })
+            return result
 
 
 if __name__ == "__main__":
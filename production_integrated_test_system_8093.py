@@ -137,6 +137,9 @@ class WorkflowState:
         self.end_time = None
         self.execution_id = None
         self.advanced_settings = {}
+        self.stage_metrics = None  # StageMetricsRecorder，由工作流启动时创建
+        self.target_probe = None  # 目标文档变更探测结果（签名、上次记录）
+        self.callback_url = None  # 调用方登记的事件回调地址（8089的 /api/workflow-events）
         
     def add_log(self, message, level="INFO"):
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -154,6 +157,7 @@ class WorkflowState:
         
     def reset(self):
         self.__init__()
+        self.callback_url = None  # 新的执行须重新登记回调，不向上一次的调用方推送事件
         
     def save_to_history(self):
         """保存执行历史"""
@@ -166,7 +170,8 @@ class WorkflowState:
                 "status": self.status,
                 "results": self.results,
                 "logs": self.logs[-20:],  # 只保存最后20条日志
-                "settings": self.advanced_settings
+                "settings": self.advanced_settings,
+                "stage_metrics": self.stage_metrics.to_dict() if self.stage_metrics else None
             }
             with open(history_file, 'w', encoding='utf-8') as f:
                 json.dump(history_data, f, ensure_ascii=False, indent=2)
@@ -336,6 +341,149 @@ except ImportError as e:
     MODULES_STATUS['week_manager'] = False
     logger.error(f"❌ 无法导入周时间管理器: {e}")
 
+# 9. 阶段指标采集（耗时/CPU/内存/IO/外部调用），并自动上报数据流监控
+try:
+    from production.core_modules.workflow_stage_metrics import (
+        StageMetricsRecorder, count_external_call, monitor_forwarder, render_prometheus
+    )
+    from production.core_modules.score_stream import count_records
+    MODULES_STATUS['stage_metrics'] = True
+    logger.info("✅ 成功导入阶段指标采集模块")
+except ImportError as e:
+    MODULES_STATUS['stage_metrics'] = False
+    logger.warning(f"⚠️ 阶段指标采集未加载: {e}")
+
+try:
+    from realtime_data_monitor import DataFlowMonitor
+    data_flow_monitor = DataFlowMonitor()
+    MODULES_STATUS['data_flow_monitor'] = True
+except ImportError as e:
+    data_flow_monitor = None
+    MODULES_STATUS['data_flow_monitor'] = False
+    logger.warning(f"⚠️ 数据流监控未加载: {e}")
+
+# 10. 文档变更探测（未修改的文档复用上次处理结果）
+try:
+    from production.core_modules.document_change_probe import probe_document, DocumentRevisionStore
+    MODULES_STATUS['change_probe'] = True
+    logger.info("✅ 成功导入文档变更探测模块")
+except ImportError as e:
+    MODULES_STATUS['change_probe'] = False
+    logger.warning(f"⚠️ 文档变更探测未加载: {e}")
+
+# 11. 服务注册（8089等调用方按注册地址直连，不再逐个端口探测）
+try:
+    from production.core_modules.service_registry import register_service, start_heartbeat
+    MODULES_STATUS['service_registry'] = True
+except ImportError as e:
+    MODULES_STATUS['service_registry'] = False
+    logger.warning(f"⚠️ 服务注册模块未加载: {e}")
+
+# 12. 工作流事件推送（阶段/完成事件POST到调用方回调）
+try:
+    from production.core_modules.workflow_events import get_event_publisher
+    MODULES_STATUS['workflow_events'] = True
+except ImportError as e:
+    MODULES_STATUS['workflow_events'] = False
+    logger.warning(f"⚠️ 工作流事件推送未加载: {e}")
+
+# 13. 表格进程池（对比/打分等CPU阶段在工作进程中执行，批量并行时随核数扩展）
+try:
+    from production.core_modules.table_process_pool import get_table_process_pool
+    MODULES_STATUS['process_pool'] = True
+except ImportError as e:
+    MODULES_STATUS['process_pool'] = False
+    logger.warning(f"⚠️ 表格进程池未加载，CPU阶段在当前进程执行: {e}")
+
+# 14. 打分文件查找索引（打分时登记文档→打分文件，涂色和UI直接查询，不再glob目录）
+try:
+    from production.core_modules.result_file_index import parse_document_key, register_score_file
+    MODULES_STATUS['score_lookup'] = True
+except ImportError as e:
+    MODULES_STATUS['score_lookup'] = False
+    logger.warning(f"⚠️ 打分文件查找索引未加载: {e}")
+
+# 15. 运行时配置缓存（与8089共用ConfigCenter，按mtime失效，请求中不再重复解析配置文件）
+try:
+    from production.config.config_center import get_config_center
+    config_center = get_config_center()
+    MODULES_STATUS['config_center'] = True
+except Exception as e:
+    config_center = None
+    MODULES_STATUS['config_center'] = False
+    logger.warning(f"⚠️ 配置中心未加载，直接读取配置文件: {e}")
+
+CONFIG_DIR = Path('/root/projects/tencent-doc-manager/config')
+COOKIES_CONFIG_FILE = str(CONFIG_DIR / 'cookies.json')
+DOWNLOAD_CONFIG_FILE = str(CONFIG_DIR / 'download_config.json')
+
+def read_config_json(path, default=None):
+    """读取配置JSON（优先走ConfigCenter缓存，返回副本）；文件不存在时返回default，损坏时抛出ValueError"""
+    if config_center:
+        return config_center.load_json(path, default)
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_config_json(path, data):
+    """写入配置JSON（原子写入并同步缓存）"""
+    if config_center:
+        config_center.save_json(path, data)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+def start_stage_metrics():
+    """为当前执行创建阶段指标记录器（批量模式下复用同一个）"""
+    if not MODULES_STATUS.get('stage_metrics') or workflow_state.stage_metrics:
+        return
+    workflow_state.stage_metrics = StageMetricsRecorder(
+        workflow_state.execution_id,
+        on_stage_complete=monitor_forwarder(data_flow_monitor) if data_flow_monitor else None
+    )
+
+def begin_stage(stage: str):
+    """开始记录一个工作流阶段（自动结束上一阶段）"""
+    if workflow_state.stage_metrics:
+        workflow_state.stage_metrics.begin(stage)
+    emit_workflow_event('stage', stage=stage)
+
+def finish_stage(success: bool = True, error: str = None):
+    """结束当前工作流阶段"""
+    if workflow_state.stage_metrics:
+        workflow_state.stage_metrics.finish(success, error)
+
+def emit_workflow_event(event_type: str, **fields):
+    """向调用方登记的回调地址推送工作流事件（未登记时不发送）"""
+    if not MODULES_STATUS.get('workflow_events') or not workflow_state.callback_url:
+        return
+    event = {
+        'type': event_type,
+        'execution_id': workflow_state.execution_id,
+        'status': workflow_state.status,
+        'progress': workflow_state.progress,
+        'current_task': workflow_state.current_task,
+    }
+    event.update(fields)
+    get_event_publisher().publish(workflow_state.callback_url, event)
+
+def record_external_call(kind: str):
+    """记录一次外部调用（下载/上传），计入当前阶段"""
+    if MODULES_STATUS.get('stage_metrics'):
+        count_external_call(kind)
+
+def annotate_stage(input_count: int = None, output_count: int = None, **extra):
+    """记录当前阶段的输入/输出数据量，供数据流监控计算完整性"""
+    if workflow_state.stage_metrics:
+        workflow_state.stage_metrics.annotate(input_count=input_count, output_count=output_count, **extra)
+
+def merge_worker_usage(usage: dict):
+    """把进程池工作进程测得的CPU/RSS/IO和外部调用次数并入当前阶段"""
+    if workflow_state.stage_metrics:
+        workflow_state.stage_metrics.merge_usage(usage)
+
 # ==================== 智能基线下载和存储函数 ====================
 def download_and_store_baseline(baseline_url: str, cookie: str, week_manager=None, workflow_state=None):
     """
@@ -391,9 +539,11 @@ def download_and_store_baseline(baseline_url: str, cookie: str, week_manager=Non
         if hasattr(exporter, 'download'):
             # PlaywrightDownloader接口（异步）
             import asyncio
+            record_external_call('tencent_download')
             result = asyncio.run(exporter.download(baseline_url, cookies=cookie, format='csv'))
         else:
             # TencentDocAutoExporter接口（同步）
+            record_external_call('tencent_download')
             result = exporter.export_document(baseline_url, cookies=cookie, format='csv')
         if workflow_state:
             workflow_state.add_log("✅ 下载请求已完成", "INFO")
@@ -518,9 +668,11 @@ def download_and_store_target(target_url: str, cookie: str, week_manager=None, w
         if hasattr(exporter, 'download'):
             # PlaywrightDownloader接口（异步）
             import asyncio
+            record_external_call('tencent_download')
             result = asyncio.run(exporter.download(target_url, cookies=cookie, format='csv'))
         else:
             # TencentDocAutoExporter接口（同步）
+            record_external_call('tencent_download')
             result = exporter.export_document(target_url, cookies=cookie, format='csv')
 
         if not result or not result.get('success'):
@@ -553,10 +705,7 @@ def download_and_store_target(target_url: str, cookie: str, week_manager=None, w
 
         try:
             # 加载文档配置
-            import json
-            config_file = '/root/projects/tencent-doc-manager/config/download_config.json'
-            with open(config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
+            config = read_config_json(DOWNLOAD_CONFIG_FILE, {})
 
             # 根据URL查找文档名（使用download_config.json以保持一致性）
             for doc in config.get('document_links', []):
@@ -635,6 +784,59 @@ def download_and_store_target(target_url: str, cookie: str, week_manager=None, w
             workflow_state.add_log(f"❌ 目标文档存储失败: {str(e)}", "ERROR")
         return None
 
+def remember_target_snapshot():
+    """完整处理成功后记录目标文档签名和产物，供下次变更探测复用"""
+    probe = workflow_state.target_probe
+    if not probe or not probe.get('signature') or not probe.get('doc_id') or not workflow_state.score_file:
+        return
+    # 已启用的涂色/上传阶段没有产出时不记录，下次同一修订号仍完整处理并重试上传
+    if MODULES_STATUS.get('marker') and not workflow_state.marked_file:
+        workflow_state.add_log("涂色未完成，不记录文档版本快照", "WARNING")
+        return
+    if MODULES_STATUS.get('uploader') and not workflow_state.upload_url:
+        workflow_state.add_log("上传未完成，不记录文档版本快照", "WARNING")
+        return
+    DocumentRevisionStore().remember(
+        probe['doc_id'],
+        probe['signature'],
+        workflow_state.baseline_file,
+        workflow_state.target_file,
+        {
+            "score_file": workflow_state.score_file,
+            "marked_file": workflow_state.marked_file,
+            "upload_url": workflow_state.upload_url
+        }
+    )
+
+def complete_workflow(skip_reset: bool, reused: bool = False):
+    """结束当前文档的工作流：更新状态、汇总结果并写入历史"""
+    finish_stage()
+    # 批量处理时不设置完成状态（由批量处理函数管理）
+    if not skip_reset:
+        workflow_state.update_progress("处理完成", 100)
+        workflow_state.status = "completed"
+        workflow_state.end_time = datetime.now()
+        workflow_state.add_log("🎉 所有步骤执行完成!", "SUCCESS")
+    else:
+        workflow_state.add_log(f"✅ 文档处理完成", "SUCCESS")
+    
+    # 保存结果
+    workflow_state.results = {
+        "baseline_file": workflow_state.baseline_file,
+        "target_file": workflow_state.target_file,
+        "score_file": workflow_state.score_file,
+        "marked_file": workflow_state.marked_file,
+        "upload_url": workflow_state.upload_url,
+        "comprehensive_file": getattr(workflow_state, 'comprehensive_file', None),
+        "reused_unchanged_target": reused,
+        "execution_time": str(workflow_state.end_time - workflow_state.start_time) if workflow_state.end_time and workflow_state.start_time else None
+    }
+    if not reused and MODULES_STATUS.get('change_probe'):
+        remember_target_snapshot()
+    
+    # 保存历史记录
+    workflow_state.save_to_history()
+
 # ==================== 核心工作流函数 ====================
 def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advanced_settings: dict = None, skip_reset: bool = False):
     """
@@ -656,8 +858,12 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
             workflow_state.execution_id = datetime.now().strftime("%Y%m%d_%H%M%S")
 
         workflow_state.advanced_settings = advanced_settings or {}
+        start_stage_metrics()
+        if workflow_state.stage_metrics:
+            workflow_state.stage_metrics.label = target_url
         
         # ========== 步骤1: 获取基线文件 ==========
+        begin_stage("baseline")
         workflow_state.update_progress("获取基线文档", 10)
         workflow_state.add_log("开始获取基线文档...")
 
@@ -809,6 +1015,7 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                     raise Exception("下载模块未加载，无法继续")
         
         # ========== 步骤2: 获取目标文件 ==========
+        begin_stage("target")
         workflow_state.update_progress("获取目标文档", 20)
         workflow_state.add_log("开始获取目标文档...")
 
@@ -830,6 +1037,28 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                     workflow_state.add_log(f"⚠️ 本地文件查找失败: {str(e)}", "WARNING")
         else:
             workflow_state.add_log("🔄 刷新模式：将下载最新目标文档")
+
+        # 变更探测：文档自上次完整处理后未修改时，直接复用上次的目标文件和处理结果
+        workflow_state.target_probe = None
+        if (should_download_target and MODULES_STATUS.get('change_probe')
+                and workflow_state.advanced_settings.get('change_probe', True)):
+            record_external_call('tencent_probe')
+            probe = probe_document(target_url, cookie, workflow_state.baseline_file)
+            workflow_state.target_probe = probe
+            if probe['unchanged']:
+                previous = probe['previous']
+                previous_results = previous.get('results', {})
+                workflow_state.target_file = previous['target_file']
+                workflow_state.score_file = previous_results.get('score_file')
+                workflow_state.marked_file = previous_results.get('marked_file')
+                workflow_state.upload_url = previous_results.get('upload_url')
+                workflow_state.add_log(
+                    f"♻️ 目标文档未变化({probe['signature']})，复用 {previous.get('recorded_at', '')} 的处理结果，"
+                    f"跳过下载/对比/打分/涂色/上传", "SUCCESS")
+                complete_workflow(skip_reset, reused=True)
+                return
+            if probe['signature']:
+                workflow_state.add_log(f"🔍 目标文档版本: {probe['signature']}，需要完整处理")
         
         # 如果本地没有目标文件，则下载并规范化存储
         if not target_file:
@@ -879,7 +1108,9 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                 workflow_state.add_log("⚠️ 无法从文件名提取文档名进行验证", "WARNING")
 
         # ========== 步骤3: CSV对比分析 ==========
+        begin_stage("compare")
         workflow_state.update_progress("执行CSV对比分析", 30)
+        comparison_saved = False  # 进程池对比时结果文件已由工作进程写出
 
         # 检查是否是新基线情况
         if hasattr(workflow_state, 'is_new_baseline') and workflow_state.is_new_baseline:
@@ -929,7 +1160,23 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
         else:
             workflow_state.add_log("开始对比分析...")
             comparison_result = None
-            if MODULES_STATUS.get('comparator'):
+            if MODULES_STATUS.get('comparator') and MODULES_STATUS.get('process_pool'):
+                # 在表格进程池中对比，结果经对比文件传回
+                import json  # 确保json模块已导入
+                comparison_file = COMPARISON_RESULTS_DIR / f"comparison_{workflow_state.execution_id}.json"
+                _, usage = get_table_process_pool().compare(
+                    workflow_state.baseline_file,
+                    workflow_state.target_file,
+                    comparison_file
+                )
+                merge_worker_usage(usage)
+                with open(comparison_file, 'r', encoding='utf-8') as f:
+                    comparison_result = json.load(f)
+                comparison_saved = True
+
+                num_changes = comparison_result.get('statistics', {}).get('total_modifications', 0)
+                workflow_state.add_log(f"✅ 对比分析完成，发现 {num_changes} 处变更")
+            elif MODULES_STATUS.get('comparator'):
                 # 使用统一CSV对比器（根据规范要求）
                 unified_comparator = UnifiedCSVComparator()
 
@@ -947,11 +1194,14 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
         if comparison_result:
             import json  # 确保json模块已导入
             comparison_file = COMPARISON_RESULTS_DIR / f"comparison_{workflow_state.execution_id}.json"
-            with open(comparison_file, 'w', encoding='utf-8') as f:
-                json.dump(comparison_result, f, ensure_ascii=False, indent=2)
+            if not comparison_saved:
+                with open(comparison_file, 'w', encoding='utf-8') as f:
+                    json.dump(comparison_result, f, ensure_ascii=False, indent=2)
 
             # 变更数量异常检测（技术规范v1.6）
             num_changes = comparison_result.get('statistics', {}).get('total_modifications', 0)
+            annotate_stage(input_count=num_changes,
+                           output_count=len(comparison_result.get('modifications', [])))
             if num_changes > 500:
                 workflow_state.add_log(f"⚠️ 警告：变更数量异常过大({num_changes})！", "WARNING")
                 workflow_state.add_log("⚠️ 这通常表示对比了不同的文档，请验证文档匹配性", "WARNING")
@@ -967,6 +1217,7 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
             workflow_state.add_log("⚠️ 比较模块未加载，跳过", "WARNING")
         
         # ========== 步骤4: 列标准化（使用V3版本） ==========
+        begin_stage("standardize")
         workflow_state.update_progress("列标准化处理", 40)
         workflow_state.add_log("开始列标准化...")
         
@@ -986,17 +1237,27 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                         if 'modified_columns' in comparison_result:
                             import asyncio
                             column_mapping = comparison_result.get('modified_columns', {})
+                            # 列映射记忆键：文档ID + 目标表头签名
+                            doc_id = extract_doc_id_from_filename(workflow_state.target_file) if workflow_state.target_file else None
+                            headers = None
+                            try:
+                                if workflow_state.target_file:
+                                    headers = processor.read_header_row(workflow_state.target_file)
+                            except Exception as e:
+                                workflow_state.add_log(f"⚠️ 读取表头失败，按修改列计算签名: {e}", "WARNING")
                             # 异步调用标准化
                             loop = asyncio.new_event_loop()
                             asyncio.set_event_loop(loop)
                             standardized_mapping = loop.run_until_complete(
-                                processor.standardize_column_names(column_mapping)
+                                processor.standardize_column_names(column_mapping, doc_id=doc_id, headers=headers)
                             )
                             loop.close()
                             
                             # 应用标准化结果
                             standardized_result = comparison_result.copy()
                             standardized_result['standardized_columns'] = standardized_mapping
+                            if standardized_mapping.get('from_memo'):
+                                workflow_state.add_log("✅ 列标准化V3命中映射记忆，未调用AI")
                             workflow_state.add_log(f"✅ 列标准化V3完成，标准化了 {len(standardized_mapping)} 个列")
                         else:
                             standardized_result = comparison_result
@@ -1027,6 +1288,7 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
             workflow_state.add_log("⚠️ 标准化模块未加载或无对比结果", "WARNING")
         
         # ========== 步骤5: L2语义分析 + L1L3规则打分 ==========
+        begin_stage("semantic")
         workflow_state.update_progress("语义分析和打分", 50)
         workflow_state.add_log("开始L2语义分析和L1L3规则打分...")
         
@@ -1061,6 +1323,7 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                 raise  # 不允许降级，直接抛出异常
         
         # ========== 步骤6: 生成详细打分JSON ==========
+        begin_stage("score")
         workflow_state.update_progress("生成详细打分", 60)
         workflow_state.add_log("生成详细打分JSON...")
 
@@ -1096,28 +1359,47 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
             with open(score_file_path, 'w', encoding='utf-8') as f:
                 json.dump(empty_score, f, ensure_ascii=False, indent=2)
 
+            if MODULES_STATUS.get('score_lookup'):
+                register_score_file(score_file_path, parse_document_key(workflow_state.target_file))
+
             workflow_state.score_file = score_file_path
+            annotate_stage(input_count=0, output_count=0)
             workflow_state.add_log(f"✅ 详细打分生成完成（新基线，0修改）: {score_file_name}")
 
         elif MODULES_STATUS.get('marker') and comparison_result:
             try:
-                # 使用统一的IntegratedScorer（必须使用AI，L2强制要求）
-                scorer = IntegratedScorer(use_ai=True, cache_enabled=False)
-                
                 # 将对比结果保存为临时JSON文件供scorer处理
+                # 附带目标文件的文档标识，scorer据此登记打分文件查找索引
                 import tempfile
+                scoring_input = comparison_result
+                if MODULES_STATUS.get('score_lookup'):
+                    document = parse_document_key(workflow_state.target_file)
+                    if document:
+                        scoring_input = dict(comparison_result, document=document)
                 with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as tmp:
-                    json.dump(comparison_result, tmp)
+                    json.dump(scoring_input, tmp)
                     tmp_input_file = tmp.name
                 
-                # 使用IntegratedScorer处理文件
-                score_file_path = scorer.process_file(
-                    input_file=tmp_input_file,
-                    output_dir=str(SCORING_RESULTS_DIR)
-                )
+                if MODULES_STATUS.get('process_pool'):
+                    # 在表格进程池中打分（必须使用AI，L2强制要求）
+                    score_file_path, usage = get_table_process_pool().score(
+                        tmp_input_file, str(SCORING_RESULTS_DIR), use_ai=True
+                    )
+                    merge_worker_usage(usage)
+                else:
+                    # 使用统一的IntegratedScorer（必须使用AI，L2强制要求）
+                    scorer = IntegratedScorer(use_ai=True, cache_enabled=False)
+                    score_file_path = scorer.process_file(
+                        input_file=tmp_input_file,
+                        output_dir=str(SCORING_RESULTS_DIR)
+                    )
                 
                 # 删除临时文件
                 os.unlink(tmp_input_file)
+
+                if workflow_state.stage_metrics:
+                    annotate_stage(input_count=len(comparison_result.get('modifications', [])),
+                                   output_count=count_records(score_file_path, 'scores'))
                 
                 workflow_state.score_file = score_file_path
                 workflow_state.add_log(f"✅ 详细打分生成完成: {os.path.basename(score_file_path)}")
@@ -1127,6 +1409,7 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                 raise
         
         # ========== 步骤7: 下载目标XLSX ==========
+        begin_stage("excel_download")
         workflow_state.update_progress("下载Excel格式", 70)
         workflow_state.add_log("下载目标文档的Excel格式...")
         
@@ -1136,6 +1419,7 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
             exporter_excel = TencentDocAutoExporter()
             
             import asyncio
+            record_external_call('tencent_download')
             if hasattr(exporter_excel, 'download'):
                 # PlaywrightDownloader接口
                 excel_result = asyncio.run(exporter_excel.download(target_url, cookies=cookie, format='xlsx'))
@@ -1149,6 +1433,7 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                 workflow_state.add_log("⚠️ Excel下载失败", "WARNING")
         
         # ========== 步骤8: 修复Excel格式 ==========
+        begin_stage("excel_fix")
         if excel_file and MODULES_STATUS.get('fixer'):
             workflow_state.update_progress("修复Excel格式", 75)
             workflow_state.add_log("修复腾讯文档Excel格式问题...")
@@ -1159,6 +1444,7 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                 workflow_state.add_log(f"✅ Excel格式修复完成")
         
         # ========== 步骤9: 应用条纹涂色 ==========
+        begin_stage("mark")
         if excel_file and MODULES_STATUS.get('marker') and workflow_state.score_file:
             workflow_state.update_progress("应用智能涂色", 85)
             workflow_state.add_log("应用条纹涂色标记...")
@@ -1169,17 +1455,20 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                 workflow_state.score_file
             )
             
+            annotate_stage(input_count=marker.last_scored_cells, output_count=marker.last_colored_cells)
             if marked_file:
                 workflow_state.marked_file = marked_file
                 workflow_state.add_log(f"✅ 涂色标记完成: {os.path.basename(marked_file)}")
         
         # ========== 步骤10: 上传到腾讯文档 ==========
+        begin_stage("upload")
         if workflow_state.marked_file and MODULES_STATUS.get('uploader'):
             workflow_state.update_progress("上传腾讯文档", 90)
             workflow_state.add_log("上传处理后的文档到腾讯文档...")
 
             # 修正：sync_upload_v3只需要3个参数(cookie_string, file_path, headless)
             # 第1个参数必须是cookie_string，第2个是file_path
+            record_external_call('tencent_upload')
             upload_result = sync_upload_file(
                 cookie,  # 第1个参数：cookie_string
                 workflow_state.marked_file,  # 第2个参数：file_path
@@ -1195,6 +1484,7 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
                 workflow_state.add_log("⚠️ 文档上传失败", "WARNING")
 
         # ========== 步骤11: 生成综合打分 ==========
+        begin_stage("comprehensive")
         # 批量处理时跳过单文档的综合打分（由批量处理函数统一生成）
         if not skip_reset:
             workflow_state.update_progress("生成综合打分", 95)
@@ -1243,30 +1533,10 @@ def run_complete_workflow(baseline_url: str, target_url: str, cookie: str, advan
             workflow_state.add_log("📋 批量处理模式：跳过单文档综合打分，将在最后统一生成")
 
         # ========== 完成 ==========
-        # 批量处理时不设置完成状态（由批量处理函数管理）
-        if not skip_reset:
-            workflow_state.update_progress("处理完成", 100)
-            workflow_state.status = "completed"
-            workflow_state.end_time = datetime.now()
-            workflow_state.add_log("🎉 所有步骤执行完成!", "SUCCESS")
-        else:
-            workflow_state.add_log(f"✅ 文档处理完成", "SUCCESS")
-        
-        # 保存结果
-        workflow_state.results = {
-            "baseline_file": workflow_state.baseline_file,
-            "target_file": workflow_state.target_file,
-            "score_file": workflow_state.score_file,
-            "marked_file": workflow_state.marked_file,
-            "upload_url": workflow_state.upload_url,
-            "comprehensive_file": getattr(workflow_state, 'comprehensive_file', None),
-            "execution_time": str(workflow_state.end_time - workflow_state.start_time) if workflow_state.end_time and workflow_state.start_time else None
-        }
-        
-        # 保存历史记录
-        workflow_state.save_to_history()
+        complete_workflow(skip_reset)
         
     except Exception as e:
+        finish_stage(success=False, error=str(e))
         workflow_state.status = "error"
         workflow_state.end_time = datetime.now()
         workflow_state.add_log(f"❌ 执行出错: {str(e)}", "ERROR")
@@ -1300,6 +1570,18 @@ def run_batch_workflow(document_pairs: list, cookie: str, advanced_settings: dic
         all_score_files = []
         excel_urls = {}
 
+        # 开启批次清单：每个文档打分完成后立即折叠，最后直接落盘
+        batch_accumulator = None
+        try:
+            from production.core_modules.auto_comprehensive_generator import AutoComprehensiveGenerator
+            batch_accumulator = AutoComprehensiveGenerator().start_batch(
+                expected_count=total_pairs,
+                batch_id=workflow_state.execution_id
+            )
+            workflow_state.add_log(f"📋 批次清单已创建: {batch_accumulator.manifest_path.name}", "INFO")
+        except Exception as e:
+            workflow_state.add_log(f"⚠️ 批次清单创建失败，将在最后按时间窗口聚合: {e}", "WARNING")
+
         # 处理每个文档对
         for idx, doc_pair in enumerate(document_pairs, 1):
             doc_name = doc_pair.get('name', f'文档{idx}')
@@ -1319,6 +1601,11 @@ def run_batch_workflow(document_pairs: list, cookie: str, advanced_settings: dic
                 current_logs = workflow_state.logs[:]
                 current_progress = workflow_state.progress
 
+                # 清空上一个文档的单文档结果，避免被误计入当前文档
+                workflow_state.score_file = None
+                workflow_state.marked_file = None
+                workflow_state.upload_url = None
+
                 # 执行单文档工作流（第一个文档已经重置过状态了，后续文档跳过重置）
                 run_complete_workflow(baseline_url, target_url, cookie, advanced_settings, skip_reset=True)
 
@@ -1331,12 +1618,21 @@ def run_batch_workflow(document_pairs: list, cookie: str, advanced_settings: dic
                     excel_urls[doc_name] = workflow_state.upload_url
                     workflow_state.add_log(f"📊 {doc_name} Excel已上传: {workflow_state.upload_url}", "SUCCESS")
 
+                # 折叠到批次综合打分
+                if batch_accumulator and workflow_state.score_file:
+                    batch_accumulator.add_table(
+                        workflow_state.score_file,
+                        table_name=doc_name,
+                        excel_url=workflow_state.upload_url
+                    )
+
                 all_results.append({
                     'name': doc_name,
                     'score_file': workflow_state.score_file,
                     'marked_file': workflow_state.marked_file,
                     'upload_url': workflow_state.upload_url
                 })
+                emit_workflow_event('document', document=all_results[-1], index=idx, total=total_pairs)
 
             except Exception as e:
                 workflow_state.add_log(f"❌ 处理 {doc_name} 失败: {str(e)}", "ERROR")
@@ -1346,22 +1642,31 @@ def run_batch_workflow(document_pairs: list, cookie: str, advanced_settings: dic
                 raise Exception(f"文档处理失败 - {doc_name}: {str(e)}")
 
         # ========== 批量综合打分生成 ==========
+        start_stage_metrics()
+        if workflow_state.stage_metrics:
+            workflow_state.stage_metrics.label = None
+        begin_stage("batch_comprehensive")
         workflow_state.update_progress("生成多文档综合打分", 90)
         workflow_state.add_log("📊 开始生成多文档综合打分...", "INFO")
 
         try:
-            # 导入批量综合打分生成器
-            from production.core_modules.auto_comprehensive_generator import AutoComprehensiveGenerator
+            if batch_accumulator:
+                # 各文档已在处理完成时折叠，这里只需落盘
+                comprehensive_file = batch_accumulator.flush()
+                workflow_state.add_log(f"   使用批次清单 {batch_accumulator.manifest_path.name} 生成", "INFO")
+            else:
+                # 导入批量综合打分生成器
+                from production.core_modules.auto_comprehensive_generator import AutoComprehensiveGenerator
 
-            generator = AutoComprehensiveGenerator()
+                generator = AutoComprehensiveGenerator()
 
-            # 使用新的批量处理方法，传入期望的文档数量
-            expected_doc_count = len(document_pairs)  # 使用配置的文档数
-            comprehensive_file = generator.generate_from_all_detailed_results(
-                excel_urls,
-                expected_count=expected_doc_count
-            )
-            workflow_state.add_log(f"   使用配置的文档数 {expected_doc_count} 进行批量处理", "INFO")
+                # 使用新的批量处理方法，传入期望的文档数量
+                expected_doc_count = len(document_pairs)  # 使用配置的文档数
+                comprehensive_file = generator.generate_from_all_detailed_results(
+                    excel_urls,
+                    expected_count=expected_doc_count
+                )
+                workflow_state.add_log(f"   使用配置的文档数 {expected_doc_count} 进行批量处理", "INFO")
 
             workflow_state.comprehensive_file = comprehensive_file
             workflow_state.add_log(f"✅ 多文档综合打分已生成: {comprehensive_file}", "SUCCESS")
@@ -1377,6 +1682,7 @@ def run_batch_workflow(document_pairs: list, cookie: str, advanced_settings: dic
             workflow_state.add_log(f"⚠️ 批量综合打分生成失败: {e}", "WARNING")
 
         # ========== 完成 ==========
+        finish_stage()
         # 检查是否所有文档都成功处理
         if len(all_results) == total_pairs:
             workflow_state.update_progress("批量处理完成", 100)
@@ -1403,14 +1709,21 @@ def run_batch_workflow(document_pairs: list, cookie: str, advanced_settings: dic
 
         # 保存历史记录
         workflow_state.save_to_history()
+        emit_workflow_event(
+            'completed',
+            processed_documents=all_results,
+            comprehensive_file=workflow_state.results['comprehensive_file']
+        )
 
         return workflow_state.execution_id
 
     except Exception as e:
+        finish_stage(success=False, error=str(e))
         workflow_state.status = "error"
         workflow_state.end_time = datetime.now()
         workflow_state.add_log(f"❌ 批量处理失败: {str(e)}", "ERROR")
         workflow_state.save_to_history()
+        emit_workflow_event('error', error=str(e))
         logger.error(f"批量工作流执行失败: {e}", exc_info=True)
         return None
 
@@ -1475,6 +1788,27 @@ def get_modules():
     """获取模块加载状态"""
     return jsonify(MODULES_STATUS)
 
+@app.route('/api/metrics')
+def get_metrics():
+    """Prometheus格式的工作流阶段指标"""
+    from flask import Response
+    if not MODULES_STATUS.get('stage_metrics'):
+        return Response("# stage metrics unavailable\n", mimetype='text/plain')
+    return Response(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/prewarm', methods=['POST'])
+def prewarm():
+    """定时任务开始前预热：为CSV基线建好列式存储旁路文件，工作进程对比时直接mmap加载"""
+    if not MODULES_STATUS.get('comparator'):
+        return jsonify({"error": "比较模块未加载"}), 503
+
+    from simplified_csv_comparator import preload_files
+    files = (request.get_json(silent=True) or {}).get('files', [])
+    result = preload_files(files)
+    print(f"🔥 预热基线: 载入 {len(result['loaded'])} 个，跳过 {len(result['skipped'])} 个，"
+          f"失败 {len(result['failed'])} 个")
+    return jsonify(result)
+
 @app.route('/api/status')
 def get_status():
     """获取当前工作流状态 - 增强版自动重置机制"""
@@ -1564,9 +1898,6 @@ def save_cookie():
         if not cookie_string:
             return jsonify({"error": "Cookie不能为空"}), 400
         
-        # Cookie配置文件路径
-        cookie_file = Path("/root/projects/tencent-doc-manager/config/cookies.json")
-        
         # 解析Cookie字符串
         cookie_list = []
         for cookie_part in cookie_string.split('; '):
@@ -1585,14 +1916,10 @@ def save_cookie():
             "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        # 确保目录存在
-        cookie_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        # 保存到文件
-        with open(cookie_file, 'w', encoding='utf-8') as f:
-            json.dump(cookie_config, f, indent=2, ensure_ascii=False)
+        # 保存到文件（原子写入并同步配置缓存）
+        write_config_json(COOKIES_CONFIG_FILE, cookie_config)
         
-        logger.info(f"✅ Cookie已保存到配置文件: {cookie_file}")
+        logger.info(f"✅ Cookie已保存到配置文件: {COOKIES_CONFIG_FILE}")
         return jsonify({
             "success": True,
             "message": f"Cookie已成功保存到配置文件",
@@ -1608,14 +1935,10 @@ def save_cookie():
 def load_cookie():
     """从配置文件加载Cookie"""
     try:
-        cookie_file = Path("/root/projects/tencent-doc-manager/config/cookies.json")
-        
-        if not cookie_file.exists():
+        cookie_config = read_config_json(COOKIES_CONFIG_FILE)
+        if cookie_config is None:
             return jsonify({"error": "Cookie配置文件不存在"}), 404
         
-        with open(cookie_file, 'r', encoding='utf-8') as f:
-            cookie_config = json.load(f)
-        
         return jsonify({
             "success": True,
             "cookie": cookie_config.get("cookie_string", ""),
@@ -1674,6 +1997,7 @@ def start_batch_workflow():
     data = request.json
     cookie = data.get('cookie')
     advanced_settings = data.get('advanced_settings', {})
+    workflow_state.callback_url = data.get('callback_url')
 
     # 从配置文件读取文档配置
     import sys
@@ -1682,25 +2006,27 @@ def start_batch_workflow():
     # 直接读取配置文件 - 使用与8089相同的配置源
     import json
     # 优先使用download_config.json，确保与8089 UI一致
-    config_file = Path("/root/projects/tencent-doc-manager/config/download_config.json")
     REAL_DOCUMENTS = {'documents': []}
 
-    if config_file.exists():
-        with open(config_file, 'r', encoding='utf-8') as f:
-            download_config = json.load(f)
-            # 转换download_config格式到REAL_DOCUMENTS格式
-            documents = []
-            for link in download_config.get('document_links', []):
-                if link.get('enabled', False):  # 只处理启用的链接
-                    documents.append({
-                        'name': link['name'],
-                        'url': link['url'],
-                        'doc_id': link['url'].split('/')[-1] if '/' in link['url'] else link['url'],
-                        'csv_pattern': f"tencent_{link['name']}_*.csv",
-                        'description': f"来自UI配置: {link['name']}"
-                    })
-            REAL_DOCUMENTS = {'documents': documents}
-            print(f"✅ 从download_config.json加载 {len(documents)} 个启用的文档")
+    try:
+        download_config = read_config_json(DOWNLOAD_CONFIG_FILE)
+    except ValueError as e:
+        workflow_state.status = "idle"
+        return jsonify({"error": str(e)}), 500
+    if download_config is not None:
+        # 转换download_config格式到REAL_DOCUMENTS格式
+        documents = []
+        for link in download_config.get('document_links', []):
+            if link.get('enabled', False):  # 只处理启用的链接
+                documents.append({
+                    'name': link['name'],
+                    'url': link['url'],
+                    'doc_id': link['url'].split('/')[-1] if '/' in link['url'] else link['url'],
+                    'csv_pattern': f"tencent_{link['name']}_*.csv",
+                    'description': f"来自UI配置: {link['name']}"
+                })
+        REAL_DOCUMENTS = {'documents': documents}
+        print(f"✅ 从download_config.json加载 {len(documents)} 个启用的文档")
     else:
         print("⚠️ 未找到download_config.json，使用空配置")
 
@@ -1721,13 +2047,10 @@ def start_batch_workflow():
     if not cookie:
         # 尝试从配置文件读取cookie
         try:
-            cookie_file = Path("/root/projects/tencent-doc-manager/config/cookies.json")
-            if cookie_file.exists():
-                with open(cookie_file, 'r', encoding='utf-8') as f:
-                    cookie_config = json.load(f)
-                    cookie = cookie_config.get('current_cookies', '') or cookie_config.get('cookie_string', '')
-        except Exception:
-            pass
+            cookie_config = read_config_json(COOKIES_CONFIG_FILE, {})
+            cookie = cookie_config.get('current_cookies', '') or cookie_config.get('cookie_string', '')
+        except ValueError as e:
+            logger.error(f"读取Cookie配置失败: {e}")
 
         if not cookie:
             return jsonify({"error": "缺少Cookie参数"}), 400
@@ -1742,7 +2065,9 @@ def start_batch_workflow():
 
     return jsonify({
         "message": f"批量工作流已启动，将处理 {len(document_pairs)} 个文档",
-        "documents": [doc['name'] for doc in document_pairs]
+        "execution_id": workflow_state.execution_id,
+        "documents": [doc['name'] for doc in document_pairs],
+        "callback": bool(workflow_state.callback_url and MODULES_STATUS.get('workflow_events'))
     })
 
 @app.route('/api/files/<path:category>')
@@ -3126,8 +3451,13 @@ if __name__ == '__main__':
     # 尝试多个端口
     ports = [8093, 8094, 8095, 8096, 8097, 8098, 8099, 8100, 8101, 8102]
     
+    if MODULES_STATUS.get('service_registry'):
+        start_heartbeat('8093')
+
     for port in ports:
         try:
+            if MODULES_STATUS.get('service_registry'):
+                register_service('8093', port)
             app.run(host='0.0.0.0', port=port, debug=False)
             break
         except OSError as e:
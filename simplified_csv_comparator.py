@@ -7,11 +7,43 @@
 
 import csv
 import json
+import os
+import sys
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Any, Set
 import openpyxl
 
+sys.path.append(os.path.join(os.path.dirname(__file__), 'production/core_modules'))
+try:
+    from ejs_workbook_decoder import EJSDecodeError, is_ejs_file, read_ejs_rows
+except ImportError:
+    is_ejs_file = read_ejs_rows = None
+try:
+    from baseline_store import load_baseline, is_plain_csv, normalized_row_hash
+except ImportError:
+    load_baseline = None
+from cell_diff_kernel import changed_cells
+
+def preload_files(paths: List[str]) -> Dict[str, Any]:
+    """
+    为CSV基线在磁盘上建好列式存储旁路文件（baseline_store），对比时直接mmap加载；
+    对比在表格进程池的工作进程中执行，进程内的内存缓存无法共享，非CSV基线不预热
+    """
+    comparator = SimplifiedCSVComparator()
+    loaded, failed, skipped = {}, {}, {}
+    for path in paths:
+        abs_path = os.path.abspath(path)
+        try:
+            table = comparator._load_baseline_table(abs_path)
+            if table is not None:
+                loaded[abs_path] = len(table.rows())
+            else:
+                skipped[abs_path] = '非CSV基线或列式存储不可用，不预热'
+        except Exception as e:
+            failed[abs_path] = str(e)
+    return {'loaded': loaded, 'failed': failed, 'skipped': skipped}
+
 class SimplifiedCSVComparator:
     """简化的CSV对比器 - 只输出核心信息"""
     
@@ -32,9 +64,17 @@ class SimplifiedCSVComparator:
         return f"{self.get_column_letter(col)}{row + 1}"
 
     def _read_file(self, file_path: str) -> List[List[str]]:
-        """读取CSV或XLSX文件，返回二维数组"""
+        """读取CSV、XLSX或EJS文件，返回二维数组"""
         file_path = Path(file_path)
 
+        # 腾讯文档EJS导出（扩展名可能是.ejs/.csv/.xlsx），直接流式解码为行；
+        # 行列无法确认对齐时不使用解码结果，按原方式读取
+        if read_ejs_rows and (file_path.suffix.lower() == '.ejs' or is_ejs_file(file_path)):
+            try:
+                return read_ejs_rows(file_path)
+            except EJSDecodeError as e:
+                print(f"⚠️ EJS解码结果未通过行列对齐检查，按原方式读取 {file_path.name}: {e}")
+
         # 根据文件扩展名判断格式
         if file_path.suffix.lower() == '.xlsx':
             # 读取XLSX文件
@@ -61,6 +101,16 @@ class SimplifiedCSVComparator:
                 with open(file_path, 'r', encoding='gbk') as f:
                     return list(csv.reader(f))
     
+    def _load_baseline_table(self, file_path: str):
+        """CSV基线取列式存储（一周内只解析一次），不适用或失败时返回None"""
+        if load_baseline is None or not is_plain_csv(file_path):
+            return None
+        try:
+            return load_baseline(file_path)
+        except (OSError, ValueError) as e:
+            print(f"基线列式存储不可用，直接读取 {file_path}: {e}")
+            return None
+
     def compare(self, baseline_path: str, target_path: str, 
                 output_dir: str = None) -> Dict[str, Any]:
         """
@@ -87,8 +137,9 @@ class SimplifiedCSVComparator:
                 }
             }
         """
-        # 读取文件（支持CSV和XLSX）
-        baseline_data = self._read_file(baseline_path)
+        # 读取文件（支持CSV和XLSX），CSV基线走列式存储，只需解析目标文件
+        baseline_table = self._load_baseline_table(baseline_path)
+        baseline_data = baseline_table.rows() if baseline_table else self._read_file(baseline_path)
         target_data = self._read_file(target_path)
         
         # 腾讯文档CSV格式：
@@ -103,37 +154,36 @@ class SimplifiedCSVComparator:
         modifications = []  # 修改的单元格列表
         modified_column_indices = set()  # 用于去重的列索引集合
         
-        # 从第3行开始比较数据（跳过标题行和列名行）
+        # 从第3行开始比较数据（跳过标题行和列名行），只为有差异的单元格生成记录
         start_row = 2  # 从索引2开始（第3行）
-        max_rows = max(len(baseline_data), len(target_data))
-        for row_idx in range(start_row, max_rows):
+        # 基线来自列式存储时，原始值不同但规范化行哈希一致的行（仅空白差异）直接跳过
+        skip_row = None
+        if baseline_table:
+            def skip_row(row_idx):
+                return (row_idx < baseline_table.n_rows and row_idx < len(target_data)
+                        and baseline_table.row_hash(row_idx) == normalized_row_hash(target_data[row_idx]))
+        for row_idx, col_idx in changed_cells(baseline_data, target_data, start_row, skip_row=skip_row):
             baseline_row = baseline_data[row_idx] if row_idx < len(baseline_data) else []
             target_row = target_data[row_idx] if row_idx < len(target_data) else []
+            baseline_value = str(baseline_row[col_idx]) if col_idx < len(baseline_row) else ''
+            target_value = str(target_row[col_idx]) if col_idx < len(target_row) else ''
+            
+            # 获取列信息
+            column_letter = self.get_column_letter(col_idx)
+            column_name = column_names[col_idx] if col_idx < len(column_names) else ''
+            
+            # 记录修改的列（用于去重汇总）
+            if col_idx not in modified_column_indices:
+                modified_column_indices.add(col_idx)
+                modified_columns[column_letter] = column_name
             
-            max_cols = max(len(baseline_row), len(target_row))
-            for col_idx in range(max_cols):
-                baseline_value = str(baseline_row[col_idx]) if col_idx < len(baseline_row) else ''
-                target_value = str(target_row[col_idx]) if col_idx < len(target_row) else ''
-                
-                # 如果单元格值不同
-                if baseline_value.strip() != target_value.strip():
-                    # 获取列信息
-                    column_letter = self.get_column_letter(col_idx)
-                    column_name = column_names[col_idx] if col_idx < len(column_names) else ''
-                    
-                    # 记录修改的列（用于去重汇总）
-                    if col_idx not in modified_column_indices:
-                        modified_column_indices.add(col_idx)
-                        modified_columns[column_letter] = column_name
-                    
-                    # 记录修改的单元格（包含列名）
-                    cell_address = self.get_cell_address(row_idx, col_idx)
-                    modifications.append({
-                        'cell': cell_address,
-                        'column_name': column_name,  # 添加列名到每个修改块
-                        'old': baseline_value,
-                        'new': target_value
-                    })
+            # 记录修改的单元格（包含列名）
+            modifications.append({
+                'cell': self.get_cell_address(row_idx, col_idx),
+                'column_name': column_name,  # 添加列名到每个修改块
+                'old': baseline_value,
+                'new': target_value
+            })
         
         # 计算相似度（排除标题行和列名行）
         data_rows_baseline = max(0, len(baseline_data) - 2)  # 减去标题行和列名行